@@ -7,8 +7,10 @@ import enum
 import random
 import math
 import time
+import numpy as np
 import pygame
 from constants import *
+from ai_profiler import get_profiler
 
 
 class NodeStatus(enum.Enum):
@@ -189,25 +191,7 @@ class HasEnemyInSight(ConditionNode):
     """检查是否有敌人在视线内"""
     
     def tick(self, ai_player, blackboard):
-        enemies = blackboard.get('enemies', [])
-        game_map = blackboard.get('game_map')
-        team_manager = blackboard.get('team_manager')
-        
-        # 过滤掉队友（优先使用团队管理器判断，其次使用team_id对比）
-        filtered_enemies = []
-        for enemy in enemies:
-            if enemy.get('is_dead', False):
-                continue
-            # 检查是否是队友（先用are_teammates，避免ID类型/同步问题）
-            if team_manager:
-                if team_manager.are_teammates(ai_player.id, enemy.get('id')):
-                    continue
-                # 补充：如果双方都有team_id字段，也进行一次直接对比（防守）
-                if hasattr(ai_player, 'team_id') and ai_player.team_id is not None:
-                    enemy_team_id = enemy.get('team_id')
-                    if enemy_team_id is not None and enemy_team_id == ai_player.team_id:
-                        continue
-            filtered_enemies.append(enemy)
+        perception = blackboard.get('perception')
         
         # 检查是否有激进型AI特征（扩大检测范围）
         is_aggressive = False
@@ -218,23 +202,26 @@ class HasEnemyInSight(ConditionNode):
         sight_range = 400 if is_aggressive else 300
         close_range = 200  # 近距离范围（即使没有视线也尝试攻击）
         
+        if perception is not None:
+            # 感知快照中已有距离和视线矩阵，直接查表
+            in_range = perception.alive_enemies()
+            in_range = in_range[perception.distances[in_range] <= sight_range]
+            candidates = [(perception.record(i), float(perception.distances[i]), bool(perception.line_of_sight[i]))
+                          for i in in_range]
+        else:
+            candidates = self._candidates(ai_player, blackboard, sight_range)
+        
         closest_enemy = None
         closest_distance = float('inf')
         closest_has_los = False
         
-        for enemy in filtered_enemies:
-            enemy_pos = pygame.Vector2(*enemy['pos'])
-            distance = ai_player.pos.distance_to(enemy_pos)
-            
-            if distance <= sight_range:
-                has_los = ai_player.has_line_of_sight(enemy_pos, game_map)
-                
-                # 优先选择有视线的敌人，如果距离很近也考虑
-                if has_los or (distance <= close_range and is_aggressive):
-                    if distance < closest_distance or (has_los and not closest_has_los):
-                        closest_enemy = enemy
-                        closest_distance = distance
-                        closest_has_los = has_los
+        for enemy, distance, has_los in candidates:
+            # 优先选择有视线的敌人，如果距离很近也考虑
+            if has_los or (distance <= close_range and is_aggressive):
+                if distance < closest_distance or (has_los and not closest_has_los):
+                    closest_enemy = enemy
+                    closest_distance = distance
+                    closest_has_los = has_los
         
         if closest_enemy:
             blackboard['target_enemy'] = closest_enemy
@@ -243,12 +230,48 @@ class HasEnemyInSight(ConditionNode):
             return NodeStatus.SUCCESS
         
         return NodeStatus.FAILURE
+    
+    def _candidates(self, ai_player, blackboard, sight_range):
+        """没有感知快照时逐个过滤：生成 (敌人, 距离, 是否有视线)"""
+        enemies = blackboard.get('enemies', [])
+        game_map = blackboard.get('game_map')
+        team_manager = blackboard.get('team_manager')
+        
+        for enemy in enemies:
+            if enemy.get('is_dead', False):
+                continue
+            # 检查是否是队友（先用are_teammates，避免ID类型/同步问题）
+            if team_manager:
+                if team_manager.are_teammates(ai_player.id, enemy.get('id')):
+                    continue
+                # 补充：如果双方都有team_id字段，也进行一次直接对比（防守）
+                if hasattr(ai_player, 'team_id') and ai_player.team_id is not None:
+                    enemy_team_id = enemy.get('team_id')
+                    if enemy_team_id is not None and enemy_team_id == ai_player.team_id:
+                        continue
+            
+            enemy_pos = pygame.Vector2(*enemy['pos'])
+            distance = ai_player.pos.distance_to(enemy_pos)
+            if distance <= sight_range:
+                yield enemy, distance, ai_player.has_line_of_sight(enemy_pos, game_map)
 
 
 class HasEnemyInSoundRange(ConditionNode):
     """检查是否有敌人在声音范围内"""
     
     def tick(self, ai_player, blackboard):
+        perception = blackboard.get('perception')
+        if perception is not None:
+            # 听觉矩阵已按AI的听觉范围计算，取第一个能听到的敌人
+            heard = perception.alive_enemies()
+            heard = heard[perception.audible[heard]]
+            if len(heard):
+                enemy = perception.record(heard[0])
+                blackboard['target_enemy'] = enemy
+                blackboard['target_pos'] = pygame.Vector2(*enemy['pos'])
+                return NodeStatus.SUCCESS
+            return NodeStatus.FAILURE
+        
         enemies = blackboard.get('enemies', [])
         team_manager = blackboard.get('team_manager')
         
@@ -307,6 +330,12 @@ class IsInDanger(ConditionNode):
     """检查是否处于危险中（多个敌人靠近）"""
     
     def tick(self, ai_player, blackboard):
+        perception = blackboard.get('perception')
+        if perception is not None:
+            enemies = perception.alive_enemies()
+            danger_count = int(np.count_nonzero(perception.distances[enemies] < 150))
+            return NodeStatus.SUCCESS if danger_count >= 2 else NodeStatus.FAILURE
+        
         enemies = blackboard.get('enemies', [])
         team_manager = blackboard.get('team_manager')
         danger_count = 0
@@ -348,6 +377,10 @@ class HasTeammateInDanger(ConditionNode):
     """检查是否有队友处于危险中"""
     
     def tick(self, ai_player, blackboard):
+        perception = blackboard.get('perception')
+        if perception is not None:
+            return self._tick_perception(perception, blackboard)
+        
         allies = blackboard.get('allies', [])
         enemies = blackboard.get('enemies', [])
         
@@ -387,6 +420,25 @@ class HasTeammateInDanger(ConditionNode):
                 return NodeStatus.SUCCESS
         
         return NodeStatus.FAILURE
+    
+    def _tick_perception(self, perception, blackboard):
+        """使用感知快照的距离矩阵判断队友附近的敌人"""
+        enemies = perception.alive_enemies()
+        for i in perception.alive_allies():
+            ally = perception.record(i)
+            distances = perception.snapshot.distance[i, enemies]
+            nearby = distances < 200  # 危险距离
+            nearby_enemies = int(np.count_nonzero(nearby))
+            
+            # 如果队友生命值低且附近有敌人，或者有多个敌人靠近
+            if (ally.get('health', 100) < 50 and nearby_enemies > 0) or nearby_enemies >= 2:
+                blackboard['teammate_in_danger'] = ally
+                blackboard['teammate_danger_pos'] = pygame.Vector2(*ally['pos'])
+                if nearby_enemies:
+                    blackboard['teammate_threat'] = perception.record(enemies[np.argmin(distances)])
+                return NodeStatus.SUCCESS
+        
+        return NodeStatus.FAILURE
 
 
 class HasTeammateNearby(ConditionNode):
@@ -397,6 +449,15 @@ class HasTeammateNearby(ConditionNode):
         self.max_distance = max_distance
     
     def tick(self, ai_player, blackboard):
+        perception = blackboard.get('perception')
+        if perception is not None:
+            allies = perception.alive_allies()
+            nearby = allies[perception.distances[allies] <= self.max_distance]
+            if len(nearby):
+                blackboard['nearby_teammate'] = perception.record(nearby[0])
+                return NodeStatus.SUCCESS
+            return NodeStatus.FAILURE
+        
         allies = blackboard.get('allies', [])
         
         if not allies:
@@ -420,6 +481,20 @@ class HasTeammateEngaging(ConditionNode):
     """检查是否有队友正在与敌人交火"""
     
     def tick(self, ai_player, blackboard):
+        perception = blackboard.get('perception')
+        if perception is not None:
+            enemies = perception.alive_enemies()
+            for i in perception.alive_allies():
+                ally = perception.record(i)
+                if not ally.get('shooting', False):
+                    continue
+                engaged = enemies[perception.snapshot.distance[i, enemies] < 300]  # 交火距离
+                if len(engaged):
+                    blackboard['teammate_engaging'] = ally
+                    blackboard['teammate_target'] = perception.record(engaged[0])
+                    return NodeStatus.SUCCESS
+            return NodeStatus.FAILURE
+        
         allies = blackboard.get('allies', [])
         enemies = blackboard.get('enemies', [])
         
@@ -1592,14 +1667,102 @@ class CoverTeammateAction(ActionNode):
         return NodeStatus.RUNNING
 
 
+# ==================== 行为树编译 ====================
+
+# 编译后指令的终止目标
+END_SUCCESS = -1
+END_FAILURE = -2
+END_RUNNING = -3
+
+
+class CompiledTree:
+    """
+    扁平化的行为树
+
+    选择/序列/反转节点没有跨tick的状态（每个tick都从第一个子节点重新求值），
+    因此可以在编译期把它们展开为跳转：每条指令是一个叶子节点的tick方法和
+    它返回成功/失败/其他状态时的下一条指令下标（负数为终止）。
+    任何节点返回RUNNING时所有祖先都立即返回RUNNING，解释循环直接结束。
+    并行、重复等其他节点作为一条指令整体调用（重复节点的计数状态仍在节点对象上）。
+
+    其他状态指叶子节点返回的非SUCCESS/FAILURE/RUNNING值，按原节点的处理方式：
+    选择/序列节点继续执行下一个子节点，反转节点返回RUNNING。
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.program = []  # [(tick, 成功时跳转, 失败时跳转, 其他状态时跳转)]
+        self.entry = self._compile(root, END_SUCCESS, END_FAILURE, END_RUNNING)
+        # 预分配的默认动作（每个tick原地重置，动作节点会整体替换黑板中的动作）
+        self.action = {'move': pygame.Vector2(0, 0), 'angle': 0, 'shoot': False, 'reload': False}
+
+    def _compile(self, node, on_success, on_failure, on_other):
+        """编译节点，返回入口指令下标（从后往前编译，后继的入口已知）"""
+        node_type = type(node)
+        if node_type is SequenceNode:
+            entry = on_success
+            for child in reversed(node.children):
+                entry = self._compile(child, entry, on_failure, entry)
+            return entry
+        if node_type is SelectorNode:
+            entry = on_failure
+            for child in reversed(node.children):
+                entry = self._compile(child, on_success, entry, entry)
+            return entry
+        if node_type is InverterNode:
+            if not node.child:
+                return on_failure
+            return self._compile(node.child, on_failure, on_success, END_RUNNING)
+        self.program.append((node.tick, on_success, on_failure, on_other))
+        return len(self.program) - 1
+
+    def default_action(self, angle):
+        """重置并返回预分配的默认动作"""
+        action = self.action
+        move = action['move']
+        action.clear()
+        move.update(0, 0)
+        action['move'] = move
+        action['angle'] = angle
+        action['shoot'] = False
+        action['reload'] = False
+        return action
+
+    def run(self, ai_player, blackboard):
+        """解释执行，返回根节点的状态"""
+        program = self.program
+        success = NodeStatus.SUCCESS
+        failure = NodeStatus.FAILURE
+        running = NodeStatus.RUNNING
+        pc = self.entry
+        while pc >= 0:
+            tick, on_success, on_failure, on_other = program[pc]
+            status = tick(ai_player, blackboard)
+            if status is success:
+                pc = on_success
+            elif status is failure:
+                pc = on_failure
+            elif status is running:
+                return running
+            else:
+                pc = on_other
+        if pc == END_SUCCESS:
+            return success
+        if pc == END_FAILURE:
+            return failure
+        return running
+
+
 class BehaviorTree:
     """行为树"""
     
     def __init__(self, root_node):
         self.root = root_node
+        self.tree_type = None  # 由create_*_tree设置，用于性能分析按树类型分组
         self.blackboard = {}  # 黑板（共享数据）
+        self.compiled = None  # 根节点编译后的CompiledTree（根节点替换后重新编译）
     
-    def tick(self, ai_player, enemies, game_map, team_manager=None, allies=None):
+    def tick(self, ai_player, enemies, game_map, team_manager=None, allies=None, perception=None):
         """
         执行行为树
         
@@ -1609,6 +1772,7 @@ class BehaviorTree:
             game_map: 游戏地图对象
             team_manager: 团队管理器（可选）
             allies: 队友列表（可选）
+            perception: 本tick感知快照中该AI的视图（可选，perception.PerceptionView）
             
         Returns:
             dict: 执行的动作
@@ -1618,16 +1782,26 @@ class BehaviorTree:
         self.blackboard['game_map'] = game_map
         self.blackboard['team_manager'] = team_manager
         self.blackboard['allies'] = allies or []
-        self.blackboard['action'] = {
-            'move': pygame.Vector2(0, 0),
-            'angle': ai_player.angle,
-            'shoot': False,
-            'reload': False
-        }
-        
-        # 执行根节点
-        if self.root:
-            self.root.tick(ai_player, self.blackboard)
+        self.blackboard['perception'] = perception
+        
+        # 执行根节点（开启性能分析时按节点对象执行并挂上节点计时包装，否则执行编译后的指令）
+        profiler = get_profiler()
+        if self.root and AI_COMPILE_BEHAVIOR_TREES and not profiler.enabled:
+            if self.compiled is None or self.compiled.root is not self.root:
+                self.compiled = CompiledTree(self.root)
+            self.blackboard['action'] = self.compiled.default_action(ai_player.angle)
+            self.compiled.run(ai_player, self.blackboard)
+        else:
+            self.blackboard['action'] = {
+                'move': pygame.Vector2(0, 0),
+                'angle': ai_player.angle,
+                'shoot': False,
+                'reload': False
+            }
+            if self.root:
+                if profiler.enabled:
+                    profiler.attach(self)
+                self.root.tick(ai_player, self.blackboard)
         
         # 返回动作
         return self.blackboard.get('action', {
@@ -1688,6 +1862,7 @@ class BehaviorTree:
             chase_sequence, 
             patrol_action
         ]
+        self.tree_type = "aggressive"
         self.root = root
         return root
     
@@ -1728,6 +1903,7 @@ class BehaviorTree:
         patrol_action = PatrolAction("PatrolAction")
         
         root.children = [reload_sequence, retreat_sequence, cover_sequence, attack_sequence, patrol_action]
+        self.tree_type = "defensive"
         self.root = root
         return root
     
@@ -1799,6 +1975,7 @@ class BehaviorTree:
             chase_sequence, 
             patrol_action
         ]
+        self.tree_type = "tactical"
         self.root = root
         return root
     
@@ -1838,6 +2015,7 @@ class BehaviorTree:
         patrol_action = PatrolAction("PatrolAction")
         
         root.children = [reload_sequence, ambush_sequence, cover_sequence, attack_sequence, patrol_action]
+        self.tree_type = "stealthy"
         self.root = root
         return root
     
@@ -1910,6 +2088,7 @@ class BehaviorTree:
             chase_sequence, 
             patrol_action
         ]
+        self.tree_type = "team"
         self.root = root
         return root
 
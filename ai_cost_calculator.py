@@ -17,6 +17,10 @@ import pygame
 from constants import *
 
 
+# clipline 逐次裁剪时交点取整的累计误差上限（像素）
+CLIPLINE_MARGIN = 2
+
+
 class AICostCalculator:
     """AI代价计算器 - 使用numpy进行批量计算"""
     
@@ -43,6 +47,10 @@ class AICostCalculator:
             self.grid_centers_x = [i * grid_size + grid_size / 2 for i in range(self.grid_width)]
             self.grid_centers_y = [i * grid_size + grid_size / 2 for i in range(self.grid_height)]
         
+        # 墙壁掩码缓存（按地图对象）
+        self._wall_mask = None
+        self._wall_mask_map = None
+        
     def calculate_threat_cost(self, position, enemies, game_map):
         """
         计算位置受到威胁的代价（越高越危险）
@@ -160,30 +168,21 @@ class AICostCalculator:
         Returns:
             numpy.ndarray or list: 代价网格（值越小越好）
         """
-        # 初始化代价网格
         if HAS_NUMPY:
-            cost_grid = np.zeros((self.grid_height, self.grid_width))
-        else:
-            cost_grid = [[0.0 for _ in range(self.grid_width)] for _ in range(self.grid_height)]
+            return self._calculate_cost_window(ai_pos, enemies, game_map,
+                                               slice(0, self.grid_height), slice(0, self.grid_width))
         
-        # 计算每个网格点的代价
+        # Fallback: 逐格计算
+        cost_grid = [[0.0 for _ in range(self.grid_width)] for _ in range(self.grid_height)]
         for i in range(self.grid_height):
             for j in range(self.grid_width):
-                if HAS_NUMPY:
-                    grid_x = self.grid_centers_x[j]
-                    grid_y = self.grid_centers_y[i]
-                else:
-                    grid_x = self.grid_centers_x[j]
-                    grid_y = self.grid_centers_y[i]
-                
+                grid_x = self.grid_centers_x[j]
+                grid_y = self.grid_centers_y[i]
                 grid_pos = pygame.Vector2(grid_x, grid_y)
                 
                 # 检查是否在墙壁内（不可通行）
                 if self._is_in_wall(grid_pos, game_map):
-                    if HAS_NUMPY:
-                        cost_grid[i, j] = 9999.0
-                    else:
-                        cost_grid[i][j] = 9999.0
+                    cost_grid[i][j] = 9999.0
                     continue
                 
                 # 1. 威胁代价（越高越危险，加到总代价中）
@@ -199,14 +198,152 @@ class AICostCalculator:
                 
                 # 4. 综合代价（威胁+距离-掩体价值）
                 total_cost = threat_cost * 2.0 + distance_cost * 0.5 - cover_value * 1.5
-                
-                if HAS_NUMPY:
-                    cost_grid[i, j] = max(0.0, total_cost)
-                else:
-                    cost_grid[i][j] = max(0.0, total_cost)
+                cost_grid[i][j] = max(0.0, total_cost)
         
         return cost_grid
     
+    def _calculate_cost_window(self, ai_pos, enemies, game_map, rows, cols):
+        """
+        向量化计算网格窗口内的代价，结果与逐格调用 calculate_threat_cost / calculate_cover_value 一致
+        
+        Args:
+            rows, cols: 网格行、列切片
+            
+        Returns:
+            numpy.ndarray: 窗口代价网格
+        """
+        grid_x, grid_y = np.meshgrid(self.grid_centers_x[cols], self.grid_centers_y[rows])
+        in_wall = self._static_wall_mask(game_map)[rows, cols]
+        
+        # 距离代价
+        distance_cost = np.hypot(grid_x - ai_pos.x, grid_y - ai_pos.y) / 1000.0
+        
+        threat_cost = np.zeros(grid_x.shape)
+        cover_value = np.full(grid_x.shape, 0.5)  # 没有敌人时掩体价值中等
+        live = [enemy for enemy in enemies if not enemy.get('is_dead', False)]
+        if live:
+            enemy_x = np.array([enemy['pos'][0] for enemy in live], dtype=np.float64)
+            enemy_y = np.array([enemy['pos'][1] for enemy in live], dtype=np.float64)
+            health = np.array([enemy.get('health', 100) for enemy in live], dtype=np.float64) / 100.0
+            
+            # (h, w, E) 格子到每个敌人的距离与视线
+            distance = np.hypot(grid_x[..., None] - enemy_x, grid_y[..., None] - enemy_y)
+            boxes = self._obstacle_boxes(game_map, grid_x, grid_y, enemy_x, enemy_y)
+            has_los, walls_between = self._window_line_of_sight(game_map, grid_x, grid_y, enemy_x, enemy_y, boxes)
+            
+            # 威胁: 距离衰减 × 视线 × 敌人健康值，按敌人总数（含死亡）归一化
+            threat = np.exp(-distance / 200.0) * np.where(has_los, 2.0, 0.5) * health
+            threat_cost = np.minimum(1.0, threat.sum(axis=-1) / len(enemies))
+            
+            # 掩体: 只考虑500像素内的敌人，无视线记1分，有视线按距离给少量分数
+            near = distance <= 500
+            score = np.where(has_los, np.where(walls_between, 0.5, np.maximum(0.1, 1.0 - distance / 500.0) * 0.3), 1.0)
+            near_count = near.sum(axis=-1)
+            cover_score = np.where(near, score, 0.0).sum(axis=-1)
+            cover_value = np.where(near_count > 0, np.minimum(1.0, cover_score / np.maximum(near_count, 1)), 0.5)
+        
+        total_cost = threat_cost * 2.0 + distance_cost * 0.5 - cover_value * 1.5
+        return np.where(in_wall, 9999.0, np.maximum(0.0, total_cost))
+    
+    def _window_line_of_sight(self, game_map, grid_x, grid_y, enemy_x, enemy_y, boxes):
+        """
+        格子到每个敌人的视线 (h, w, E)，以及有视线时中间是否仍有墙壁（与 calculate_cover_value 一致）
+        
+        clipline 把交点坐标取整，贴着矩形边缘的线段与连续几何的结论可能不同。
+        矩形外扩和内缩 CLIPLINE_MARGIN 像素的结论一致时直接采用，
+        不一致的少数格子-敌人对逐个调用 _has_line_of_sight / _count_walls_between。
+        """
+        outer_blocked, inner_blocked = self._segments_blocked(grid_x[..., None], grid_y[..., None],
+                                                              enemy_x, enemy_y, boxes, CLIPLINE_MARGIN)
+        has_los = ~outer_blocked
+        walls_between = np.zeros(has_los.shape, dtype=bool)
+        for i, j, k in zip(*np.nonzero(outer_blocked & ~inner_blocked)):
+            pos = pygame.Vector2(grid_x[i, j], grid_y[i, j])
+            enemy_pos = pygame.Vector2(enemy_x[k], enemy_y[k])
+            has_los[i, j, k] = self._has_line_of_sight(pos, enemy_pos, game_map)
+            walls_between[i, j, k] = has_los[i, j, k] and self._count_walls_between(pos, enemy_pos, game_map) > 0
+        return has_los, walls_between
+    
+    def _static_wall_mask(self, game_map):
+        """格子中心是否在墙壁内（墙壁不会变化，每张地图只计算一次）"""
+        if self._wall_mask_map is not game_map:
+            # 与 _is_in_wall 一致: 1x1 的 pygame.Rect 坐标截断为整数
+            xs = self.grid_centers_x.astype(int)
+            ys = self.grid_centers_y.astype(int)
+            mask = np.zeros((self.grid_height, self.grid_width), dtype=bool)
+            for wall in game_map.walls:
+                inside_x = (xs >= wall.left) & (xs < wall.right)
+                inside_y = (ys >= wall.top) & (ys < wall.bottom)
+                mask |= inside_y[:, None] & inside_x[None, :]
+            self._wall_mask = mask
+            self._wall_mask_map = game_map
+        return self._wall_mask
+    
+    @staticmethod
+    def _obstacle_boxes(game_map, grid_x, grid_y, enemy_x, enemy_y):
+        """窗口与敌人包围盒内的墙壁和关闭的门 (K, 4) [left, top, right, bottom]"""
+        left = min(grid_x.min(), enemy_x.min())
+        top = min(grid_y.min(), enemy_y.min())
+        right = max(grid_x.max(), enemy_x.max())
+        bottom = max(grid_y.max(), enemy_y.max())
+        area = (int(left) - 1, int(top) - 1, int(right - left) + 3, int(bottom - top) + 3)
+        rects = game_map.spatial.walls_in_rect(area) + [door.rect for door in game_map.spatial.doors_in_rect(area)]
+        if not rects:
+            return np.empty((0, 4))
+        return np.array([(rect.left, rect.top, rect.right, rect.bottom) for rect in rects], dtype=np.float64)
+    
+    @classmethod
+    def _segments_blocked(cls, x0, y0, x1, y1, boxes, margin):
+        """
+        批量判断线段是否与任一外扩/内缩 margin 像素的矩形相交
+        
+        与 pygame.Rect.clipline 相同: 端点坐标截断为整数，矩形按闭区间 [left, right-1] × [top, bottom-1]；
+        clipline 的交点取整不在此模拟，由调用方按两个结论是否一致决定是否需要精确检测
+        
+        Args:
+            x0, y0, x1, y1: 可广播的线段端点数组
+            boxes: (K, 4) [left, top, right, bottom]
+            margin: 外扩/内缩的像素数
+            
+        Returns:
+            (与外扩矩形相交, 与内缩矩形相交): 广播后形状的布尔数组
+        """
+        x0, y0, x1, y1 = np.broadcast_arrays(np.trunc(x0), np.trunc(y0), np.trunc(x1), np.trunc(y1))
+        if not len(boxes):
+            return np.zeros(x0.shape, dtype=bool), np.zeros(x0.shape, dtype=bool)
+        left, top, right, bottom = boxes[:, 0], boxes[:, 1], boxes[:, 2] - 1, boxes[:, 3] - 1
+        outer = cls._slab_hits(x0[..., None], y0[..., None], x1[..., None], y1[..., None],
+                               left - margin, top - margin, right + margin, bottom + margin)
+        
+        # 内缩矩形包含在外扩矩形内，只需检测与外扩矩形相交的线段-矩形对
+        hit = np.nonzero(outer)
+        seg, box = hit[:-1], hit[-1]
+        inner_left, inner_top = left[box] + margin, top[box] + margin
+        inner_right, inner_bottom = right[box] - margin, bottom[box] - margin
+        inner_hit = cls._slab_hits(x0[seg], y0[seg], x1[seg], y1[seg],
+                                   inner_left, inner_top, inner_right, inner_bottom)
+        inner = np.zeros(outer.shape, dtype=bool)
+        inner[hit] = inner_hit & (inner_left <= inner_right) & (inner_top <= inner_bottom)
+        return outer.any(axis=-1), inner.any(axis=-1)
+    
+    @staticmethod
+    def _slab_hits(x0, y0, x1, y1, left, top, right, bottom):
+        """逐元素判断线段是否与闭区间矩形相交（slab方法）"""
+        t_enter = np.zeros(np.broadcast(x0, left).shape)
+        t_exit = np.ones(t_enter.shape)
+        for origin, delta, lo, hi in ((x0, x1 - x0, left, right), (y0, y1 - y0, top, bottom)):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t1 = (lo - origin) / delta
+                t2 = (hi - origin) / delta
+            # 该轴方向分量为0时，起点在板内则不限制，否则不相交
+            inside = (origin >= lo) & (origin <= hi)
+            parallel = delta == 0
+            near = np.where(parallel, np.where(inside, -np.inf, np.inf), np.minimum(t1, t2))
+            far = np.where(parallel, np.where(inside, np.inf, -np.inf), np.maximum(t1, t2))
+            np.maximum(t_enter, near, out=t_enter)
+            np.minimum(t_exit, far, out=t_exit)
+        return t_enter <= t_exit
+    
     def find_best_position(self, ai_pos, enemies, game_map, allies=None, 
                           max_search_radius=300):
         """
@@ -222,43 +359,48 @@ class AICostCalculator:
         Returns:
             pygame.Vector2: 最佳位置，如果找不到则返回None
         """
-        # 计算代价网格
-        cost_grid = self.calculate_position_cost_grid(ai_pos, enemies, game_map, allies)
-        
         # 只考虑在搜索半径内的位置
         ai_grid_x = int(ai_pos.x / self.grid_size)
         ai_grid_y = int(ai_pos.y / self.grid_size)
         search_radius_grid = int(max_search_radius / self.grid_size)
+        row_start = max(0, ai_grid_y - search_radius_grid)
+        row_end = min(self.grid_height, ai_grid_y + search_radius_grid + 1)
+        col_start = max(0, ai_grid_x - search_radius_grid)
+        col_end = min(self.grid_width, ai_grid_x + search_radius_grid + 1)
+        
+        if HAS_NUMPY:
+            if row_start >= row_end or col_start >= col_end:
+                return None
+            # 只计算搜索窗口内的代价
+            cost_window = self._calculate_cost_window(ai_pos, enemies, game_map,
+                                                      slice(row_start, row_end), slice(col_start, col_end))
+            cost_window = np.where(cost_window >= 9999.0, np.inf, cost_window)  # 不可通行
+            best = int(np.argmin(cost_window))
+            i, j = divmod(best, cost_window.shape[1])
+            if not np.isfinite(cost_window[i, j]):
+                return None
+            return pygame.Vector2(self.grid_centers_x[col_start + j], self.grid_centers_y[row_start + i])
+        
+        # Fallback: 计算完整代价网格后逐格比较
+        cost_grid = self.calculate_position_cost_grid(ai_pos, enemies, game_map, allies)
         
         min_cost = float('inf')
         best_pos = None
         
         # 在搜索半径内寻找代价最小的位置
-        for i in range(max(0, ai_grid_y - search_radius_grid), 
-                      min(self.grid_height, ai_grid_y + search_radius_grid + 1)):
-            for j in range(max(0, ai_grid_x - search_radius_grid), 
-                          min(self.grid_width, ai_grid_x + search_radius_grid + 1)):
-                
-                if HAS_NUMPY:
-                    cost = cost_grid[i, j]
-                else:
-                    cost = cost_grid[i][j]
+        for i in range(row_start, row_end):
+            for j in range(col_start, col_end):
+                cost = cost_grid[i][j]
                 
                 if cost >= 9999.0:  # 不可通行
                     continue
                 
                 if cost < min_cost:
                     min_cost = cost
-                    if HAS_NUMPY:
-                        best_pos = pygame.Vector2(
-                            self.grid_centers_x[j],
-                            self.grid_centers_y[i]
-                        )
-                    else:
-                        best_pos = pygame.Vector2(
-                            self.grid_centers_x[j],
-                            self.grid_centers_y[i]
-                        )
+                    best_pos = pygame.Vector2(
+                        self.grid_centers_x[j],
+                        self.grid_centers_y[i]
+                    )
         
         return best_pos
     
@@ -388,13 +530,20 @@ class AICostCalculator:
     
     def _has_line_of_sight(self, pos1, pos2, game_map):
         """检查两点之间是否有视线"""
+        # 视线预计算表能给出确定结论时直接返回，只有边界情况才做精确检测
+        known = game_map.los_table.lookup(pos1, pos2)
+        if known is not None:
+            return known
+        
+        walls, doors = game_map.spatial.segment_candidates(pos1, pos2)
+        
         # 检查墙壁
-        for wall in game_map.walls:
+        for wall in walls:
             if self._line_intersects_rect(pos1, pos2, wall):
                 return False
         
         # 检查关闭的门
-        for door in game_map.doors:
+        for door in doors:
             if not door.is_open:
                 if self._line_intersects_rect(pos1, pos2, door.rect):
                     return False
@@ -419,15 +568,13 @@ class AICostCalculator:
     def _count_walls_between(self, pos1, pos2, game_map):
         """计算两点之间的墙壁数量"""
         count = 0
-        for wall in game_map.walls:
+        walls, _ = game_map.spatial.segment_candidates(pos1, pos2)
+        for wall in walls:
             if self._line_intersects_rect(pos1, pos2, wall):
                 count += 1
         return count
     
     def _is_in_wall(self, pos, game_map):
         """检查位置是否在墙壁内"""
-        for wall in game_map.walls:
-            if wall.collidepoint(pos.x, pos.y):
-                return True
-        return False
+        return bool(game_map.spatial.walls_in_rect((pos.x, pos.y, 1, 1)))
 
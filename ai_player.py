@@ -3,9 +3,6 @@ import math
 import random
 import time
 from constants import *
-from pathfinding.core.diagonal_movement import DiagonalMovement
-from pathfinding.core.grid import Grid
-from pathfinding.finder.a_star import AStarFinder
 
 class AIPlayer:
     """AI玩家类"""
@@ -56,9 +53,9 @@ class AIPlayer:
         self.path_index = 0
         self.last_pathfind_time = 0
         self.pathfind_interval = 1.0  # 每秒重新计算路径
-        self.grid_size = 20  # 网格大小（像素）
-        self.game_grid = None
-        self.finder = AStarFinder(diagonal_movement=DiagonalMovement.always)
+        self.grid_size = NAV_GRID_SIZE  # 网格大小（像素）
+        self.navigation = None  # 地图共享的导航网格
+        self.flow_field = None  # 多个AI前往同一目标时使用的共享流场
         
         # 门交互
         self.last_door_interaction = 0
@@ -132,26 +129,8 @@ class AIPlayer:
         self.create_navigation_grid(game_map)
     
     def create_navigation_grid(self, game_map):
-        """创建用于路径规划的网格，动态考虑门的状态"""
-        # 计算网格尺寸
-        map_width = ROOM_SIZE * 3
-        map_height = ROOM_SIZE * 3
-        grid_width = map_width // self.grid_size
-        grid_height = map_height // self.grid_size
-        
-        # 创建网格矩阵（1=可通行，0=不可通行）
-        matrix = [[1 for _ in range(grid_width)] for _ in range(grid_height)]
-        
-        # 标记墙壁为不可通行
-        for wall in game_map.walls:
-            start_x = max(0, wall.left // self.grid_size)
-            end_x = min(grid_width - 1, wall.right // self.grid_size)
-            start_y = max(0, wall.top // self.grid_size)
-            end_y = min(grid_height - 1, wall.bottom // self.grid_size)
-            
-            for y in range(start_y, end_y + 1):
-                for x in range(start_x, end_x + 1):
-                    matrix[y][x] = 0
+        """获取地图共享的导航网格，并记录门的位置"""
+        self.navigation = game_map.get_navigation_grid()
         
         # 处理门：所有门都标记为可通行，AI会在经过时自动开门
         self.door_positions = []  # 记录所有门的位置
@@ -163,70 +142,12 @@ class AIPlayer:
                 'rect': door.rect
             }
             self.door_positions.append(door_info)
-            
-            # 所有门区域都标记为可通行
-            # AI会在路径规划时将门视为可通行，但在实际移动时检查并开门
-        
-        # 创建pathfinding网格
-        self.game_grid = Grid(matrix=matrix)
     
     def find_path_to_target(self, target_pos):
         """使用A*算法找到到目标的路径"""
-        if not self.game_grid:
+        if not self.navigation:
             return []
-        
-        # 转换坐标到网格坐标
-        start_x = int(self.pos.x // self.grid_size)
-        start_y = int(self.pos.y // self.grid_size)
-        end_x = int(target_pos.x // self.grid_size)
-        end_y = int(target_pos.y // self.grid_size)
-        
-        # 确保坐标在网格范围内
-        grid_width = self.game_grid.width
-        grid_height = self.game_grid.height
-        
-        start_x = max(0, min(grid_width - 1, start_x))
-        start_y = max(0, min(grid_height - 1, start_y))
-        end_x = max(0, min(grid_width - 1, end_x))
-        end_y = max(0, min(grid_height - 1, end_y))
-        
-        # 获取起点和终点
-        start = self.game_grid.node(start_x, start_y)
-        end = self.game_grid.node(end_x, end_y)
-        
-        # 如果终点不可通行，寻找附近的可通行点
-        if not end.walkable:
-            for radius in range(1, 5):
-                found = False
-                for dy in range(-radius, radius + 1):
-                    for dx in range(-radius, radius + 1):
-                        new_x = end_x + dx
-                        new_y = end_y + dy
-                        if (0 <= new_x < grid_width and 0 <= new_y < grid_height):
-                            test_node = self.game_grid.node(new_x, new_y)
-                            if test_node.walkable:
-                                end = test_node
-                                found = True
-                                break
-                    if found:
-                        break
-                if found:
-                    break
-        
-        # 清理网格（重置之前的路径）
-        self.game_grid.cleanup()
-        
-        # 寻找路径
-        path, runs = self.finder.find_path(start, end, self.game_grid)
-        
-        # 转换回世界坐标
-        world_path = []
-        for node in path:
-            world_x = node.x * self.grid_size + self.grid_size // 2
-            world_y = node.y * self.grid_size + self.grid_size // 2
-            world_path.append(pygame.Vector2(world_x, world_y))
-        
-        return world_path
+        return self.navigation.find_path(self.pos, target_pos)
     
     def check_door_interaction(self):
         """检查路径上是否有门需要开启"""
@@ -433,6 +354,15 @@ class AIPlayer:
         """更新路径规划"""
         current_time = time.time()
         
+        # 多个AI前往同一目标时沿共享流场移动，不再单独规划路径
+        if self.navigation:
+            self.flow_field = self.navigation.flow_field_for(self.id, target_pos, current_time)
+            if self.flow_field is not None and self.flow_field.reaches(self.pos):
+                self.current_path = []
+                self.path_index = 0
+                return
+            self.flow_field = None
+        
         # 定期重新计算路径或者当前路径已完成
         if (current_time - self.last_pathfind_time > self.pathfind_interval or 
             self.path_index >= len(self.current_path)):
@@ -448,6 +378,14 @@ class AIPlayer:
     
     def get_next_move_direction(self):
         """获取下一个移动方向"""
+        if self.flow_field is not None:
+            waypoints = self.flow_field.waypoints(self.pos)
+            if not waypoints:
+                return pygame.Vector2(0, 0)
+            self.check_doors_on_movement_path(self.pos, waypoints[0])
+            direction = waypoints[0] - self.pos
+            return direction.normalize() if direction.length() > 0 else pygame.Vector2(0, 0)
+        
         if not self.current_path or self.path_index >= len(self.current_path):
             return pygame.Vector2(0, 0)
         
@@ -627,14 +565,21 @@ class AIPlayer:
     
     def has_line_of_sight(self, target_pos, game_map):
         """检查是否有视线到目标位置"""
+        # 视线预计算表能给出确定结论时直接返回，只有边界情况才做精确检测
+        known = game_map.los_table.lookup(self.pos, target_pos)
+        if known is not None:
+            return known
+        
+        # 只检查与视线包围盒相交的墙壁和关闭的门
+        walls, doors = game_map.spatial.bbox_candidates(self.pos, target_pos)
+        
         # 检查墙壁遮挡
-        for wall in game_map.walls:
+        for wall in walls:
             if self.line_intersects_rect(self.pos, target_pos, wall):
                 return False
         
         # 检查关闭的门遮挡
-        for door_info in self.door_positions:
-            door = door_info['door']
+        for door in doors:
             if not door.is_open:
                 if self.line_intersects_rect(self.pos, target_pos, door.rect):
                     return False
@@ -659,17 +604,8 @@ class AIPlayer:
             PLAYER_RADIUS * 2
         )
         
-        # 检查墙壁碰撞
-        for wall in game_map.walls:
-            if player_rect.colliderect(wall):
-                return False
-        
-        # 检查门碰撞
-        for door in game_map.doors:
-            if door.check_collision(player_rect):
-                return False
-        
-        return True
+        # 检查墙壁和门碰撞
+        return not game_map.spatial.rect_blocked(player_rect)
     
     def find_valid_move_direction(self, game_map, preferred_directions=None):
         """找到可以移动的方向，优先使用preferred_directions"""
@@ -1061,12 +997,17 @@ class AIPlayer:
     
     def _has_line_of_sight(self, start_pos, end_pos, game_map):
         """检查两点之间是否有视线"""
+        known = game_map.los_table.lookup(start_pos, end_pos)
+        if known is not None:
+            return known
+        
         # 简化的视线检测
-        for wall in game_map.walls:
+        walls, doors = game_map.spatial.segment_candidates(start_pos, end_pos)
+        for wall in walls:
             if self._line_intersects_rect(start_pos, end_pos, wall):
                 return False
         
-        for door in game_map.doors:
+        for door in doors:
             if not door.is_open and self._line_intersects_rect(start_pos, end_pos, door.rect):
                 return False
         
@@ -8,9 +8,6 @@ import math
 import random
 import time
 from constants import *
-from pathfinding.core.diagonal_movement import DiagonalMovement
-from pathfinding.core.grid import Grid
-from pathfinding.finder.a_star import AStarFinder
 
 # 导入行为树和个性化系统
 from ai_behavior_tree import BehaviorTree
@@ -79,9 +76,9 @@ class EnhancedAIPlayer:
         self.path_index = 0
         self.last_pathfind_time = 0
         self.pathfind_interval = 1.0
-        self.grid_size = 20
-        self.game_grid = None
-        self.finder = AStarFinder(diagonal_movement=DiagonalMovement.always)
+        self.grid_size = NAV_GRID_SIZE
+        self.navigation = None  # 地图共享的导航网格
+        self.flow_field = None  # 多个AI前往同一目标时使用的共享流场
 
         # 巡逻路径
         self.patrol_points = []
@@ -160,48 +157,8 @@ class EnhancedAIPlayer:
         self.create_navigation_grid(game_map)
 
     def create_navigation_grid(self, game_map):
-        """创建导航网格，考虑玩家半径以避免路径点太靠近墙壁"""
-        map_width = ROOM_SIZE * 3
-        map_height = ROOM_SIZE * 3
-        grid_width = map_width // self.grid_size
-        grid_height = map_height // self.grid_size
-
-        matrix = [[1 for _ in range(grid_width)] for _ in range(grid_height)]
-
-        # 计算需要扩展的网格数（考虑玩家半径 + 安全距离）
-        # PLAYER_RADIUS = 20, grid_size = 20, 所以至少需要扩展1个网格
-        # 为了更安全，扩展2个网格（40像素）
-        expansion = max(1, int((PLAYER_RADIUS + 10) // self.grid_size))
-
-        # 标记墙壁（扩大区域以避免路径点太靠近墙壁）
-        for wall in game_map.walls:
-            # 扩大墙壁区域
-            start_x = max(0, (wall.left - PLAYER_RADIUS - 10) // self.grid_size)
-            end_x = min(
-                grid_width - 1, (wall.right + PLAYER_RADIUS + 10) // self.grid_size
-            )
-            start_y = max(0, (wall.top - PLAYER_RADIUS - 10) // self.grid_size)
-            end_y = min(
-                grid_height - 1, (wall.bottom + PLAYER_RADIUS + 10) // self.grid_size
-            )
-
-            for y in range(start_y, end_y + 1):
-                for x in range(start_x, end_x + 1):
-                    # 检查这个网格中心是否在墙壁的扩展区域内
-                    grid_center_x = x * self.grid_size + self.grid_size // 2
-                    grid_center_y = y * self.grid_size + self.grid_size // 2
-
-                    # 创建测试矩形（考虑玩家半径）
-                    test_rect = pygame.Rect(
-                        grid_center_x - PLAYER_RADIUS,
-                        grid_center_y - PLAYER_RADIUS,
-                        PLAYER_RADIUS * 2,
-                        PLAYER_RADIUS * 2,
-                    )
-
-                    # 如果测试矩形与墙壁碰撞，标记为不可行走
-                    if test_rect.colliderect(wall):
-                        matrix[y][x] = 0
+        """获取地图共享的导航网格（考虑玩家半径，避免路径点太靠近墙壁）"""
+        self.navigation = game_map.get_navigation_grid(agent_radius=PLAYER_RADIUS)
 
         # 记录门位置
         self.door_positions = []
@@ -213,62 +170,25 @@ class EnhancedAIPlayer:
             }
             self.door_positions.append(door_info)
 
-        self.game_grid = Grid(matrix=matrix)
-
     def find_path_to_target(self, target_pos):
         """使用A*算法找到到目标的路径"""
-        if not self.game_grid:
+        if not self.navigation:
             return []
-
-        start_x = int(self.pos.x // self.grid_size)
-        start_y = int(self.pos.y // self.grid_size)
-        end_x = int(target_pos.x // self.grid_size)
-        end_y = int(target_pos.y // self.grid_size)
-
-        grid_width = self.game_grid.width
-        grid_height = self.game_grid.height
-
-        start_x = max(0, min(grid_width - 1, start_x))
-        start_y = max(0, min(grid_height - 1, start_y))
-        end_x = max(0, min(grid_width - 1, end_x))
-        end_y = max(0, min(grid_height - 1, end_y))
-
-        start = self.game_grid.node(start_x, start_y)
-        end = self.game_grid.node(end_x, end_y)
-
-        if not end.walkable:
-            for radius in range(1, 5):
-                found = False
-                for dy in range(-radius, radius + 1):
-                    for dx in range(-radius, radius + 1):
-                        new_x = end_x + dx
-                        new_y = end_y + dy
-                        if 0 <= new_x < grid_width and 0 <= new_y < grid_height:
-                            test_node = self.game_grid.node(new_x, new_y)
-                            if test_node.walkable:
-                                end = test_node
-                                found = True
-                                break
-                    if found:
-                        break
-                if found:
-                    break
-
-        self.game_grid.cleanup()
-        path, runs = self.finder.find_path(start, end, self.game_grid)
-
-        world_path = []
-        for node in path:
-            world_x = node.x * self.grid_size + self.grid_size // 2
-            world_y = node.y * self.grid_size + self.grid_size // 2
-            world_path.append(pygame.Vector2(world_x, world_y))
-
-        return world_path
+        return self.navigation.find_path(self.pos, target_pos)
 
     def update_pathfinding(self, target_pos):
         """更新路径规划"""
         current_time = time.time()
 
+        # 多个AI前往同一目标时沿共享流场移动，不再单独规划路径
+        if self.navigation:
+            self.flow_field = self.navigation.flow_field_for(self.id, target_pos, current_time)
+            if self.flow_field is not None and self.flow_field.reaches(self.pos):
+                self.current_path = []
+                self.path_index = 0
+                return
+            self.flow_field = None
+
         # 检查是否需要重新规划路径
         need_repath = (
             current_time - self.last_pathfind_time > self.pathfind_interval
@@ -289,6 +209,17 @@ class EnhancedAIPlayer:
 
     def get_next_move_direction(self, game_map=None):
         """获取下一个移动方向，并检查碰撞"""
+        if self.flow_field is not None:
+            # 沿流场的后续路径点，依次尝试不会碰撞的方向
+            for target in self.flow_field.waypoints(self.pos, count=3):
+                direction = target - self.pos
+                if direction.length() == 0:
+                    continue
+                direction_normalized = direction.normalize()
+                if not game_map or self.can_move_in_direction(direction_normalized, game_map, distance=30):
+                    return direction_normalized
+            return pygame.Vector2(0, 0)
+
         if not self.current_path or self.path_index >= len(self.current_path):
             return pygame.Vector2(0, 0)
 
@@ -377,12 +308,17 @@ class EnhancedAIPlayer:
 
     def has_line_of_sight(self, target_pos, game_map):
         """检查是否有视线到目标"""
-        for wall in game_map.walls:
+        # 视线预计算表能给出确定结论时直接返回，只有边界情况才做精确检测
+        known = game_map.los_table.lookup(self.pos, target_pos)
+        if known is not None:
+            return known
+
+        walls, doors = game_map.spatial.segment_candidates(self.pos, target_pos)
+        for wall in walls:
             if self._line_intersects_rect(self.pos, target_pos, wall):
                 return False
 
-        for door_info in self.door_positions:
-            door = door_info["door"]
+        for door in doors:
             if not door.is_open:
                 if self._line_intersects_rect(self.pos, target_pos, door.rect):
                     return False
@@ -433,17 +369,8 @@ class EnhancedAIPlayer:
             PLAYER_RADIUS * 2,
         )
 
-        # 检查墙壁碰撞
-        for wall in game_map.walls:
-            if player_rect.colliderect(wall):
-                return False
-
-        # 检查门碰撞
-        for door in game_map.doors:
-            if door.check_collision(player_rect):
-                return False
-
-        return True
+        # 检查墙壁和门碰撞
+        return not game_map.spatial.rect_blocked(player_rect)
 
     def find_valid_move_direction(self, game_map, preferred_directions=None):
         """找到可以移动的方向，优先使用preferred_directions"""
@@ -530,23 +457,8 @@ class EnhancedAIPlayer:
             self.is_making_sound = False
             self.sound_volume = 0.0
 
-    def update(self, dt, players, game_map, bullets, team_manager=None):
-        """更新AI状态"""
-        if self.is_dead:
-            return None
-
-        current_time = time.time()
-
-        # 更新装填状态（检查换弹是否完成）
-        if self.is_reloading:
-            if current_time - self.reload_start_time >= RELOAD_TIME:
-                self.is_reloading = False
-                self.ammo = MAGAZINE_SIZE
-
-        # 更新静步模式
-        self.update_stealth_mode(players, game_map)
-
-        # 准备敌人和友军数据
+    def _split_players(self, players, team_manager):
+        """把其他玩家数据划分为敌人和队友"""
         enemies = []
         allies = []
 
@@ -586,9 +498,40 @@ class EnhancedAIPlayer:
             else:
                 enemies.append(player_data)
 
+        return enemies, allies
+
+    def update(self, dt, players, game_map, bullets, team_manager=None, perception=None):
+        """
+        更新AI状态
+
+        perception: 本tick共享感知快照中该AI的视图（perception.PerceptionView），
+            提供时直接使用其中的敌人/队友列表，不再逐个玩家重建
+        """
+        if self.is_dead:
+            return None
+
+        current_time = time.time()
+
+        # 更新装填状态（检查换弹是否完成）
+        if self.is_reloading:
+            if current_time - self.reload_start_time >= RELOAD_TIME:
+                self.is_reloading = False
+                self.ammo = MAGAZINE_SIZE
+
+        # 更新静步模式
+        self.update_stealth_mode(players, game_map)
+
+        # 准备敌人和友军数据（有感知快照时直接使用快照中的划分）
+        if perception is not None:
+            enemies = perception.enemies
+            allies = perception.allies
+        else:
+            enemies, allies = self._split_players(players, team_manager)
+
         # 执行行为树（传递team_manager和allies）
         action = self.behavior_tree.tick(
-            self, enemies, game_map, team_manager=team_manager, allies=allies
+            self, enemies, game_map, team_manager=team_manager, allies=allies,
+            perception=perception
         )
 
         # 检查门交互
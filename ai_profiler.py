@@ -0,0 +1,180 @@
+"""
+行为树性能分析模块
+
+按需开启的行为树节点计时：按行为树类型（create_aggressive_tree 等）和节点路径
+（如 Root/AttackSequence/HasEnemyInSight）统计调用次数、返回状态分布、累计时间和自身时间
+（扣除子节点的时间），用于在实际对局中找出AI的热点节点。
+
+开启时给行为树的每个节点挂上计时包装（实例属性覆盖类的tick方法），关闭时移除，
+未开启时行为树的执行路径没有任何额外开销。
+统计结果可导出为JSON，也可通过游戏内指令 .aiprof 查看。
+只统计当前进程中执行的行为树（使用AI决策进程池时工作进程中的决策不计入）。
+"""
+
+import json
+import time
+import weakref
+from typing import Dict, List
+
+from constants import AI_PROFILE_BEHAVIOR_TREES
+
+STATUSES = ("success", "failure", "running")
+
+
+class NodeStats:
+    """单个节点的统计"""
+
+    __slots__ = ("node_type", "calls", "total", "self_time", "statuses")
+
+    def __init__(self, node_type):
+        self.node_type = node_type
+        self.clear()
+
+    def clear(self):
+        self.calls = 0
+        self.total = 0.0
+        self.self_time = 0.0
+        self.statuses = dict.fromkeys(STATUSES, 0)
+
+    def to_dict(self, path) -> Dict:
+        return {
+            "path": path,
+            "type": self.node_type,
+            "calls": self.calls,
+            "total_ms": self.total * 1000,
+            "self_ms": self.self_time * 1000,
+            "avg_us": self.total / self.calls * 1e6 if self.calls else 0.0,
+            "status": dict(self.statuses),
+        }
+
+
+class BehaviorTreeProfiler:
+    """行为树节点计时器"""
+
+    def __init__(self, enabled=AI_PROFILE_BEHAVIOR_TREES):
+        self.enabled = False
+        self.stats: Dict = {}  # 行为树类型 -> {节点路径: NodeStats}
+        self.started_at = time.time()
+        self._stack: List[float] = []  # 正在执行的节点的子节点累计时间
+        self._nodes = weakref.WeakSet()  # 已挂上计时包装的节点
+        if enabled:
+            self.enable()
+
+    def enable(self):
+        """开启统计（已有行为树在下一次tick时挂上计时包装）"""
+        if not self.stats:
+            self.started_at = time.time()
+        self.enabled = True
+
+    def disable(self):
+        """关闭统计并移除所有计时包装（保留已收集的数据）"""
+        self.enabled = False
+        for node in list(self._nodes):
+            node.__dict__.pop("tick", None)
+        self._nodes = weakref.WeakSet()
+        self._stack.clear()
+
+    def reset(self):
+        """清空已收集的数据"""
+        for tree_stats in self.stats.values():
+            for stats in tree_stats.values():
+                stats.clear()
+        self.started_at = time.time()
+
+    def attach(self, tree):
+        """给行为树挂上计时包装（根节点已挂上时直接返回）"""
+        root = tree.root
+        if root is None or "tick" in root.__dict__:
+            return
+        tree_type = getattr(tree, "tree_type", None) or "custom"
+        self._instrument(root, root.name, self.stats.setdefault(tree_type, {}))
+
+    def _instrument(self, node, path, tree_stats):
+        stats = tree_stats.get(path)
+        if stats is None:
+            stats = tree_stats[path] = NodeStats(type(node).__name__)
+        original = type(node).tick.__get__(node)
+        stack = self._stack
+        perf_counter = time.perf_counter
+
+        def tick(ai_player, blackboard):
+            stack.append(0.0)
+            start = perf_counter()
+            status = None
+            try:
+                status = original(ai_player, blackboard)
+                return status
+            finally:
+                elapsed = perf_counter() - start
+                children = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                stats.calls += 1
+                stats.total += elapsed
+                stats.self_time += elapsed - children
+                key = getattr(status, "value", None)
+                if key in stats.statuses:
+                    stats.statuses[key] += 1
+
+        node.tick = tick
+        self._nodes.add(node)
+        children = list(node.children)
+        child = getattr(node, "child", None)
+        if child is not None and child not in children:
+            children.append(child)
+        for child in children:
+            self._instrument(child, f"{path}/{child.name}", tree_stats)
+
+    def to_dict(self) -> Dict:
+        """全部统计数据（可直接序列化为JSON）"""
+        trees = {}
+        for tree_type, tree_stats in self.stats.items():
+            nodes = [stats.to_dict(path) for path, stats in tree_stats.items()]
+            root = nodes[0] if nodes else None
+            trees[tree_type] = {
+                "ticks": root["calls"] if root else 0,
+                "total_ms": root["total_ms"] if root else 0.0,
+                "nodes": nodes,
+            }
+        return {
+            "enabled": self.enabled,
+            "duration_s": time.time() - self.started_at,
+            "trees": trees,
+        }
+
+    def export(self, path) -> Dict:
+        """导出统计数据到JSON文件"""
+        data = self.to_dict()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return data
+
+    def report(self, limit=10) -> str:
+        """按自身时间排序的热点节点（文本）"""
+        rows = []
+        for tree_type, tree_stats in self.stats.items():
+            for path, stats in tree_stats.items():
+                if stats.calls:
+                    rows.append((stats.self_time, tree_type, path, stats))
+        if not rows:
+            return "没有行为树统计数据"
+        rows.sort(key=lambda row: row[0], reverse=True)
+        lines = [f"行为树热点（按自身时间，统计{time.time() - self.started_at:.0f}秒）:"]
+        for self_time, tree_type, path, stats in rows[:limit]:
+            share = {key: count * 100 // stats.calls for key, count in stats.statuses.items()}
+            lines.append(
+                f"  [{tree_type}] {path}: {stats.calls}次 自身{self_time * 1000:.1f}ms "
+                f"累计{stats.total * 1000:.1f}ms "
+                f"成功{share['success']}%/失败{share['failure']}%/运行{share['running']}%"
+            )
+        return "\n".join(lines)
+
+
+_profiler = None
+
+
+def get_profiler() -> BehaviorTreeProfiler:
+    global _profiler
+    if _profiler is None:
+        _profiler = BehaviorTreeProfiler()
+    return _profiler
@@ -0,0 +1,163 @@
+"""
+AI调度模块
+
+按AI与真人玩家的距离、战斗状态和所在房间的人员情况给每个AI分配决策（行为树）频率，
+把同一频率的AI错开到不同tick上，并限制每个tick用于AI决策的CPU时间。
+移动积分不经过调度器，每个tick都会按AI最近一次决策的移动向量推进。
+
+决策档位（频率越高越优先）:
+    TIER_COMBAT: 战斗中（附近有其他存活玩家、刚开过枪或刚受到伤害），按 SERVER_AI_RATE 决策
+    TIER_NEAR: 靠近真人玩家或与真人在同一房间
+    TIER_ROOM: 房间里有其他玩家（AI之间）
+    TIER_IDLE: 远离真人且房间里没有其他玩家
+后三档的频率由 AI_LOD_THINK_RATES 配置。
+
+每个tick到期的AI按（到期时间, 档位）排序依次决策（最早到期优先，同时到期时高频档优先），
+超出预算的AI顺延到下一个tick并排在前面，低频档的AI在过载时也不会饿死；
+每个tick至少执行一个AI。
+"""
+
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from constants import (
+    ROOM_SIZE, SERVER_TICK_RATE, SERVER_AI_RATE, SERVER_AI_THINK_BUDGET_MS,
+    AI_LOD_THINK_RATES, AI_LOD_NEAR_DISTANCE, AI_LOD_COMBAT_DISTANCE
+)
+
+TIER_COMBAT = 0
+TIER_NEAR = 1
+TIER_ROOM = 2
+TIER_IDLE = 3
+
+
+class AIScheduler:
+    """AI决策频率调度器"""
+
+    def __init__(self, tick_rate=SERVER_TICK_RATE, combat_rate=SERVER_AI_RATE, think_rates=AI_LOD_THINK_RATES,
+                 near_distance=AI_LOD_NEAR_DISTANCE, combat_distance=AI_LOD_COMBAT_DISTANCE,
+                 budget_ms=SERVER_AI_THINK_BUDGET_MS):
+        """
+        Args:
+            tick_rate: 服务端tick频率（Hz）
+            combat_rate: 战斗档的决策频率（Hz）
+            think_rates: 靠近真人/房间有人/空闲三档的决策频率（Hz）
+            near_distance: 判定靠近真人玩家的距离
+            combat_distance: 判定战斗状态的其他玩家距离
+            budget_ms: 每个tick用于AI决策的时间预算（毫秒）
+        """
+        rates = [combat_rate] + list(think_rates)
+        self.intervals = [max(1, int(round(tick_rate / rate))) if rate > 0 else tick_rate for rate in rates]
+        self.near_distance = near_distance
+        self.combat_distance = combat_distance
+        self.budget = budget_ms / 1000.0
+        self.next_tick: Dict = {}  # AI ID -> 下次决策的tick
+        self.tiers: Dict = {}  # AI ID -> 当前档位
+        self.last_health: Dict = {}
+        self.actions: Dict = {}  # AI ID -> 最近一次决策的动作（未轮到决策的tick沿用其移动向量）
+        self.registered = 0
+        self.tick_start = 0.0
+        self.thoughts = 0  # 本tick已决策的AI数
+        self.deferred = 0  # 因超出预算顺延的累计次数
+
+    def classify(self, ai_players: Dict, players_data: Dict, shooting: Dict = None) -> Dict:
+        """
+        计算每个AI的决策档位
+
+        Args:
+            ai_players: {AI ID: AI玩家对象}（只包含存活的AI）
+            players_data: {玩家ID: 玩家数据dict}（含pos、is_dead），不在ai_players中的存活玩家视为真人
+            shooting: {AI ID: 上次决策是否开枪}
+
+        Returns:
+            {AI ID: 档位}
+        """
+        shooting = shooting or {}
+        if not ai_players:
+            return {}
+        ai_ids = list(ai_players)
+        alive = [pid for pid, pdata in players_data.items() if not pdata.get("is_dead", False)]
+        others = np.array([players_data[pid].get("pos", [0, 0]) for pid in alive], dtype=np.float64).reshape(-1, 2)
+        is_human = np.array([pid not in ai_players for pid in alive], dtype=bool)
+        bots = np.array([(ai.pos.x, ai.pos.y) for ai in ai_players.values()], dtype=np.float64).reshape(-1, 2)
+
+        delta = bots[:, None, :] - others[None, :, :]
+        distance = np.sqrt((delta * delta).sum(axis=2))
+        # 排除自己
+        column = {pid: j for j, pid in enumerate(alive)}
+        for i, pid in enumerate(ai_ids):
+            j = column.get(pid)
+            if j is not None:
+                distance[i, j] = np.inf
+
+        bot_rooms = np.floor(bots / ROOM_SIZE)
+        other_rooms = np.floor(others / ROOM_SIZE)
+        same_room = (bot_rooms[:, None, :] == other_rooms[None, :, :]).all(axis=2) & np.isfinite(distance)
+
+        combat = (distance <= self.combat_distance).any(axis=1)
+        near = ((distance <= self.near_distance) | same_room)[:, is_human].any(axis=1)
+        occupied = same_room.any(axis=1)
+
+        tiers = {}
+        for i, pid in enumerate(ai_ids):
+            health = ai_players[pid].health
+            damaged = health < self.last_health.get(pid, health)
+            self.last_health[pid] = health
+            if combat[i] or damaged or shooting.get(pid, False):
+                tiers[pid] = TIER_COMBAT
+            elif near[i]:
+                tiers[pid] = TIER_NEAR
+            elif occupied[i]:
+                tiers[pid] = TIER_ROOM
+            else:
+                tiers[pid] = TIER_IDLE
+        return tiers
+
+    def plan(self, tick: int, tiers: Dict) -> List:
+        """
+        本tick到期需要决策的AI（按优先级排序）
+
+        新加入的AI按注册顺序错开相位；档位提高时下次决策时间提前到新档位的间隔内。
+        """
+        for pid in list(self.next_tick):
+            if pid not in tiers:
+                del self.next_tick[pid]
+                self.tiers.pop(pid, None)
+                self.last_health.pop(pid, None)
+                self.actions.pop(pid, None)
+
+        for pid, tier in tiers.items():
+            interval = self.intervals[tier]
+            if pid not in self.next_tick:
+                self.next_tick[pid] = tick + self.registered % interval
+                self.registered += 1
+            elif tier < self.tiers.get(pid, tier):
+                self.next_tick[pid] = min(self.next_tick[pid], tick + interval)
+            self.tiers[pid] = tier
+
+        due = [pid for pid in tiers if self.next_tick[pid] <= tick]
+        due.sort(key=lambda pid: (self.next_tick[pid], self.tiers[pid]))
+        self.tick_start = time.perf_counter()
+        self.thoughts = 0
+        return due
+
+    def has_budget(self) -> bool:
+        """本tick是否还能再执行一个AI决策（每个tick至少执行一个）"""
+        if self.thoughts == 0:
+            return True
+        return time.perf_counter() - self.tick_start < self.budget
+
+    def thought(self, pid, tick: int):
+        """记录AI完成一次决策，安排下次决策时间"""
+        self.thoughts += 1
+        self.next_tick[pid] = tick + self.intervals[self.tiers.get(pid, TIER_COMBAT)]
+
+    def reschedule(self, pid, tick: int):
+        """安排下次决策时间（决策交给工作进程执行，不计入本tick的预算）"""
+        self.next_tick[pid] = tick + self.intervals[self.tiers.get(pid, TIER_COMBAT)]
+
+    def defer(self, count: int):
+        """记录因超出预算顺延的AI数"""
+        self.deferred += count
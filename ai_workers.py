@@ -0,0 +1,319 @@
+"""
+AI决策进程池
+
+把行为树AI的决策（行为树、代价网格、A*寻路）放到独立的工作进程中执行，绕开GIL，
+让AI较多的服务器能用上多个CPU核心。主进程仍负责移动积分、射击、门交互和网络同步。
+
+工作方式:
+    - 每个工作进程启动时自己构建一份地图（地图布局是确定的）及其导航网格、视线表
+    - 每个AI固定分配给一个工作进程，工作进程中保存该AI的“大脑”（EnhancedAIPlayer副本：
+      行为树状态、路径、巡逻点等），主进程每次只发送紧凑的物理状态（STATE_FIELDS）
+    - 每个tick把到期AI的状态与世界快照（玩家数据、门状态、团队归属）发给对应的工作进程，
+      工作进程返回动作dict（move, angle, shoot, reload, interact_door 等，门以下标表示）
+      以及决策过程中被行为树修改的字段（WRITEBACK_FIELDS），主进程在之后的tick应用
+    - 工作进程上一批还没有返回时不再发送新的一批，到期的AI顺延，主进程不会因为管道写满而阻塞
+    - 单个AI决策出错时该AI本次返回空动作；工作进程退出（崩溃、被OOM终止）后，
+      其负责的AI改回主进程决策，服务器继续运行
+
+工作进程使用spawn方式启动（与平台无关，也不会继承主进程中网络线程持有的锁）。
+"""
+
+import multiprocessing
+import traceback
+from typing import Dict, List
+
+from constants import SERVER_AI_WORKERS
+
+# 主进程 -> 工作进程同步的AI物理状态（位置单独同步）
+STATE_FIELDS = (
+    "angle", "health", "is_dead", "death_time", "ammo", "is_reloading", "reload_start_time",
+    "last_shot_time", "team_id", "armor", "grenades", "speed_boost_end_time",
+    "speed_boost_multiplier", "damage_boost_end_time", "damage_boost_multiplier",
+)
+
+# 行为树在决策过程中可能直接修改、需要写回主进程的字段
+WRITEBACK_FIELDS = ("angle", "ammo", "is_reloading", "reload_start_time")
+
+
+def door_states(doors) -> List[tuple]:
+    """门的动画状态（工作进程据此还原门的矩形）"""
+    return [(door.is_open, door.is_opening, door.is_closing, door.animation_progress) for door in doors]
+
+
+def bot_state(ai_player) -> Dict:
+    """AI的紧凑物理状态"""
+    state = {field: getattr(ai_player, field) for field in STATE_FIELDS}
+    state["pos"] = (ai_player.pos.x, ai_player.pos.y)
+    return state
+
+
+def encode_action(action, game_map) -> Dict:
+    """动作dict转换为可跨进程传输的形式（向量转元组，门转下标）"""
+    encoded = dict(action)
+    move = action.get("move")
+    if move is not None:
+        encoded["move"] = (move.x, move.y)
+    door = action.get("interact_door")
+    if door:
+        encoded["interact_door"] = game_map.doors.index(door)
+    return encoded
+
+
+def decode_action(encoded, game_map) -> Dict:
+    """encode_action的逆变换（门下标转换为主进程地图中的门）"""
+    import pygame
+
+    action = dict(encoded)
+    action["move"] = pygame.Vector2(encoded.get("move", (0, 0)))
+    door = encoded.get("interact_door")
+    if door is not None:
+        action["interact_door"] = game_map.doors[door]
+    return action
+
+
+def _sync_doors(game_map, states):
+    """把主进程的门状态应用到工作进程的地图"""
+    for index, (is_open, is_opening, is_closing, progress) in enumerate(states):
+        door = game_map.doors[index]
+        if (door.is_open, door.is_opening, door.is_closing, door.animation_progress) == (is_open, is_opening, is_closing, progress):
+            continue
+        door.is_open = is_open
+        door.is_opening = is_opening
+        door.is_closing = is_closing
+        door.animation_progress = progress
+        door.update_rect()
+        game_map.sync_door(index)
+
+
+def _sync_brain(brain, state):
+    """把主进程的物理状态同步到工作进程中的AI副本"""
+    if state["death_time"] != brain.death_time:
+        # 主进程中AI死亡并复活过：重置目标、路径等决策状态
+        brain.respawn(*state["pos"])
+    old_team_id = brain.team_id
+    for field in STATE_FIELDS:
+        setattr(brain, field, state[field])
+    brain.pos.update(state["pos"])
+    if brain.team_id != old_team_id:
+        brain._initialize_behavior_tree()
+
+
+def _worker_main(conn):
+    """工作进程主循环"""
+    from ai_player_enhanced import EnhancedAIPlayer
+    from map import Map
+    from perception import PerceptionSnapshot
+    from team import TeamManager
+
+    game_map = Map()
+    brains = {}
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        kind = message[0]
+        if kind == "stop":
+            break
+        if kind == "forget":
+            for pid in message[1]:
+                brains.pop(pid, None)
+            continue
+
+        _, tick, dt, world, batch = message
+        _sync_doors(game_map, world["doors"])
+        team_manager = None
+        if world["player_teams"] is not None:
+            team_manager = TeamManager()
+            team_manager.player_teams = world["player_teams"]
+
+        observers = {}
+        results = []
+        for pid, spawn, state in batch:
+            try:
+                brain = brains.get(pid)
+                if brain is None:
+                    brain = EnhancedAIPlayer(pid, *state["pos"], spawn["difficulty"], spawn["personality_traits"])
+                    brain.reaction_time = spawn["reaction_time"]
+                    brain.accuracy = spawn["accuracy"]
+                    brain.death_time = state["death_time"]
+                    brains[pid] = brain
+                _sync_brain(brain, state)
+                observers[pid] = brain
+            except Exception:
+                traceback.print_exc()
+                results.append((pid, None, {}))
+
+        players = world["players"]
+        perception = PerceptionSnapshot(players, game_map, team_manager, observers)
+        for pid, brain in observers.items():
+            # 单个AI出错不影响同批的其他AI，也不让工作进程退出
+            try:
+                before = {field: getattr(brain, field) for field in WRITEBACK_FIELDS}
+                action = brain.update(dt, players, game_map, None, team_manager, perception=perception.view(pid))
+                changes = {field: getattr(brain, field) for field in WRITEBACK_FIELDS
+                           if getattr(brain, field) != before[field]}
+                results.append((pid, encode_action(action, game_map) if action else None, changes))
+            except Exception:
+                traceback.print_exc()
+                results.append((pid, None, {}))
+        conn.send(("actions", tick, results))
+
+
+class AIWorkerPool:
+    """行为树AI决策进程池"""
+
+    def __init__(self, workers=SERVER_AI_WORKERS):
+        """
+        Args:
+            workers: 工作进程数量
+        """
+        context = multiprocessing.get_context("spawn")
+        self.connections = []
+        self.processes = []
+        for index in range(max(1, int(workers))):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_worker_main, args=(child_conn,),
+                                      name=f"ai-worker-{index}", daemon=True)
+            process.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+        self.assignment: Dict = {}  # AI ID -> 工作进程下标
+        self.known = set()  # 已经把创建信息发给工作进程的AI
+        self.pending = set()  # 决策结果尚未返回的AI
+        self.busy = [False] * len(self.connections)  # 工作进程是否有未返回的批次
+        self.alive = [True] * len(self.connections)  # 工作进程是否仍在运行
+        self.local = set()  # 所属工作进程已退出、改回主进程决策的AI
+        self.next_worker = 0
+
+    def _next_alive_worker(self):
+        """轮流分配仍在运行的工作进程，全部退出时返回None"""
+        for _ in range(len(self.connections)):
+            worker = self.next_worker
+            self.next_worker = (self.next_worker + 1) % len(self.connections)
+            if self.alive[worker]:
+                return worker
+        return None
+
+    def _worker_died(self, worker, error):
+        """工作进程退出：清除其状态，负责的AI改回主进程决策"""
+        print(f"[AI工作进程] 工作进程{worker}已退出（{error!r}），其AI改为在主进程决策")
+        self.alive[worker] = False
+        self.busy[worker] = False
+        for pid, assigned in list(self.assignment.items()):
+            if assigned == worker:
+                del self.assignment[pid]
+                self.known.discard(pid)
+                self.pending.discard(pid)
+                self.local.add(pid)
+
+    def remote(self, pid) -> bool:
+        """该AI是否由工作进程决策（否则由主进程决策）"""
+        return pid not in self.local and any(self.alive)
+
+    def submit(self, tick, dt, ai_players: List, players_data: Dict, game_map, team_manager=None) -> List:
+        """
+        提交一批AI决策
+
+        Returns:
+            实际提交的AI ID列表（所属工作进程忙或结果未返回的AI不提交，主进程决策的AI见remote()）
+        """
+        batches = {}
+        for ai_player in ai_players:
+            pid = ai_player.id
+            if pid in self.local:
+                continue
+            worker = self.assignment.get(pid)
+            if worker is None:
+                worker = self._next_alive_worker()
+                if worker is None:
+                    self.local.add(pid)
+                    continue
+                self.assignment[pid] = worker
+            if self.busy[worker] or pid in self.pending:
+                continue
+            spawn = None
+            if pid not in self.known:
+                spawn = {
+                    "difficulty": ai_player.difficulty,
+                    "personality_traits": ai_player.personality_traits,
+                    "reaction_time": ai_player.reaction_time,
+                    "accuracy": ai_player.accuracy,
+                }
+                self.known.add(pid)
+            batches.setdefault(worker, []).append((pid, spawn, bot_state(ai_player)))
+
+        if not batches:
+            return []
+        world = {
+            "players": players_data,
+            "doors": door_states(game_map.doors),
+            "player_teams": dict(team_manager.player_teams) if team_manager else None,
+        }
+        submitted = []
+        for worker, batch in batches.items():
+            try:
+                self.connections[worker].send(("think", tick, dt, world, batch))
+            except (EOFError, OSError) as e:
+                self._worker_died(worker, e)
+                continue
+            self.busy[worker] = True
+            for pid, _, _ in batch:
+                self.pending.add(pid)
+                submitted.append(pid)
+        return submitted
+
+    def collect(self) -> List:
+        """
+        取回已完成的决策（不阻塞）
+
+        Returns:
+            [(AI ID, 编码后的动作dict或None, 需要写回的字段dict)]
+        """
+        results = []
+        for worker, conn in enumerate(self.connections):
+            if not self.alive[worker]:
+                continue
+            try:
+                while conn.poll():
+                    _, _, batch = conn.recv()
+                    self.busy[worker] = False
+                    for pid, action, changes in batch:
+                        self.pending.discard(pid)
+                        results.append((pid, action, changes))
+            except (EOFError, OSError) as e:
+                self._worker_died(worker, e)
+        return results
+
+    def prune(self, ai_ids):
+        """通知工作进程丢弃已被移除的AI"""
+        self.local = {pid for pid in self.local if pid in ai_ids}
+        removed = [pid for pid in self.assignment if pid not in ai_ids]
+        if not removed:
+            return
+        by_worker = {}
+        for pid in removed:
+            by_worker.setdefault(self.assignment.pop(pid), []).append(pid)
+            self.known.discard(pid)
+            self.pending.discard(pid)
+        for worker, pids in by_worker.items():
+            try:
+                self.connections[worker].send(("forget", pids))
+            except (EOFError, OSError) as e:
+                self._worker_died(worker, e)
+
+    def close(self):
+        """停止所有工作进程"""
+        for conn in self.connections:
+            try:
+                conn.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+        self.connections = []
+        self.processes = []
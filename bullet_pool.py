@@ -0,0 +1,216 @@
+"""
+子弹池模块
+
+以结构数组（位置、方向、所有者、发射时间各为一列 NumPy 数组）保存全部子弹，
+每个tick批量推进位置，并批量完成子弹与玩家碰撞盒、墙壁/关闭的门的碰撞检测，
+替代逐个 weapons.Bullet 对象构造 Rect、遍历玩家和墙壁的做法。
+
+碰撞规则与 Ray.closest_hit 一致（游戏中的子弹只经过这里模拟，weapons.Bullet 仅用于渲染）:
+    - 对本tick移动经过的线段做扫掠检测：线段与玩家圆（半径 PLAYER_RADIUS + 子弹半径）、
+      线段与按子弹半径外扩的墙壁/关闭的门矩形，结果与帧率无关，高速子弹不会穿墙
+    - 跳过所有者、已死亡玩家和同队玩家
+    - 取最近的命中；玩家与墙壁距离相同时算命中玩家。命中或撞墙后移除
+命中事件由调用方交给 NetworkManager 处理（服务端 _handle_damage，客户端发送 hit_damage）。
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pygame
+
+from constants import BULLET_RADIUS, BULLET_SPEED, PLAYER_RADIUS
+from weapons import Bullet
+
+NO_TEAM = -1
+
+
+def rect_array(rects: Iterable) -> np.ndarray:
+    """把矩形列表转换为 (K, 4) 的 [left, top, right, bottom] 数组"""
+    boxes = [(r.left, r.top, r.right, r.bottom) for r in rects]
+    if not boxes:
+        return np.empty((0, 4), dtype=np.float64)
+    return np.asarray(boxes, dtype=np.float64)
+
+
+class BulletPool:
+    """NumPy 结构数组子弹池"""
+
+    def __init__(self, capacity=256, radius=BULLET_RADIUS):
+        self.radius = radius
+        self.count = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.pos = np.zeros((capacity, 2), dtype=np.float64)
+        self.dirs = np.zeros((capacity, 2), dtype=np.float64)
+        self.owners = np.zeros(capacity, dtype=np.int64)
+        self.spawn_times = np.zeros(capacity, dtype=np.float64)
+        self.speeds = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """逐个生成 Bullet 对象（用于渲染，模拟不经过这里）"""
+        for i in range(self.count):
+            bullet = Bullet({
+                'id': int(self.ids[i]),
+                'pos': self.pos[i].tolist(),
+                'dir': self.dirs[i].tolist(),
+                'owner': int(self.owners[i]),
+                'time': float(self.spawn_times[i]),
+            }, float(self.speeds[i]))
+            yield bullet
+
+    def _grow(self, needed):
+        capacity = len(self.ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ('ids', 'pos', 'dirs', 'owners', 'spawn_times', 'speeds'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, bullet_data: Dict, speed=BULLET_SPEED):
+        """按网络子弹数据添加一颗子弹"""
+        direction = pygame.Vector2(bullet_data['dir'])
+        if direction.length_squared() == 0:
+            return
+        direction = direction.normalize()
+        self._grow(self.count + 1)
+        i = self.count
+        self.ids[i] = bullet_data['id']
+        self.pos[i] = bullet_data['pos']
+        self.dirs[i] = (direction.x, direction.y)
+        self.owners[i] = bullet_data['owner']
+        self.spawn_times[i] = bullet_data['time']
+        self.speeds[i] = speed
+        self.count += 1
+
+    def _compact(self, keep: np.ndarray):
+        """只保留keep为True的子弹（保持原有顺序）"""
+        rows = np.flatnonzero(keep)
+        if len(rows) == self.count:
+            return
+        for name in ('ids', 'pos', 'dirs', 'owners', 'spawn_times', 'speeds'):
+            array = getattr(self, name)
+            array[:len(rows)] = array[rows]
+        self.count = len(rows)
+
+    def remove_ids(self, bullet_ids: Iterable[int]):
+        """移除指定ID的子弹"""
+        bullet_ids = np.fromiter(bullet_ids, dtype=np.int64)
+        if self.count and len(bullet_ids):
+            self._compact(~np.isin(self.ids[:self.count], bullet_ids))
+
+    def sync(self, network_bullets: List[Dict], speed=BULLET_SPEED):
+        """与服务器子弹列表同步：移除已不存在的子弹，添加新子弹"""
+        network_ids = np.fromiter((b['id'] for b in network_bullets), dtype=np.int64,
+                                  count=len(network_bullets))
+        if self.count:
+            self._compact(np.isin(self.ids[:self.count], network_ids))
+        current_ids = set(self.ids[:self.count].tolist())
+        for bullet_data in network_bullets:
+            if bullet_data['id'] not in current_ids:
+                self.add(bullet_data, speed)
+
+    def _sweep_players(self, start, dirs, length, player_ids, player_pos, player_teams, bullet_teams):
+        """线段与玩家圆的进入距离 (n, P)，未命中为inf"""
+        n = len(start)
+        if not len(player_ids):
+            return np.empty((n, 0))
+        radius = PLAYER_RADIUS + self.radius
+        # 按坐标分量分别计算 (n, P) 数组，避免最内层维度只有2导致的广播开销
+        # player_pos 为 (P, 2) 或每颗子弹各自的 (n, P, 2)，取分量后均可广播为 (n, P)
+        to_x = start[:, 0, None] - player_pos[..., 0]
+        to_y = start[:, 1, None] - player_pos[..., 1]
+        c = to_x * to_x + to_y * to_y - radius * radius
+        b = to_x * dirs[:, 0, None] + to_y * dirs[:, 1, None]
+        disc = b * b - c
+        with np.errstate(invalid='ignore'):
+            entry = -b - np.sqrt(disc)
+        inside = c <= 0
+        valid = inside | ((b <= 0) & (disc >= 0) & (entry <= length[:, None]))
+
+        valid &= self.owners[:n, None] != player_ids[None, :]
+        same_team = (bullet_teams[:, None] == player_teams[None, :]) & (bullet_teams[:, None] != NO_TEAM)
+        valid &= ~same_team
+        return np.where(valid, np.where(inside, 0.0, entry), np.inf)
+
+    @staticmethod
+    def _slab(origin, direction, lo, hi):
+        """单个坐标轴的slab区间 (t_near, t_far)，方向分量为0时起点在板内则不限制"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t1 = (lo[None, :] - origin[:, None]) / direction[:, None]
+            t2 = (hi[None, :] - origin[:, None]) / direction[:, None]
+        t_near = np.minimum(t1, t2)
+        t_far = np.maximum(t1, t2)
+        parallel = direction == 0
+        if parallel.any():
+            inside = (origin[parallel, None] >= lo[None, :]) & (origin[parallel, None] <= hi[None, :])
+            t_near[parallel] = np.where(inside, -np.inf, np.inf)
+            t_far[parallel] = np.where(inside, np.inf, -np.inf)
+        return t_near, t_far
+
+    def _sweep_obstacles(self, start, dirs, length, obstacles):
+        """线段与外扩矩形的进入距离 (n, K)，未命中为inf（slab方法）"""
+        n = len(start)
+        if not len(obstacles):
+            return np.empty((n, 0))
+        r = self.radius
+        near_x, far_x = self._slab(start[:, 0], dirs[:, 0], obstacles[:, 0] - r, obstacles[:, 2] + r)
+        near_y, far_y = self._slab(start[:, 1], dirs[:, 1], obstacles[:, 1] - r, obstacles[:, 3] + r)
+        enter = np.maximum(near_x, near_y)
+        leave = np.minimum(far_x, far_y)
+        hit = (enter <= leave) & (leave >= 0) & (enter <= length[:, None])
+        return np.where(hit, np.maximum(enter, 0.0), np.inf)
+
+    def step(self, dt, obstacles: np.ndarray, player_ids: np.ndarray, player_pos: np.ndarray,
+             player_teams: np.ndarray, bullet_teams: np.ndarray) -> Tuple[List[Tuple[int, int, int]], List[int]]:
+        """
+        推进一个tick
+
+        Args:
+            dt: 时间步长
+            obstacles: (K, 4) 墙壁和关闭的门的 [left, top, right, bottom]
+            player_ids: (P,) 可被击中的玩家ID（已排除死亡玩家）
+            player_pos: (P, 2) 玩家位置，或 (count, P, 2) 每颗子弹各自的目标位置（延迟补偿回溯后）
+            player_teams: (P,) 玩家团队ID，无团队为 NO_TEAM
+            bullet_teams: (count,) 子弹所有者的团队ID，无团队为 NO_TEAM
+
+        Returns:
+            (命中事件列表 [(子弹ID, 所有者ID, 目标玩家ID)], 被移除的子弹ID列表)
+        """
+        n = self.count
+        if n == 0:
+            return [], []
+
+        start = self.pos[:n].copy()
+        dirs = self.dirs[:n]
+        length = self.speeds[:n] * dt
+        self.pos[:n] += dirs * length[:, None]
+
+        player_dist = self._sweep_players(start, dirs, length, player_ids, player_pos,
+                                          player_teams, bullet_teams)
+        obstacle_dist = self._sweep_obstacles(start, dirs, length, obstacles)
+
+        # 最近命中（与Ray.closest_hit一致，距离相同时玩家优先）
+        nearest_player = player_dist.min(axis=1) if player_dist.shape[1] else np.full(n, np.inf)
+        nearest_obstacle = obstacle_dist.min(axis=1) if obstacle_dist.shape[1] else np.full(n, np.inf)
+        hit_rows = np.isfinite(nearest_player) & (nearest_player <= nearest_obstacle)
+        blocked = np.isfinite(nearest_obstacle)
+        hit_targets = player_ids[player_dist.argmin(axis=1)] if player_dist.shape[1] else np.zeros(n, np.int64)
+
+        # 命中的子弹停在命中点
+        stop = np.minimum(nearest_player, nearest_obstacle)
+        stopped = np.isfinite(stop)
+        self.pos[:n][stopped] = start[stopped] + dirs[stopped] * stop[stopped, None]
+
+        hits = [(int(self.ids[i]), int(self.owners[i]), int(hit_targets[i]))
+                for i in np.flatnonzero(hit_rows)]
+        removed_rows = hit_rows | blocked
+        removed = self.ids[:n][removed_rows].tolist()
+        if removed:
+            self._compact(~removed_rows)
+        return hits, removed
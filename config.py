@@ -150,6 +150,8 @@ ROOM_SIZE = get("map.room_size", 600)
 WALL_THICKNESS = get("map.wall_thickness", 20)
 DOOR_SIZE = get("map.door_size", 80)
 DOOR_ANIMATION_SPEED = get("map.door_animation_speed", 2.0)
+SPATIAL_CELL_SIZE = get("map.spatial_cell_size", 100)
+LOS_TABLE_CELL_SIZE = get("map.los_table_cell_size", 50)
 
 # 被击中减速效果
 HIT_SLOWDOWN_DURATION = get("hit_effects.slowdown_duration", 0.5)
@@ -178,10 +180,30 @@ HEARTBEAT_INTERVAL = get("network.heartbeat_interval", 1.0)
 CLIENT_TIMEOUT = get("network.client_timeout", 5.0)
 CONNECTION_TIMEOUT = get("network.connection_timeout", 10.0)
 SCAN_TIMEOUT = get("network.scan_timeout", 1.0)
+NETWORK_BINARY_CODEC = get("network.binary_codec", True)
+INTEREST_MANAGEMENT = get("network.interest_management", True)
+INTEREST_RADIUS = get("network.interest_radius", 600)
+NETWORK_BUNDLE_SIZE = get("network.bundle_size", 1200)  # 合并发送的数据包上限（字节）
+NETWORK_RELIABLE_RTO_MIN = get("network.reliable_rto_min", 0.1)  # 可靠通道重发超时下限（秒）
+NETWORK_RELIABLE_RTO_MAX = get("network.reliable_rto_max", 2.0)  # 可靠通道重发超时上限（秒）
+NETWORK_CLIENT_PREDICTION = get("network.client_prediction", True)  # 客户端预测移动，服务端执行输入并校正
+NETWORK_INTERPOLATION_DELAY = get("network.interpolation_delay", 0.1)  # 远程玩家插值延迟（秒），0为直接使用最新快照
+NETWORK_MAX_EXTRAPOLATION = get("network.max_extrapolation", 0.1)  # 快照中断时最多外推的时间（秒）
+
+# 服务端固定tick配置
+SERVER_TICK_RATE = get("server.tick_rate", 60)
+SERVER_BROADCAST_RATE = get("server.broadcast_rate", 20)
+SERVER_AI_RATE = get("server.ai_rate", 20)
+SERVER_AI_THINK_BUDGET_MS = get("server.ai_think_budget_ms", 4.0)
+SERVER_AI_WORKERS = get("server.ai_workers", 0)  # AI决策工作进程数，0表示在主进程中决策
+SERVER_MAX_CATCHUP_TICKS = get("server.max_catchup_ticks", 5)
+SERVER_MAX_LAG_COMPENSATION = get("server.max_lag_compensation", 0.3)  # 命中判定最多回溯的时间（秒），0为不回溯
 
 # 视角配置
 FIELD_OF_VIEW = get("vision.field_of_view", 120)
 VISION_RANGE = get("vision.vision_range", 300)
+VISION_CACHE_POSITION_QUANTUM = get("vision.cache_position_quantum", 2)
+VISION_CACHE_ANGLE_QUANTUM = get("vision.cache_angle_quantum", 1.0)
 
 # 聊天配置
 MAX_CHAT_MESSAGES = get("chat.max_messages", 10)
@@ -190,6 +212,16 @@ MAX_CHAT_LENGTH = get("chat.max_length", 50)
 
 # AI配置
 USE_ENHANCED_AI = get("ai.use_enhanced_ai", True)
+NAV_GRID_SIZE = get("ai.nav_grid_size", 20)
+NAV_CLOSED_DOOR_WEIGHT = get("ai.nav_closed_door_weight", 3)
+NAV_PATH_CACHE_SIZE = get("ai.nav_path_cache_size", 256)
+NAV_FLOW_FIELD_MIN_AGENTS = get("ai.nav_flow_field_min_agents", 3)
+NAV_FLOW_FIELD_REUSE_CELLS = get("ai.nav_flow_field_reuse_cells", 1)
+AI_LOD_THINK_RATES = get("ai.lod_think_rates", [10, 5, 2])
+AI_LOD_NEAR_DISTANCE = get("ai.lod_near_distance", 600)
+AI_LOD_COMBAT_DISTANCE = get("ai.lod_combat_distance", 400)
+AI_PROFILE_BEHAVIOR_TREES = get("ai.profile_behavior_trees", False)  # 启动时开启行为树节点计时
+AI_COMPILE_BEHAVIOR_TREES = get("ai.compile_behavior_trees", True)  # 行为树编译为扁平指令执行
 COMMANDS_PREFIX = get("commands.prefix", ".")
 COMMANDS_ENABLED = get("commands.enabled", True)
 
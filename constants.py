@@ -23,6 +23,8 @@ try:
         WALL_THICKNESS,
         DOOR_SIZE,
         DOOR_ANIMATION_SPEED,
+        SPATIAL_CELL_SIZE,
+        LOS_TABLE_CELL_SIZE,
         # 效果配置
         HIT_SLOWDOWN_DURATION,
         HIT_SLOWDOWN_FACTOR,
@@ -47,15 +49,44 @@ try:
         CLIENT_TIMEOUT,
         CONNECTION_TIMEOUT,
         SCAN_TIMEOUT,
+        NETWORK_BINARY_CODEC,
+        INTEREST_MANAGEMENT,
+        INTEREST_RADIUS,
+        NETWORK_BUNDLE_SIZE,
+        NETWORK_RELIABLE_RTO_MIN,
+        NETWORK_RELIABLE_RTO_MAX,
+        NETWORK_CLIENT_PREDICTION,
+        NETWORK_INTERPOLATION_DELAY,
+        NETWORK_MAX_EXTRAPOLATION,
+        # 服务端tick配置
+        SERVER_TICK_RATE,
+        SERVER_BROADCAST_RATE,
+        SERVER_AI_RATE,
+        SERVER_AI_THINK_BUDGET_MS,
+        SERVER_AI_WORKERS,
+        SERVER_MAX_CATCHUP_TICKS,
+        SERVER_MAX_LAG_COMPENSATION,
         # 视角配置
         FIELD_OF_VIEW,
         VISION_RANGE,
+        VISION_CACHE_POSITION_QUANTUM,
+        VISION_CACHE_ANGLE_QUANTUM,
         # 聊天配置
         MAX_CHAT_MESSAGES,
         CHAT_DISPLAY_TIME,
         MAX_CHAT_LENGTH,
         # AI配置
         USE_ENHANCED_AI,
+        NAV_GRID_SIZE,
+        NAV_CLOSED_DOOR_WEIGHT,
+        NAV_PATH_CACHE_SIZE,
+        NAV_FLOW_FIELD_MIN_AGENTS,
+        NAV_FLOW_FIELD_REUSE_CELLS,
+        AI_LOD_THINK_RATES,
+        AI_LOD_NEAR_DISTANCE,
+        AI_LOD_COMBAT_DISTANCE,
+        AI_PROFILE_BEHAVIOR_TREES,
+        AI_COMPILE_BEHAVIOR_TREES,
         # 颜色
         WHITE,
         RED,
@@ -102,6 +133,8 @@ except ImportError:
     WALL_THICKNESS = 20
     DOOR_SIZE = 80
     DOOR_ANIMATION_SPEED = 2.0
+    SPATIAL_CELL_SIZE = 100
+    LOS_TABLE_CELL_SIZE = 50
 
     # 效果配置
     HIT_SLOWDOWN_DURATION = 0.5
@@ -130,10 +163,30 @@ except ImportError:
     CLIENT_TIMEOUT = 5.0
     CONNECTION_TIMEOUT = 10.0
     SCAN_TIMEOUT = 1.0
+    NETWORK_BINARY_CODEC = True
+    INTEREST_MANAGEMENT = True
+    INTEREST_RADIUS = 600
+    NETWORK_BUNDLE_SIZE = 1200
+    NETWORK_RELIABLE_RTO_MIN = 0.1
+    NETWORK_RELIABLE_RTO_MAX = 2.0
+    NETWORK_CLIENT_PREDICTION = True
+    NETWORK_INTERPOLATION_DELAY = 0.1
+    NETWORK_MAX_EXTRAPOLATION = 0.1
+
+    # 服务端tick配置
+    SERVER_TICK_RATE = 60
+    SERVER_BROADCAST_RATE = 20
+    SERVER_AI_RATE = 20
+    SERVER_AI_THINK_BUDGET_MS = 4.0
+    SERVER_AI_WORKERS = 0
+    SERVER_MAX_CATCHUP_TICKS = 5
+    SERVER_MAX_LAG_COMPENSATION = 0.3
 
     # 视角配置
     FIELD_OF_VIEW = 120
     VISION_RANGE = 300
+    VISION_CACHE_POSITION_QUANTUM = 2
+    VISION_CACHE_ANGLE_QUANTUM = 1.0
 
     # 聊天配置
     MAX_CHAT_MESSAGES = 10
@@ -142,6 +195,16 @@ except ImportError:
 
     # AI配置
     USE_ENHANCED_AI = True
+    NAV_GRID_SIZE = 20
+    NAV_CLOSED_DOOR_WEIGHT = 3
+    NAV_PATH_CACHE_SIZE = 256
+    NAV_FLOW_FIELD_MIN_AGENTS = 3
+    NAV_FLOW_FIELD_REUSE_CELLS = 1
+    AI_LOD_THINK_RATES = [10, 5, 2]
+    AI_LOD_NEAR_DISTANCE = 600
+    AI_LOD_COMBAT_DISTANCE = 400
+    AI_PROFILE_BEHAVIOR_TREES = False
+    AI_COMPILE_BEHAVIOR_TREES = True
 
     # 颜色
     WHITE = (255, 255, 255)
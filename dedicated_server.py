@@ -0,0 +1,169 @@
+"""
+无头专用服务器
+
+不创建窗口、不加载字体、不渲染，只运行服务端权威tick循环。
+用法:
+    python main.py --dedicated [--name 服务器名] [--ai 数量] [--ai-difficulty normal]
+    python dedicated_server.py [同上参数]
+
+控制台输入以命令前缀开头的行作为管理员命令执行（同游戏内命令），
+其他文本作为系统消息广播，输入 quit / exit 关闭服务器。
+"""
+
+import argparse
+import queue
+import sys
+import threading
+import time
+
+from ai_scheduler import AIScheduler
+from ai_workers import AIWorkerPool
+from bullet_pool import BulletPool
+from constants import *
+from game_world import GameWorldMixin
+from lag_compensation import PositionHistory
+from map import Map
+from network import NetworkManager
+from server_tick import FixedTickClock
+from team import TeamManager
+
+
+class DedicatedServer(GameWorldMixin):
+    """无头专用服务器（没有本地玩家）"""
+
+    def __init__(self, server_name=None, tick_rate=SERVER_TICK_RATE, ai_workers=SERVER_AI_WORKERS):
+        self.running = True
+
+        # 专用服务器没有主机玩家，其余玩家全部来自网络
+        self.player = None
+        self.other_players = {}
+
+        # 游戏规则设置（与Game保持一致）
+        self.game_rules = {
+            "damage_multiplier": 1.0,
+            "respawn_time": RESPAWN_TIME,
+            "friendly_fire": True,
+            "bullet_speed": BULLET_SPEED,
+            "footstep_range": VISION_RANGE,
+        }
+
+        # AI玩家管理
+        self.ai_players = {}
+        self.next_ai_id = 100
+
+        # 团队系统
+        self.team_manager = TeamManager()
+        self.team_chat_mode = False
+
+        # 世界状态
+        self.game_map = Map()
+        self.bullets = BulletPool()
+        self.grenades = []
+        self.last_grenade_explosion = None
+        self.init_item_manager()
+
+        self.network_manager = NetworkManager(
+            is_server=True, game_instance=self, server_name=server_name or "专用服务器"
+        )
+        if not self.network_manager.connected:
+            raise RuntimeError(self.network_manager.connection_error or "无法启动服务器")
+        # NetworkManager默认为主机创建玩家1，专用服务器中移除
+        with self.network_manager.lock:
+            self.network_manager.players.pop(self.network_manager.player_id, None)
+
+        self.server_clock = FixedTickClock(tick_rate=tick_rate)
+        self.ai_scheduler = AIScheduler(tick_rate=self.server_clock.tick_rate)
+        # 延迟补偿的玩家位置记录（server.max_lag_compensation为0时不回溯）
+        self.position_history = PositionHistory() if SERVER_MAX_LAG_COMPENSATION > 0 else None
+        # 行为树AI决策进程池（可选）
+        self.ai_pool = AIWorkerPool(ai_workers) if ai_workers > 0 else None
+
+        # 控制台命令
+        self.console_commands = queue.Queue()
+        self.console_thread = None
+
+    def on_server_name_received(self, server_name):
+        """NetworkManager回调（专用服务器不需要处理）"""
+        pass
+
+    def start_console(self):
+        """启动控制台输入线程"""
+        self.console_thread = threading.Thread(target=self._read_console)
+        self.console_thread.daemon = True
+        self.console_thread.start()
+
+    def _read_console(self):
+        while self.running:
+            line = sys.stdin.readline()
+            if not line:
+                return  # stdin已关闭（如后台运行），不再读取
+            line = line.strip()
+            if line:
+                self.console_commands.put(line)
+
+    def process_console_commands(self):
+        """在tick线程中执行控制台命令"""
+        while not self.console_commands.empty():
+            text = self.console_commands.get_nowait()
+            if text in ("quit", "exit"):
+                self.running = False
+                return
+            from game_commands import COMMANDS_PREFIX, process_command
+            if text.startswith(COMMANDS_PREFIX):
+                result = process_command(text, self, self.network_manager.player_id, True)
+                if result:
+                    print(result)
+            else:
+                self.network_manager._send_system_message(text)
+
+    def run(self):
+        """运行服务端tick循环直到停止"""
+        clock = self.server_clock
+        print(f"[专用服务器] 已启动，tick频率: {clock.tick_rate}Hz，端口: {SERVER_PORT}")
+        try:
+            while self.running and self.network_manager.running:
+                self.process_console_commands()
+                self.network_manager.poll()
+                for _ in range(clock.advance()):
+                    self.item_manager.update(clock.tick_interval)
+                    self.server_tick(clock.tick_interval)
+                time.sleep(clock.time_until_next_tick())
+        except KeyboardInterrupt:
+            print("\n[专用服务器] 收到中断信号")
+        finally:
+            self.running = False
+            if self.ai_pool:
+                self.ai_pool.close()
+            self.network_manager.stop()
+            print("[专用服务器] 已关闭")
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="无头专用服务器")
+    parser.add_argument("--dedicated", action="store_true", help="以专用服务器模式运行（由main.py转发）")
+    parser.add_argument("--name", default=None, help="服务器名称")
+    parser.add_argument("--ai", type=int, default=0, help="启动时添加的AI数量")
+    parser.add_argument("--ai-difficulty", default="normal", help="AI难度")
+    parser.add_argument("--tick-rate", type=int, default=SERVER_TICK_RATE, help="服务端tick频率（Hz）")
+    parser.add_argument("--ai-workers", type=int, default=SERVER_AI_WORKERS, help="AI决策工作进程数（0为不使用）")
+    parser.add_argument("--no-console", action="store_true", help="不读取控制台命令")
+    args = parser.parse_args(argv)
+
+    try:
+        server = DedicatedServer(server_name=args.name, tick_rate=args.tick_rate, ai_workers=args.ai_workers)
+    except RuntimeError as e:
+        print(f"[专用服务器] 启动失败: {e}")
+        return 1
+
+    for _ in range(max(0, args.ai)):
+        server.add_ai_player(args.ai_difficulty)
+    if not args.no_console:
+        server.start_console()
+
+    server.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,6 +16,7 @@
     .all           - 切换全局聊天
     .addai         - 添加AI
     .removeai      - 移除AI
+    .aiprof        - 行为树性能分析
     .team add      - 创建团队
     .team delete   - 删除团队
     .team list     - 列出团队
@@ -344,6 +345,44 @@ class GameCommandSystem:
             aliases=["delete"],
         )
 
+        def aiprof_handler(args, game, player_id, is_server) -> str:
+            if not is_server:
+                return "只有服务器可以分析AI性能"
+            from ai_profiler import get_profiler
+
+            profiler = get_profiler()
+            subcmd = args[0].lower() if args else "show"
+            if subcmd == "on":
+                profiler.enable()
+                note = "（工作进程中的决策不计入）" if getattr(game, "ai_pool", None) else ""
+                return f"已开启行为树性能分析{note}"
+            elif subcmd == "off":
+                profiler.disable()
+                return "已关闭行为树性能分析"
+            elif subcmd == "reset":
+                profiler.reset()
+                return "已清空行为树性能数据"
+            elif subcmd == "show":
+                try:
+                    limit = int(args[1]) if len(args) > 1 else 10
+                except ValueError:
+                    return "无效的数量"
+                return profiler.report(limit)
+            elif subcmd == "export":
+                path = args[1] if len(args) > 1 else "ai_profile.json"
+                profiler.export(path)
+                return f"已导出行为树性能数据到 {path}"
+            return f"用法: {prefix}aiprof <on|off|reset|show [数量]|export [路径]>"
+
+        self.register(
+            name="aiprof",
+            handler=aiprof_handler,
+            description="行为树性能分析 (on/off/reset/show/export)",
+            category=CommandCategory.AI,
+            permission=CommandPermission.SERVER,
+            usage=".aiprof <on|off|reset|show [数量]|export [路径]>",
+        )
+
         def team_handler(args, game, player_id, is_server) -> str:
             if not args:
                 return f"用法: {prefix}team <add|delete|list|join|leave> [参数]"
@@ -451,6 +490,7 @@ class GameCommandSystem:
                                 del game.network_manager.client_last_seen[target_addr]
                         if target_id in game.network_manager.players:
                             del game.network_manager.players[target_id]
+                        game.network_manager._release_client_session(target_addr)
 
                     game.network_manager.recycle_player_id(target_id)
                     game.network_manager._send_system_message(
@@ -0,0 +1,780 @@
+"""
+游戏世界模拟模块
+
+Game（带窗口的客户端/主机）与 DedicatedServer（无头专用服务器）共享的世界模拟逻辑：
+网络玩家同步、服务端固定tick、子弹/手雷/门推进、AI更新与AI玩家管理。
+
+使用方需要提供以下属性:
+    network_manager, game_map, player（专用服务器为None）, other_players,
+    ai_players, next_ai_id, bullets, grenades, server_clock, ai_scheduler, ai_pool, game_rules,
+    position_history（服务端延迟补偿的玩家位置记录，客户端为None）
+"""
+
+import math
+import random
+import time
+
+import numpy as np
+import pygame
+
+from bullet_pool import NO_TEAM, BulletPool, rect_array
+from constants import *
+from ai_workers import decode_action
+from perception import PerceptionSnapshot
+from player import Player
+
+
+class GameWorldMixin:
+    """世界模拟逻辑（混入Game与DedicatedServer）"""
+
+    def init_item_manager(self):
+        """创建道具管理器并在地图上生成道具"""
+        from items import ItemManager, ItemType
+        self.item_manager = ItemManager()
+        self.item_manager.attach_spatial_index(self.game_map.spatial)
+        self.item_manager.generate_spawn_points(self.game_map.rooms, self.game_map.walls)
+
+        weights = {
+            ItemType.HEALTH_PACK: 0.30,
+            ItemType.AMMO_BOX: 0.20,
+            ItemType.ARMOR: 0.15,
+            ItemType.SPEED_BOOST: 0.10,
+            ItemType.DAMAGE_BOOST: 0.10,
+            ItemType.GRENADE: 0.15,
+        }
+        self.item_manager.set_spawn_weights(weights)
+        self.item_manager.spawn_all_types()
+        return self.item_manager
+
+    def _collect_all_players(self):
+        """合并本地玩家、网络玩家和AI玩家（服务端），用于碰撞检测"""
+        # 合并所有玩家（本地+网络）
+        all_players = {self.player.id: self.player} if self.player else {}
+        all_players.update(self.other_players)
+
+        # 服务端：添加AI玩家对象到all_players用于碰撞检测
+        if self.network_manager.is_server and hasattr(self, "ai_players"):
+            for ai_id, ai_player in self.ai_players.items():
+                if ai_id not in all_players:
+                    # 创建一个简单的Player对象用于碰撞检测
+                    class AIPlayerWrapper:
+                        def __init__(self, ai):
+                            self.id = ai.id
+                            self.pos = ai.pos
+                            self.is_dead = ai.is_dead
+
+                    wrapper = AIPlayerWrapper(ai_player)
+                    all_players[ai_id] = wrapper
+                    print(
+                        f"[调试] 添加AI玩家{ai_id}到all_players，位置=({wrapper.pos.x}, {wrapper.pos.y}), 死亡={wrapper.is_dead}"
+                    )
+
+        return all_players
+
+    def sync_network_players(self):
+        """把网络玩家数据同步到本地Player对象"""
+        # 同步网络玩家数据并清理断线玩家
+        with self.network_manager.lock:
+            # 获取当前网络中的玩家ID
+            network_player_ids = set(self.network_manager.players.keys())
+            # 获取当前本地其他玩家ID
+            local_other_player_ids = set(self.other_players.keys())
+
+            # 移除已断线的玩家
+            disconnected_players = local_other_player_ids - network_player_ids
+            local_id = self.player.id if self.player else None
+            for pid in disconnected_players:
+                if pid != local_id:  # 不要删除本地玩家
+                    print(f"[客户端] 移除断线玩家{pid}")
+                    del self.other_players[pid]
+                    if self.network_manager.interpolator is not None:
+                        self.network_manager.interpolator.remove(pid)
+
+            # 更新或添加在线玩家
+            for pid, pdata in self.network_manager.players.items():
+                # 本地玩家：只同步权威数据（健康值、死亡状态等）
+                if pid == local_id:
+                    self.player.health = pdata.get("health", self.player.health)
+                    self.player.is_dead = pdata.get("is_dead", False)
+                    self.player.death_time = pdata.get("death_time", 0)
+                    self.player.respawn_time = pdata.get("respawn_time", 0)
+                    self.player.is_respawning = pdata.get("is_respawning", False)
+                    self.player.armor = pdata.get("armor", self.player.armor)
+                    self.player.speed_boost_end_time = pdata.get("speed_boost_end_time", 0)
+                    self.player.damage_boost_end_time = pdata.get("damage_boost_end_time", 0)
+                    self.player.grenades = pdata.get("grenades", 0)
+                    continue
+
+                # 创建或更新其他玩家
+                if pid not in self.other_players:
+                    player_name = pdata.get("name", f"玩家{pid}")
+                    self.other_players[pid] = Player(
+                        pid, pdata["pos"][0], pdata["pos"][1], name=player_name
+                    )
+                    print(f"[客户端] 添加新玩家{pid}")
+
+                # 更新玩家数据（客户端的位置和朝向由interpolate_remote_players按插值缓冲每帧更新）
+                other_player = self.other_players[pid]
+                if self.network_manager.interpolator is None:
+                    # 只在非复活状态下更新位置
+                    if not pdata.get("is_respawning", False):
+                        other_player.pos.update(pdata["pos"])
+                    other_player.angle = pdata["angle"]
+                other_player.health = pdata["health"]
+                other_player.ammo = pdata["ammo"]
+                other_player.armor = pdata.get("armor", 0)
+                other_player.is_reloading = pdata["is_reloading"]
+                other_player.shooting = pdata["shooting"]
+                other_player.is_dead = pdata.get("is_dead", False)
+                other_player.death_time = pdata.get("death_time", 0)
+                other_player.respawn_time = pdata.get("respawn_time", 0)
+                other_player.is_respawning = pdata.get("is_respawning", False)
+                other_player.name = pdata.get("name", f"玩家{pid}")
+                other_player.speed_boost_end_time = pdata.get("speed_boost_end_time", 0)
+                other_player.damage_boost_end_time = pdata.get("damage_boost_end_time", 0)
+                other_player.grenades = pdata.get("grenades", 0)
+
+                # 同步团队ID
+                if "team_id" in pdata:
+                    other_player.team_id = pdata["team_id"]
+
+                # 同步状态（包括武器类型和瞄准状态）
+                other_player.sync_from_network(pdata)
+
+    def interpolate_remote_players(self, now):
+        """按快照插值缓冲更新远程玩家的渲染位置和朝向（仅客户端，每帧调用）"""
+        interpolator = self.network_manager.interpolator
+        if interpolator is None:
+            return
+        for pid, other_player in self.other_players.items():
+            sample = interpolator.sample(pid, now)
+            if sample is not None:
+                other_player.pos.update(sample[0], sample[1])
+                other_player.angle = sample[2]
+
+    def server_tick(self, tick_dt):
+        """
+        服务端固定步长tick
+
+        按固定的tick_dt推进权威模拟：网络玩家同步、AI、复活、子弹、手雷和门，
+        并按广播分频发送状态。由update()中的FixedTickClock驱动。
+
+        Args:
+            tick_dt (float): tick时长（秒）
+        """
+        clock = self.server_clock
+        clock.begin_tick()
+        now = time.time()
+
+        self.sync_network_players()
+        all_players = self._collect_all_players()
+
+        # AI决策由调度器按档位错开，移动积分每个tick都执行
+        self.update_ai_players(tick_dt, all_players)
+
+        # 记录本tick移动后的位置，供延迟补偿回溯
+        if self.position_history is not None:
+            self.position_history.record(now, {pid: (p.pos.x, p.pos.y)
+                                               for pid, p in all_players.items() if not p.is_dead})
+
+        self.network_manager.check_player_respawns(now)
+        if clock.is_broadcast_tick():
+            self.network_manager.broadcast_state(now)
+
+        self.sync_bullets()
+        self.update_world(tick_dt, all_players)
+
+        # 本tick产生的全部消息按客户端合并发送
+        self.network_manager.flush()
+
+    def update_world(self, dt, all_players):
+        """推进子弹、飞行手雷和门"""
+        # 批量更新子弹
+        self.update_bullets(dt, all_players)
+        
+        # 更新飞行手雷
+        walls = self.game_map.walls
+        for grenade in list(self.grenades):
+            if grenade.update(dt, walls):
+                targets = grenade.get_targets(all_players)
+                if grenade.explosion_pos:
+                    self.last_grenade_explosion = {
+                        'pos': grenade.explosion_pos,
+                        'time': time.time()
+                    }
+                for target in targets:
+                    target_id = target.get('target_id')
+                    damage = target.get('damage')
+                    attacker_id = target.get('attacker_id')
+                    
+                    if self.network_manager and self.network_manager.is_server:
+                        damage_data = {
+                            'target_id': target_id,
+                            'damage': damage,
+                            'attacker_id': attacker_id,
+                            'type': 'grenade'
+                        }
+                        self.network_manager._handle_damage(damage_data)
+                    else:
+                        if target_id == self.player.id:
+                            if not self.player.is_dead:
+                                self.player.take_damage(damage)
+                                print(f"[手雷] 本地玩家{target_id}受到{damage}伤害")
+                        elif target_id in self.ai_players:
+                            ai_player = self.ai_players[target_id]
+                            if not ai_player.is_dead:
+                                ai_player.take_damage(damage)
+                                print(f"[手雷] AI玩家{target_id}受到{damage}伤害")
+                        elif target_id in self.other_players:
+                            target_player = self.other_players[target_id]
+                            if not target_player.is_dead:
+                                target_player.take_damage(damage)
+                                print(f"[手雷] 网络玩家{target_id}受到{damage}伤害")
+                self.grenades.remove(grenade)
+
+        # 更新门
+        self.game_map.update_doors(dt, self.network_manager)
+
+    def _team_key(self, player_id, player=None):
+        """子弹碰撞用的团队ID（团队管理器 → 网络数据 → 玩家对象），无团队为NO_TEAM"""
+        team_id = None
+        team_manager = getattr(self, 'team_manager', None)
+        if team_manager:
+            team_id = team_manager.get_player_team_id(player_id)
+        if team_id is None:
+            team_id = self.network_manager.players.get(player_id, {}).get('team_id')
+        if team_id is None and player is not None:
+            team_id = getattr(player, 'team_id', None)
+        return NO_TEAM if team_id is None else int(team_id)
+
+    def _bullet_obstacles(self):
+        """墙壁和关闭的门的矩形数组，门状态变化时重建"""
+        spatial = self.game_map.spatial
+        cached = getattr(self, '_bullet_obstacle_cache', None)
+        if cached is None or cached[0] != spatial.version:
+            doors = [self.game_map.doors[i] for i in sorted(spatial.door_hash.rects)]
+            boxes = rect_array(list(self.game_map.walls) + [door.rect for door in doors])
+            cached = (spatial.version, boxes)
+            self._bullet_obstacle_cache = cached
+        return cached[1]
+
+    def update_bullets(self, dt, all_players):
+        """推进子弹池并处理命中事件"""
+        pool = self.bullets
+        if not len(pool):
+            return
+
+        alive = {pid: p for pid, p in all_players.items() if not p.is_dead}
+        self.game_map.spatial.update_players(alive)
+        near = self._bullet_target_candidates(pool, dt)
+        targets = [(pid, p) for pid, p in alive.items() if pid in near]
+        player_ids = np.array([pid for pid, _ in targets], dtype=np.int64)
+        player_pos = np.array([(p.pos.x, p.pos.y) for _, p in targets], dtype=np.float64).reshape(-1, 2)
+        player_teams = np.array([self._team_key(pid, p) for pid, p in targets], dtype=np.int64)
+
+        # 所有者团队按所有者去重后查询
+        owners = pool.owners[:pool.count]
+        unique_owners, inverse = np.unique(owners, return_inverse=True)
+        owner_teams = np.array([self._team_key(int(o), all_players.get(int(o))) for o in unique_owners],
+                               dtype=np.int64)
+
+        target_pos = self._lag_compensated_positions(player_ids, player_pos, unique_owners, inverse)
+        hits, removed = pool.step(dt, self._bullet_obstacles(), player_ids, target_pos,
+                                  player_teams, owner_teams[inverse])
+
+        network_manager = self.network_manager
+        for bullet_id, owner_id, target_id in hits:
+            print(f"[子弹碰撞] 子弹{bullet_id}击中玩家{target_id}，所有者{owner_id}")
+            damage_data = {
+                'target_id': target_id,
+                'damage': BULLET_DAMAGE,
+                'attacker_id': owner_id,
+                'type': 'bullet'
+            }
+            if network_manager.is_server:
+                # 服务端直接处理伤害
+                network_manager._handle_damage(damage_data)
+            elif not network_manager.server_hit_detection:
+                # 客户端发送伤害请求（服务端做延迟补偿命中判定时不再上报）
+                network_manager.send_data({
+                    'type': 'hit_damage',
+                    'data': damage_data
+                })
+
+        # 通知服务器移除子弹
+        if removed and network_manager.is_server:
+            for bullet_id in removed:
+                network_manager.remove_bullet(bullet_id)
+
+    def _lag_compensating(self):
+        return self.position_history is not None and self.network_manager.is_server
+
+    def _bullet_target_candidates(self, pool, dt):
+        """
+        本tick可能被子弹击中的玩家ID
+
+        按子弹所在格子查询空间索引的玩家层，查询范围外扩子弹本tick的移动距离和碰撞半径，
+        做延迟补偿时再外扩回溯窗口内的最大移动距离，结果是逐个玩家扫掠检测的超集。
+        """
+        n = pool.count
+        spatial = self.game_map.spatial
+        cs = spatial.player_hash.cell_size
+        reach = float(pool.speeds[:n].max()) * dt + pool.radius + 2
+        if self._lag_compensating():
+            reach += self.position_history.max_displacement
+        reach = int(math.ceil(reach))
+
+        near = set()
+        for cx, cy in np.unique(np.floor(pool.pos[:n] / cs).astype(np.int64), axis=0).tolist():
+            near.update(spatial.players_in_rect((cx * cs - reach, cy * cs - reach,
+                                                 cs + reach * 2, cs + reach * 2)))
+        return near
+
+    def _lag_compensated_positions(self, player_ids, player_pos, unique_owners, inverse):
+        """
+        服务端把目标回溯到每颗子弹所有者开火时看到的位置（lag_compensation.py）
+        回溯位置离当前位置超过 max_displacement（期间复活）时保留当前位置
+
+        Returns:
+            无需回溯时为当前位置 (P, 2)，否则为每颗子弹各自的目标位置 (n, P, 2)
+        """
+        history = self.position_history
+        network_manager = self.network_manager
+        if not self._lag_compensating() or not len(player_ids):
+            return player_pos
+        latencies = [network_manager.view_latency(int(owner)) for owner in unique_owners]
+        if not any(latencies):
+            return player_pos  # 全部是主机/AI的子弹
+
+        now = time.time()
+        max_sq = history.max_displacement ** 2
+        owner_pos = np.repeat(player_pos[None], len(unique_owners), axis=0)
+        for row, latency in enumerate(latencies):
+            if latency <= 0:
+                continue
+            past = history.rewind(now - latency)
+            for col, pid in enumerate(player_ids.tolist()):
+                pos = past.get(pid)
+                if pos is None:
+                    continue
+                x, y = player_pos[col]
+                if (pos[0] - x) ** 2 + (pos[1] - y) ** 2 <= max_sq:
+                    owner_pos[row, col] = pos
+        return owner_pos[inverse]
+
+    def is_position_safe(self, x, y):
+        """检查位置是否安全（不与墙壁或门碰撞）"""
+        player_rect = pygame.Rect(
+            x - PLAYER_RADIUS, y - PLAYER_RADIUS, PLAYER_RADIUS * 2, PLAYER_RADIUS * 2
+        )
+
+        # 检查墙壁和门碰撞
+        return not self.game_map.spatial.rect_blocked(player_rect)
+
+    def get_safe_spawn_pos(self, max_attempts=50):
+        """获取安全的复活位置（不与墙壁或门碰撞）"""
+        # 尝试使用房间中心位置（更安全）
+        for attempt in range(max_attempts):
+            room_id = random.randint(0, 8)
+            room_row = room_id // 3
+            room_col = room_id % 3
+
+            # 在房间中心附近随机位置
+            spawn_x = room_col * ROOM_SIZE + ROOM_SIZE // 2 + random.randint(-100, 100)
+            spawn_y = room_row * ROOM_SIZE + ROOM_SIZE // 2 + random.randint(-100, 100)
+
+            # 确保在房间边界内
+            spawn_x = max(
+                room_col * ROOM_SIZE + 50, min(spawn_x, (room_col + 1) * ROOM_SIZE - 50)
+            )
+            spawn_y = max(
+                room_row * ROOM_SIZE + 50, min(spawn_y, (room_row + 1) * ROOM_SIZE - 50)
+            )
+
+            # 检查位置是否安全
+            if self.is_position_safe(spawn_x, spawn_y):
+                return spawn_x, spawn_y
+
+        # 如果所有尝试都失败，使用更保守的方法：在整个地图范围内随机尝试
+        for attempt in range(max_attempts):
+            spawn_x = random.randint(100, ROOM_SIZE * 3 - 100)
+            spawn_y = random.randint(100, ROOM_SIZE * 3 - 100)
+
+            if self.is_position_safe(spawn_x, spawn_y):
+                return spawn_x, spawn_y
+
+        # 如果还是找不到安全位置，返回地图中心（作为最后的备选）
+        return ROOM_SIZE * 1.5, ROOM_SIZE * 1.5
+
+    def update_ai_players(self, dt, all_players):
+        """
+        更新AI玩家（仅服务端，每个tick调用）
+
+        决策（行为树/状态机）由ai_scheduler按档位错开到不同tick并受每tick时间预算限制，
+        没有轮到决策的AI沿用上一次决策的移动向量和朝向，移动积分每个tick都执行。
+        配置了ai_pool时行为树AI的决策交给工作进程，结果在之后的tick取回并应用。
+        """
+        if not self.network_manager.is_server:
+            return
+
+        # 准备玩家位置数据供AI使用
+        players_data = {}
+        for pid, player in all_players.items():
+            players_data[pid] = {
+                "pos": [player.pos.x, player.pos.y],
+                "is_dead": player.is_dead,
+                "shooting": getattr(player, "shooting", False),
+                "is_reloading": getattr(player, "is_reloading", False),
+                "is_walking": getattr(player, "is_walking", False),
+                "team_id": getattr(player, "team_id", None),  # 添加团队ID
+            }
+
+        # 添加网络玩家数据（合并，优先使用网络数据中的完整信息）
+        for pid, pdata in self.network_manager.players.items():
+            if pid in players_data:
+                # 合并数据，保留网络数据中的完整信息
+                players_data[pid].update(
+                    {
+                        "shooting": pdata.get("shooting", False),
+                        "is_reloading": pdata.get("is_reloading", False),
+                        "is_walking": pdata.get("is_walking", False),
+                        "team_id": pdata.get(
+                            "team_id", players_data[pid].get("team_id")
+                        ),  # 优先使用网络数据中的team_id
+                    }
+                )
+            else:
+                players_data[pid] = pdata
+
+        # 同步AI的team_id（从网络数据中获取），需在构建感知快照之前完成
+        for ai_id, ai_player in self.ai_players.items():
+            if ai_id in self.network_manager.players:
+                network_team_id = self.network_manager.players[ai_id].get("team_id")
+                old_team_id = getattr(ai_player, "team_id", None)
+
+                # 如果team_id改变了，更新并重新初始化行为树（如果需要）
+                if network_team_id != old_team_id:
+                    ai_player.team_id = network_team_id
+                    # 如果使用了增强版AI，重新初始化行为树以适应新的团队状态
+                    if hasattr(ai_player, "_initialize_behavior_tree"):
+                        ai_player._initialize_behavior_tree()
+
+        # 检查AI是否需要复活（本tick复活的AI从下一个tick开始参与调度）
+        alive_ai = {ai_id: ai for ai_id, ai in self.ai_players.items() if not ai.is_dead}
+        for ai_id, ai_player in self.ai_players.items():
+            if ai_player.is_dead:
+                current_time = time.time()
+                if current_time >= ai_player.respawn_time:
+                    # 获取安全的复活位置（不与墙壁或门碰撞）
+                    spawn_x, spawn_y = self.get_safe_spawn_pos()
+                    ai_player.respawn(spawn_x, spawn_y)
+
+                    # 更新网络数据
+                    if ai_id in self.network_manager.players:
+                        self.network_manager.players[ai_id]["pos"] = [spawn_x, spawn_y]
+                        self.network_manager.players[ai_id]["health"] = 100
+                        self.network_manager.players[ai_id]["is_dead"] = False
+                        self.network_manager.players[ai_id]["respawn_time"] = 0
+
+        scheduler = self.ai_scheduler
+        tick = self.server_clock.tick_count
+        team_manager = getattr(self, "team_manager", None)
+        pool = getattr(self, "ai_pool", None)
+        if pool:
+            # 应用工作进程返回的决策（期间死亡或被移除的AI丢弃结果）
+            pool.prune(self.ai_players)
+            for ai_id, encoded, changes in pool.collect():
+                ai_player = alive_ai.get(ai_id)
+                if ai_player is None:
+                    continue
+                for field, value in changes.items():
+                    setattr(ai_player, field, value)
+                if encoded:
+                    action = decode_action(encoded, self.game_map)
+                    scheduler.actions[ai_id] = action
+                    self._apply_ai_decision(ai_id, ai_player, action)
+
+        # 按档位挑出本tick需要决策的AI
+        shooting = {ai_id: action["shoot"] for ai_id, action in scheduler.actions.items()}
+        due = scheduler.plan(tick, scheduler.classify(alive_ai, players_data, shooting))
+
+        if pool:
+            # 行为树AI提交给工作进程（工作进程忙时顺延到下一个tick，工作进程退出后改在主进程决策）
+            bots = [alive_ai[ai_id] for ai_id in due if hasattr(alive_ai[ai_id], "behavior_tree")]
+            submitted = set(pool.submit(tick, dt, bots, players_data, self.game_map, team_manager))
+            for ai_id in submitted:
+                scheduler.reschedule(ai_id, tick)
+            due = [ai_id for ai_id in due if ai_id not in submitted
+                   and not (hasattr(alive_ai[ai_id], "behavior_tree") and pool.remote(ai_id))]
+
+        # 本tick共享的感知快照（距离、队友关系、视线、听觉矩阵），只为需要决策的行为树AI计算
+        observers = {
+            ai_id: alive_ai[ai_id] for ai_id in due if hasattr(alive_ai[ai_id], "behavior_tree")
+        }
+        perception = None
+        if observers:
+            perception = PerceptionSnapshot(players_data, self.game_map, team_manager, observers)
+
+        for count, ai_id in enumerate(due):
+            if not scheduler.has_budget():
+                # 超出本tick预算，剩余的AI顺延到下一个tick
+                scheduler.defer(len(due) - count)
+                break
+
+            # 更新AI逻辑（传递team_manager以便AI识别队友）
+            ai_player = alive_ai[ai_id]
+            if ai_id in observers:
+                action = ai_player.update(
+                    dt, players_data, self.game_map, self.bullets, team_manager,
+                    perception=perception.view(ai_id)
+                )
+            else:
+                action = ai_player.update(
+                    dt, players_data, self.game_map, self.bullets, team_manager
+                )
+            scheduler.thought(ai_id, tick)
+            if action:
+                scheduler.actions[ai_id] = action
+                self._apply_ai_decision(ai_id, ai_player, action)
+
+        # 移动积分每个tick都执行，未轮到决策的AI沿用上一次决策的移动向量
+        for ai_id, ai_player in alive_ai.items():
+            action = scheduler.actions.get(ai_id)
+            if action:
+                self._move_ai_player(ai_id, ai_player, action, dt)
+
+    def _apply_ai_decision(self, ai_id, ai_player, action):
+        """应用一次AI决策中的一次性动作：朝向、射击、装填、开门、静步和声音状态"""
+        # 更新角度
+        ai_player.angle = action["angle"]
+
+        # 处理射击
+        if action["shoot"] and ai_player.ammo > 0:
+            # 计算子弹方向向量（与玩家相同的方式）
+            bullet_dir = pygame.Vector2(
+                math.cos(math.radians(ai_player.angle)),
+                -math.sin(math.radians(ai_player.angle)),
+            )
+            bullet_pos = ai_player.pos + bullet_dir * (
+                PLAYER_RADIUS + BULLET_RADIUS
+            )
+
+            # 创建子弹
+            self.network_manager.request_fire_bullet(
+                [bullet_pos.x, bullet_pos.y],
+                [bullet_dir.x, bullet_dir.y],
+                ai_id,
+            )
+            ai_player.ammo -= 1
+            ai_player.last_shot_time = time.time()
+
+        # 处理装填
+        if action.get("reload", False):
+            # 如果还没有开始换弹，则开始换弹
+            if not ai_player.is_reloading:
+                ai_player.is_reloading = True
+                ai_player.reload_start_time = time.time()
+
+        # 处理门交互
+        if "interact_door" in action and action["interact_door"]:
+            door = action["interact_door"]
+            if not door.is_open:
+                # AI开门
+                door.open()
+                print(f"[AI门交互] AI玩家{ai_id}开启了门")
+
+        # 处理静步状态
+        if "is_walking" in action:
+            ai_player.is_walking = action["is_walking"]
+
+        # 处理声音状态
+        if "is_making_sound" in action:
+            ai_player.is_making_sound = action["is_making_sound"]
+        if "sound_volume" in action:
+            ai_player.sound_volume = action["sound_volume"]
+
+    def _move_ai_player(self, ai_id, ai_player, action, dt):
+        """按AI最近一次决策的移动向量推进一个tick，并同步网络数据"""
+        # 应用移动
+        move_vec = action["move"] * dt
+        new_pos = ai_player.pos + move_vec
+
+        # 碰撞检测
+        player_rect = pygame.Rect(
+            new_pos.x - PLAYER_RADIUS,
+            new_pos.y - PLAYER_RADIUS,
+            PLAYER_RADIUS * 2,
+            PLAYER_RADIUS * 2,
+        )
+
+        # 检查墙壁和门碰撞
+        spatial = self.game_map.spatial
+        collision = spatial.rect_blocked(player_rect)
+
+        if not collision:
+            ai_player.pos = new_pos
+        else:
+            # 碰撞时尝试滑动移动
+            # 尝试只在X轴移动
+            test_pos_x = pygame.Vector2(
+                ai_player.pos.x + move_vec.x, ai_player.pos.y
+            )
+            test_rect_x = pygame.Rect(
+                test_pos_x.x - PLAYER_RADIUS,
+                test_pos_x.y - PLAYER_RADIUS,
+                PLAYER_RADIUS * 2,
+                PLAYER_RADIUS * 2,
+            )
+
+            collision_x = spatial.rect_blocked(test_rect_x)
+
+            if not collision_x:
+                ai_player.pos = test_pos_x
+            else:
+                # 尝试只在Y轴移动
+                test_pos_y = pygame.Vector2(
+                    ai_player.pos.x, ai_player.pos.y + move_vec.y
+                )
+                test_rect_y = pygame.Rect(
+                    test_pos_y.x - PLAYER_RADIUS,
+                    test_pos_y.y - PLAYER_RADIUS,
+                    PLAYER_RADIUS * 2,
+                    PLAYER_RADIUS * 2,
+                )
+
+                collision_y = spatial.rect_blocked(test_rect_y)
+
+                if not collision_y:
+                    ai_player.pos = test_pos_y
+
+        # 检查换弹是否完成
+        if ai_player.is_reloading:
+            current_time = time.time()
+            if current_time - ai_player.reload_start_time >= RELOAD_TIME:
+                ai_player.ammo = MAGAZINE_SIZE
+                ai_player.is_reloading = False
+
+        # 更新网络数据
+        if ai_id in self.network_manager.players:
+            self.network_manager.players[ai_id]["pos"] = [
+                ai_player.pos.x,
+                ai_player.pos.y,
+            ]
+            self.network_manager.players[ai_id]["angle"] = ai_player.angle
+            self.network_manager.players[ai_id]["health"] = ai_player.health
+            self.network_manager.players[ai_id]["ammo"] = ai_player.ammo
+            self.network_manager.players[ai_id]["is_reloading"] = (
+                ai_player.is_reloading
+            )
+            self.network_manager.players[ai_id]["shooting"] = action["shoot"]
+            self.network_manager.players[ai_id]["is_walking"] = getattr(
+                ai_player, "is_walking", False
+            )
+            self.network_manager.players[ai_id]["is_making_sound"] = getattr(
+                ai_player, "is_making_sound", False
+            )
+            self.network_manager.players[ai_id]["sound_volume"] = getattr(
+                ai_player, "sound_volume", 0.0
+            )
+
+    def add_ai_player(self, difficulty="normal"):
+        """添加AI玩家（供命令系统调用）- 性格为隐性参数"""
+        if not self.network_manager.is_server:
+            return None
+
+        ai_id = self.next_ai_id
+        self.next_ai_id += 1
+
+        spawn_x, spawn_y = self.get_safe_spawn_pos()
+
+        try:
+            if USE_ENHANCED_AI:
+                from ai_player_enhanced import EnhancedAIPlayer
+                from ai_personality import AIPersonality, AIPersonalityTraits
+
+                # 性格随机生成，玩家无法选择
+                personality_traits = AIPersonalityTraits.random_personality()
+
+                ai_player = EnhancedAIPlayer(
+                    ai_id, spawn_x, spawn_y, difficulty, personality_traits
+                )
+                ai_player_name = ai_player.name
+                use_enhanced_ai = True
+            else:
+                raise ImportError("USE_ENHANCED_AI is False")
+
+        except ImportError:
+            from ai_player import AIPlayer
+
+            ai_player = AIPlayer(ai_id, spawn_x, spawn_y, difficulty)
+            ai_player_name = f"AI_{difficulty}_{ai_id}"
+            use_enhanced_ai = False
+
+        if hasattr(ai_player, "generate_patrol_points"):
+            ai_player.generate_patrol_points(self.game_map)
+
+        self.ai_players[ai_id] = ai_player
+
+        player_data = {
+            "pos": [spawn_x, spawn_y],
+            "angle": ai_player.angle,
+            "health": ai_player.health,
+            "ammo": ai_player.ammo,
+            "is_reloading": ai_player.is_reloading,
+            "shooting": False,
+            "is_dead": ai_player.is_dead,
+            "death_time": ai_player.death_time,
+            "respawn_time": ai_player.respawn_time,
+            "is_respawning": False,
+            "melee_attacking": False,
+            "melee_direction": 0,
+            "weapon_type": ai_player.weapon_type,
+            "is_aiming": ai_player.is_aiming,
+            "name": ai_player_name,
+            "team_id": getattr(ai_player, "team_id", None),
+        }
+
+        if use_enhanced_ai:
+            player_data["is_walking"] = getattr(ai_player, "is_walking", False)
+            player_data["is_making_sound"] = getattr(
+                ai_player, "is_making_sound", False
+            )
+            player_data["sound_volume"] = getattr(ai_player, "sound_volume", 0.0)
+
+        self.network_manager.players[ai_id] = player_data
+
+        # 不显示性格信息
+        self.network_manager._send_system_message(
+            f"已添加AI玩家 (难度: {difficulty}, ID: {ai_id})"
+        )
+
+        return ai_id
+
+    def remove_ai_player(self, ai_id):
+        """移除AI玩家（供命令系统调用）"""
+        if not self.network_manager.is_server:
+            return False
+
+        if ai_id in self.ai_players:
+            del self.ai_players[ai_id]
+            if ai_id in self.network_manager.players:
+                del self.network_manager.players[ai_id]
+            self.network_manager._send_system_message(f"已移除AI玩家 (ID: {ai_id})")
+            return True
+
+        return False
+
+    def sync_bullets(self):
+        """同步子弹 - 完全基于服务器数据"""
+        network_bullets = self.network_manager.get_bullets()
+
+        # 使用游戏规则中的子弹速度
+        bullet_speed = BULLET_SPEED
+        if hasattr(self, "game_rules"):
+            bullet_speed = self.game_rules["bullet_speed"]
+
+        # 移除不在网络列表中的子弹并添加新子弹
+        self.bullets.sync(network_bullets, bullet_speed)
+        
+        if not hasattr(self, 'last_grenade_explosion'):
+            self.last_grenade_explosion = None
@@ -0,0 +1,127 @@
+"""
+兴趣管理模块
+
+服务端广播前为每个接收方挑选相关实体，只序列化接收方可能看见或听见的部分，
+使出站带宽随局部密度而不是玩家总数的平方增长。
+
+相关性规则（满足任一即相关）:
+    - 接收方自己、队友、接收方发射的子弹
+    - 与接收方位于同一房间（地图为 3x3 的 ROOM_SIZE 房间网格）
+    - 与接收方距离不超过 INTEREST_RADIUS（默认600，与枪声可闻范围一致）
+
+实体按房间分桶，查询时只检查接收方周围若干圈房间内的实体。
+"""
+
+import math
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from constants import ROOM_SIZE, INTEREST_RADIUS
+
+
+def room_of(pos):
+    """坐标所在房间 (列, 行)"""
+    return (int(pos[0] // ROOM_SIZE), int(pos[1] // ROOM_SIZE))
+
+
+def _entity_pos(entity):
+    pos = entity.get('pos')
+    if isinstance(pos, (list, tuple)) and len(pos) >= 2:
+        return pos
+    return None
+
+
+class InterestIndex:
+    """单个广播tick的兴趣索引（按房间分桶）"""
+
+    def __init__(self, players: Dict, bullets: Iterable[Dict] = (), items: Iterable[Dict] = (),
+                 radius: float = INTEREST_RADIUS,
+                 teammates_of: Optional[Callable[[int], Iterable[int]]] = None):
+        """
+        Args:
+            players: 玩家快照 {pid_str: pdata}
+            bullets: 子弹状态列表
+            items: 道具状态列表
+            radius: 兴趣半径
+            teammates_of: 查询队友ID的函数，缺省时按快照中的team_id判断
+        """
+        self.players = players
+        self.radius = radius
+        self.radius_sq = radius * radius
+        # 需要检查的房间圈数，保证半径内的实体一定落在候选房间中
+        self.rings = max(1, int(math.ceil(radius / ROOM_SIZE)))
+        self.teammates_of = teammates_of
+
+        self.bullets = list(bullets)
+        self.items = list(items)
+        self.player_rooms = self._bucket(players.items())
+        self.bullet_rooms = self._bucket(enumerate(self.bullets))
+        self.item_rooms = self._bucket(enumerate(self.items))
+        self.bullets_by_owner = {}
+        for i, bullet in enumerate(self.bullets):
+            self.bullets_by_owner.setdefault(str(bullet.get('owner')), []).append(i)
+
+    @staticmethod
+    def _bucket(entries):
+        rooms = {}
+        for key, entity in entries:
+            pos = _entity_pos(entity)
+            if pos is None:
+                continue
+            rooms.setdefault(room_of(pos), []).append((key, entity, pos))
+        return rooms
+
+    def _nearby(self, rooms, center):
+        """返回中心点相关的实体（同房间或在兴趣半径内）"""
+        home = room_of(center)
+        result = []
+        for dx in range(-self.rings, self.rings + 1):
+            for dy in range(-self.rings, self.rings + 1):
+                room = (home[0] + dx, home[1] + dy)
+                for key, entity, pos in rooms.get(room, ()):
+                    if room == home:
+                        result.append((key, entity))
+                        continue
+                    ddx = pos[0] - center[0]
+                    ddy = pos[1] - center[1]
+                    if ddx * ddx + ddy * ddy <= self.radius_sq:
+                        result.append((key, entity))
+        return result
+
+    def _center(self, recipient_id):
+        pdata = self.players.get(str(recipient_id))
+        return _entity_pos(pdata) if pdata else None
+
+    def _teammates(self, recipient_id) -> Set[str]:
+        if self.teammates_of is not None:
+            return {str(pid) for pid in self.teammates_of(int(recipient_id))}
+        team_id = self.players.get(str(recipient_id), {}).get('team_id')
+        if team_id is None:
+            return set()
+        return {pid for pid, pdata in self.players.items() if pdata.get('team_id') == team_id}
+
+    def players_for(self, recipient_id) -> Set[str]:
+        """接收方相关的玩家ID集合（字符串形式，与快照键一致）"""
+        center = self._center(recipient_id)
+        if center is None:
+            return set(self.players)
+        visible = {key for key, _ in self._nearby(self.player_rooms, center)}
+        visible.add(str(recipient_id))
+        visible.update(pid for pid in self._teammates(recipient_id) if pid in self.players)
+        return visible
+
+    def bullets_for(self, recipient_id) -> List[Dict]:
+        """接收方相关的子弹"""
+        center = self._center(recipient_id)
+        if center is None:
+            return self.bullets
+        indices = {key for key, _ in self._nearby(self.bullet_rooms, center)}
+        indices.update(self.bullets_by_owner.get(str(recipient_id), ()))
+        return [self.bullets[i] for i in sorted(indices)]
+
+    def items_for(self, recipient_id) -> List[Dict]:
+        """接收方相关的道具"""
+        center = self._center(recipient_id)
+        if center is None:
+            return self.items
+        indices = {key for key, _ in self._nearby(self.item_rooms, center)}
+        return [self.items[i] for i in sorted(indices)]
@@ -0,0 +1,102 @@
+"""
+快照插值模块
+
+客户端为每个远程玩家保存带时间戳的位置/朝向环形缓冲（按收到快照的时间记录），
+渲染时在 当前时间 - 插值延迟 处取样，在相邻两个快照之间线性插值，
+使远程玩家的运动不随广播频率（默认20Hz）跳动。
+
+    - 插值延迟（network.interpolation_delay）应不小于两个广播间隔，丢失一个快照时仍有插值区间
+    - 取样时间超出最新快照时按最后两个快照的速度外推，最多外推 network.max_extrapolation 秒后停住
+    - 相邻快照的位移远超移动速度时视为传送（复活），清空缓冲直接跳到新位置
+
+本地玩家使用客户端预测（prediction.py），不经过插值。
+"""
+
+import math
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from constants import PLAYER_SPEED, NETWORK_INTERPOLATION_DELAY, NETWORK_MAX_EXTRAPOLATION
+
+BUFFER_SIZE = 32  # 每个实体保存的快照数（20Hz时约1.6秒）
+TELEPORT_SPEED = PLAYER_SPEED * 3  # 相邻快照间的位移速度超过该值视为传送
+
+
+def _lerp_angle(a, b, t):
+    """按最短方向插值角度（度）"""
+    diff = (b - a + 180) % 360 - 180
+    return a + diff * t
+
+
+class SnapshotBuffer:
+    """单个实体的快照环形缓冲"""
+
+    __slots__ = ("samples",)
+
+    def __init__(self):
+        self.samples = deque(maxlen=BUFFER_SIZE)  # (时间, x, y, 朝向)
+
+    def push(self, t, x, y, angle):
+        if self.samples:
+            last_t, last_x, last_y, _ = self.samples[-1]
+            if t <= last_t:
+                return  # 同一时刻或乱序的快照
+            if math.hypot(x - last_x, y - last_y) > TELEPORT_SPEED * max(t - last_t, 0.05):
+                self.samples.clear()
+        self.samples.append((t, x, y, angle))
+
+    def sample(self, t, max_extrapolation) -> Optional[Tuple[float, float, float]]:
+        """取样时间t处的 (x, y, 朝向)，缓冲为空时返回None"""
+        samples = self.samples
+        if not samples:
+            return None
+        first = samples[0]
+        if t <= first[0] or len(samples) == 1:
+            return first[1:]
+
+        last = samples[-1]
+        if t >= last[0]:
+            # 外推：按最后两个快照的速度，最多外推max_extrapolation秒
+            prev = samples[-2]
+            span = last[0] - prev[0]
+            ahead = min(t - last[0], max_extrapolation) / span
+            return (last[1] + (last[1] - prev[1]) * ahead,
+                    last[2] + (last[2] - prev[2]) * ahead,
+                    last[3])
+
+        # 从新到旧查找包含t的区间（取样时间通常靠近缓冲末尾）
+        for i in range(len(samples) - 1, 0, -1):
+            older = samples[i - 1]
+            if older[0] <= t:
+                newer = samples[i]
+                k = (t - older[0]) / (newer[0] - older[0])
+                return (older[1] + (newer[1] - older[1]) * k,
+                        older[2] + (newer[2] - older[2]) * k,
+                        _lerp_angle(older[3], newer[3], k))
+        return first[1:]
+
+
+class SnapshotInterpolator:
+    """远程实体的快照插值（按实体ID保存缓冲）"""
+
+    def __init__(self, delay=NETWORK_INTERPOLATION_DELAY, max_extrapolation=NETWORK_MAX_EXTRAPOLATION):
+        self.delay = delay
+        self.max_extrapolation = max_extrapolation
+        self.buffers: Dict[int, SnapshotBuffer] = {}
+
+    def push(self, entity_id, t, pos, angle=0.0):
+        """记录实体在时间t（收到快照的时间）的位置和朝向"""
+        buffer = self.buffers.get(entity_id)
+        if buffer is None:
+            buffer = self.buffers[entity_id] = SnapshotBuffer()
+        buffer.push(t, float(pos[0]), float(pos[1]), float(angle or 0.0))
+
+    def sample(self, entity_id, now) -> Optional[Tuple[float, float, float]]:
+        """渲染时间（now - 插值延迟）处的 (x, y, 朝向)，没有数据时返回None"""
+        buffer = self.buffers.get(entity_id)
+        if buffer is None:
+            return None
+        return buffer.sample(now - self.delay, self.max_extrapolation)
+
+    def remove(self, entity_id):
+        self.buffers.pop(entity_id, None)
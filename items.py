@@ -83,8 +83,9 @@ class Item:
     
     def draw(self, surface: pygame.Surface, camera_offset: pygame.Vector2,
              player_pos: pygame.Vector2 = None, player_angle: float = None,
-             walls: List = None, doors: List = None, is_aiming: bool = False):
-        """绘制道具"""
+             walls: List = None, doors: List = None, is_aiming: bool = False, spatial_index=None,
+             los_table=None):
+        """绘制道具（spatial_index/los_table为地图空间索引和视线表，用于视线检测）"""
         if not self.is_active:
             return
         
@@ -95,7 +96,8 @@ class Item:
         
         if player_pos and player_angle and walls and doors:
             from utils import is_visible
-            if not is_visible(player_pos, player_angle, self.pos, 120, walls, doors):
+            if not is_visible(player_pos, player_angle, self.pos, 120, walls, doors,
+                              spatial_index=spatial_index, los_table=los_table):
                 return
         
         pygame.draw.circle(surface, self.COLOR, (int(screen_pos.x), int(screen_pos.y)), self.RADIUS)
@@ -388,6 +390,16 @@ class ItemManager:
         self.item_spawn_points: List[Tuple[float, float]] = []
         self.item_weights: Dict[ItemType, float] = {}
         self.respawn_enabled = True
+        self.spatial_index = None  # 地图空间索引（spatial_index.MapSpatialIndex），拾取检测只检查附近的道具
+    
+    def attach_spatial_index(self, spatial_index):
+        """使用地图空间索引的道具层做拾取检测"""
+        self.spatial_index = spatial_index
+        self._sync_spatial_index()
+    
+    def _sync_spatial_index(self):
+        if self.spatial_index is not None:
+            self.spatial_index.update_items(self.items)
     
     def generate_spawn_points(self, map_rooms: List[pygame.Rect], walls: List[pygame.Rect]):
         """生成道具生成点（避开墙壁和门）"""
@@ -439,6 +451,7 @@ class ItemManager:
         item = item_class(self.next_item_id, pos[0], pos[1])
         self.next_item_id += 1
         self.items[item.id] = item
+        self._sync_spatial_index()
         return item
     
     def spawn_items(self, count: int = 10):
@@ -497,7 +510,13 @@ class ItemManager:
         """检查玩家是否拾取道具"""
         pickup_radius = PLAYER_RADIUS + 15
         
-        for item in self.items.values():
+        if self.spatial_index is not None:
+            nearby = sorted(self.spatial_index.items_in_radius(player.pos, pickup_radius))
+            candidates = [self.items[item_id] for item_id in nearby if item_id in self.items]
+        else:
+            candidates = self.items.values()
+        
+        for item in candidates:
             if not item.can_pickup(player.id):
                 continue
             
@@ -559,6 +578,7 @@ class ItemManager:
         dt = 0.05
         
         walls = getattr(game_map, 'walls', [])
+        spatial = getattr(game_map, 'spatial', None)
         
         for bounce in range(max_bounces):
             steps = int(3.0 / dt)
@@ -566,7 +586,8 @@ class ItemManager:
                 velocity.y += gravity * dt
                 new_pos = current_pos + velocity * dt
                 
-                for wall in walls:
+                nearby_walls = spatial.walls_in_rect((new_pos.x, new_pos.y, 1, 1)) if spatial else walls
+                for wall in nearby_walls:
                     if wall.collidepoint(new_pos.x, new_pos.y):
                         if abs(velocity.x) > abs(velocity.y):
                             velocity.x *= -0.6
@@ -585,8 +606,19 @@ class ItemManager:
     def _has_line_of_sight(self, from_pos: pygame.Vector2, to_pos: pygame.Vector2,
                             game_map) -> bool:
         """检查两点之间是否有视线（不穿过墙壁）"""
+        los_table = getattr(game_map, 'los_table', None)
+        if los_table is not None:
+            # 门（含已打开的门框）也算障碍，视线表给出确定结论时直接返回
+            known = los_table.lookup(from_pos, to_pos, include_open_doors=True)
+            if known is not None:
+                return known
+        
         walls = getattr(game_map, 'walls', [])
         doors = getattr(game_map, 'doors', [])
+        spatial = getattr(game_map, 'spatial', None)
+        if spatial is not None:
+            # 墙壁只取线段经过格子中的候选；门（含已打开的门框）数量少，仍全部检查
+            walls, _ = spatial.segment_candidates(from_pos, to_pos)
         
         obstacles = list(walls) + [d.rect for d in doors]
         
@@ -668,13 +700,17 @@ class ItemManager:
         for item_id in existing_ids - new_ids:
             if item_id in self.items:
                 del self.items[item_id]
+        
+        self._sync_spatial_index()
     
     def draw(self, surface: pygame.Surface, camera_offset: pygame.Vector2,
              player_pos: pygame.Vector2 = None, player_angle: float = None,
-             walls: List = None, doors: List = None, is_aiming: bool = False):
+             walls: List = None, doors: List = None, is_aiming: bool = False, spatial_index=None,
+             los_table=None):
         """绘制所有活跃道具"""
         for item in self.items.values():
-            item.draw(surface, camera_offset, player_pos, player_angle, walls, doors, is_aiming)
+            item.draw(surface, camera_offset, player_pos, player_angle, walls, doors, is_aiming,
+                      spatial_index, los_table)
 
 
 def create_default_item_manager() -> ItemManager:
@@ -0,0 +1,86 @@
+"""
+延迟补偿模块
+
+服务端每个tick记录所有存活玩家的位置，保存最近 server.max_lag_compensation 秒的环形缓冲。
+判定远程客户端发起的攻击时，把目标回溯到攻击者开火时屏幕上看到的时刻再做命中检测，
+命中结果不再取决于谁的延迟更低：
+
+    - 客户端看到的远程玩家落后服务端 单程延迟(RTT/2) + 插值延迟（interpolation.py）
+    - 攻击到达服务端又经过 RTT/2，服务端子弹也从到达时才开始模拟，
+      因此相对服务端处理时刻需要回溯 RTT + 插值延迟
+    - 回溯时间不超过 server.max_lag_compensation，防止高延迟（或谎报延迟）的客户端打中很久以前的位置
+
+两个tick之间线性插值；位移远超移动速度（复活）时取时间上较近的一帧，不插出中间位置。
+回溯位置与当前位置相距超过 max_displacement（窗口内复活/传送过）时不回溯，
+命中检测因此只需考虑当前位置附近 max_displacement 内的玩家（game_world.update_bullets）。
+"""
+
+import math
+from collections import deque
+from typing import Dict, Tuple
+
+from constants import SERVER_MAX_LAG_COMPENSATION
+from interpolation import TELEPORT_SPEED
+
+
+def view_latency(rtt, view_delay, max_rewind=SERVER_MAX_LAG_COMPENSATION) -> float:
+    """攻击者视角相对服务端处理时刻的延迟（秒），限制在 0..max_rewind"""
+    return min(max((rtt or 0.0) + (view_delay or 0.0), 0.0), max_rewind)
+
+
+class PositionHistory:
+    """服务端玩家位置的历史记录（按tick保存）"""
+
+    def __init__(self, window=SERVER_MAX_LAG_COMPENSATION):
+        self.window = window
+        self.frames = deque()  # (时间, {玩家ID: (x, y)})，按时间递增
+
+    @property
+    def max_displacement(self) -> float:
+        """回溯窗口内玩家不经传送能移动的最大距离"""
+        return TELEPORT_SPEED * self.window
+
+    def record(self, t, positions: Dict[int, Tuple[float, float]]):
+        """记录时间t的玩家位置，并丢弃超出回溯窗口的旧记录"""
+        if self.frames and t <= self.frames[-1][0]:
+            return
+        self.frames.append((t, positions))
+        # 保留一帧早于窗口起点的记录，窗口起点处仍可插值
+        cutoff = t - self.window
+        while len(self.frames) > 2 and self.frames[1][0] <= cutoff:
+            self.frames.popleft()
+
+    def rewind(self, t) -> Dict[int, Tuple[float, float]]:
+        """时间t处各玩家的位置（超出记录范围时取最早或最新一帧，该时刻不存在的玩家不包含在内）"""
+        frames = self.frames
+        if not frames:
+            return {}
+        if t >= frames[-1][0]:
+            return frames[-1][1]
+        if t <= frames[0][0]:
+            return frames[0][1]
+
+        # 从新到旧查找包含t的区间（回溯时间通常靠近缓冲末尾）
+        for i in range(len(frames) - 1, 0, -1):
+            older_t, older = frames[i - 1]
+            if older_t <= t:
+                newer_t, newer = frames[i]
+                span = newer_t - older_t
+                k = (t - older_t) / span
+                max_step = TELEPORT_SPEED * max(span, 0.05)
+                result = {}
+                for pid, (x1, y1) in newer.items():
+                    start = older.get(pid)
+                    if start is None:
+                        result[pid] = (x1, y1)
+                        continue
+                    x0, y0 = start
+                    if math.hypot(x1 - x0, y1 - y0) > max_step:
+                        result[pid] = (x1, y1) if k >= 0.5 else (x0, y0)
+                    else:
+                        result[pid] = (x0 + (x1 - x0) * k, y0 + (y1 - y0) * k)
+                return result
+        return frames[0][1]
+
+    def clear(self):
+        self.frames.clear()
@@ -0,0 +1,336 @@
+"""
+视线预计算表
+
+按格子对预计算静态墙壁下的视线关系，再叠加随门状态变化的门覆盖层，
+为各处视线检测提供O(1)的保守判定，只有边界情况的格子对才回退到精确检测。
+
+格子对的状态:
+    LOS_CLEAR: 两个格子内任意两点之间都有视线
+    LOS_BLOCKED: 两个格子内任意两点之间都没有视线
+    LOS_PARTIAL: 无法确定，需要精确检测
+
+判定方法（格子是边长 cell_size 的正方形）:
+    - 可见: 两个格子的凸包不与任何墙壁相交。凸包等于中心连线与格子的 Minkowski 和，
+      因此等价于中心连线不与按半个格子外扩的墙壁相交
+    - 遮挡: 存在一面墙，两个格子分别位于墙面两侧，且所有连线穿过墙面的位置都落在墙面范围内
+      （穿过位置的极值在格子角点处取得）
+    两种判定都额外留出1像素余量，避免各处精确检测的取整差异与表的结论矛盾。
+
+门覆盖层:
+    打开的门不影响视线；正在打开的门（矩形在原矩形内缩小）只把凸包与门相交的“可见”降为“需精确检测”；
+    完全关闭的门还能把被门隔开的格子对判为“遮挡”。门状态变化时各行在下次查询时重新叠加。
+
+每个起点格子的一行在第一次查询时计算，且只计算 max_range 范围内的格子（AI的视线检测都在视距附近），
+范围外的格子对一律需要精确检测。
+"""
+
+import math
+
+import numpy as np
+
+from constants import ROOM_SIZE, LOS_TABLE_CELL_SIZE, VISION_RANGE
+
+LOS_BLOCKED = 0
+LOS_CLEAR = 1
+LOS_PARTIAL = 2
+
+DOOR_OPEN = 0
+DOOR_OPENING = 1
+DOOR_CLOSED = 2
+
+MARGIN = 1.0  # 判定余量（像素）
+
+
+def _door_state(door):
+    if door.is_open:
+        return DOOR_OPEN
+    if door.rect == door.original_rect:
+        return DOOR_CLOSED
+    return DOOR_OPENING
+
+
+def _rect_array(rects):
+    boxes = [(r.left, r.top, r.right, r.bottom) for r in rects]
+    if not boxes:
+        return np.empty((0, 4), dtype=np.float64)
+    return np.asarray(boxes, dtype=np.float64)
+
+
+def _segments_hit_boxes(x0, y0, x1, y1, boxes):
+    """从 (x0, y0) 到各终点 (x1, y1) 的线段是否与各闭矩形相交 (C, K)"""
+    result = np.zeros((len(x1), len(boxes)), dtype=bool)
+    # 先用线段包围盒筛选，只对候选做slab测试
+    rows, cols = np.nonzero((np.minimum(x0, x1)[:, None] <= boxes[:, 2]) & (np.maximum(x0, x1)[:, None] >= boxes[:, 0])
+                            & (np.minimum(y0, y1)[:, None] <= boxes[:, 3]) & (np.maximum(y0, y1)[:, None] >= boxes[:, 1]))
+    if not len(rows):
+        return result
+    t_enter = np.zeros(len(rows))
+    t_exit = np.ones(len(rows))
+    for origin, end, lo, hi in ((x0, x1[rows], boxes[cols, 0], boxes[cols, 2]),
+                                (y0, y1[rows], boxes[cols, 1], boxes[cols, 3])):
+        delta = end - origin
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t1 = (lo - origin) / delta
+            t2 = (hi - origin) / delta
+        # 包围盒已相交，方向分量为0时起点必在板内
+        parallel = delta == 0
+        np.maximum(t_enter, np.where(parallel, -np.inf, np.minimum(t1, t2)), out=t_enter)
+        np.minimum(t_exit, np.where(parallel, np.inf, np.maximum(t1, t2)), out=t_exit)
+    hit = t_enter <= t_exit
+    result[rows[hit], cols[hit]] = True
+    return result
+
+
+def _faces(boxes, axis, min_span):
+    """
+    矩形的墙面 (K', 4) [矩形编号, 墙面坐标, 范围下限, 范围上限]
+
+    axis=0 取竖直墙面（矩形左边，范围为y），axis=1 取水平墙面（矩形上边，范围为x）。
+    范围按 pygame 闭区间 [left, right-1] 并留出余量；短于一个格子的墙面不可能隔开两个格子，直接略去。
+    """
+    if axis == 0:
+        face, lo, hi = boxes[:, 0], boxes[:, 1] + MARGIN, boxes[:, 3] - 1 - MARGIN
+    else:
+        face, lo, hi = boxes[:, 1], boxes[:, 0] + MARGIN, boxes[:, 2] - 1 - MARGIN
+    keep = hi - lo >= min_span
+    return np.stack([np.flatnonzero(keep), face[keep], lo[keep], hi[keep]], axis=1)
+
+
+def _face_separated(a_lo, a_hi, a_a, a_b, b_lo, b_hi, b_a, b_b, faces, count):
+    """
+    格子A与各格子B是否被墙面完全隔开 (C, K)
+
+    lo/hi 为格子在穿越轴上的范围，a/b 为沿墙面方向的范围，faces 来自 _faces()。
+    两个格子分别位于墙面两侧时，连线穿越墙面处的坐标在格子角点处取得极值，
+    极值都落在墙面范围内即所有连线都穿过墙面。
+    """
+    result = np.zeros((len(b_lo), count), dtype=bool)
+    if not len(faces):
+        return result
+    face = faces[:, 1]
+    # A位于墙面哪一侧决定了B需要在哪一侧
+    before = a_hi <= face
+    after = a_lo >= face
+    cells, index = np.nonzero((before & (b_lo[:, None] >= face)) | (after & (b_hi[:, None] <= face)))
+    if not len(cells):
+        return result
+    face = face[index]
+    a_first = before[index]
+    # first 为墙面前方的格子，second 为后方的格子
+    first_lo = np.where(a_first, a_lo, b_lo[cells])
+    first_hi = np.where(a_first, a_hi, b_hi[cells])
+    second_lo = np.where(a_first, b_lo[cells], a_lo)
+    second_hi = np.where(a_first, b_hi[cells], a_hi)
+    first_a = np.where(a_first, a_a, b_a[cells])
+    first_b = np.where(a_first, a_b, b_b[cells])
+    second_a = np.where(a_first, b_a[cells], a_a)
+    second_b = np.where(a_first, b_b[cells], a_b)
+    # 穿越比例 s 随两端坐标单调变化
+    s_max = (face - first_lo) / (second_lo - first_lo)
+    s_min = (face - first_hi) / (second_hi - first_hi)
+    low = np.minimum(first_a + (second_a - first_a) * s_min, first_a + (second_a - first_a) * s_max)
+    high = np.maximum(first_b + (second_b - first_b) * s_min, first_b + (second_b - first_b) * s_max)
+    ok = (low >= faces[index, 2]) & (high <= faces[index, 3])
+    result[cells[ok], faces[index[ok], 0].astype(int)] = True
+    return result
+
+
+class LineOfSightTable:
+    """格子对视线预计算表"""
+
+    def __init__(self, walls, doors, cell_size=LOS_TABLE_CELL_SIZE, map_size=ROOM_SIZE * 3,
+                 max_range=VISION_RANGE * 2):
+        """
+        Args:
+            walls: 墙壁矩形列表
+            doors: 门列表
+            cell_size: 格子边长（像素）
+            map_size: 地图边长（像素）
+            max_range: 预计算的最大距离（像素），超出范围的格子对需要精确检测
+        """
+        self.cell_size = cell_size
+        self.cols = int(math.ceil(map_size / cell_size))
+        self.rows = self.cols
+        self.cell_count = self.cols * self.rows
+        self.window_radius = int(math.ceil(max_range / cell_size))
+        self.doors = doors
+
+        index = np.arange(self.cell_count)
+        self._left = (index % self.cols) * float(cell_size)
+        self._top = (index // self.cols) * float(cell_size)
+        self._right = self._left + cell_size
+        self._bottom = self._top + cell_size
+        self._center_x = self._left + cell_size / 2
+        self._center_y = self._top + cell_size / 2
+
+        self._walls = _rect_array(walls)
+        self._door_rects = _rect_array([door.original_rect for door in doors])
+        self._wall_faces = (_faces(self._walls, 0, cell_size), _faces(self._walls, 1, cell_size))
+        self._door_faces = (_faces(self._door_rects, 0, cell_size), _faces(self._door_rects, 1, cell_size))
+
+        count = self.cell_count
+        packed = (count + 7) // 8
+        self._static = np.full((count, count), LOS_PARTIAL, dtype=np.uint8)
+        self._row_built = np.zeros(count, dtype=bool)
+        # 每行各扇门的凸包相交/隔开位图（按位压缩）
+        self._door_hull_bits = np.zeros((count, len(doors), packed), dtype=np.uint8)
+        self._door_separate_bits = np.zeros((count, len(doors), packed), dtype=np.uint8)
+
+        # 叠加当前门状态后的行，以及把所有门都视为障碍的行
+        self._current = np.zeros((count, count), dtype=np.uint8)
+        self._current_version = np.full(count, -1, dtype=np.int64)
+        self._with_doors = np.zeros((count, count), dtype=np.uint8)
+        self._with_doors_built = np.zeros(count, dtype=bool)
+
+        self._door_states = [_door_state(door) for door in doors]
+        self.door_version = 0
+
+    # ------------------------------------------------------------------
+    # 门状态
+    # ------------------------------------------------------------------
+
+    def sync_door(self, index):
+        """门状态变化后使各行的门覆盖层失效，返回是否发生变化"""
+        state = _door_state(self.doors[index])
+        if self._door_states[index] == state:
+            return False
+        self._door_states[index] = state
+        self.door_version += 1
+        return True
+
+    # ------------------------------------------------------------------
+    # 预计算
+    # ------------------------------------------------------------------
+
+    def _window(self, a):
+        """格子 a 周围 max_range 范围内的格子编号"""
+        cx, cy = a % self.cols, a // self.cols
+        r = self.window_radius
+        xs = np.arange(max(0, cx - r), min(self.cols, cx + r + 1))
+        ys = np.arange(max(0, cy - r), min(self.rows, cy + r + 1))
+        return (ys[:, None] * self.cols + xs[None, :]).ravel()
+
+    def _separated(self, a, cells, faces, count):
+        """格子 a 与各格子是否被某个矩形完全隔开 (len(cells), K)"""
+        vertical, horizontal = faces
+        left, top = self._left[cells], self._top[cells]
+        right, bottom = self._right[cells], self._bottom[cells]
+        a_left, a_top, a_right, a_bottom = self._left[a], self._top[a], self._right[a], self._bottom[a]
+        result = _face_separated(a_left, a_right, a_top, a_bottom, left, right, top, bottom, vertical, count)
+        result |= _face_separated(a_top, a_bottom, a_left, a_right, top, bottom, left, right, horizontal, count)
+        return result
+
+    def _hull_hits(self, a, cells, boxes):
+        """格子 a 与各格子的凸包是否与各矩形相交 (len(cells), K)"""
+        inflate = self.cell_size / 2 + MARGIN
+        inflated = boxes + np.array([-inflate, -inflate, inflate, inflate])
+        return _segments_hit_boxes(self._center_x[a], self._center_y[a],
+                                   self._center_x[cells], self._center_y[cells], inflated)
+
+    def _build_row(self, a):
+        cells = self._window(a)
+        if len(self._walls):
+            clear = ~self._hull_hits(a, cells, self._walls).any(axis=1)
+            blocked = self._separated(a, cells, self._wall_faces, len(self._walls)).any(axis=1)
+            self._static[a, cells] = np.where(clear, LOS_CLEAR, np.where(blocked, LOS_BLOCKED, LOS_PARTIAL))
+        else:
+            self._static[a, cells] = LOS_CLEAR
+
+        if len(self._door_rects):
+            hull = np.zeros((len(self.doors), self.cell_count), dtype=bool)
+            separated = np.zeros((len(self.doors), self.cell_count), dtype=bool)
+            hull[:, cells] = self._hull_hits(a, cells, self._door_rects).T
+            separated[:, cells] = self._separated(a, cells, self._door_faces, len(self._door_rects)).T
+            self._door_hull_bits[a] = np.packbits(hull, axis=1)
+            self._door_separate_bits[a] = np.packbits(separated, axis=1)
+        self._row_built[a] = True
+
+    def _unpack(self, bits):
+        return np.unpackbits(bits, count=self.cell_count).astype(bool)
+
+    def _row(self, a):
+        """叠加当前门状态后的一行"""
+        if not self._row_built[a]:
+            self._build_row(a)
+        if self._current_version[a] != self.door_version:
+            row = self._static[a].copy()
+            for index, state in enumerate(self._door_states):
+                if state == DOOR_OPEN:
+                    continue
+                row[self._unpack(self._door_hull_bits[a, index]) & (row == LOS_CLEAR)] = LOS_PARTIAL
+                if state == DOOR_CLOSED:
+                    row[self._unpack(self._door_separate_bits[a, index])] = LOS_BLOCKED
+            self._current[a] = row
+            self._current_version[a] = self.door_version
+        return self._current[a]
+
+    def _row_with_doors(self, a):
+        """把所有门（含打开的门）都视为可能的障碍时的一行"""
+        if not self._with_doors_built[a]:
+            if not self._row_built[a]:
+                self._build_row(a)
+            row = self._static[a].copy()
+            for index in range(len(self.doors)):
+                row[self._unpack(self._door_hull_bits[a, index]) & (row == LOS_CLEAR)] = LOS_PARTIAL
+            self._with_doors[a] = row
+            self._with_doors_built[a] = True
+        return self._with_doors[a]
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def cell_of(self, pos):
+        """位置所在格子的编号，超出地图时为None"""
+        cx = int(pos[0] // self.cell_size)
+        cy = int(pos[1] // self.cell_size)
+        if 0 <= cx < self.cols and 0 <= cy < self.rows:
+            return cy * self.cols + cx
+        return None
+
+    def classify(self, start, end, include_open_doors=False):
+        """两点所在格子对的状态（LOS_CLEAR / LOS_BLOCKED / LOS_PARTIAL）"""
+        a = self.cell_of(start)
+        b = self.cell_of(end)
+        if a is None or b is None:
+            return LOS_PARTIAL
+        row = self._row_with_doors(a) if include_open_doors else self._row(a)
+        return int(row[b])
+
+    def classify_many(self, starts, ends):
+        """批量classify（按起点格子分组查表），starts/ends 为 (n, 2) 数组"""
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+        a = self._cells_of(starts)
+        b = self._cells_of(ends)
+        states = np.full(len(starts), LOS_PARTIAL, dtype=np.int8)
+        valid = (a >= 0) & (b >= 0)
+        for cell in np.unique(a[valid]):
+            pairs = np.flatnonzero(valid & (a == cell))
+            states[pairs] = self._row(int(cell))[b[pairs]]
+        return states
+
+    def _cells_of(self, points):
+        """(n, 2) 位置对应的格子编号，超出地图为-1"""
+        cx = np.floor(points[:, 0] / self.cell_size).astype(np.int64)
+        cy = np.floor(points[:, 1] / self.cell_size).astype(np.int64)
+        inside = (cx >= 0) & (cx < self.cols) & (cy >= 0) & (cy < self.rows)
+        return np.where(inside, cy * self.cols + cx, -1)
+
+    def lookup(self, start, end, include_open_doors=False):
+        """
+        O(1)保守视线判定
+
+        Args:
+            start, end: 两点位置
+            include_open_doors: 为True时把打开的门也视为可能的障碍
+
+        Returns:
+            True 一定有视线，False 一定被遮挡，None 需要精确检测
+        """
+        state = self.classify(start, end, include_open_doors)
+        if state == LOS_CLEAR:
+            return True
+        if state == LOS_BLOCKED:
+            return False
+        return None
@@ -14,6 +14,12 @@ import threading
 import time
 import ipaddress
 
+# 无头专用服务器：在初始化pygame显示和字体之前分流
+if __name__ == "__main__" and "--dedicated" in sys.argv[1:]:
+    from dedicated_server import main as dedicated_main
+
+    sys.exit(dedicated_main(sys.argv[1:]))
+
 # 第三方库导入
 import pygame
 from pygame.locals import *
@@ -40,6 +46,13 @@ from map import Map, Door
 from network import NetworkManager, ChatMessage, generate_default_player_name
 from player import Player
 from weapons import MeleeWeapon, Bullet, Ray
+from server_tick import FixedTickClock
+from ai_scheduler import AIScheduler
+from lag_compensation import PositionHistory
+from ai_workers import AIWorkerPool
+from game_world import GameWorldMixin
+from bullet_pool import BulletPool
+from visibility import VisibilityCache
 
 # 本地模块导入 - 工具和UI
 from utils import *
@@ -290,7 +303,7 @@ def scan_for_servers():
     return found_servers
 
 
-class Game:
+class Game(GameWorldMixin):
     """
     游戏主类
 
@@ -350,7 +363,11 @@ class Game:
 
         # 网络同步
         self.last_sync_time = 0
-        self.sync_interval = 0.05  # 50ms同步间隔
+        self.sync_interval = 0.05  # 50ms同步间隔（客户端）
+        self.server_clock = None  # 服务端固定步长时钟
+        self.ai_scheduler = None  # 服务端AI决策调度器
+        self.ai_pool = None  # 行为树AI决策进程池（可选）
+        self.position_history = None  # 服务端延迟补偿的玩家位置记录
 
         # 聊天系统
         self.chat_active = False
@@ -1164,30 +1181,25 @@ class Game:
             )
             self.other_players = {}  # 存储其他玩家
 
+            # 服务端权威模拟以固定频率推进，与渲染帧率解耦
+            if self.network_manager.is_server:
+                self.server_clock = FixedTickClock()
+                self.ai_scheduler = AIScheduler(tick_rate=self.server_clock.tick_rate)
+                if SERVER_MAX_LAG_COMPENSATION > 0:
+                    self.position_history = PositionHistory()
+                if SERVER_AI_WORKERS > 0 and self.ai_pool is None:
+                    self.ai_pool = AIWorkerPool(SERVER_AI_WORKERS)
+
             # 初始化游戏地图（使用九宫格地图）
             self.game_map = Map()
-            self.bullets = []  # 本地子弹对象
+            self.visibility = VisibilityCache(self.game_map)
+            self.bullets = BulletPool()  # 本地子弹池
             self.grenades = []  # 飞行手雷列表
+            self.last_grenade_explosion = None
             self.camera_offset = pygame.Vector2(0, 0)
             
             # 初始化道具系统
-            from items import ItemManager, ItemType
-            self.item_manager = ItemManager()
-            self.item_manager.generate_spawn_points(self.game_map.rooms, self.game_map.walls)
-            
-            weights = {
-                ItemType.HEALTH_PACK: 0.30,
-                ItemType.AMMO_BOX: 0.20,
-                ItemType.ARMOR: 0.15,
-                ItemType.SPEED_BOOST: 0.10,
-                ItemType.DAMAGE_BOOST: 0.10,
-                ItemType.GRENADE: 0.15,
-            }
-            self.item_manager.set_spawn_weights(weights)
-            
-            spawn_count = 12
-            from config import ITEMS_SPAWN_COUNT
-            self.item_manager.spawn_all_types()
+            self.init_item_manager()
             
             print(f"游戏初始化成功，玩家ID: {self.network_manager.player_id}")
             print(f"道具系统已初始化，生成 {len(self.item_manager.items)} 个道具")
@@ -1341,6 +1353,9 @@ class Game:
                         self.player.is_aiming = False
 
     def update(self, dt):
+        # 处理网络线程收到的消息（在游戏线程中批量分发）
+        self.network_manager.poll()
+
         # 检查网络连接状态
         if not self.network_manager.connected:
             if self.network_manager.connection_error:
@@ -1359,25 +1374,7 @@ class Game:
             return
 
         # 合并所有玩家（本地+网络）
-        all_players = {self.player.id: self.player}
-        all_players.update(self.other_players)
-
-        # 服务端：添加AI玩家对象到all_players用于碰撞检测
-        if self.network_manager.is_server and hasattr(self, "ai_players"):
-            for ai_id, ai_player in self.ai_players.items():
-                if ai_id not in all_players:
-                    # 创建一个简单的Player对象用于碰撞检测
-                    class AIPlayerWrapper:
-                        def __init__(self, ai):
-                            self.id = ai.id
-                            self.pos = ai.pos
-                            self.is_dead = ai.is_dead
-
-                    wrapper = AIPlayerWrapper(ai_player)
-                    all_players[ai_id] = wrapper
-                    print(
-                        f"[调试] 添加AI玩家{ai_id}到all_players，位置=({wrapper.pos.x}, {wrapper.pos.y}), 死亡={wrapper.is_dead}"
-                    )
+        all_players = self._collect_all_players()
 
         # 更新本地玩家
         self.player.update(
@@ -1415,7 +1412,15 @@ class Game:
                             self.network_manager.players[self.player.id]['damage_boost_end_time'] = self.player.damage_boost_end_time
                             self.network_manager.players[self.player.id]['grenades'] = getattr(self.player, 'grenades', 0)
                         
-                        self.network_manager.send_item_update(self.item_manager.get_state())
+                        # 通过可靠通道广播拾取事件，客户端据此标记道具为已拾取
+                        self.network_manager.send_data({
+                            'type': 'item_pickup',
+                            'data': {
+                                'player_id': self.player.id,
+                                'item_id': pickup_result.get('item_id'),
+                                'effect': pickup_result
+                            }
+                        })
                     else:
                         # 客户端：通知服务端，等待服务端确认后再应用效果
                         # 临时标记道具为不活跃，防止重复拾取
@@ -1431,134 +1436,21 @@ class Game:
                             }
                         })
 
-        # 控制网络同步频率
-        if current_time - self.last_sync_time > self.sync_interval:
-            self.last_sync_time = current_time
-
-            # 同步网络玩家数据并清理断线玩家
-            with self.network_manager.lock:
-                # 获取当前网络中的玩家ID
-                network_player_ids = set(self.network_manager.players.keys())
-                # 获取当前本地其他玩家ID
-                local_other_player_ids = set(self.other_players.keys())
-
-                # 移除已断线的玩家
-                disconnected_players = local_other_player_ids - network_player_ids
-                for pid in disconnected_players:
-                    if pid != self.player.id:  # 不要删除本地玩家
-                        print(f"[客户端] 移除断线玩家{pid}")
-                        del self.other_players[pid]
-
-                # 更新或添加在线玩家
-                for pid, pdata in self.network_manager.players.items():
-                    # 本地玩家：只同步权威数据（健康值、死亡状态等）
-                    if pid == self.player.id:
-                        self.player.health = pdata.get("health", self.player.health)
-                        self.player.is_dead = pdata.get("is_dead", False)
-                        self.player.death_time = pdata.get("death_time", 0)
-                        self.player.respawn_time = pdata.get("respawn_time", 0)
-                        self.player.is_respawning = pdata.get("is_respawning", False)
-                        self.player.armor = pdata.get("armor", self.player.armor)
-                        self.player.speed_boost_end_time = pdata.get("speed_boost_end_time", 0)
-                        self.player.damage_boost_end_time = pdata.get("damage_boost_end_time", 0)
-                        self.player.grenades = pdata.get("grenades", 0)
-                        continue
-
-                    # 创建或更新其他玩家
-                    if pid not in self.other_players:
-                        player_name = pdata.get("name", f"玩家{pid}")
-                        self.other_players[pid] = Player(
-                            pid, pdata["pos"][0], pdata["pos"][1], name=player_name
-                        )
-                        print(f"[客户端] 添加新玩家{pid}")
-
-                    # 更新玩家数据
-                    other_player = self.other_players[pid]
-                    # 只在非复活状态下更新位置
-                    if not pdata.get("is_respawning", False):
-                        other_player.pos.update(pdata["pos"])
-                    other_player.angle = pdata["angle"]
-                    other_player.health = pdata["health"]
-                    other_player.ammo = pdata["ammo"]
-                    other_player.armor = pdata.get("armor", 0)
-                    other_player.is_reloading = pdata["is_reloading"]
-                    other_player.shooting = pdata["shooting"]
-                    other_player.is_dead = pdata.get("is_dead", False)
-                    other_player.death_time = pdata.get("death_time", 0)
-                    other_player.respawn_time = pdata.get("respawn_time", 0)
-                    other_player.is_respawning = pdata.get("is_respawning", False)
-                    other_player.name = pdata.get("name", f"玩家{pid}")
-                    other_player.speed_boost_end_time = pdata.get("speed_boost_end_time", 0)
-                    other_player.damage_boost_end_time = pdata.get("damage_boost_end_time", 0)
-                    other_player.grenades = pdata.get("grenades", 0)
-
-                    # 同步团队ID
-                    if "team_id" in pdata:
-                        other_player.team_id = pdata["team_id"]
-
-                    # 同步状态（包括武器类型和瞄准状态）
-                    other_player.sync_from_network(pdata)
-
-            # 更新AI玩家（仅服务端）
-            if self.network_manager.is_server:
-                self.update_ai_players(dt, all_players)
+        if self.network_manager.is_server:
+            # 服务端：固定步长tick推进权威模拟，渲染只读取最新状态
+            for _ in range(self.server_clock.advance()):
+                self.server_tick(self.server_clock.tick_interval)
+        else:
+            # 控制网络同步频率
+            if current_time - self.last_sync_time > self.sync_interval:
+                self.last_sync_time = current_time
+                self.sync_network_players()
+                self.sync_bullets()
 
-            # 服务端定期广播
-            self.network_manager.update_and_broadcast()
+            # 远程玩家每帧按插值缓冲取样，不随快照频率跳动
+            self.interpolate_remote_players(current_time)
 
-            # 同步子弹
-            self.sync_bullets()
-
-        # 更新子弹
-        for bullet in list(self.bullets):
-            if bullet.update(dt, self.game_map, all_players, self.network_manager):
-                self.bullets.remove(bullet)
-                # 通知服务器移除子弹
-                if self.network_manager.is_server:
-                    self.network_manager.remove_bullet(bullet.id)
-        
-        # 更新飞行手雷
-        walls = self.game_map.walls
-        for grenade in list(self.grenades):
-            if grenade.update(dt, walls):
-                targets = grenade.get_targets(all_players)
-                if grenade.explosion_pos:
-                    self.last_grenade_explosion = {
-                        'pos': grenade.explosion_pos,
-                        'time': time.time()
-                    }
-                for target in targets:
-                    target_id = target.get('target_id')
-                    damage = target.get('damage')
-                    attacker_id = target.get('attacker_id')
-                    
-                    if self.network_manager and self.network_manager.is_server:
-                        damage_data = {
-                            'target_id': target_id,
-                            'damage': damage,
-                            'attacker_id': attacker_id,
-                            'type': 'grenade'
-                        }
-                        self.network_manager._handle_damage(damage_data)
-                    else:
-                        if target_id == self.player.id:
-                            if not self.player.is_dead:
-                                self.player.take_damage(damage)
-                                print(f"[手雷] 本地玩家{target_id}受到{damage}伤害")
-                        elif target_id in self.ai_players:
-                            ai_player = self.ai_players[target_id]
-                            if not ai_player.is_dead:
-                                ai_player.take_damage(damage)
-                                print(f"[手雷] AI玩家{target_id}受到{damage}伤害")
-                        elif target_id in self.other_players:
-                            target_player = self.other_players[target_id]
-                            if not target_player.is_dead:
-                                target_player.take_damage(damage)
-                                print(f"[手雷] 网络玩家{target_id}受到{damage}伤害")
-                self.grenades.remove(grenade)
-
-        # 更新门
-        self.game_map.update_doors(dt, self.network_manager)
+            self.update_world(dt, all_players)
 
         # 更新相机（考虑瞄准偏移）
         if not self.player.is_dead and not self.player.is_respawning:
@@ -1588,402 +1480,6 @@ class Game:
             if self.hit_effect_time < 0:
                 self.hit_effect_time = 0
 
-    def is_position_safe(self, x, y):
-        """检查位置是否安全（不与墙壁或门碰撞）"""
-        player_rect = pygame.Rect(
-            x - PLAYER_RADIUS, y - PLAYER_RADIUS, PLAYER_RADIUS * 2, PLAYER_RADIUS * 2
-        )
-
-        # 检查墙壁碰撞
-        for wall in self.game_map.walls:
-            if player_rect.colliderect(wall):
-                return False
-
-        # 检查门碰撞
-        for door in self.game_map.doors:
-            if door.check_collision(player_rect):
-                return False
-
-        return True
-
-    def get_safe_spawn_pos(self, max_attempts=50):
-        """获取安全的复活位置（不与墙壁或门碰撞）"""
-        # 尝试使用房间中心位置（更安全）
-        for attempt in range(max_attempts):
-            room_id = random.randint(0, 8)
-            room_row = room_id // 3
-            room_col = room_id % 3
-
-            # 在房间中心附近随机位置
-            spawn_x = room_col * ROOM_SIZE + ROOM_SIZE // 2 + random.randint(-100, 100)
-            spawn_y = room_row * ROOM_SIZE + ROOM_SIZE // 2 + random.randint(-100, 100)
-
-            # 确保在房间边界内
-            spawn_x = max(
-                room_col * ROOM_SIZE + 50, min(spawn_x, (room_col + 1) * ROOM_SIZE - 50)
-            )
-            spawn_y = max(
-                room_row * ROOM_SIZE + 50, min(spawn_y, (room_row + 1) * ROOM_SIZE - 50)
-            )
-
-            # 检查位置是否安全
-            if self.is_position_safe(spawn_x, spawn_y):
-                return spawn_x, spawn_y
-
-        # 如果所有尝试都失败，使用更保守的方法：在整个地图范围内随机尝试
-        for attempt in range(max_attempts):
-            spawn_x = random.randint(100, ROOM_SIZE * 3 - 100)
-            spawn_y = random.randint(100, ROOM_SIZE * 3 - 100)
-
-            if self.is_position_safe(spawn_x, spawn_y):
-                return spawn_x, spawn_y
-
-        # 如果还是找不到安全位置，返回地图中心（作为最后的备选）
-        return ROOM_SIZE * 1.5, ROOM_SIZE * 1.5
-
-    def update_ai_players(self, dt, all_players):
-        """更新AI玩家（仅服务端）"""
-        if not self.network_manager.is_server:
-            return
-
-        # 准备玩家位置数据供AI使用
-        players_data = {}
-        for pid, player in all_players.items():
-            players_data[pid] = {
-                "pos": [player.pos.x, player.pos.y],
-                "is_dead": player.is_dead,
-                "shooting": getattr(player, "shooting", False),
-                "is_reloading": getattr(player, "is_reloading", False),
-                "is_walking": getattr(player, "is_walking", False),
-                "team_id": getattr(player, "team_id", None),  # 添加团队ID
-            }
-
-        # 添加网络玩家数据（合并，优先使用网络数据中的完整信息）
-        for pid, pdata in self.network_manager.players.items():
-            if pid in players_data:
-                # 合并数据，保留网络数据中的完整信息
-                players_data[pid].update(
-                    {
-                        "shooting": pdata.get("shooting", False),
-                        "is_reloading": pdata.get("is_reloading", False),
-                        "is_walking": pdata.get("is_walking", False),
-                        "team_id": pdata.get(
-                            "team_id", players_data[pid].get("team_id")
-                        ),  # 优先使用网络数据中的team_id
-                    }
-                )
-            else:
-                players_data[pid] = pdata
-
-        # 更新每个AI玩家
-        for ai_id, ai_player in list(self.ai_players.items()):
-            # 同步AI的team_id（从网络数据中获取）
-            if ai_id in self.network_manager.players:
-                network_team_id = self.network_manager.players[ai_id].get("team_id")
-                old_team_id = getattr(ai_player, "team_id", None)
-
-                # 如果team_id改变了，更新并重新初始化行为树（如果需要）
-                if network_team_id != old_team_id:
-                    ai_player.team_id = network_team_id
-                    # 如果使用了增强版AI，重新初始化行为树以适应新的团队状态
-                    if hasattr(ai_player, "_initialize_behavior_tree"):
-                        ai_player._initialize_behavior_tree()
-
-            # 检查AI是否需要复活
-            if ai_player.is_dead:
-                current_time = time.time()
-                if current_time >= ai_player.respawn_time:
-                    # 获取安全的复活位置（不与墙壁或门碰撞）
-                    spawn_x, spawn_y = self.get_safe_spawn_pos()
-                    ai_player.respawn(spawn_x, spawn_y)
-
-                    # 更新网络数据
-                    if ai_id in self.network_manager.players:
-                        self.network_manager.players[ai_id]["pos"] = [spawn_x, spawn_y]
-                        self.network_manager.players[ai_id]["health"] = 100
-                        self.network_manager.players[ai_id]["is_dead"] = False
-                        self.network_manager.players[ai_id]["respawn_time"] = 0
-                continue
-
-            # 更新AI逻辑（传递team_manager以便AI识别队友）
-            team_manager = getattr(self, "team_manager", None)
-            action = ai_player.update(
-                dt, players_data, self.game_map, self.bullets, team_manager
-            )
-
-            if action:
-                # 应用移动
-                move_vec = action["move"] * dt
-                new_pos = ai_player.pos + move_vec
-
-                # 碰撞检测
-                player_rect = pygame.Rect(
-                    new_pos.x - PLAYER_RADIUS,
-                    new_pos.y - PLAYER_RADIUS,
-                    PLAYER_RADIUS * 2,
-                    PLAYER_RADIUS * 2,
-                )
-
-                # 检查墙壁碰撞
-                collision = False
-                for wall in self.game_map.walls:
-                    if player_rect.colliderect(wall):
-                        collision = True
-                        break
-
-                # 检查门碰撞
-                if not collision:
-                    for door in self.game_map.doors:
-                        if door.check_collision(player_rect):
-                            collision = True
-                            break
-
-                if not collision:
-                    ai_player.pos = new_pos
-                else:
-                    # 碰撞时尝试滑动移动
-                    # 尝试只在X轴移动
-                    test_pos_x = pygame.Vector2(
-                        ai_player.pos.x + move_vec.x, ai_player.pos.y
-                    )
-                    test_rect_x = pygame.Rect(
-                        test_pos_x.x - PLAYER_RADIUS,
-                        test_pos_x.y - PLAYER_RADIUS,
-                        PLAYER_RADIUS * 2,
-                        PLAYER_RADIUS * 2,
-                    )
-
-                    collision_x = False
-                    for wall in self.game_map.walls:
-                        if test_rect_x.colliderect(wall):
-                            collision_x = True
-                            break
-
-                    if not collision_x:
-                        for door in self.game_map.doors:
-                            if door.check_collision(test_rect_x):
-                                collision_x = True
-                                break
-
-                    if not collision_x:
-                        ai_player.pos = test_pos_x
-                    else:
-                        # 尝试只在Y轴移动
-                        test_pos_y = pygame.Vector2(
-                            ai_player.pos.x, ai_player.pos.y + move_vec.y
-                        )
-                        test_rect_y = pygame.Rect(
-                            test_pos_y.x - PLAYER_RADIUS,
-                            test_pos_y.y - PLAYER_RADIUS,
-                            PLAYER_RADIUS * 2,
-                            PLAYER_RADIUS * 2,
-                        )
-
-                        collision_y = False
-                        for wall in self.game_map.walls:
-                            if test_rect_y.colliderect(wall):
-                                collision_y = True
-                                break
-
-                        if not collision_y:
-                            for door in self.game_map.doors:
-                                if door.check_collision(test_rect_y):
-                                    collision_y = True
-                                    break
-
-                        if not collision_y:
-                            ai_player.pos = test_pos_y
-
-                # 更新角度
-                ai_player.angle = action["angle"]
-
-                # 处理射击
-                if action["shoot"] and ai_player.ammo > 0:
-                    # 计算子弹方向向量（与玩家相同的方式）
-                    bullet_dir = pygame.Vector2(
-                        math.cos(math.radians(ai_player.angle)),
-                        -math.sin(math.radians(ai_player.angle)),
-                    )
-                    bullet_pos = ai_player.pos + bullet_dir * (
-                        PLAYER_RADIUS + BULLET_RADIUS
-                    )
-
-                    # 创建子弹
-                    self.network_manager.request_fire_bullet(
-                        [bullet_pos.x, bullet_pos.y],
-                        [bullet_dir.x, bullet_dir.y],
-                        ai_id,
-                    )
-                    ai_player.ammo -= 1
-                    ai_player.last_shot_time = time.time()
-
-                # 处理装填
-                if action.get("reload", False):
-                    # 如果还没有开始换弹，则开始换弹
-                    if not ai_player.is_reloading:
-                        ai_player.is_reloading = True
-                        ai_player.reload_start_time = time.time()
-
-                # 检查换弹是否完成
-                if ai_player.is_reloading:
-                    current_time = time.time()
-                    if current_time - ai_player.reload_start_time >= RELOAD_TIME:
-                        ai_player.ammo = MAGAZINE_SIZE
-                        ai_player.is_reloading = False
-
-                # 处理门交互
-                if "interact_door" in action and action["interact_door"]:
-                    door = action["interact_door"]
-                    if not door.is_open:
-                        # AI开门
-                        door.open()
-                        print(f"[AI门交互] AI玩家{ai_id}开启了门")
-
-                # 处理静步状态
-                if "is_walking" in action:
-                    ai_player.is_walking = action["is_walking"]
-
-                # 处理声音状态
-                if "is_making_sound" in action:
-                    ai_player.is_making_sound = action["is_making_sound"]
-                if "sound_volume" in action:
-                    ai_player.sound_volume = action["sound_volume"]
-
-                # 更新网络数据
-                if ai_id in self.network_manager.players:
-                    self.network_manager.players[ai_id]["pos"] = [
-                        ai_player.pos.x,
-                        ai_player.pos.y,
-                    ]
-                    self.network_manager.players[ai_id]["angle"] = ai_player.angle
-                    self.network_manager.players[ai_id]["health"] = ai_player.health
-                    self.network_manager.players[ai_id]["ammo"] = ai_player.ammo
-                    self.network_manager.players[ai_id]["is_reloading"] = (
-                        ai_player.is_reloading
-                    )
-                    self.network_manager.players[ai_id]["shooting"] = action["shoot"]
-                    self.network_manager.players[ai_id]["is_walking"] = getattr(
-                        ai_player, "is_walking", False
-                    )
-                    self.network_manager.players[ai_id]["is_making_sound"] = getattr(
-                        ai_player, "is_making_sound", False
-                    )
-                    self.network_manager.players[ai_id]["sound_volume"] = getattr(
-                        ai_player, "sound_volume", 0.0
-                    )
-
-    def add_ai_player(self, difficulty="normal"):
-        """添加AI玩家（供命令系统调用）- 性格为隐性参数"""
-        if not self.network_manager.is_server:
-            return None
-
-        ai_id = self.next_ai_id
-        self.next_ai_id += 1
-
-        spawn_x, spawn_y = self.get_safe_spawn_pos()
-
-        try:
-            if USE_ENHANCED_AI:
-                from ai_player_enhanced import EnhancedAIPlayer
-                from ai_personality import AIPersonality, AIPersonalityTraits
-
-                # 性格随机生成，玩家无法选择
-                personality_traits = AIPersonalityTraits.random_personality()
-
-                ai_player = EnhancedAIPlayer(
-                    ai_id, spawn_x, spawn_y, difficulty, personality_traits
-                )
-                ai_player_name = ai_player.name
-                use_enhanced_ai = True
-            else:
-                raise ImportError("USE_ENHANCED_AI is False")
-
-        except ImportError:
-            from ai_player import AIPlayer
-
-            ai_player = AIPlayer(ai_id, spawn_x, spawn_y, difficulty)
-            ai_player_name = f"AI_{difficulty}_{ai_id}"
-            use_enhanced_ai = False
-
-        if hasattr(ai_player, "generate_patrol_points"):
-            ai_player.generate_patrol_points(self.game_map)
-
-        self.ai_players[ai_id] = ai_player
-
-        player_data = {
-            "pos": [spawn_x, spawn_y],
-            "angle": ai_player.angle,
-            "health": ai_player.health,
-            "ammo": ai_player.ammo,
-            "is_reloading": ai_player.is_reloading,
-            "shooting": False,
-            "is_dead": ai_player.is_dead,
-            "death_time": ai_player.death_time,
-            "respawn_time": ai_player.respawn_time,
-            "is_respawning": False,
-            "melee_attacking": False,
-            "melee_direction": 0,
-            "weapon_type": ai_player.weapon_type,
-            "is_aiming": ai_player.is_aiming,
-            "name": ai_player_name,
-            "team_id": getattr(ai_player, "team_id", None),
-        }
-
-        if use_enhanced_ai:
-            player_data["is_walking"] = getattr(ai_player, "is_walking", False)
-            player_data["is_making_sound"] = getattr(
-                ai_player, "is_making_sound", False
-            )
-            player_data["sound_volume"] = getattr(ai_player, "sound_volume", 0.0)
-
-        self.network_manager.players[ai_id] = player_data
-
-        # 不显示性格信息
-        self.network_manager._send_system_message(
-            f"已添加AI玩家 (难度: {difficulty}, ID: {ai_id})"
-        )
-
-        return ai_id
-
-    def remove_ai_player(self, ai_id):
-        """移除AI玩家（供命令系统调用）"""
-        if not self.network_manager.is_server:
-            return False
-
-        if ai_id in self.ai_players:
-            del self.ai_players[ai_id]
-            if ai_id in self.network_manager.players:
-                del self.network_manager.players[ai_id]
-            self.network_manager._send_system_message(f"已移除AI玩家 (ID: {ai_id})")
-            return True
-
-        return False
-
-    def sync_bullets(self):
-        """同步子弹 - 完全基于服务器数据"""
-        network_bullets = self.network_manager.get_bullets()
-
-        # 获取当前子弹ID集合
-        current_bullet_ids = {b.id for b in self.bullets}
-        network_bullet_ids = {b["id"] for b in network_bullets}
-
-        # 移除不在网络列表中的子弹
-        self.bullets = [b for b in self.bullets if b.id in network_bullet_ids]
-
-        # 添加新子弹
-        for bullet_data in network_bullets:
-            if bullet_data["id"] not in current_bullet_ids:
-                # 使用游戏规则中的子弹速度
-                bullet_speed = BULLET_SPEED
-                if hasattr(self, "game_rules"):
-                    bullet_speed = self.game_rules["bullet_speed"]
-
-                new_bullet = Bullet(bullet_data, bullet_speed)
-                self.bullets.append(new_bullet)
-        
-        if not hasattr(self, 'last_grenade_explosion'):
-            self.last_grenade_explosion = None
-
     def render(self):
         # 清空屏幕为黑色（默认背景）
         self.screen.fill(BLACK)
@@ -2010,7 +1506,9 @@ class Game:
                 player_angle,
                 self.game_map.walls,
                 self.game_map.doors,
-                is_aiming
+                is_aiming,
+                spatial_index=self.game_map.spatial,
+                los_table=self.game_map.los_table,
             )
 
         # 绘制游戏对象
@@ -2024,6 +1522,8 @@ class Game:
                     self.game_map.walls,
                     self.game_map.doors,
                     self.player.is_aiming,
+                    spatial_index=self.game_map.spatial,
+                    los_table=self.game_map.los_table,
                 )
             else:
                 bullet.draw(self.screen, self.camera_offset)
@@ -2061,6 +1561,8 @@ class Game:
                     is_aiming=self.player.is_aiming,
                     team_manager=self.team_manager,
                     local_player_id=self.player.id,
+                    spatial_index=self.game_map.spatial,
+                    los_table=self.game_map.los_table,
                 )
             else:
                 player.draw(
@@ -2124,95 +1626,10 @@ class Game:
             self.player.pos.y - self.camera_offset.y,
         )
 
-        # 使用光线投射算法计算可见区域
-        half_fov = current_fov / 2
-
-        # 优化：根据屏幕分辨率和视野角度动态调整光线数量
-        # 瞄准时使用更多光线以获得更精确的边缘
-        ray_count = 40 if current_fov > 60 else 20
-        angle_step = current_fov / ray_count
-
-        # 收集所有可见点，用于构建可见多边形
-        visible_points = [player_screen_pos]  # 起始点是玩家位置
-
-        # 预先筛选可能与视野相交的墙壁和门，减少循环中的检查次数
-        potential_walls = []
-        for wall in self.game_map.walls:
-            # 简单检查：如果墙壁在玩家视野范围内，则添加到潜在列表
-            wall_center_x = wall.x + wall.width / 2
-            wall_center_y = wall.y + wall.height / 2
-            distance = math.sqrt(
-                (self.player.pos.x - wall_center_x) ** 2
-                + (self.player.pos.y - wall_center_y) ** 2
-            )
-            if distance <= VISION_RANGE * 1.5:  # 稍微扩大检查范围
-                potential_walls.append(wall)
-
-        potential_doors = []
-        for door in self.game_map.doors:
-            if not door.is_open:
-                door_center_x = door.rect.x + door.rect.width / 2
-                door_center_y = door.rect.y + door.rect.height / 2
-                distance = math.sqrt(
-                    (self.player.pos.x - door_center_x) ** 2
-                    + (self.player.pos.y - door_center_y) ** 2
-                )
-                if distance <= VISION_RANGE * 1.5:
-                    potential_doors.append(door)
-
-        # 使用批处理方式处理光线
-        batch_size = 5  # 每批处理的光线数量
-        for batch_start in range(0, ray_count + 1, batch_size):
-            batch_rays = []
-            batch_angles = []
-
-            # 为这一批次准备光线数据
-            for i in range(batch_start, min(batch_start + batch_size, ray_count + 1)):
-                angle = self.player.angle - half_fov + (angle_step * i)
-                angle_rad = math.radians(angle)
-                ray_end_x = self.player.pos.x + math.cos(angle_rad) * VISION_RANGE
-                ray_end_y = self.player.pos.y - math.sin(angle_rad) * VISION_RANGE
-                ray_end = pygame.Vector2(ray_end_x, ray_end_y)
-                batch_rays.append(ray_end)
-                batch_angles.append(angle)
-
-            # 处理这一批次的所有光线
-            for j, ray_end in enumerate(batch_rays):
-                closest_hit = None
-                closest_distance = float("inf")
-
-                # 检查墙壁碰撞
-                for wall in potential_walls:
-                    intersection = self.get_line_rect_intersection(
-                        self.player.pos, ray_end, wall
-                    )
-                    if intersection:
-                        distance = self.player.pos.distance_to(intersection)
-                        if distance < closest_distance:
-                            closest_distance = distance
-                            closest_hit = intersection
-
-                # 检查门碰撞
-                for door in potential_doors:
-                    intersection = self.get_line_rect_intersection(
-                        self.player.pos, ray_end, door.rect
-                    )
-                    if intersection:
-                        distance = self.player.pos.distance_to(intersection)
-                        if distance < closest_distance:
-                            closest_distance = distance
-                            closest_hit = intersection
-
-                # 确定最终点位置（射线终点或碰撞点）
-                if closest_hit:
-                    final_point = closest_hit
-                else:
-                    final_point = ray_end
-
-                # 转换为屏幕坐标并添加到可见点列表
-                screen_x = final_point.x - self.camera_offset.x
-                screen_y = final_point.y - self.camera_offset.y
-                visible_points.append((screen_x, screen_y))
+        # 可见多边形（角度扫描计算，按位置/朝向/门状态缓存）
+        visible_points = self.world_to_screen_points(
+            self.visibility.get(self.player.pos, self.player.angle, current_fov)
+        )
 
         # 绘制可见区域多边形
         if len(visible_points) >= 3:
@@ -2315,100 +1732,10 @@ class Game:
                             continue
 
                         if teammate and not teammate.is_dead:
-                            # 为队友使用相同的射线检测方法创建真实视野
-                            teammate_fov = 120  # 队友使用正常视野
-                            teammate_half_fov = teammate_fov / 2
-
-                            # 使用与本地玩家相同的光线数量
-                            teammate_ray_count = 40 if teammate_fov > 60 else 20
-                            teammate_angle_step = teammate_fov / teammate_ray_count
-
-                            # 收集队友的可见点
-                            teammate_screen_pos = (
-                                teammate.pos.x - self.camera_offset.x,
-                                teammate.pos.y - self.camera_offset.y,
+                            # 队友使用正常视野，与本地玩家共用可见多边形缓存
+                            teammate_visible_points = self.world_to_screen_points(
+                                self.visibility.get(teammate.pos, teammate.angle, 120)
                             )
-                            teammate_visible_points = [teammate_screen_pos]
-
-                            # 预先筛选可能与队友视野相交的墙壁和门
-                            teammate_potential_walls = []
-                            for wall in self.game_map.walls:
-                                wall_center_x = wall.x + wall.width / 2
-                                wall_center_y = wall.y + wall.height / 2
-                                distance = math.sqrt(
-                                    (teammate.pos.x - wall_center_x) ** 2
-                                    + (teammate.pos.y - wall_center_y) ** 2
-                                )
-                                if distance <= VISION_RANGE * 1.5:
-                                    teammate_potential_walls.append(wall)
-
-                            teammate_potential_doors = []
-                            for door in self.game_map.doors:
-                                if not door.is_open:
-                                    door_center_x = door.rect.x + door.rect.width / 2
-                                    door_center_y = door.rect.y + door.rect.height / 2
-                                    distance = math.sqrt(
-                                        (teammate.pos.x - door_center_x) ** 2
-                                        + (teammate.pos.y - door_center_y) ** 2
-                                    )
-                                    if distance <= VISION_RANGE * 1.5:
-                                        teammate_potential_doors.append(door)
-
-                            # 为队友进行射线检测
-                            for i in range(teammate_ray_count + 1):
-                                angle = (
-                                    teammate.angle
-                                    - teammate_half_fov
-                                    + (teammate_angle_step * i)
-                                )
-                                angle_rad = math.radians(angle)
-                                ray_end_x = (
-                                    teammate.pos.x + math.cos(angle_rad) * VISION_RANGE
-                                )
-                                ray_end_y = (
-                                    teammate.pos.y - math.sin(angle_rad) * VISION_RANGE
-                                )
-                                ray_end = pygame.Vector2(ray_end_x, ray_end_y)
-
-                                closest_hit = None
-                                closest_distance = float("inf")
-
-                                # 检查墙壁碰撞
-                                for wall in teammate_potential_walls:
-                                    intersection = self.get_line_rect_intersection(
-                                        teammate.pos, ray_end, wall
-                                    )
-                                    if intersection:
-                                        distance = teammate.pos.distance_to(
-                                            intersection
-                                        )
-                                        if distance < closest_distance:
-                                            closest_distance = distance
-                                            closest_hit = intersection
-
-                                # 检查门碰撞
-                                for door in teammate_potential_doors:
-                                    intersection = self.get_line_rect_intersection(
-                                        teammate.pos, ray_end, door.rect
-                                    )
-                                    if intersection:
-                                        distance = teammate.pos.distance_to(
-                                            intersection
-                                        )
-                                        if distance < closest_distance:
-                                            closest_distance = distance
-                                            closest_hit = intersection
-
-                                # 确定最终点位置
-                                if closest_hit:
-                                    final_point = closest_hit
-                                else:
-                                    final_point = ray_end
-
-                                # 转换为屏幕坐标
-                                screen_x = final_point.x - self.camera_offset.x
-                                screen_y = final_point.y - self.camera_offset.y
-                                teammate_visible_points.append((screen_x, screen_y))
 
                             # 绘制队友的视野区域
                             if len(teammate_visible_points) >= 3:
@@ -2437,51 +1764,11 @@ class Game:
                         0,
                     )
 
-    def get_line_rect_intersection(self, start, end, rect):
-        """获取线段与矩形的交点"""
-        # 检查与四条边的交点
-        edges = [
-            ((rect.left, rect.top), (rect.left, rect.bottom)),  # 左边
-            ((rect.right, rect.top), (rect.right, rect.bottom)),  # 右边
-            ((rect.left, rect.top), (rect.right, rect.top)),  # 上边
-            ((rect.left, rect.bottom), (rect.right, rect.bottom)),  # 下边
-        ]
-
-        closest_point = None
-        min_distance = float("inf")
-
-        for edge in edges:
-            intersection = self.get_line_line_intersection(
-                start, end, pygame.Vector2(edge[0]), pygame.Vector2(edge[1])
-            )
-            if intersection:
-                distance = start.distance_to(intersection)
-                if distance < min_distance:
-                    min_distance = distance
-                    closest_point = intersection
-
-        return closest_point
-
-    def get_line_line_intersection(self, p1, p2, p3, p4):
-        """获取两条线段的交点"""
-        x1, y1 = p1
-        x2, y2 = p2
-        x3, y3 = p3
-        x4, y4 = p4
-
-        denom = (x1 - x2) * (y3 - y4) - (y1 - y2) * (x3 - x4)
-        if abs(denom) < 0.0001:
-            return None
-
-        t = ((x1 - x3) * (y3 - y4) - (y1 - y3) * (x3 - x4)) / denom
-        u = -((x1 - x2) * (y1 - y3) - (y1 - y2) * (x1 - x3)) / denom
-
-        if 0 <= t <= 1 and 0 <= u <= 1:
-            x = x1 + t * (x2 - x1)
-            y = y1 + t * (y2 - y1)
-            return pygame.Vector2(x, y)
-
-        return None
+    def world_to_screen_points(self, points):
+        """世界坐标点列表转换为屏幕坐标"""
+        offset_x = self.camera_offset.x
+        offset_y = self.camera_offset.y
+        return [(x - offset_x, y - offset_y) for x, y in points]
 
     def render_full_ground(self):
         """绘制完整的灰色地面（不使用视角系统时）"""
@@ -3125,6 +2412,8 @@ class Game:
 
                 self.render()
 
+        if self.ai_pool:
+            self.ai_pool.close()
         if self.network_manager:
             self.network_manager.stop()
         pygame.quit()
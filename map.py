@@ -2,6 +2,9 @@ import pygame
 import random
 from pygame.locals import *
 from constants import *
+from spatial_index import MapSpatialIndex
+from navigation import NavigationGrid
+from los_table import LineOfSightTable
 
 class Door:
     """门类，管理门的状态、动画和交互"""
@@ -141,6 +144,12 @@ class Map:
         self.walls = []
         self.door_positions = []
         self.generate_map()
+        # 墙壁/门的空间索引，供碰撞和视线检测查询
+        self.spatial = MapSpatialIndex(self.walls, self.doors)
+        # 格子对视线预计算表（按行懒计算），提供O(1)的保守视线判定
+        self.los_table = LineOfSightTable(self.walls, self.doors)
+        # 所有AI共享的导航网格（按AI体型缓存）
+        self.navigation_grids = {}
     
     def generate_map(self):
         """生成3x3房间网格地图"""
@@ -271,11 +280,28 @@ class Map:
             if i in network_manager.doors:
                 door_state = network_manager.doors[i]
                 door.set_state(door_state)
+            self.sync_door(i)
     
     def update(self, dt):
         """更新地图状态（不包含网络同步）"""
-        for door in self.doors:
+        for i, door in enumerate(self.doors):
             door.update(dt)
+            self.sync_door(i)
+    
+    def sync_door(self, index):
+        """门状态变化后增量更新空间索引、导航网格和视线表"""
+        if self.spatial.sync_door(index):
+            for navigation in self.navigation_grids.values():
+                navigation.sync_door(index)
+            self.los_table.sync_door(index)
+    
+    def get_navigation_grid(self, agent_radius=0):
+        """获取共享导航网格（首次请求时构建）"""
+        navigation = self.navigation_grids.get(agent_radius)
+        if navigation is None:
+            navigation = NavigationGrid(self.walls, self.doors, agent_radius=agent_radius)
+            self.navigation_grids[agent_radius] = navigation
+        return navigation
     
     def draw(self, screen, screen_offset, in_fog=False):
         """绘制地图"""
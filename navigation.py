@@ -0,0 +1,406 @@
+"""
+导航网格服务
+
+地图级共享的寻路网格，所有AI共用，避免每个AI各自构建 pathfinding.Grid。
+
+    - 可通行矩阵按墙壁构建一次（NumPy标记），按AI体型（agent_radius）区分不同AI的网格:
+      agent_radius=0 时墙壁覆盖的格子不可通行（AIPlayer），
+      agent_radius>0 时以格子中心为中心、边长2*agent_radius的碰撞盒与墙壁相交即不可通行（EnhancedAIPlayer）
+    - 门区域始终可通行（AI经过时会开门），关闭的门所在格子通行代价更高，
+      让路径优先经过已打开的门；门开关时只更新门所在格子的代价
+
+路径缓存（LRU，键为 (起点格, 终点格)，记录计算时的门状态版本）:
+    - 后缀复用: 最短路径的后缀仍是最短路径，起点落在任一条同终点缓存路径上时直接取其后缀，
+      覆盖AI沿路径前进后重新规划、多个AI追同一目标的情况
+    - 门状态变化: 按门变化记录增量校验缓存路径——开门且门在路径上、关门且门不在路径上时路径仍最优，
+      只有其余情况才丢弃该条路径
+    - 终点移动一格: 由到相邻终点的缓存路径截断（仍最优）或追加一步（最多多走一格）得到，
+      修补出的路径不再作为下一次修补的基础，避免误差累积
+
+流场（多个AI前往同一目标时共享）:
+    以目标格为源做反向Dijkstra，每个格子记录通往目标的下一格，AI每帧O(1)读取移动方向。
+    Dijkstra按需扩展：只扩展到请求流场的AI所在格子被确定为止，之后再有更远的AI加入时继续扩展。
+    近期有至少 NAV_FLOW_FIELD_MIN_AGENTS 个AI前往同一目标附近时才建立流场，其余情况仍使用A*路径。
+"""
+
+import heapq
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pygame
+from pathfinding.core.diagonal_movement import DiagonalMovement
+from pathfinding.core.grid import Grid
+from pathfinding.finder.a_star import AStarFinder
+
+from constants import (ROOM_SIZE, NAV_GRID_SIZE, NAV_CLOSED_DOOR_WEIGHT, NAV_PATH_CACHE_SIZE,
+                       NAV_FLOW_FIELD_MIN_AGENTS, NAV_FLOW_FIELD_REUSE_CELLS)
+
+NEIGHBOUR_OFFSETS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+MAX_DOOR_LOG = 256  # 保留的门状态变化记录条数
+MAX_FLOW_FIELDS = 8  # 同时保留的流场数量
+FLOW_DEMAND_TTL = 1.0  # AI目标登记的有效时间（秒）
+
+
+class CachedPath:
+    """缓存的格子路径"""
+
+    __slots__ = ('cells', 'index', 'version', 'exact')
+
+    def __init__(self, cells, version, exact=True):
+        self.cells = cells
+        self.index = {cell: i for i, cell in enumerate(cells)}
+        self.version = version  # 最近一次确认仍为最短路径时的门状态版本
+        self.exact = exact  # 是否由A*直接求得（修补出的路径为False）
+
+
+class FlowField:
+    """以目标格为源的共享流场（按需扩展的反向Dijkstra）"""
+
+    def __init__(self, navigation, goal_cell):
+        self.navigation = navigation
+        self.goal = goal_cell
+        self.version = navigation.version
+        self.width = navigation.width
+        self.height = navigation.height
+        self._walkable = navigation.walkable_flat
+        self._weights = list(navigation.cell_weights)
+
+        size = self.width * self.height
+        goal_index = goal_cell[1] * self.width + goal_cell[0]
+        self.cost = [math.inf] * size
+        self.next_index = [-1] * size  # 通往目标的下一格
+        self.settled = bytearray(size)
+        self.cost[goal_index] = 0.0
+        self.next_index[goal_index] = goal_index
+        self._heap = [(0.0, goal_index)]
+
+    def _expand_until(self, index):
+        """扩展Dijkstra直到指定格子的代价确定（或全部可达格子已确定）"""
+        width, height = self.width, self.height
+        cost, next_index, settled = self.cost, self.next_index, self.settled
+        walkable, weights, heap = self._walkable, self._weights, self._heap
+        while heap and not settled[index]:
+            current_cost, current = heapq.heappop(heap)
+            if settled[current]:
+                continue
+            settled[current] = 1
+            cy, cx = divmod(current, width)
+            # 从邻格进入当前格的代价（与A*一致: 步长 × 进入格子的权重）
+            straight = weights[current]
+            diagonal = straight * math.sqrt(2)
+            for dx, dy in NEIGHBOUR_OFFSETS:
+                x, y = cx + dx, cy + dy
+                if x < 0 or y < 0 or x >= width or y >= height:
+                    continue
+                neighbour = y * width + x
+                if settled[neighbour] or not walkable[neighbour]:
+                    continue
+                new_cost = current_cost + (diagonal if dx and dy else straight)
+                if new_cost < cost[neighbour]:
+                    cost[neighbour] = new_cost
+                    next_index[neighbour] = current
+                    heapq.heappush(heap, (new_cost, neighbour))
+        return bool(settled[index])
+
+    def _index_of(self, pos):
+        x, y = self.navigation.to_cell(pos)
+        index = y * self.width + x
+        if not self._walkable[index]:
+            # AI贴墙时所在格子可能不可通行，取附近的可通行格子
+            x, y = self.navigation.nearest_walkable((x, y), max_radius=1)
+            index = y * self.width + x
+        return index
+
+    def reaches(self, pos) -> bool:
+        """该位置是否能沿流场到达目标"""
+        return self._expand_until(self._index_of(pos))
+
+    def waypoints(self, pos, count=1) -> List[pygame.Vector2]:
+        """从该位置起沿流场的后续路径点（格子中心），到达目标或不可达时为空"""
+        index = self._index_of(pos)
+        if not self._expand_until(index):
+            return []
+        points = []
+        next_index = self.next_index
+        while len(points) < count and next_index[index] != index:
+            index = next_index[index]
+            y, x = divmod(index, self.width)
+            points.append(self.navigation.to_world((x, y)))
+        return points
+
+
+class NavigationGrid:
+    """共享导航网格"""
+
+    def __init__(self, walls, doors, grid_size=NAV_GRID_SIZE, agent_radius=0,
+                 closed_door_weight=NAV_CLOSED_DOOR_WEIGHT, path_cache_size=NAV_PATH_CACHE_SIZE,
+                 flow_min_agents=NAV_FLOW_FIELD_MIN_AGENTS, flow_reuse_cells=NAV_FLOW_FIELD_REUSE_CELLS):
+        """
+        Args:
+            walls: 墙壁矩形列表
+            doors: 门列表
+            grid_size: 网格大小（像素）
+            agent_radius: AI碰撞盒半宽，0表示只标记墙壁覆盖的格子
+            closed_door_weight: 关闭的门所在格子的通行代价
+            path_cache_size: 路径缓存条数，0表示不缓存
+            flow_min_agents: 建立流场所需的同目标AI数量
+            flow_reuse_cells: 目标与已有流场目标相距不超过该格数时复用流场
+        """
+        self.grid_size = grid_size
+        self.agent_radius = agent_radius
+        self.closed_door_weight = max(1, int(closed_door_weight))
+        self.width = ROOM_SIZE * 3 // grid_size
+        self.height = ROOM_SIZE * 3 // grid_size
+        self.doors = doors
+
+        self.walkable = self._build_walkable(walls)
+        self.walkable_flat = self.walkable.ravel().tolist()
+        self.cell_weights = [1.0] * (self.width * self.height)
+        self.grid = Grid(matrix=self.walkable.astype(int).tolist())
+        self.finder = AStarFinder(diagonal_movement=DiagonalMovement.always)
+
+        # 门所在的可通行格子
+        self.door_cells: List[List[Tuple[int, int]]] = [self._cells_in_rect(door.original_rect)
+                                                        for door in doors]
+        self._door_open: Dict[int, bool] = {}
+        self.version = 0
+
+        # 路径缓存，按终点分组便于查找可复用后缀的路径
+        self.path_cache_size = path_cache_size
+        self._paths: "OrderedDict[Tuple[Tuple[int, int], Tuple[int, int]], CachedPath]" = OrderedDict()
+        self._paths_by_goal: Dict[Tuple[int, int], Dict[Tuple[int, int], CachedPath]] = {}
+        self._door_log: List[Tuple[int, bool]] = []  # 第i条变化后的版本为 _log_base + i + 1
+        self._log_base = 0
+        self.cache_hits = 0
+        self.cache_repairs = 0
+        self.cache_misses = 0
+
+        # 共享流场: 目标格 -> FlowField，以及各AI最近登记的 (目标格, 时间)
+        self.flow_min_agents = flow_min_agents
+        self.flow_reuse_cells = flow_reuse_cells
+        self._flow_fields: "OrderedDict[Tuple[int, int], FlowField]" = OrderedDict()
+        self._flow_demand: Dict[object, Tuple[Tuple[int, int], float]] = {}
+
+        self.sync_doors()
+        self._door_log.clear()
+        self._log_base = self.version
+
+    def _build_walkable(self, walls) -> np.ndarray:
+        walkable = np.ones((self.height, self.width), dtype=bool)
+        gs = self.grid_size
+        if self.agent_radius <= 0:
+            for wall in walls:
+                x0, x1 = max(0, wall.left // gs), min(self.width - 1, wall.right // gs)
+                y0, y1 = max(0, wall.top // gs), min(self.height - 1, wall.bottom // gs)
+                walkable[y0:y1 + 1, x0:x1 + 1] = False
+            return walkable
+
+        # 以格子中心为中心的AI碰撞盒与墙壁相交即不可通行
+        r = self.agent_radius
+        centers_x = np.arange(self.width) * gs + gs // 2
+        centers_y = np.arange(self.height) * gs + gs // 2
+        for wall in walls:
+            x0 = max(0, (wall.left - r) // gs)
+            x1 = min(self.width - 1, (wall.right + r) // gs)
+            y0 = max(0, (wall.top - r) // gs)
+            y1 = min(self.height - 1, (wall.bottom + r) // gs)
+            cx = centers_x[x0:x1 + 1]
+            cy = centers_y[y0:y1 + 1]
+            hit_x = (cx - r < wall.right) & (cx + r > wall.left)
+            hit_y = (cy - r < wall.bottom) & (cy + r > wall.top)
+            walkable[y0:y1 + 1, x0:x1 + 1] &= ~(hit_y[:, None] & hit_x[None, :])
+        return walkable
+
+    def _cells_in_rect(self, rect) -> List[Tuple[int, int]]:
+        gs = self.grid_size
+        x0, x1 = max(0, rect.left // gs), min(self.width - 1, (rect.right - 1) // gs)
+        y0, y1 = max(0, rect.top // gs), min(self.height - 1, (rect.bottom - 1) // gs)
+        return [(x, y) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1) if self.walkable[y, x]]
+
+    def sync_door(self, index):
+        """门开关状态变化后更新门所在格子的通行代价"""
+        is_open = self.doors[index].is_open
+        if self._door_open.get(index) == is_open:
+            return False
+        self._door_open[index] = is_open
+        weight = 1 if is_open else self.closed_door_weight
+        for x, y in self.door_cells[index]:
+            self.grid.node(x, y).weight = weight
+            self.cell_weights[y * self.width + x] = float(weight)
+        self.version += 1
+        self._door_log.append((index, is_open))
+        if len(self._door_log) > MAX_DOOR_LOG:
+            drop = len(self._door_log) // 2
+            del self._door_log[:drop]
+            self._log_base += drop
+        return True
+
+    def sync_doors(self):
+        for index in range(len(self.doors)):
+            self.sync_door(index)
+
+    def to_cell(self, pos) -> Tuple[int, int]:
+        """世界坐标转换为网格坐标（限制在网格范围内）"""
+        x = max(0, min(self.width - 1, int(pos[0] // self.grid_size)))
+        y = max(0, min(self.height - 1, int(pos[1] // self.grid_size)))
+        return x, y
+
+    def to_world(self, cell) -> pygame.Vector2:
+        return pygame.Vector2(cell[0] * self.grid_size + self.grid_size // 2,
+                              cell[1] * self.grid_size + self.grid_size // 2)
+
+    def nearest_walkable(self, cell, max_radius=4):
+        """终点不可通行时寻找附近的可通行格子"""
+        x, y = cell
+        if self.walkable[y, x]:
+            return cell
+        for radius in range(1, max_radius + 1):
+            for dy in range(-radius, radius + 1):
+                for dx in range(-radius, radius + 1):
+                    nx, ny = x + dx, y + dy
+                    if 0 <= nx < self.width and 0 <= ny < self.height and self.walkable[ny, nx]:
+                        return nx, ny
+        return cell
+
+    # ------------------------------------------------------------------
+    # 路径缓存
+    # ------------------------------------------------------------------
+
+    def _store(self, start_cell, end_cell, cells, exact):
+        if self.path_cache_size <= 0:
+            return
+        key = (start_cell, end_cell)
+        entry = CachedPath(cells, self.version, exact)
+        self._paths[key] = entry
+        self._paths.move_to_end(key)
+        self._paths_by_goal.setdefault(end_cell, {})[start_cell] = entry
+        while len(self._paths) > self.path_cache_size:
+            oldest, _ = self._paths.popitem(last=False)
+            self._unindex(oldest)
+
+    def _unindex(self, key):
+        start_cell, end_cell = key
+        bucket = self._paths_by_goal.get(end_cell)
+        if bucket is not None:
+            bucket.pop(start_cell, None)
+            if not bucket:
+                del self._paths_by_goal[end_cell]
+
+    def _drop(self, key):
+        self._paths.pop(key, None)
+        self._unindex(key)
+
+    def _revalidate(self, entry: CachedPath) -> bool:
+        """按门状态变化记录判断缓存路径是否仍为最短路径，是则更新其版本"""
+        if entry.version == self.version:
+            return True
+        if entry.version < self._log_base:
+            return False
+        for index, is_open in self._door_log[entry.version - self._log_base:]:
+            on_path = any(cell in entry.index for cell in self.door_cells[index])
+            # 开门只降低代价（门在路径上时路径仍最优），关门只提高代价（门不在路径上时路径仍最优）
+            if on_path != is_open:
+                return False
+        entry.version = self.version
+        return True
+
+    def _cached_suffix(self, start_cell, end_cell, exact_only=False) -> Optional[List[Tuple[int, int]]]:
+        """经过起点的同终点缓存路径的后缀"""
+        bucket = self._paths_by_goal.get(end_cell)
+        if not bucket:
+            return None
+        for path_start, entry in list(bucket.items()):
+            position = entry.index.get(start_cell)
+            if position is None or (exact_only and not entry.exact):
+                continue
+            if not self._revalidate(entry):
+                self._drop((path_start, end_cell))
+                continue
+            self._paths.move_to_end((path_start, end_cell))
+            return entry.cells[position:]
+        return None
+
+    def _repair_goal_shift(self, start_cell, end_cell) -> Optional[List[Tuple[int, int]]]:
+        """终点移动一格时由到相邻终点的缓存路径修补"""
+        x, y = end_cell
+        if not self.walkable[y, x]:
+            return None
+        for dx, dy in NEIGHBOUR_OFFSETS:
+            cells = self._cached_suffix(start_cell, (x + dx, y + dy), exact_only=True)
+            if cells is None:
+                continue
+            if end_cell in cells:
+                return cells[:cells.index(end_cell) + 1]
+            return cells + [end_cell]
+        return None
+
+    def clear_path_cache(self):
+        self._paths.clear()
+        self._paths_by_goal.clear()
+
+    # ------------------------------------------------------------------
+    # 寻路
+    # ------------------------------------------------------------------
+
+    def find_cell_path(self, start_cell, end_cell, use_cache=True) -> List[Tuple[int, int]]:
+        """网格坐标A*寻路（优先使用缓存路径）"""
+        end_cell = self.nearest_walkable(end_cell)
+        if use_cache:
+            cells = self._cached_suffix(start_cell, end_cell)
+            if cells is not None:
+                self.cache_hits += 1
+                return cells
+            cells = self._repair_goal_shift(start_cell, end_cell)
+            if cells is not None:
+                self.cache_repairs += 1
+                self._store(start_cell, end_cell, cells, exact=False)
+                return list(cells)
+
+        self.cache_misses += 1
+        start = self.grid.node(*start_cell)
+        end = self.grid.node(*end_cell)
+        # find_path内部会先清理网格
+        path, _ = self.finder.find_path(start, end, self.grid)
+        cells = [(node.x, node.y) for node in path]
+        if use_cache and cells:
+            self._store(start_cell, end_cell, cells, exact=True)
+        return list(cells)
+
+    def flow_field_for(self, agent_id, target_pos, now=None) -> Optional[FlowField]:
+        """
+        登记AI的目标，多个AI前往同一目标附近时返回共享流场
+
+        Returns:
+            FlowField，目标不够热门时返回None（调用方使用A*路径）
+        """
+        now = time.time() if now is None else now
+        goal = self.nearest_walkable(self.to_cell(target_pos))
+        self._flow_demand[agent_id] = (goal, now)
+        reuse = self.flow_reuse_cells
+
+        for field_goal in list(self._flow_fields):
+            field = self._flow_fields[field_goal]
+            if field.version != self.version:
+                del self._flow_fields[field_goal]
+            elif max(abs(field_goal[0] - goal[0]), abs(field_goal[1] - goal[1])) <= reuse:
+                self._flow_fields.move_to_end(field_goal)
+                return field
+
+        demand = sum(1 for (cell, stamp) in self._flow_demand.values()
+                     if now - stamp <= FLOW_DEMAND_TTL
+                     and max(abs(cell[0] - goal[0]), abs(cell[1] - goal[1])) <= reuse)
+        if self.flow_min_agents <= 0 or demand < self.flow_min_agents:
+            return None
+        field = FlowField(self, goal)
+        self._flow_fields[goal] = field
+        if len(self._flow_fields) > MAX_FLOW_FIELDS:
+            self._flow_fields.popitem(last=False)
+        return field
+
+    def find_path(self, start_pos, target_pos) -> List[pygame.Vector2]:
+        """世界坐标A*寻路，返回路径点（格子中心）"""
+        cells = self.find_cell_path(self.to_cell(start_pos), self.to_cell(target_pos))
+        return [self.to_world(cell) for cell in cells]
@@ -0,0 +1,615 @@
+"""
+网络快照编解码模块
+
+为 NetworkManager 的高频状态广播提供版本化的定长二进制编码，
+JSON 作为未协商客户端的回退格式保留。
+
+支持二进制编码的消息类型:
+    - player_update / init_players: 玩家快照
+    - player_delta: 相对客户端已确认基线的玩家增量快照
+    - bullets_update: 子弹列表
+    - item_update: 道具状态
+
+二进制数据包格式（小端）:
+    头部: magic(B) version(B) msg_type(B) base_time(d) count(H)
+    增量子头部（仅player_delta）: seq(I) base(I) part(B) parts(B) removed(H) + removed个pid(H)
+    记录: count 条记录
+
+玩家记录为 pid(H) mask(H) + 字段组，mask 标记记录中包含哪些字段组，
+完整快照与增量快照共用同一布局。
+
+量化规则:
+    - 坐标按 1/POS_SCALE 单位量化为 int16
+    - 角度量化为 uint16（一圈 65536 份）
+    - 绝对时间戳编码为相对 base_time 的 float32 偏移，0 表示未设置
+    - 生命值/护甲按 0.1 精度量化为 uint16
+
+编码格式在 connect_request 握手中协商（见 supported_codecs / choose_codec）。
+
+合并包（服务端每次flush把发往同一客户端的多个数据报合并为一个，握手中以bundles字段协商）:
+    头部: magic(B) version(B)
+    之后重复: length(H) + 一个完整的数据报（JSON文本或二进制包）
+"""
+
+import json
+import math
+import struct
+from typing import Dict, List, Optional
+
+from constants import BUFFER_SIZE
+from items import ItemType
+
+CODEC_JSON = 'json'
+CODEC_BINARY = 'binary'
+CODEC_VERSION = 2
+
+# 支持增量快照的最低协议版本
+DELTA_MIN_VERSION = 2
+
+# 服务端/客户端保留的快照历史数量（20Hz下约1.6秒）
+SNAPSHOT_HISTORY_SIZE = 32
+
+# 0xFF 不会出现在合法的 UTF-8 文本中，用于区分二进制包与 JSON 文本
+BINARY_MAGIC = 0xFF
+
+# 单个数据报的最大字节数，超过接收端 recvfrom 缓冲区会被静默截断
+MAX_DATAGRAM_SIZE = BUFFER_SIZE
+
+# 合并包标记（0xFE 同样不会出现在合法的 UTF-8 文本中）
+BUNDLE_MAGIC = 0xFE
+BUNDLE_VERSION = 1
+
+MSG_PLAYER_UPDATE = 1
+MSG_INIT_PLAYERS = 2
+MSG_BULLETS_UPDATE = 3
+MSG_ITEM_UPDATE = 4
+MSG_PLAYER_DELTA = 5
+
+_MSG_TYPE_IDS = {
+    'player_update': MSG_PLAYER_UPDATE,
+    'init_players': MSG_INIT_PLAYERS,
+    'bullets_update': MSG_BULLETS_UPDATE,
+    'item_update': MSG_ITEM_UPDATE,
+    'player_delta': MSG_PLAYER_DELTA,
+}
+_MSG_TYPE_NAMES = {type_id: name for name, type_id in _MSG_TYPE_IDS.items()}
+
+# 可以按玩家拆分为多个数据报的消息类型
+_SPLITTABLE_TYPES = ('player_update', 'init_players')
+
+POS_SCALE = 8  # 坐标精度 1/8 单位，int16 可表示 ±4096 单位
+ANGLE_STEPS = 65536
+
+_HEADER = struct.Struct('<BBBdH')
+_BUNDLE_HEADER = struct.Struct('<BB')
+_BUNDLE_LENGTH = struct.Struct('<H')
+_DELTA_HEADER = struct.Struct('<IIBBH')
+_PLAYER_HEADER = struct.Struct('<HH')
+_PID = struct.Struct('<H')
+# id, x, y, dir_angle, owner, time
+_BULLET = struct.Struct('<IhhHHf')
+# id, type, x, y, is_active, respawn_time_remaining
+_ITEM = struct.Struct('<HBhhBf')
+
+# 玩家布尔状态（作为一个字段组编码为 present/values 两个位图）
+_PLAYER_FLAGS = (
+    'is_reloading',
+    'shooting',
+    'is_dead',
+    'is_respawning',
+    'melee_attacking',
+    'is_aiming',
+    'is_walking',
+    'is_making_sound',
+)
+
+_TIMER_FIELDS = ('death_time', 'respawn_time', 'speed_boost_end_time', 'damage_boost_end_time')
+
+
+def supported_codecs(binary_enabled=True) -> List[str]:
+    """本端支持的编码格式（按优先级排序）"""
+    if binary_enabled:
+        return [CODEC_BINARY, CODEC_JSON]
+    return [CODEC_JSON]
+
+
+def choose_codec(offered, version, binary_enabled=True) -> str:
+    """服务端根据客户端在握手中提供的编码列表选择编码格式"""
+    if not isinstance(offered, list):
+        return CODEC_JSON
+    for codec in supported_codecs(binary_enabled):
+        if codec not in offered:
+            continue
+        if codec == CODEC_BINARY and version != CODEC_VERSION:
+            continue
+        return codec
+    return CODEC_JSON
+
+
+def is_binary_packet(packet: bytes) -> bool:
+    """判断数据包是否为二进制编码"""
+    return len(packet) > 0 and packet[0] == BINARY_MAGIC
+
+
+def supports_binary(msg_type) -> bool:
+    """该消息类型是否有二进制布局"""
+    return msg_type in _MSG_TYPE_IDS
+
+
+# ============================================================================
+# 量化工具
+# ============================================================================
+
+def _clamp(value, low, high):
+    return low if value < low else high if value > high else value
+
+
+def _quantize_pos(value):
+    return _clamp(int(round(float(value) * POS_SCALE)), -32768, 32767)
+
+
+def _dequantize_pos(value):
+    return value / POS_SCALE
+
+
+def _quantize_angle(degrees):
+    return int(round((float(degrees or 0) % 360.0) / 360.0 * ANGLE_STEPS)) % ANGLE_STEPS
+
+
+def _dequantize_angle(value):
+    angle = value * 360.0 / ANGLE_STEPS
+    # 还原到 -180~180，与 atan2 计算出的角度保持一致
+    return angle - 360.0 if angle > 180.0 else angle
+
+
+def _quantize_tenths(value):
+    return _clamp(int(round(float(value or 0) * 10)), 0, 65535)
+
+
+def _quantize_byte(value):
+    return _clamp(int(value or 0), 0, 255)
+
+
+def _encode_time(value, base_time):
+    if not value:
+        return math.nan
+    return float(value) - base_time
+
+
+def _decode_time(value, base_time):
+    if math.isnan(value):
+        return 0
+    return base_time + value
+
+
+# ============================================================================
+# 玩家记录
+# ============================================================================
+
+# 字段组: (mask位对应的键, struct格式, 编码函数, 解码函数)
+# 编码函数签名 (pdata, base_time) -> tuple，解码函数签名 (values, base_time) -> dict
+_PLAYER_GROUPS = [
+    (('pos',), struct.Struct('<hh'),
+     lambda p, t: (_quantize_pos(p['pos'][0]), _quantize_pos(p['pos'][1])),
+     lambda v, t: {'pos': [_dequantize_pos(v[0]), _dequantize_pos(v[1])]}),
+    (('angle',), struct.Struct('<H'),
+     lambda p, t: (_quantize_angle(p['angle']),),
+     lambda v, t: {'angle': _dequantize_angle(v[0])}),
+    (('melee_direction',), struct.Struct('<H'),
+     lambda p, t: (_quantize_angle(p['melee_direction']),),
+     lambda v, t: {'melee_direction': _dequantize_angle(v[0])}),
+    (('health',), struct.Struct('<H'),
+     lambda p, t: (_quantize_tenths(p['health']),),
+     lambda v, t: {'health': v[0] / 10}),
+    (('armor',), struct.Struct('<H'),
+     lambda p, t: (_quantize_tenths(p['armor']),),
+     lambda v, t: {'armor': v[0] / 10}),
+    (('ammo',), struct.Struct('<B'),
+     lambda p, t: (_quantize_byte(p['ammo']),),
+     lambda v, t: {'ammo': v[0]}),
+    (('grenades',), struct.Struct('<B'),
+     lambda p, t: (_quantize_byte(p['grenades']),),
+     lambda v, t: {'grenades': v[0]}),
+    (('sound_volume',), struct.Struct('<B'),
+     lambda p, t: (_clamp(int(round(float(p['sound_volume'] or 0.0) * 255)), 0, 255),),
+     lambda v, t: {'sound_volume': v[0] / 255}),
+    (('team_id',), struct.Struct('<h'),
+     lambda p, t: (-1 if p['team_id'] is None else _clamp(int(p['team_id']), 0, 32767),),
+     lambda v, t: {'team_id': None if v[0] < 0 else v[0]}),
+    (('weapon_type',), struct.Struct('<B'),
+     lambda p, t: (1 if p['weapon_type'] == 'melee' else 0,),
+     lambda v, t: {'weapon_type': 'melee' if v[0] else 'gun'}),
+] + [
+    ((key,), struct.Struct('<f'),
+     lambda p, t, key=key: (_encode_time(p[key], t),),
+     lambda v, t, key=key: {key: _decode_time(v[0], t)})
+    for key in _TIMER_FIELDS
+]
+_GROUP_FLAGS = len(_PLAYER_GROUPS)
+_GROUP_NAME = _GROUP_FLAGS + 1
+_FLAGS_STRUCT = struct.Struct('<HH')
+_NAME_LEN = struct.Struct('<B')
+
+
+def _encode_player(pid, pdata, base_time) -> bytes:
+    """编码一条玩家记录，只包含pdata中出现的字段"""
+    mask = 0
+    body = []
+    for bit, (keys, fmt, encode, _) in enumerate(_PLAYER_GROUPS):
+        if all(key in pdata for key in keys):
+            mask |= 1 << bit
+            body.append(fmt.pack(*encode(pdata, base_time)))
+
+    present = 0
+    values = 0
+    for bit, key in enumerate(_PLAYER_FLAGS):
+        if key in pdata:
+            present |= 1 << bit
+            if pdata[key]:
+                values |= 1 << bit
+    if present:
+        mask |= 1 << _GROUP_FLAGS
+        body.append(_FLAGS_STRUCT.pack(present, values))
+
+    if 'name' in pdata:
+        mask |= 1 << _GROUP_NAME
+        name = str(pdata['name'] or '').encode('utf-8')[:255]
+        body.append(_NAME_LEN.pack(len(name)) + name)
+
+    return _PLAYER_HEADER.pack(int(pid), mask) + b''.join(body)
+
+
+def _decode_player(packet, offset, base_time):
+    pid, mask = _PLAYER_HEADER.unpack_from(packet, offset)
+    offset += _PLAYER_HEADER.size
+    pdata = {}
+    for bit, (_, fmt, _, decode) in enumerate(_PLAYER_GROUPS):
+        if mask & (1 << bit):
+            pdata.update(decode(fmt.unpack_from(packet, offset), base_time))
+            offset += fmt.size
+
+    if mask & (1 << _GROUP_FLAGS):
+        present, values = _FLAGS_STRUCT.unpack_from(packet, offset)
+        offset += _FLAGS_STRUCT.size
+        for bit, key in enumerate(_PLAYER_FLAGS):
+            if present & (1 << bit):
+                pdata[key] = bool(values & (1 << bit))
+
+    if mask & (1 << _GROUP_NAME):
+        (name_len,) = _NAME_LEN.unpack_from(packet, offset)
+        offset += _NAME_LEN.size
+        pdata['name'] = bytes(packet[offset:offset + name_len]).decode('utf-8', errors='ignore')
+        offset += name_len
+
+    return str(pid), pdata, offset
+
+
+# ============================================================================
+# 子弹与道具记录
+# ============================================================================
+
+def _encode_bullet(bullet, base_time) -> bytes:
+    direction = bullet.get('dir') or (1, 0)
+    dir_angle = math.degrees(math.atan2(direction[1], direction[0]))
+    pos = bullet.get('pos') or (0, 0)
+    return _BULLET.pack(
+        int(bullet['id']) & 0xFFFFFFFF,
+        _quantize_pos(pos[0]),
+        _quantize_pos(pos[1]),
+        _quantize_angle(dir_angle),
+        _clamp(int(bullet.get('owner') or 0), 0, 65535),
+        _encode_time(bullet.get('time', 0), base_time),
+    )
+
+
+def _decode_bullet(packet, offset, base_time):
+    bullet_id, x, y, dir_angle, owner, spawn_time = _BULLET.unpack_from(packet, offset)
+    radians = math.radians(dir_angle * 360.0 / ANGLE_STEPS)
+    bullet = {
+        'id': bullet_id,
+        'pos': [_dequantize_pos(x), _dequantize_pos(y)],
+        'dir': [math.cos(radians), math.sin(radians)],
+        'owner': owner,
+        'time': _decode_time(spawn_time, base_time),
+    }
+    return bullet, offset + _BULLET.size
+
+
+def _encode_item(item) -> bytes:
+    type_name = item.get('type')
+    type_id = ItemType[type_name].value if type_name in ItemType.__members__ else 0
+    pos = item.get('pos') or (0, 0)
+    return _ITEM.pack(
+        _clamp(int(item['id']), 0, 65535),
+        type_id,
+        _quantize_pos(pos[0]),
+        _quantize_pos(pos[1]),
+        1 if item.get('is_active', True) else 0,
+        float(item.get('respawn_time_remaining', 0) or 0),
+    )
+
+
+def _decode_item(packet, offset):
+    item_id, type_id, x, y, is_active, respawn_time_remaining = _ITEM.unpack_from(packet, offset)
+    try:
+        type_name = ItemType(type_id).name
+    except ValueError:
+        type_name = None
+    item = {
+        'id': item_id,
+        'type': type_name,
+        'pos': [_dequantize_pos(x), _dequantize_pos(y)],
+        'is_active': bool(is_active),
+        'respawn_time_remaining': respawn_time_remaining,
+    }
+    return item, offset + _ITEM.size
+
+
+# ============================================================================
+# 增量快照
+# ============================================================================
+
+def copy_players(players: Dict) -> Dict:
+    """复制玩家快照（pos列表单独复制，避免与实时数据共享）"""
+    snapshot = {}
+    for pid, pdata in players.items():
+        pdata = dict(pdata)
+        if isinstance(pdata.get('pos'), (list, tuple)):
+            pdata['pos'] = list(pdata['pos'])
+        snapshot[str(pid)] = pdata
+    return snapshot
+
+
+def build_player_delta(seq: int, base_seq: int, baseline: Optional[Dict], current: Dict) -> Dict:
+    """
+    计算相对基线的玩家增量快照
+
+    Args:
+        seq: 当前快照序号
+        base_seq: 基线快照序号，0 表示没有基线（发送完整快照）
+        baseline: 基线快照 {pid_str: pdata}，base_seq 为 0 时忽略
+        current: 当前快照 {pid_str: pdata}
+
+    Returns:
+        player_delta 消息的 data 字段
+    """
+    if not base_seq or baseline is None:
+        return {'seq': seq, 'base': 0, 'players': current, 'removed': []}
+
+    players = {}
+    for pid, pdata in current.items():
+        old = baseline.get(pid)
+        if old is None:
+            players[pid] = pdata
+            continue
+        changed = {key: value for key, value in pdata.items() if old.get(key, _MISSING) != value}
+        if changed:
+            players[pid] = changed
+
+    removed = [pid for pid in baseline if pid not in current]
+    return {'seq': seq, 'base': base_seq, 'players': players, 'removed': removed}
+
+
+_MISSING = object()
+
+
+def apply_player_delta(baseline: Optional[Dict], delta: Dict) -> Dict:
+    """在基线上应用增量快照，返回新的完整快照（不修改基线）"""
+    state = copy_players(baseline or {}) if delta.get('base') else {}
+    for pid in delta.get('removed', []):
+        state.pop(str(pid), None)
+    for pid, changes in delta.get('players', {}).items():
+        state.setdefault(str(pid), {}).update(changes)
+    return state
+
+
+def _split_players(players: Dict, parts: int) -> List[Dict]:
+    items = list(players.items())
+    size = max(1, -(-len(items) // parts))
+    return [dict(items[i:i + size]) for i in range(0, len(items), size)] or [{}]
+
+
+# ============================================================================
+# 消息级编解码
+# ============================================================================
+
+def _pack(msg_type, base_time, records, sub_header=b'') -> bytes:
+    header = _HEADER.pack(BINARY_MAGIC, CODEC_VERSION, _MSG_TYPE_IDS[msg_type], base_time, len(records))
+    return header + sub_header + b''.join(records)
+
+
+def _encode_single_binary(message, base_time) -> bytes:
+    msg_type = message['type']
+    data = message.get('data')
+
+    if msg_type in _SPLITTABLE_TYPES:
+        records = [_encode_player(pid, pdata, base_time) for pid, pdata in (data or {}).items()]
+        return _pack(msg_type, base_time, records)
+    if msg_type == 'player_delta':
+        removed = [int(pid) for pid in data.get('removed', [])]
+        sub_header = _DELTA_HEADER.pack(
+            data['seq'], data.get('base', 0), data.get('part', 0), data.get('parts', 1), len(removed)
+        ) + b''.join(_PID.pack(pid) for pid in removed)
+        records = [_encode_player(pid, pdata, base_time) for pid, pdata in data.get('players', {}).items()]
+        return _pack(msg_type, base_time, records, sub_header)
+    if msg_type == 'bullets_update':
+        records = [_encode_bullet(bullet, base_time) for bullet in (data or [])]
+        return _pack(msg_type, base_time, records)
+    if msg_type == 'item_update':
+        records = [_encode_item(item) for item in (data or {}).get('items', [])]
+        return _pack(msg_type, base_time, records)
+    raise ValueError(f"消息类型 {msg_type} 没有二进制布局")
+
+
+def _encode_single(message, codec, base_time) -> bytes:
+    if codec == CODEC_BINARY and supports_binary(message.get('type')):
+        return _encode_single_binary(message, base_time)
+    return json.dumps(message).encode()
+
+
+def _split_message(message, parts) -> List[Dict]:
+    """把玩家类消息拆分为parts个分片"""
+    msg_type = message['type']
+    data = message.get('data') or {}
+
+    if msg_type == 'player_delta':
+        chunks = _split_players(data.get('players', {}), parts)
+        return [{
+            'type': msg_type,
+            'data': {
+                'seq': data['seq'],
+                'base': data.get('base', 0),
+                'part': index,
+                'parts': len(chunks),
+                'players': chunk,
+                'removed': data.get('removed', []) if index == 0 else [],
+            }
+        } for index, chunk in enumerate(chunks)]
+
+    # init_players 的后续分片作为 player_update 合并到已初始化的玩家表
+    chunks = _split_players(data, parts)
+    return [{'type': msg_type if index == 0 else 'player_update', 'data': chunk}
+            for index, chunk in enumerate(chunks)]
+
+
+def encode_message(message: Dict, codec: str, now: float = 0.0) -> List[bytes]:
+    """
+    将消息编码为一个或多个数据报
+
+    Args:
+        message: {'type': ..., 'data': ...} 形式的消息
+        codec: CODEC_BINARY 或 CODEC_JSON
+        now: 当前时间，作为时间戳字段的编码基准
+
+    Returns:
+        数据报列表；玩家快照超过 MAX_DATAGRAM_SIZE 时会被拆分
+    """
+    packet = _encode_single(message, codec, now)
+    msg_type = message.get('type')
+    if len(packet) <= MAX_DATAGRAM_SIZE or msg_type not in _SPLITTABLE_TYPES + ('player_delta',):
+        return [packet]
+
+    # 逐步增加分片数，直到每个分片都能放进一个数据报
+    parts = 2
+    while True:
+        chunks = _split_message(message, parts)
+        packets = [_encode_single(chunk, codec, now) for chunk in chunks]
+        if all(len(p) <= MAX_DATAGRAM_SIZE for p in packets) or len(chunks) < parts:
+            return packets
+        parts *= 2
+
+
+def decode_message(packet: bytes) -> Optional[Dict]:
+    """解码二进制数据包，版本不符或格式错误时返回 None"""
+    try:
+        magic, version, type_id, base_time, count = _HEADER.unpack_from(packet, 0)
+    except struct.error:
+        return None
+    if magic != BINARY_MAGIC or version != CODEC_VERSION or type_id not in _MSG_TYPE_NAMES:
+        return None
+
+    msg_type = _MSG_TYPE_NAMES[type_id]
+    offset = _HEADER.size
+    try:
+        if msg_type in _SPLITTABLE_TYPES:
+            data = {}
+            for _ in range(count):
+                pid, pdata, offset = _decode_player(packet, offset, base_time)
+                data[pid] = pdata
+        elif msg_type == 'player_delta':
+            seq, base, part, parts, removed_count = _DELTA_HEADER.unpack_from(packet, offset)
+            offset += _DELTA_HEADER.size
+            removed = []
+            for _ in range(removed_count):
+                (pid,) = _PID.unpack_from(packet, offset)
+                removed.append(str(pid))
+                offset += _PID.size
+            players = {}
+            for _ in range(count):
+                pid, pdata, offset = _decode_player(packet, offset, base_time)
+                players[pid] = pdata
+            data = {'seq': seq, 'base': base, 'part': part, 'parts': parts,
+                    'players': players, 'removed': removed}
+        elif msg_type == 'bullets_update':
+            data = []
+            for _ in range(count):
+                bullet, offset = _decode_bullet(packet, offset, base_time)
+                data.append(bullet)
+        else:
+            items = []
+            for _ in range(count):
+                item, offset = _decode_item(packet, offset)
+                items.append(item)
+            data = {'items': items}
+    except struct.error:
+        return None
+
+    return {'type': msg_type, 'data': data}
+
+
+# ============================================================================
+# 合并包
+# ============================================================================
+
+def is_bundle(packet: bytes) -> bool:
+    """判断数据包是否为合并包"""
+    return len(packet) > 0 and packet[0] == BUNDLE_MAGIC
+
+
+def bundle_packets(packets: List[bytes], limit: int) -> List[bytes]:
+    """
+    把多个数据报合并为不超过limit字节的合并包（按原顺序）
+
+    单独放不下的数据报原样发送，只含一个数据报的合并包也原样发送（省去头部）
+    """
+    datagrams = []
+    current = []
+    size = _BUNDLE_HEADER.size
+
+    def close():
+        if len(current) == 1:
+            datagrams.append(current[0])
+        elif current:
+            parts = [_BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION)]
+            for packet in current:
+                parts.append(_BUNDLE_LENGTH.pack(len(packet)))
+                parts.append(packet)
+            datagrams.append(b''.join(parts))
+
+    for packet in packets:
+        needed = _BUNDLE_LENGTH.size + len(packet)
+        if _BUNDLE_HEADER.size + needed > limit:
+            close()
+            current, size = [], _BUNDLE_HEADER.size
+            datagrams.append(packet)
+            continue
+        if size + needed > limit:
+            close()
+            current, size = [], _BUNDLE_HEADER.size
+        current.append(packet)
+        size += needed
+    close()
+    return datagrams
+
+
+def split_bundle(packet: bytes) -> List[bytes]:
+    """拆开合并包，版本不符或格式错误时返回空列表"""
+    try:
+        magic, version = _BUNDLE_HEADER.unpack_from(packet, 0)
+    except struct.error:
+        return []
+    if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+        return []
+    packets = []
+    offset = _BUNDLE_HEADER.size
+    while offset < len(packet):
+        try:
+            (length,) = _BUNDLE_LENGTH.unpack_from(packet, offset)
+        except struct.error:
+            return packets
+        offset += _BUNDLE_LENGTH.size
+        if offset + length > len(packet):
+            return packets
+        packets.append(packet[offset:offset + length])
+        offset += length
+    return packets
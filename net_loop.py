@@ -0,0 +1,99 @@
+"""
+网络事件循环模块
+
+在后台线程中运行 asyncio 事件循环，UDP套接字交给 DatagramProtocol 接收，
+替代阻塞 recvfrom 的接收线程和各自 sleep 的心跳/清理线程：
+
+    - 数据报在网络线程中解码后放入无锁收件箱（collections.deque，append/popleft 在CPython中是原子操作）
+    - 游戏线程每帧/每个tick调用 NetworkManager.poll() 批量取出消息，按消息类型查表分发，
+      网络线程不持有 NetworkManager.lock，也不修改玩家、门、道具等游戏状态
+    - 周期任务使用事件循环的定时器（call_every），需要修改游戏状态的任务投递到收件箱由游戏线程执行
+
+游戏线程发送数据仍直接调用套接字的 sendto（UDP发送是线程安全的），
+transport 只在网络线程中使用（如响应服务器探测）。
+"""
+
+import asyncio
+import threading
+from collections import deque
+
+INBOX_LIMIT = 4096  # 收件箱上限，游戏线程长时间未取出时丢弃最旧的消息（与UDP丢包等价）
+
+
+class _DatagramReceiver(asyncio.DatagramProtocol):
+    """把收到的数据报交给回调（在网络线程中执行）"""
+
+    def __init__(self, on_datagram):
+        self.on_datagram = on_datagram
+
+    def datagram_received(self, data, addr):
+        try:
+            self.on_datagram(data, addr)
+        except Exception as e:
+            print(f"接收数据错误: {e}")
+
+    def error_received(self, exc):
+        # UDP的ICMP错误（如对端端口不可达）不影响套接字，忽略
+        pass
+
+
+class NetworkLoop:
+    """后台线程中的 asyncio 事件循环"""
+
+    def __init__(self, name="network-loop"):
+        self.loop = asyncio.new_event_loop()
+        self.transport = None
+        self.inbox = deque(maxlen=INBOX_LIMIT)
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        # 让关闭transport等收尾回调执行完
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+
+    def start(self, sock, on_datagram):
+        """
+        启动事件循环并开始接收
+
+        Args:
+            sock: 已绑定/已握手的UDP套接字（之后由事件循环设置为非阻塞）
+            on_datagram: 收到数据报时在网络线程中调用的 on_datagram(data, addr)
+        """
+        self.thread.start()
+        future = asyncio.run_coroutine_threadsafe(
+            self.loop.create_datagram_endpoint(lambda: _DatagramReceiver(on_datagram), sock=sock),
+            self.loop,
+        )
+        self.transport, _ = future.result(timeout=5.0)
+
+    def call_every(self, interval, callback):
+        """在网络线程中每隔interval秒调用一次callback，callback返回False时停止"""
+        def run():
+            try:
+                if callback() is False:
+                    return
+            except Exception as e:
+                print(f"网络定时任务错误: {e}")
+            self.loop.call_later(interval, run)
+
+        self.loop.call_soon_threadsafe(self.loop.call_later, interval, run)
+
+    def post(self, task):
+        """投递一个由游戏线程在 NetworkManager.poll() 中执行的任务"""
+        self.inbox.append((task, None, 0.0))
+
+    def stop(self):
+        """关闭transport并停止事件循环"""
+        if self.loop.is_closed() or not self.thread.is_alive():
+            return
+
+        def shutdown():
+            if self.transport:
+                self.transport.close()
+            self.loop.stop()
+
+        self.loop.call_soon_threadsafe(shutdown)
+        if threading.current_thread() is not self.thread:
+            self.thread.join(timeout=1.0)
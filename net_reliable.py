@@ -0,0 +1,128 @@
+"""
+可靠有序通道模块
+
+在UDP之上为关键事件（复活、道具拾取、命中、踢出、门状态、聊天）提供可靠有序投递，
+与不可靠的快照通道（player_delta、bullets_update 等，丢包由下一帧快照弥补）分开：
+
+    - 发送端为每条事件分配递增序号，保存到收到确认为止，超时（RTO）未确认时重发
+    - 接收端按序号顺序交付，乱序到达的先缓存，重复到达的丢弃
+    - 确认为累计确认（已按序收到的最大序号），携带在对方发出的可靠消息中，
+      服务端另外把单独的确认放进发给该客户端的合并包，与快照一起发送
+    - RTO 按 RFC 6298 由往返时间估计（SRTT/RTTVAR），只用未重发过的消息采样（Karn算法），
+      重发后指数退避
+
+每个连接一个 ReliableChannel：服务端按客户端地址保存在会话中，客户端保存一个。
+"""
+
+from typing import Dict, List, Optional
+
+from constants import NETWORK_RELIABLE_RTO_MIN, NETWORK_RELIABLE_RTO_MAX
+
+# 通过可靠通道发送的消息类型（对端在握手时声明支持可靠通道时生效）
+RELIABLE_TYPES = frozenset({
+    'respawn', 'item_pickup', 'item_update', 'hit_damage', 'melee_attack',
+    'kick', 'door_update', 'chat_message', 'chat_history',
+})
+
+RELIABLE_WINDOW = 256  # 接收端最多缓存的乱序消息序号范围
+INITIAL_RTO = 0.5  # 尚无往返时间采样时的重发超时（秒）
+
+
+class ReliableChannel:
+    """单个连接的可靠有序通道（发送端与接收端状态）"""
+
+    def __init__(self, rto_min=NETWORK_RELIABLE_RTO_MIN, rto_max=NETWORK_RELIABLE_RTO_MAX):
+        self.rto_min = rto_min
+        self.rto_max = rto_max
+        self.rto = min(max(INITIAL_RTO, rto_min), rto_max)
+        self.srtt = None
+        self.rttvar = 0.0
+
+        # 发送端：序号 -> [消息, 最近发送时间, 发送次数]（按序号递增插入）
+        self.next_seq = 1
+        self.pending: Dict[int, list] = {}
+        self.resent = 0
+
+        # 接收端
+        self.received = 0  # 已按序交付的最大序号（累计确认值）
+        self.buffer: Dict[int, Dict] = {}  # 乱序到达的消息
+        self.ack_dirty = False  # 收到新的可靠消息后需要回送确认
+
+    def wrap(self, message, now) -> Dict:
+        """为消息分配序号并记录为待确认，返回可靠消息"""
+        seq = self.next_seq
+        self.next_seq += 1
+        self.pending[seq] = [message, now, 1]
+        return self._envelope(seq, message)
+
+    def _envelope(self, seq, message) -> Dict:
+        # 顺带确认对端的消息
+        self.ack_dirty = False
+        return {'type': 'reliable', 'data': {'seq': seq, 'ack': self.received, 'msg': message}}
+
+    def on_ack(self, ack, now):
+        """处理累计确认：移除序号不大于ack的待确认消息，并用首次发送即确认的消息更新RTT"""
+        if not isinstance(ack, int):
+            return
+        for seq in list(self.pending):
+            if seq > ack:
+                break
+            _, sent_at, attempts = self.pending.pop(seq)
+            if seq == ack and attempts == 1:
+                self._sample_rtt(now - sent_at)
+
+    def _sample_rtt(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = min(max(self.srtt + 4 * self.rttvar, self.rto_min), self.rto_max)
+
+    def due(self, now) -> List[Dict]:
+        """返回超时未确认、需要重发的可靠消息（按序号顺序）"""
+        resend = []
+        for seq, entry in self.pending.items():
+            if now - entry[1] >= self.rto:
+                entry[1] = now
+                entry[2] += 1
+                resend.append(self._envelope(seq, entry[0]))
+        if resend:
+            self.resent += len(resend)
+            self.rto = min(self.rto * 2, self.rto_max)
+        return resend
+
+    def receive(self, seq, message) -> List:
+        """
+        接收一条可靠消息
+
+        Returns:
+            按序可交付的消息列表（可能为空：重复、乱序或超出窗口）
+        """
+        if not isinstance(seq, int):
+            return []
+        self.ack_dirty = True  # 重复到达说明确认丢失，同样需要回送
+        if seq <= self.received or seq in self.buffer or seq > self.received + RELIABLE_WINDOW:
+            return []
+        self.buffer[seq] = message
+        delivered = []
+        while self.received + 1 in self.buffer:
+            self.received += 1
+            delivered.append(self.buffer.pop(self.received))
+        return delivered
+
+    def take_ack(self) -> Optional[Dict]:
+        """需要回送确认时返回确认消息并清除标记，否则返回None"""
+        if not self.ack_dirty:
+            return None
+        self.ack_dirty = False
+        return {'type': 'reliable_ack', 'data': {'ack': self.received}}
+
+    def outgoing(self, now) -> List[Dict]:
+        """本次需要发送的重发消息，以及（重发消息未携带时）单独的确认"""
+        messages = self.due(now)
+        ack = self.take_ack()
+        if ack is not None:
+            messages.append(ack)
+        return messages
@@ -9,8 +9,17 @@ from constants import (
     CHAT_DISPLAY_TIME, MAX_CHAT_LENGTH, MAX_CHAT_MESSAGES,
     WHITE, RED, BLUE, GREEN, YELLOW, ORANGE, PURPLE,
     ROOM_SIZE, MAGAZINE_SIZE, CONNECTION_TIMEOUT, RESPAWN_TIME,
-    MELEE_DAMAGE, HEAVY_MELEE_DAMAGE, PLAYER_RADIUS
+    MELEE_DAMAGE, HEAVY_MELEE_DAMAGE, PLAYER_RADIUS, NETWORK_BINARY_CODEC,
+    INTEREST_MANAGEMENT, INTEREST_RADIUS, NETWORK_BUNDLE_SIZE, NETWORK_CLIENT_PREDICTION,
+    NETWORK_INTERPOLATION_DELAY, MELEE_RANGE, HEAVY_MELEE_RANGE, SERVER_MAX_LAG_COMPENSATION
 )
+import net_codec
+from interest import InterestIndex
+from net_loop import NetworkLoop
+from net_reliable import ReliableChannel, RELIABLE_TYPES
+from prediction import InputBudget, InputPredictor, apply_input, new_inputs
+from interpolation import SnapshotInterpolator
+from lag_compensation import view_latency
 
 # 延迟导入以避免循环依赖
 # AIPlayer 会在需要时导入
@@ -57,7 +66,7 @@ class NetworkManager:
         self.doors = {}  # 存储门状态
         self.items = {}  # 存储道具状态
         self.chat_messages = []  # 存储聊天消息
-        self.lock = threading.Lock()
+        self.lock = threading.RLock()  # 游戏线程处理消息时持有（处理函数中可能再次获取）
         self.running = True
         self.connected = False
         self.connection_error = None
@@ -74,15 +83,45 @@ class NetworkManager:
         self.client_last_seen = {}  # 客户端最后活跃时间
         self.recycled_ids = set()  # 回收的玩家ID池
         self.next_new_id = 2  # 下一个全新的玩家ID（服务端是1）
-        
+        # 客户端会话: 地址 -> {'player_id', 'codec', 'protocol_version', 'bundles', 'reliable', 'input',
+        #                        'view_delay', 'rtt', 'acked_snapshot', 'views'}
+        # reliable 为该客户端的可靠有序通道（旧客户端为None，事件仍直接发送）
+        # input 为服务端执行该客户端移动输入的状态（旧客户端为None，仍接受客户端上报的位置）
+        # view_delay/rtt 为客户端的插值延迟和心跳上报的往返时间，用于延迟补偿回溯
+        # views 记录每个快照序号下发送给该客户端的玩家集合（兴趣管理过滤后）
+        # 增量快照基线按连接保存，与clients(地址->玩家ID)分开维护
+        self.client_sessions = {}
+        self.snapshot_seq = 0  # 最近一次广播的玩家快照序号
+        self.snapshot_history = {}  # 快照序号 -> 玩家快照（服务端为已广播快照，客户端为已完整接收快照）
+        # 发送队列: 地址 -> 待发送的数据报，flush()时合并为合并包发送
+        self.outbox = {}
+        self.send_stats = {'packets': 0, 'datagrams': 0}  # 累计入队的数据报数与实际发送的数据包数
+
         # 客户端特有属性
         self.server_address = server_address
         self.last_heartbeat = 0
         self.last_server_response = 0
+        self.codec = net_codec.CODEC_JSON  # 与服务端协商的编码格式
+        self.reliable = None  # 与服务端的可靠有序通道（服务端支持时在握手后创建）
+        self.predictor = None  # 本地移动预测（服务端执行移动输入时在握手后创建）
+        self.server_hit_detection = False  # 服务端做延迟补偿的子弹命中判定，客户端不再上报命中
+        self.rtt = None  # 心跳测得的往返时间（秒）
+        # 远程玩家快照插值（客户端，插值延迟为0时直接使用最新快照）
+        self.interpolator = None
+        if not is_server and NETWORK_INTERPOLATION_DELAY > 0:
+            self.interpolator = SnapshotInterpolator()
+        self._received_at = 0.0  # 正在处理的消息的接收时间
+        self._pending_snapshots = {}  # 未接收完整的增量快照: seq -> 分片接收状态
+        self._latest_snapshot_seq = 0
         
         self.last_damage_time = {}  # 防止重复处理伤害
         self.last_broadcast = 0  # 上次广播时间
         
+        # 网络线程（asyncio事件循环）与收件箱，游戏线程通过poll()批量处理收到的消息
+        self.net_loop = NetworkLoop()
+        self.inbox = self.net_loop.inbox
+        self._handlers = self._build_handlers()
+        
         # 简化的子弹管理
         self.active_bullets = []  # 当前活动的子弹
         self.next_bullet_id = 1
@@ -123,11 +162,6 @@ class NetworkManager:
                 }
                 self.connected = True
                 
-                # 启动清理线程
-                self.cleanup_thread = threading.Thread(target=self.cleanup_disconnected_clients)
-                self.cleanup_thread.daemon = True
-                self.cleanup_thread.start()
-                
             except Exception as e:
                 self.connection_error = f"无法启动服务器: {e}"
                 self.running = False
@@ -139,16 +173,12 @@ class NetworkManager:
                 self.connection_error = "无法连接到服务器"
                 return
         
-        # 启动接收线程
-        self.receive_thread = threading.Thread(target=self.receive_data)
-        self.receive_thread.daemon = True
-        self.receive_thread.start()
-        
-        # 启动心跳线程
-        if not self.is_server:
-            self.heartbeat_thread = threading.Thread(target=self.heartbeat_loop)
-            self.heartbeat_thread.daemon = True
-            self.heartbeat_thread.start()
+        # 启动网络事件循环：接收数据报，服务端定时清理超时客户端，客户端定时发送心跳
+        self.net_loop.start(self.socket, self._on_datagram)
+        if self.is_server:
+            self.net_loop.call_every(2.0, self._schedule_cleanup)
+        else:
+            self.net_loop.call_every(0.5, self._heartbeat_timer)
     
     def allocate_player_id(self):
         """分配玩家ID（优先使用回收的ID）"""
@@ -193,7 +223,13 @@ class NetworkManager:
             # 发送连接请求，包含玩家名称
             connect_msg = {
                 'type': 'connect_request',
-                'player_name': self.player_name
+                'player_name': self.player_name,
+                'codecs': net_codec.supported_codecs(NETWORK_BINARY_CODEC),
+                'codec_version': net_codec.CODEC_VERSION,
+                'bundles': True,
+                'reliable': True,
+                'inputs': NETWORK_CLIENT_PREDICTION,
+                'view_delay': NETWORK_INTERPOLATION_DELAY if self.interpolator is not None else 0.0
             }
             self.socket.sendto(json.dumps(connect_msg).encode(), (self.server_address, SERVER_PORT))
             
@@ -207,9 +243,17 @@ class NetworkManager:
                     if response.get('type') == 'connect_response':
                         self.player_id = response.get('client_id', -1)
                         self.server_name = response.get('server_name', '默认服务器')
+                        codec = response.get('codec', net_codec.CODEC_JSON)
+                        if codec in net_codec.supported_codecs(NETWORK_BINARY_CODEC):
+                            self.codec = codec
+                        if response.get('reliable'):
+                            self.reliable = ReliableChannel()
+                        if response.get('inputs') and NETWORK_CLIENT_PREDICTION:
+                            self.predictor = InputPredictor()
+                        self.server_hit_detection = bool(response.get('server_hits'))
                         self.connected = True
                         self.last_server_response = time.time()
-                        print(f"连接成功！分配到玩家ID: {self.player_id}, 服务器名称: {self.server_name}")
+                        print(f"连接成功！分配到玩家ID: {self.player_id}, 服务器名称: {self.server_name}, 编码: {self.codec}")
                         
                         # 通知游戏实例服务器名称已更新
                         if self.game_instance:
@@ -229,178 +273,306 @@ class NetworkManager:
             self.connection_error = f"连接失败: {e}"
             return False
     
+    def _schedule_cleanup(self):
+        """定时器回调（网络线程）：把超时客户端清理投递给游戏线程"""
+        if not self.running:
+            return False
+        self.net_loop.post(self.cleanup_disconnected_clients)
+
     def cleanup_disconnected_clients(self):
-        """清理断开连接的客户端（仅服务端）"""
-        while self.running:
-            time.sleep(2.0)  # 每2秒检查一次
+        """清理断开连接的客户端（仅服务端，在游戏线程的poll()中执行）"""
+        if not self.is_server:
+            return
             
-            if not self.is_server:
-                continue
-                
+        current_time = time.time()
+        disconnected_clients = []
+        
+        with self.lock:
+            for addr, last_seen in list(self.client_last_seen.items()):
+                if current_time - last_seen > CLIENT_TIMEOUT:
+                    disconnected_clients.append(addr)
+            
+            # 移除断开连接的客户端
+            for addr in disconnected_clients:
+                if addr in self.clients:
+                    player_id = self.clients[addr]
+                    print(f"[服务端] 玩家{player_id}连接超时，已踢出")
+                    
+                    # 广播玩家离开消息
+                    player_name = self.players.get(player_id, {}).get('name', f'玩家{player_id}')
+                    leave_msg = ChatMessage(
+                        0, 
+                        "[系统]",
+                        f"{player_name} 离开了游戏", 
+                        time.time()
+                    )
+                    self.chat_messages.append(leave_msg)
+                    self.broadcast_chat_message(leave_msg)
+                    
+                    # 清理团队信息
+                    game_instance = getattr(self, 'game_instance', None)
+                    if game_instance and hasattr(game_instance, 'team_manager'):
+                        game_instance.team_manager.remove_player(player_id)
+                    
+                    # 回收玩家ID
+                    self.recycle_player_id(player_id)
+                    
+                    # 清理数据
+                    del self.clients[addr]
+                    del self.client_last_seen[addr]
+                    if player_id in self.players:
+                        del self.players[player_id]
+                    self._release_client_session(addr)
+                    
+                    print(f"[服务端] 已清理玩家{player_id}的数据，当前玩家数: {len(self.players)}")
+    
+    def _heartbeat_timer(self):
+        """客户端心跳定时器（网络线程）：发送心跳并检查服务器是否超时"""
+        if not self.running or self.is_server:
+            return False
+        try:
             current_time = time.time()
-            disconnected_clients = []
             
-            with self.lock:
-                for addr, last_seen in list(self.client_last_seen.items()):
-                    if current_time - last_seen > CLIENT_TIMEOUT:
-                        disconnected_clients.append(addr)
-                
-                # 移除断开连接的客户端
-                for addr in disconnected_clients:
-                    if addr in self.clients:
-                        player_id = self.clients[addr]
-                        print(f"[服务端] 玩家{player_id}连接超时，已踢出")
-                        
-                        # 广播玩家离开消息
-                        player_name = self.players.get(player_id, {}).get('name', f'玩家{player_id}')
-                        leave_msg = ChatMessage(
-                            0, 
-                            "[系统]",
-                            f"{player_name} 离开了游戏", 
-                            time.time()
-                        )
-                        self.chat_messages.append(leave_msg)
-                        self.broadcast_chat_message(leave_msg)
-                        
-                        # 清理团队信息
-                        game_instance = getattr(self, 'game_instance', None)
-                        if game_instance and hasattr(game_instance, 'team_manager'):
-                            game_instance.team_manager.remove_player(player_id)
-                        
-                        # 回收玩家ID
-                        self.recycle_player_id(player_id)
-                        
-                        # 清理数据
-                        del self.clients[addr]
-                        del self.client_last_seen[addr]
-                        if player_id in self.players:
-                            del self.players[player_id]
-                        
-                        print(f"[服务端] 已清理玩家{player_id}的数据，当前玩家数: {len(self.players)}")
+            # 发送心跳
+            if current_time - self.last_heartbeat > HEARTBEAT_INTERVAL:
+                heartbeat_msg = {
+                    'type': 'heartbeat',
+                    'data': {'player_id': self.player_id, 'timestamp': current_time, 'rtt': self.rtt}
+                }
+                self.send_data_raw(heartbeat_msg)
+                self.last_heartbeat = current_time
+            
+            # 检查服务器连接
+            if current_time - self.last_server_response > CLIENT_TIMEOUT:
+                print("[客户端] 服务器连接超时")
+                self.connection_error = "与服务器连接丢失"
+                self.connected = False
+                self.running = False
+                return False
+            
+        except Exception as e:
+            print(f"[客户端] 心跳错误: {e}")
+            return False
     
-    def heartbeat_loop(self):
-        """客户端心跳循环"""
-        while self.running and not self.is_server:
+    def _on_datagram(self, data, addr):
+        """
+        收到数据报（网络线程）
+
+        解码后连同接收时间放入收件箱，服务器探测直接在网络线程中响应
+        """
+        received_at = time.time()
+        if not self.is_server:
+            self.last_server_response = received_at
+        
+        # 合并包：逐个处理其中的数据报
+        if net_codec.is_bundle(data):
+            for packet in net_codec.split_bundle(data):
+                self._on_packet(packet, addr, received_at)
+            return
+        self._on_packet(data, addr, received_at)
+
+    def _on_packet(self, data, addr, received_at):
+        """解码单个数据报并放入收件箱（网络线程）"""
+        # 二进制快照包（握手时协商）
+        if net_codec.is_binary_packet(data):
+            message = net_codec.decode_message(data)
+            if message is not None:
+                self.inbox.append((message, addr, received_at))
+            return
+        
+        message_str = data.decode()
+        
+        # 处理服务器探测（仅服务端）
+        if message_str == "server_probe" and self.is_server:
             try:
-                current_time = time.time()
-                
-                # 发送心跳
-                if current_time - self.last_heartbeat > HEARTBEAT_INTERVAL:
-                    heartbeat_msg = {
-                        'type': 'heartbeat',
-                        'data': {'player_id': self.player_id, 'timestamp': current_time}
-                    }
-                    self.send_data_raw(heartbeat_msg)
-                    self.last_heartbeat = current_time
-                
-                # 检查服务器连接
-                if current_time - self.last_server_response > CLIENT_TIMEOUT:
-                    print("[客户端] 服务器连接超时")
-                    self.connection_error = "与服务器连接丢失"
-                    self.connected = False
-                    self.running = False
-                    break
-                
-                time.sleep(0.5)
-                
+                server_info = self.get_server_info()
+                response = f"server_info:{json.dumps(server_info)}"
+                self.net_loop.transport.sendto(response.encode(), addr)
+                print(f"[服务端] 响应探测请求来自: {addr}")
             except Exception as e:
-                print(f"[客户端] 心跳错误: {e}")
-                break
-    
-    def receive_data(self):
-        while self.running:
-            try:
-                data, addr = self.socket.recvfrom(BUFFER_SIZE)
-                message_str = data.decode()
-                
-                # 更新最后收到数据的时间
-                if self.is_server:
-                    with self.lock:
-                        if addr in self.clients:
-                            self.client_last_seen[addr] = time.time()
-                else:
-                    self.last_server_response = time.time()
-                
-                # 处理服务器探测（仅服务端）
-                if message_str == "server_probe" and self.is_server:
-                    try:
-                        server_info = self.get_server_info()
-                        response = f"server_info:{json.dumps(server_info)}"
-                        self.socket.sendto(response.encode(), addr)
-                        print(f"[服务端] 响应探测请求来自: {addr}")
-                    except Exception as e:
-                        print(f"[服务端] 响应探测请求失败: {e}")
-                    continue
-                
-                # 处理连接请求（仅服务端）
-                if message_str == "connect_request" and self.is_server:
-                    self._handle_connection_request(addr)
-                    continue
-                
-                # 处理包含玩家名称的连接请求（仅服务端）
-                try:
-                    message = json.loads(message_str)
-                    if isinstance(message, dict) and message.get('type') == 'connect_request':
-                        self._handle_connection_request(addr, message)
-                        continue
-                except json.JSONDecodeError:
-                    pass
-                
-                # 处理连接响应（仅客户端）
-                if message_str.startswith("connect_accepted:") and not self.is_server:
-                    continue  # 已在connect_to_server中处理
-                
-                try:
-                    message = json.loads(message_str)
-                    if not isinstance(message, dict) or 'type' not in message:
+                print(f"[服务端] 响应探测请求失败: {e}")
+            return
+        
+        # 处理连接请求（仅服务端），整个请求作为消息数据交给处理函数
+        if message_str == "connect_request" and self.is_server:
+            self.inbox.append(({'type': 'connect_request', 'data': None}, addr, received_at))
+            return
+        
+        # 处理连接响应（仅客户端）
+        if message_str.startswith("connect_accepted:") and not self.is_server:
+            return  # 已在connect_to_server中处理
+        
+        try:
+            message = json.loads(message_str)
+        except json.JSONDecodeError:
+            return
+        if not isinstance(message, dict) or 'type' not in message:
+            return
+        if message['type'] == 'connect_request':
+            if not self.is_server:
+                return
+            message = {'type': 'connect_request', 'data': message}
+        self.inbox.append((message, addr, received_at))
+
+    def poll(self):
+        """
+        处理网络线程收到的消息（游戏线程每帧/每个tick调用）
+
+        一次取空收件箱，整批消息只获取一次self.lock。
+
+        Returns:
+            int: 处理的消息数
+        """
+        inbox = self.inbox
+        count = 0
+        if inbox:
+            with self.lock:
+                while inbox:
+                    message, addr, received_at = inbox.popleft()
+                    if addr is None:
+                        # 定时器投递的任务
+                        message()
                         continue
-                except json.JSONDecodeError:
-                    continue
-                
-                with self.lock:
-                    msg_type = message['type']
-                    msg_data = message.get('data', {})
                     
-                    if msg_type == 'player_update':
-                        self._update_players(msg_data)
-                    elif msg_type == 'init_players':
-                        self._init_players(msg_data)
-                    elif msg_type == 'door_update':
-                        self._update_door(msg_data)
-                    elif msg_type == 'item_update':
-                        self._update_items(msg_data)
-                    elif msg_type == 'item_pickup':
-                        self._handle_item_pickup(msg_data)
-                    elif msg_type == 'request_bullet':
-                        self._handle_bullet_request(msg_data)
-                    elif msg_type == 'bullets_update':
-                        self._update_bullets(msg_data)
-                    elif msg_type == 'hit_damage':
-                        self._handle_damage(msg_data)
-                    elif msg_type == 'melee_attack':
-                        self._handle_melee_attack(msg_data)
-                    elif msg_type == 'respawn':
-                        self._handle_respawn(msg_data)
-                    elif msg_type == 'chat_message':
-                        # 服务端和客户端都使用_handle_chat_message
-                        # 服务端会处理队内聊天并转发，客户端直接接收
-                        self._handle_chat_message(msg_data)
-                    elif msg_type == 'chat_history':
-                        self._handle_chat_history(msg_data)
-                    elif msg_type == 'heartbeat':
-                        self._handle_heartbeat(msg_data, addr)
-                    elif msg_type == 'kick':
-                        self._handle_kick(msg_data)
-                        
-            except socket.timeout:
+                    # 更新最后收到数据的时间
+                    if self.is_server and addr in self.clients:
+                        self.client_last_seen[addr] = received_at
+                    self._received_at = received_at
+                    try:
+                        self._dispatch_message(message, addr)
+                    except Exception as e:
+                        print(f"处理{message.get('type')}消息错误: {e}")
+                    count += 1
+        # 发送处理过程中产生的回应、可靠通道的确认与重发
+        self.flush()
+        return count
+
+    def _build_handlers(self):
+        """消息类型 -> (处理函数, 是否需要来源地址)"""
+        return {
+            'player_update': (self._handle_player_update, True),
+            'init_players': (self._init_players, False),
+            'door_update': (self._update_door, False),
+            'item_update': (self._update_items, False),
+            'item_pickup': (self._handle_item_pickup, False),
+            'request_bullet': (self._handle_bullet_request, False),
+            'bullets_update': (self._update_bullets, False),
+            'hit_damage': (self._handle_hit_report, False),
+            'melee_attack': (self._handle_melee_attack, False),
+            'respawn': (self._handle_respawn, False),
+            # 服务端和客户端都使用_handle_chat_message
+            # 服务端会处理队内聊天并转发，客户端直接接收
+            'chat_message': (self._handle_chat_message, False),
+            'chat_history': (self._handle_chat_history, False),
+            'heartbeat': (self._handle_heartbeat, True),
+            'heartbeat_response': (self._handle_heartbeat_response, False),
+            'kick': (self._handle_kick, False),
+            'player_delta': (self._handle_player_delta, False),
+            'snapshot_ack': (self._handle_snapshot_ack, True),
+            'reliable': (self._handle_reliable, True),
+            'reliable_ack': (self._handle_reliable_ack, True),
+            'player_input': (self._handle_player_input, True),
+            'input_ack': (self._handle_input_ack, False),
+            'connect_request': (lambda data, addr: self._handle_connection_request(addr, data), True),
+        }
+
+    def _dispatch_message(self, message, addr):
+        """按消息类型分发已解码的消息（调用方需持有self.lock）"""
+        entry = self._handlers.get(message['type'])
+        if entry is None:
+            return
+        handler, with_addr = entry
+        msg_data = message.get('data', {})
+        if with_addr:
+            handler(msg_data, addr)
+        else:
+            handler(msg_data)
+
+    def _reliable_channel(self, addr):
+        """与对端的可靠通道（服务端按客户端地址查找），未协商时返回None"""
+        if not self.is_server:
+            return self.reliable
+        session = self.client_sessions.get(addr)
+        return session.get('reliable') if session else None
+
+    def _handle_reliable(self, envelope, addr):
+        """处理可靠消息：应用其中携带的确认，按序号顺序分发可交付的事件"""
+        channel = self._reliable_channel(addr)
+        if channel is None or not isinstance(envelope, dict):
+            return
+        channel.on_ack(envelope.get('ack'), time.time())
+        for message in channel.receive(envelope.get('seq'), envelope.get('msg')):
+            if not isinstance(message, dict) or message.get('type') not in RELIABLE_TYPES:
                 continue
+            try:
+                self._dispatch_message(message, addr)
             except Exception as e:
-                print(f"接收数据错误: {e}")
-                if not self.is_server:
-                    self.connection_error = f"网络错误: {e}"
-                    self.connected = False
-                    self.running = False
+                print(f"处理{message.get('type')}消息错误: {e}")
+
+    def _handle_reliable_ack(self, ack_data, addr):
+        """处理单独发送的可靠通道确认"""
+        channel = self._reliable_channel(addr)
+        if channel is not None and isinstance(ack_data, dict):
+            channel.on_ack(ack_data.get('ack'), time.time())
+
+    def send_move_input(self, move_input, dt, walking, aiming):
+        """记录本地玩家本帧的移动输入并发给服务端（仅客户端，未协商客户端预测时不发送）"""
+        if self.predictor is None:
+            return
+        self.predictor.record(move_input, dt, walking, aiming)
+        self.send_data_raw(self.predictor.outgoing())
+
+    def _handle_player_input(self, input_data, addr):
+        """按序执行客户端的移动输入（仅服务端），结果写入权威位置"""
+        session = self.client_sessions.get(addr)
+        if not self.is_server or session is None or session.get('input') is None:
+            return
+        if not isinstance(input_data, dict):
+            return
+        state = session['input']
+        player_id = session['player_id']
+        game = getattr(self, 'game_instance', None)
+        game_map = getattr(game, 'game_map', None)
+        player = getattr(game, 'other_players', {}).get(player_id)
+        pdata = self.players.get(player_id)
+        if player is None or pdata is None or game_map is None:
+            return  # 玩家对象在下一个服务端tick创建，客户端按回送校正
+        
+        now = time.time()
+        entries = state['budget'].take(new_inputs(input_data.get('inputs'), state['seq']), now)
+        if not entries:
+            return
+        player.pos.update(pdata['pos'])
+        for entry in entries:
+            apply_input(player, entry, game_map, now)
+        state['seq'] = entries[-1][0]
+        pdata['pos'] = [player.pos.x, player.pos.y]
+
+    def _send_input_acks(self):
+        """向执行移动输入的客户端回送最后执行的输入序号和执行后的位置、速度（仅服务端）"""
+        game = getattr(self, 'game_instance', None)
+        other_players = getattr(game, 'other_players', {})
+        for addr, session in list(self.client_sessions.items()):
+            state = session.get('input')
+            player = other_players.get(session.get('player_id'))
+            pdata = self.players.get(session.get('player_id'))
+            if state is None or player is None or pdata is None:
                 continue
+            ack = {'seq': state['seq'], 'pos': list(pdata['pos']), 'vel': [player.velocity.x, player.velocity.y]}
+            if ack != state['echoed']:
+                state['echoed'] = ack
+                self.send_to_client({'type': 'input_ack', 'data': ack}, addr)
+
+    def _handle_input_ack(self, ack_data):
+        """按服务端回送校正本地玩家位置（仅客户端）"""
+        if self.is_server or self.predictor is None or not isinstance(ack_data, dict):
+            return
+        game = getattr(self, 'game_instance', None)
+        player = getattr(game, 'player', None)
+        game_map = getattr(game, 'game_map', None)
+        if player is None or game_map is None or player.is_dead:
+            return
+        self.predictor.reconcile(player, game_map, ack_data, time.time())
 
     def _handle_connection_request(self, addr, data=None):
         """处理连接请求（仅服务端）"""
@@ -416,6 +588,35 @@ class NetworkManager:
             self.clients[addr] = new_player_id
             self.client_last_seen[addr] = time.time()
             
+            # 协商快照编码格式（旧客户端不提供codecs字段，回退为JSON）
+            codec = net_codec.CODEC_JSON
+            if data and isinstance(data, dict):
+                codec = net_codec.choose_codec(
+                    data.get('codecs'), data.get('codec_version'), NETWORK_BINARY_CODEC
+                )
+            protocol_version = 0
+            if data and isinstance(data, dict) and isinstance(data.get('codec_version'), int):
+                protocol_version = data['codec_version']
+            reliable = ReliableChannel() if isinstance(data, dict) and data.get('reliable') else None
+            move_input = None
+            if NETWORK_CLIENT_PREDICTION and isinstance(data, dict) and data.get('inputs'):
+                move_input = {'seq': 0, 'echoed': None, 'budget': InputBudget(time.time())}
+            view_delay = 0.0
+            if isinstance(data, dict) and isinstance(data.get('view_delay'), (int, float)):
+                view_delay = max(float(data['view_delay']), 0.0)
+            self.client_sessions[addr] = {
+                'player_id': new_player_id,
+                'codec': codec,
+                'protocol_version': protocol_version,
+                'bundles': bool(data.get('bundles')) if isinstance(data, dict) else False,
+                'reliable': reliable,
+                'input': move_input,
+                'view_delay': view_delay,
+                'rtt': None,
+                'acked_snapshot': 0,
+                'views': {},
+            }
+            
             # 获取玩家名称
             player_name = generate_default_player_name()
             if data and isinstance(data, dict):
@@ -451,14 +652,18 @@ class NetworkManager:
                 'grenades': 0  # 手雷数量
             }
             
-            print(f"[服务端] 玩家{new_player_id}已连接，地址：{addr}，玩家名: {player_name}，当前玩家数: {len(self.players)}")
+            print(f"[服务端] 玩家{new_player_id}已连接，地址：{addr}，玩家名: {player_name}，编码: {codec}，当前玩家数: {len(self.players)}")
             
             # 发送连接响应（包含服务器名称）
             response = {
                 'type': 'connect_response',
                 'client_id': new_player_id,
                 'server_name': self.server_name,
-                'server_time': time.time()
+                'server_time': time.time(),
+                'codec': codec,
+                'reliable': reliable is not None,
+                'inputs': move_input is not None,
+                'server_hits': SERVER_MAX_LAG_COMPENSATION > 0
             }
             self.socket.sendto(json.dumps(response).encode(), addr)
             
@@ -518,16 +723,59 @@ class NetworkManager:
             if addr in self.clients:
                 self.client_last_seen[addr] = time.time()
                 
-                # 回应心跳
+                # 记录客户端测得的往返时间（延迟补偿）
+                session = self.client_sessions.get(addr)
+                rtt = heartbeat_data.get('rtt') if isinstance(heartbeat_data, dict) else None
+                if session is not None and isinstance(rtt, (int, float)) and rtt >= 0:
+                    session['rtt'] = float(rtt)
+                
+                # 回应心跳，回送客户端时间戳供其测量往返时间
                 response = {
                     'type': 'heartbeat_response',
-                    'data': {'timestamp': time.time()}
+                    'data': {'timestamp': time.time(),
+                             'echo': heartbeat_data.get('timestamp') if isinstance(heartbeat_data, dict) else None}
                 }
                 self.send_to_client(response, addr)
         else:
             # 客户端：收到服务端的心跳回应
             self.last_server_response = time.time()
 
+    def _handle_heartbeat_response(self, response_data):
+        """按回送的心跳时间戳测量往返时间（仅客户端，平滑方式同可靠通道的SRTT）"""
+        if self.is_server or not isinstance(response_data, dict):
+            return
+        echo = response_data.get('echo')
+        if not isinstance(echo, (int, float)):
+            return
+        sample = self._received_at - echo
+        if sample < 0:
+            return
+        self.rtt = sample if self.rtt is None else 0.875 * self.rtt + 0.125 * sample
+
+    def view_latency(self, player_id):
+        """
+        玩家开火时看到的画面相对服务端当前时刻的延迟（秒，仅服务端）
+
+        往返时间优先使用服务端可靠通道测得的SRTT，没有采样时使用客户端心跳上报的值；
+        主机玩家和AI为0。
+        """
+        if not self.is_server:
+            return 0.0
+        for session in self.client_sessions.values():
+            if session.get('player_id') != player_id:
+                continue
+            channel = session.get('reliable')
+            rtt = channel.srtt if channel is not None and channel.srtt is not None else session.get('rtt')
+            return view_latency(rtt, session.get('view_delay', 0.0))
+        return 0.0
+
+    def _handle_hit_report(self, damage_data):
+        """处理客户端上报的命中（服务端做延迟补偿的子弹命中判定时忽略客户端上报的子弹命中）"""
+        if (self.is_server and SERVER_MAX_LAG_COMPENSATION > 0 and isinstance(damage_data, dict)
+                and damage_data.get('type', 'bullet') == 'bullet'):
+            return
+        self._handle_damage(damage_data)
+
     def _handle_kick(self, kick_data):
         """处理踢出消息（仅客户端）"""
         if not self.is_server:
@@ -537,10 +785,14 @@ class NetworkManager:
             self.connected = False
             self.running = False
 
-    def _update_players(self, player_data):
+    def _update_players(self, player_data, addr=None):
         """更新玩家数据"""
         if not isinstance(player_data, dict):
             return
+        
+        # 服务端执行移动输入的客户端：位置以服务端为准，忽略客户端上报的位置
+        session = self.client_sessions.get(addr) if self.is_server else None
+        server_moved = session is not None and session.get('input') is not None
             
         for pid_str, pdata in player_data.items():
             try:
@@ -558,8 +810,11 @@ class NetworkManager:
                         current_speed_boost = self.players[pid].get('speed_boost_end_time', 0)
                         current_damage_boost = self.players[pid].get('damage_boost_end_time', 0)
                         current_grenades = self.players[pid].get('grenades', 0)
+                        current_team_id = self.players[pid].get('team_id')
                         
                         # 更新客户端发来的数据
+                        if server_moved and isinstance(pdata, dict):
+                            pdata = {key: value for key, value in pdata.items() if key != 'pos'}
                         self.players[pid].update(pdata)
                         
                         # 恢复服务端权威数据（但允许名称更新）
@@ -572,6 +827,8 @@ class NetworkManager:
                         self.players[pid]['speed_boost_end_time'] = current_speed_boost
                         self.players[pid]['damage_boost_end_time'] = current_damage_boost
                         self.players[pid]['grenades'] = current_grenades
+                        # 团队由服务端管理（二进制快照总是携带team_id字段）
+                        self.players[pid]['team_id'] = current_team_id
                     else:
                         self.players[pid] = pdata
                         self.players[pid]['name'] = pdata.get('name', f'玩家{pid}')
@@ -581,6 +838,95 @@ class NetworkManager:
             except (ValueError, TypeError) as e:
                 continue
 
+    def _handle_player_update(self, player_data, addr):
+        """处理完整的玩家状态（服务端为客户端上报，客户端为旧版本快照）"""
+        self._update_players(player_data, addr)
+        if not self.is_server and isinstance(player_data, dict):
+            self._record_snapshot(player_data)
+
+    def _record_snapshot(self, players):
+        """按接收时间记录远程玩家的位置和朝向，供渲染插值（仅客户端）"""
+        if self.interpolator is None:
+            return
+        for pid_str, pdata in players.items():
+            try:
+                pid = int(pid_str)
+            except (ValueError, TypeError):
+                continue
+            pos = pdata.get('pos') if isinstance(pdata, dict) else None
+            if pid != self.player_id and pos:
+                self.interpolator.push(pid, self._received_at, pos, pdata.get('angle', 0))
+
+    def _handle_player_delta(self, delta):
+        """应用服务端发来的增量玩家快照（仅客户端）"""
+        if self.is_server or not isinstance(delta, dict):
+            return
+
+        seq = delta.get('seq', 0)
+        base = delta.get('base', 0)
+        if seq < self._latest_snapshot_seq:
+            return  # 乱序到达的旧快照
+
+        pending = self._pending_snapshots.get(seq)
+        if pending is None:
+            if base and base not in self.snapshot_history:
+                return  # 基线已丢失，等待服务端按新的确认重发
+            pending = {
+                'base': base,
+                'parts': delta.get('parts', 1),
+                'received': set(),
+                'state': net_codec.apply_player_delta(
+                    self.snapshot_history.get(base),
+                    {'base': base, 'players': {}, 'removed': []}
+                ),
+            }
+            self._pending_snapshots[seq] = pending
+
+        part = delta.get('part', 0)
+        if part in pending['received']:
+            return
+        pending['received'].add(part)
+        self._latest_snapshot_seq = seq
+
+        state = pending['state']
+        for pid_str in delta.get('removed', []):
+            state.pop(str(pid_str), None)
+            try:
+                self.players.pop(int(pid_str), None)
+            except ValueError:
+                continue
+        for pid_str, changes in delta.get('players', {}).items():
+            state.setdefault(str(pid_str), {}).update(changes)
+        self._update_players({pid_str: dict(state[str(pid_str)]) for pid_str in delta.get('players', {})})
+
+        if len(pending['received']) < pending['parts']:
+            return
+
+        # 全部分片到齐：记录为新基线并确认
+        # 增量只包含变化的玩家，插值缓冲按完整状态记录（静止的玩家也需要新的时间点）
+        self._record_snapshot(state)
+        if not pending['base']:
+            # 完整快照中不存在的玩家已不在本客户端的兴趣范围内
+            for pid in [pid for pid in self.players if str(pid) not in state]:
+                del self.players[pid]
+        self.snapshot_history[seq] = state
+        for old_seq in [s for s in self._pending_snapshots if s <= seq]:
+            del self._pending_snapshots[old_seq]
+        for old_seq in sorted(self.snapshot_history)[:-net_codec.SNAPSHOT_HISTORY_SIZE]:
+            del self.snapshot_history[old_seq]
+        self.send_data({'type': 'snapshot_ack', 'data': {'seq': seq}})
+
+    def _handle_snapshot_ack(self, ack_data, addr):
+        """记录客户端已确认的快照序号（仅服务端）"""
+        if not self.is_server or not isinstance(ack_data, dict):
+            return
+        session = self.client_sessions.get(addr)
+        seq = ack_data.get('seq')
+        if session is None or seq not in self.snapshot_history:
+            return
+        if seq > session['acked_snapshot']:
+            session['acked_snapshot'] = seq
+
     def _init_players(self, player_data):
         """初始化玩家数据"""
         if not self.is_server and isinstance(player_data, dict):
@@ -669,7 +1015,8 @@ class NetworkManager:
                                 self.players[player_id]['grenades'] = getattr(player, 'grenades', 0)
                                 print(f"[服务端] 同步玩家{player_id}状态: health={player.health}, armor={player.armor}")
                         
-                        # 广播道具拾取消息给所有客户端
+                        # 广播道具拾取消息给所有客户端（可靠通道，客户端据此把道具标记为已拾取，
+                        # 不再广播完整道具状态）
                         self.send_data({
                             'type': 'item_pickup',
                             'data': {
@@ -678,13 +1025,16 @@ class NetworkManager:
                                 'effect': effect
                             }
                         })
-                        
-                        # 广播道具状态更新
-                        self.send_item_update(item_manager.get_state())
             
-            # 客户端：应用道具效果
+            # 客户端：标记道具为已拾取（本地按复活时间倒计时）并应用道具效果
             if not self.is_server and self.game_instance:
                 game = self.game_instance
+                item_manager = getattr(game, 'item_manager', None)
+                if item_manager and item_id in item_manager.items:
+                    item = item_manager.items[item_id]
+                    if item.is_active:
+                        item.is_active = False
+                        item.respawn_time_remaining = item.RESPAWN_TIME
                 player = None
                 if hasattr(game, 'player') and game.player and game.player.id == player_id:
                     player = game.player
@@ -958,6 +1308,9 @@ class NetworkManager:
                 # 处理每个被击中的目标
                 for target_id in targets:
                     if target_id != attacker_id and target_id in self.players:
+                        if not self._melee_in_reach(attacker_id, target_id, is_heavy):
+                            print(f"[近战攻击] 忽略玩家{attacker_id}上报的目标{target_id}：回溯后不在攻击范围内")
+                            continue
                         damage_data = {
                             'target_id': target_id,
                             'damage': damage,
@@ -969,6 +1322,22 @@ class NetworkManager:
             except (ValueError, TypeError) as e:
                 print(f"处理近战攻击数据错误: {e}")
 
+    def _melee_in_reach(self, attacker_id, target_id, is_heavy):
+        """把目标回溯到攻击者视角的时刻，检查客户端上报的近战目标是否在攻击距离内（仅服务端）"""
+        game = getattr(self, 'game_instance', None)
+        history = getattr(game, 'position_history', None)
+        attacker = self.players.get(attacker_id)
+        if history is None or attacker is None:
+            return True
+        target_pos = history.rewind(time.time() - self.view_latency(attacker_id)).get(target_id)
+        if target_pos is None:
+            target_pos = self.players[target_id]['pos']
+        # 攻击者位置为服务端权威位置，允许一个玩家半径的偏差
+        reach = (HEAVY_MELEE_RANGE if is_heavy else MELEE_RANGE) + PLAYER_RADIUS
+        dx = target_pos[0] - attacker['pos'][0]
+        dy = target_pos[1] - attacker['pos'][1]
+        return dx * dx + dy * dy <= reach * reach
+
     def _handle_respawn(self, respawn_data):
         """处理复活事件"""
         if isinstance(respawn_data, dict) and 'player_id' in respawn_data and 'pos' in respawn_data:
@@ -1222,6 +1591,7 @@ class NetworkManager:
                             del self.client_last_seen[target_addr]
                         if target_id in self.players:
                             del self.players[target_id]
+                        self._release_client_session(target_addr)
                             
                     # 回收玩家ID
                     self.recycle_player_id(target_id)
@@ -1962,7 +2332,7 @@ class NetworkManager:
         # 同步到游戏实例中的玩家对象
         game_instance = getattr(self, 'game_instance', None)
         if game_instance:
-            if player_id == self.player_id and hasattr(game_instance, 'player'):
+            if player_id == self.player_id and getattr(game_instance, 'player', None):
                 game_instance.player.team_id = team_id
             elif hasattr(game_instance, 'other_players') and player_id in game_instance.other_players:
                 game_instance.other_players[player_id].team_id = team_id
@@ -1991,32 +2361,44 @@ class NetworkManager:
         """发送数据到服务端或所有客户端"""
         self.send_data_raw(data)
 
+    def _encode(self, data, codec):
+        """按编码格式序列化消息，返回一个或多个数据报"""
+        return net_codec.encode_message(data, codec, time.time())
+
+    def _client_codec(self, addr):
+        """获取客户端协商的编码格式"""
+        session = self.client_sessions.get(addr)
+        return session['codec'] if session else net_codec.CODEC_JSON
+
+    def _release_client_session(self, addr):
+        """清理客户端连接附带的会话状态（编码格式、快照基线等）"""
+        self.client_sessions.pop(addr, None)
+
     def send_data_raw(self, data):
         """原始数据发送方法"""
         try:
-            serialized = json.dumps(data).encode()
             if self.is_server:
-                # 服务端广播
+                # 服务端广播：每种编码格式只序列化一次，放入各客户端的发送队列
+                # 关键事件走各客户端的可靠通道（序号按客户端分配，逐个编码）
+                reliable = data.get('type') in RELIABLE_TYPES
+                packets_by_codec = {}
                 for addr in list(self.clients.keys()):
-                    try:
-                        self.socket.sendto(serialized, addr)
-                    except Exception as e:
-                        print(f"向{addr}发送数据失败: {e}")
-                        # 移除失效的客户端
-                        with self.lock:
-                            if addr in self.clients:
-                                player_id = self.clients[addr]
-                                print(f"移除失效客户端 玩家{player_id}")
-                                # 回收ID
-                                self.recycle_player_id(player_id)
-                                del self.clients[addr]
-                                if addr in self.client_last_seen:
-                                    del self.client_last_seen[addr]
-                                if player_id in self.players:
-                                    del self.players[player_id]
+                    if reliable and self._send_reliable(data, addr):
+                        continue
+                    codec = self._client_codec(addr)
+                    packets = packets_by_codec.get(codec)
+                    if packets is None:
+                        packets = packets_by_codec[codec] = self._encode(data, codec)
+                    self._queue_packets(addr, packets)
             else:
                 # 客户端发送到服务端
-                self.socket.sendto(serialized, (self.server_address, SERVER_PORT))
+                if self.reliable is not None and data.get('type') in RELIABLE_TYPES:
+                    data = self.reliable.wrap(data, time.time())
+                for packet in self._encode(data, self.codec):
+                    self.socket.sendto(packet, (self.server_address, SERVER_PORT))
+        except BlockingIOError:
+            # 非阻塞套接字发送缓冲区已满，丢弃本次数据报（与UDP丢包等价，可靠事件由重传补发），不断开连接
+            pass
         except Exception as e:
             print(f"[网络错误] 发送数据失败: {e}")
             if not self.is_server:
@@ -2024,13 +2406,92 @@ class NetworkManager:
                 self.connected = False
 
     def send_to_client(self, data, addr):
-        """发送数据到指定客户端"""
+        """发送数据到指定客户端（放入发送队列，下一次flush时发送）"""
         try:
-            serialized = json.dumps(data).encode()
-            self.socket.sendto(serialized, addr)
+            if data.get('type') in RELIABLE_TYPES and self._send_reliable(data, addr):
+                return
+            self._queue_packets(addr, self._encode(data, self._client_codec(addr)))
         except Exception as e:
             print(f"[网络错误] 发送到{addr}失败: {e}")
 
+    def _send_reliable(self, data, addr):
+        """通过客户端的可靠通道发送事件（仅服务端），客户端不支持可靠通道时返回False"""
+        session = self.client_sessions.get(addr)
+        channel = session.get('reliable') if session else None
+        if channel is None:
+            return False
+        self._queue_packets(addr, self._encode(channel.wrap(data, time.time()), session['codec']))
+        return True
+
+    def _queue_packets(self, addr, packets):
+        """把数据报放入客户端的发送队列（仅服务端）"""
+        queue = self.outbox.get(addr)
+        if queue is None:
+            queue = self.outbox[addr] = []
+        queue.extend(packets)
+        self.send_stats['packets'] += len(packets)
+
+    def _flush_reliable(self):
+        """发送可靠通道的重发消息与确认（服务端放入发送队列，与同一次flush的快照合并发送）"""
+        now = time.time()
+        if not self.is_server:
+            if self.reliable is not None:
+                for message in self.reliable.outgoing(now):
+                    self.send_data_raw(message)
+            return
+        for addr, session in list(self.client_sessions.items()):
+            channel = session.get('reliable')
+            if channel is not None:
+                for message in channel.outgoing(now):
+                    self._queue_packets(addr, self._encode(message, session['codec']))
+
+    def flush(self):
+        """
+        发送各客户端队列中的数据报（每次处理完消息和每个服务端tick结束时调用）
+
+        支持合并包的客户端把一次flush的全部数据报按顺序合并为不超过 NETWORK_BUNDLE_SIZE 的包，
+        本身超过该大小的快照分片单独发送；旧客户端逐个发送。
+        客户端只发送可靠通道的重发消息与确认（其余消息直接发送）。
+
+        Returns:
+            int: 实际发送的数据包数
+        """
+        self._flush_reliable()
+        if not self.outbox:
+            return 0
+        outbox, self.outbox = self.outbox, {}
+        sent = 0
+        for addr, packets in outbox.items():
+            session = self.client_sessions.get(addr)
+            if session and session.get('bundles'):
+                datagrams = net_codec.bundle_packets(packets, NETWORK_BUNDLE_SIZE)
+            else:
+                datagrams = packets
+            try:
+                for datagram in datagrams:
+                    self.socket.sendto(datagram, addr)
+                    sent += 1
+            except BlockingIOError:
+                # 套接字发送缓冲区已满，丢弃本次剩余的数据报（与UDP丢包等价）
+                continue
+            except Exception as e:
+                print(f"向{addr}发送数据失败: {e}")
+                # 移除失效的客户端
+                with self.lock:
+                    if addr in self.clients:
+                        player_id = self.clients[addr]
+                        print(f"移除失效客户端 玩家{player_id}")
+                        # 回收ID
+                        self.recycle_player_id(player_id)
+                        del self.clients[addr]
+                        if addr in self.client_last_seen:
+                            del self.client_last_seen[addr]
+                        if player_id in self.players:
+                            del self.players[player_id]
+                        self._release_client_session(addr)
+        self.send_stats['datagrams'] += sent
+        return sent
+
     def send_chat_message(self, message, is_team_chat=False):
         """发送聊天消息"""
         if len(message.strip()) == 0:
@@ -2132,42 +2593,141 @@ class NetworkManager:
         })
 
     def update_and_broadcast(self):
-        """服务端定期广播游戏状态"""
+        """服务端定期广播游戏状态（按墙钟20Hz节流，固定tick驱动时使用broadcast_state）"""
         if self.is_server:
             current_time = time.time()
             if current_time - self.last_broadcast > 0.05:  # 20Hz
                 # 检查玩家复活（服务端统一处理）
                 self.check_player_respawns(current_time)
-                
-                # 广播玩家状态
-                self.send_data({
-                    'type': 'player_update', 
-                    'data': {str(pid): pdata for pid, pdata in self.players.items()}
-                })
-                
-                # 清理过期子弹（3秒后）
-                with self.lock:
-                    self.active_bullets = [
-                        b for b in self.active_bullets 
-                        if current_time - b['time'] < 3.0
-                    ]
-                
-                # 广播子弹状态
-                self.send_data({
-                    'type': 'bullets_update',
-                    'data': self.active_bullets
-                })
-                
-                # 广播道具状态
-                if hasattr(self, 'game_instance') and self.game_instance:
-                    game = self.game_instance
-                    if hasattr(game, 'item_manager') and game.item_manager:
-                        self.send_data({
-                            'type': 'item_update',
-                            'data': game.item_manager.get_state()
-                        })
-                
-                self.last_broadcast = current_time
+                self.broadcast_state(current_time)
+
+    def broadcast_state(self, current_time=None):
+        """广播玩家、子弹和道具状态（仅服务端）"""
+        if not self.is_server:
+            return
+        if current_time is None:
+            current_time = time.time()
+        
+        # 清理过期子弹（3秒后）
+        with self.lock:
+            self.active_bullets = [
+                b for b in self.active_bullets 
+                if current_time - b['time'] < 3.0
+            ]
+            snapshot = net_codec.copy_players(self.players)
+            bullets = list(self.active_bullets)
+        
+        # 道具状态只按帧发给不支持可靠通道的旧客户端，其余客户端在连接时收到完整道具状态，
+        # 之后通过可靠的item_pickup事件更新
+        items = None
+        legacy = [addr for addr in self.clients if self._reliable_channel(addr) is None]
+        if legacy and hasattr(self, 'game_instance') and self.game_instance:
+            game = self.game_instance
+            if hasattr(game, 'item_manager') and game.item_manager:
+                items = game.item_manager.get_state()['items']
+        
+        # 兴趣管理：每个接收方只收到附近/同房间/队友相关的实体
+        index = self._build_interest_index(snapshot, bullets, items or [])
+        
+        # 广播玩家状态（按客户端确认的基线发送增量）
+        self.broadcast_player_snapshot(snapshot, index)
+        
+        # 回送已执行的移动输入（与快照合并发送）
+        self._send_input_acks()
+        
+        # 广播子弹状态
+        self._broadcast_filtered(
+            'bullets_update', bullets,
+            index.bullets_for if index else None,
+            lambda entries: entries
+        )
+        
+        # 广播道具状态（旧客户端）
+        if items is not None:
+            self._broadcast_filtered(
+                'item_update', items,
+                index.items_for if index else None,
+                lambda entries: {'items': entries},
+                legacy
+            )
+        
+        self.last_broadcast = current_time
+
+    def _build_interest_index(self, snapshot, bullets, items):
+        """构建本次广播的兴趣索引，关闭兴趣管理时返回None"""
+        if not INTEREST_MANAGEMENT:
+            return None
+        teammates_of = None
+        game = getattr(self, 'game_instance', None)
+        if game and hasattr(game, 'team_manager'):
+            teammates_of = game.team_manager.get_teammates
+        return InterestIndex(snapshot, bullets, items, INTEREST_RADIUS, teammates_of)
+
+    def _broadcast_filtered(self, msg_type, entries, entries_for, wrap, addrs=None):
+        """按接收方过滤后广播列表型状态，相同内容与编码只序列化一次（addrs缺省时发给所有客户端）"""
+        packets_cache = {}
+        for addr in list(self.clients) if addrs is None else addrs:
+            player_id = self.clients[addr]
+            selected = entries if entries_for is None else entries_for(player_id)
+            codec = self._client_codec(addr)
+            key = (codec, tuple(entry.get('id') for entry in selected))
+            packets = packets_cache.get(key)
+            if packets is None:
+                packets = packets_cache[key] = self._encode({'type': msg_type, 'data': wrap(selected)}, codec)
+            self._queue_packets(addr, packets)
+
+    def broadcast_player_snapshot(self, snapshot=None, index=None):
+        """
+        记录新的玩家快照，并按各客户端已确认的基线发送增量（仅服务端）
+
+        Args:
+            snapshot: 玩家快照，缺省时从self.players复制
+            index: 兴趣索引，缺省时向所有客户端发送全部玩家
+        """
+        if snapshot is None:
+            with self.lock:
+                snapshot = net_codec.copy_players(self.players)
+        self.snapshot_seq += 1
+        seq = self.snapshot_seq
+        self.snapshot_history[seq] = snapshot
+        for old_seq in sorted(self.snapshot_history)[:-net_codec.SNAPSHOT_HISTORY_SIZE]:
+            del self.snapshot_history[old_seq]
+
+        # 基线、可见集合与编码都相同的客户端共享同一份编码结果
+        groups = {}
+        for addr, player_id in list(self.clients.items()):
+            view = frozenset(snapshot) if index is None else frozenset(index.players_for(player_id))
+            session = self.client_sessions.get(addr)
+            if session is None or session['protocol_version'] < net_codec.DELTA_MIN_VERSION:
+                key = (self._client_codec(addr), None, view, None)
+            else:
+                base = session['acked_snapshot']
+                if base not in self.snapshot_history or base not in session['views']:
+                    base = 0  # 基线过期，回退为完整快照
+                key = (session['codec'], base, view, session['views'].get(base))
+                session['views'][seq] = view
+                for old_seq in [s for s in session['views'] if s not in self.snapshot_history]:
+                    del session['views'][old_seq]
+            groups.setdefault(key, []).append(addr)
+
+        for (codec, base, view, base_view), addrs in groups.items():
+            current = {pid: snapshot[pid] for pid in view}
+            if base is None:
+                # 旧版本客户端：完整的player_update
+                message = {'type': 'player_update', 'data': current}
+            else:
+                baseline = None
+                if base:
+                    # 基线只包含当时发送给该客户端的玩家，离开兴趣范围的玩家会出现在removed中
+                    history = self.snapshot_history[base]
+                    baseline = {pid: history[pid] for pid in base_view if pid in history}
+                message = {
+                    'type': 'player_delta',
+                    'data': net_codec.build_player_delta(seq, base, baseline, current)
+                }
+            packets = self._encode(message, codec)
+            for addr in addrs:
+                self._queue_packets(addr, packets)
 
     def check_player_respawns(self, current_time):
         """检查并处理玩家复活（仅服务端）"""
@@ -2249,6 +2809,7 @@ class NetworkManager:
     
     def stop(self):
         self.running = False
+        self.net_loop.stop()
         try:
             self.socket.close()
         except:
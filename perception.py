@@ -0,0 +1,191 @@
+"""
+AI感知快照模块
+
+每个服务端AI tick只计算一次全体玩家之间的感知关系，所有AI的行为树从同一份快照读取，
+替代每个AI各自重建敌人/队友列表、每个条件节点各自过滤队友并逐个构造Vector2算距离的做法。
+
+快照内容（按玩家下标排列的 NumPy 数组，均为只读）:
+    distance: (N, N) 两两距离
+    teammate: (N, N) 队友关系（与EnhancedAIPlayer.update的判定规则一致）
+    los: (N, N) los[i, j] 表示观察者i能看到玩家j，只计算观察者（AI）到 SIGHT_RANGE 内存活玩家的线对，
+         先批量查视线预计算表，只有表无法确定的线对才做精确检测；
+         按行懒计算，观察者第一次取视图时才计算自己的一行
+    audible: (N, N) audible[i, j] 表示观察者i能听到玩家j发出的声音
+
+每个AI通过 view(ai_id) 取得自己的只读视图（PerceptionView），放到行为树黑板的 'perception' 中。
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+from los_table import LOS_BLOCKED, LOS_CLEAR
+
+SIGHT_RANGE = 400  # 行为树视线检测的最大范围（激进型AI的HasEnemyInSight）
+
+
+def _exact_line_of_sight(start, end, spatial):
+    """与EnhancedAIPlayer.has_line_of_sight一致的精确检测（墙壁和未打开的门）"""
+    walls, doors = spatial.segment_candidates(start, end)
+    for wall in walls:
+        if wall.clipline(start, end):
+            return False
+    for door in doors:
+        if not door.is_open and door.rect.clipline(start, end):
+            return False
+    return True
+
+
+def _readonly(array):
+    array.flags.writeable = False
+    return array
+
+
+class PerceptionSnapshot:
+    """一个AI tick内共享的感知快照"""
+
+    def __init__(self, players: Dict, game_map, team_manager=None, observers: Optional[Dict] = None,
+                 sight_range=SIGHT_RANGE):
+        """
+        Args:
+            players: {玩家ID: 玩家数据dict}（update_ai_players准备的players_data）
+            game_map: 游戏地图
+            team_manager: 团队管理器（可选，为None时所有其他玩家都视为敌人）
+            observers: {AI玩家ID: AI玩家对象}，只为这些玩家计算视线和听觉
+            sight_range: 视线矩阵的计算范围
+        """
+        observers = observers or {}
+        self.ids = list(players.keys())
+        self.index = {pid: i for i, pid in enumerate(self.ids)}
+        self.records = [self._record(pid, pdata) for pid, pdata in players.items()]
+        n = len(self.ids)
+
+        pos = np.array([record["pos"] for record in self.records], dtype=np.float64).reshape(n, 2)
+        self.pos = _readonly(pos)
+        self.alive = _readonly(np.array([not r["is_dead"] for r in self.records], dtype=bool))
+        self.making_sound = _readonly(np.array([bool(r["is_making_sound"]) for r in self.records], dtype=bool))
+
+        delta = pos[:, None, :] - pos[None, :, :]
+        self.distance = _readonly(np.sqrt((delta * delta).sum(axis=2)))
+
+        self.teammate = _readonly(self._team_matrix(team_manager, observers))
+        self.audible = _readonly(self._audible_matrix(observers))
+
+        # 视线矩阵按行懒计算：只有真正执行决策的AI（取视图时）才计算自己的一行
+        self.game_map = game_map
+        self.sight_range = sight_range
+        self._los = np.zeros((n, n), dtype=bool)
+        self._los_done = np.zeros(n, dtype=bool)
+        self.los = _readonly(self._los.view())
+
+    @staticmethod
+    def _record(pid, pdata):
+        """与EnhancedAIPlayer.update中构造的玩家数据相同"""
+        return {
+            "id": pid,
+            "pos": pdata.get("pos", [0, 0]),
+            "angle": pdata.get("angle", 0),
+            "health": pdata.get("health", 100),
+            "is_dead": pdata.get("is_dead", False),
+            "shooting": pdata.get("shooting", False),
+            "is_reloading": pdata.get("is_reloading", False),
+            "is_walking": pdata.get("is_walking", False),
+            "is_making_sound": pdata.get("is_making_sound", False),
+            "sound_volume": pdata.get("sound_volume", 0.0),
+            "team_id": pdata.get("team_id", None),
+        }
+
+    def _team_matrix(self, team_manager, observers):
+        """队友关系：团队管理器判定为队友，或观察者自身team_id与对方team_id相同"""
+        n = len(self.ids)
+        if not team_manager:
+            return np.zeros((n, n), dtype=bool)
+
+        manager_team = np.full(n, -1, dtype=np.int64)
+        for i, pid in enumerate(self.ids):
+            team = team_manager.get_player_team_id(pid)
+            if team is not None:
+                manager_team[i] = team
+        matrix = (manager_team[:, None] == manager_team[None, :]) & (manager_team[:, None] >= 0)
+
+        # 观察者一行使用AI对象的team_id，其他玩家使用玩家数据中的team_id
+        team_ids = [record["team_id"] for record in self.records]
+        for pid, ai_player in observers.items():
+            if pid in self.index:
+                team_ids[self.index[pid]] = getattr(ai_player, "team_id", None)
+        codes = {}
+        team_codes = np.array([-1 if t is None else codes.setdefault(t, len(codes)) for t in team_ids],
+                              dtype=np.int64).reshape(n)
+        matrix |= (team_codes[:, None] == team_codes[None, :]) & (team_codes[:, None] >= 0)
+        np.fill_diagonal(matrix, False)
+        return matrix
+
+    def los_row(self, i):
+        """
+        观察者i到视线范围内存活玩家的视线（一行）
+
+        按观察者->目标方向检测（精确检测的取整与方向有关），同一tick内只计算一次
+        """
+        if self._los_done[i]:
+            return self.los[i]
+        self._los_done[i] = True
+
+        cols = np.flatnonzero(self.alive & (self.distance[i] <= self.sight_range))
+        cols = cols[cols != i]
+        if len(cols):
+            start = np.broadcast_to(self.pos[i], (len(cols), 2))
+            states = self.game_map.los_table.classify_many(start, self.pos[cols])
+            visible = states == LOS_CLEAR
+            origin = self.pos[i].tolist()
+            for k in np.flatnonzero((states != LOS_CLEAR) & (states != LOS_BLOCKED)):
+                visible[k] = _exact_line_of_sight(origin, self.pos[cols[k]].tolist(), self.game_map.spatial)
+            self._los[i, cols] = visible
+        return self.los[i]
+
+    def _audible_matrix(self, observers):
+        """观察者在听觉范围内能听到的发声玩家"""
+        n = len(self.ids)
+        hearing = np.zeros(n)
+        for pid, ai_player in observers.items():
+            if pid in self.index:
+                hearing[self.index[pid]] = getattr(ai_player, "sound_detection_range", 0)
+        audible = (self.making_sound & self.alive)[None, :] & (self.distance <= hearing[:, None])
+        np.fill_diagonal(audible, False)
+        return audible
+
+    def view(self, pid) -> Optional["PerceptionView"]:
+        """指定AI的只读视图，玩家不在快照中时返回None"""
+        index = self.index.get(pid)
+        if index is None:
+            return None
+        return PerceptionView(self, index)
+
+
+class PerceptionView:
+    """单个AI看到的感知快照（敌人/队友按玩家顺序排列）"""
+
+    def __init__(self, snapshot: PerceptionSnapshot, index: int):
+        self.snapshot = snapshot
+        self.index = index
+        others = np.ones(len(snapshot.ids), dtype=bool)
+        others[index] = False
+        teammate = snapshot.teammate[index]
+        self.enemy_indices = np.flatnonzero(others & ~teammate)
+        self.ally_indices = np.flatnonzero(others & teammate)
+        self.enemies = [snapshot.records[i] for i in self.enemy_indices]
+        self.allies = [snapshot.records[i] for i in self.ally_indices]
+        self.distances = snapshot.distance[index]
+        self.line_of_sight = snapshot.los_row(index)
+        self.audible = snapshot.audible[index]
+
+    def alive_enemies(self):
+        """存活敌人的下标（按玩家顺序）"""
+        return self.enemy_indices[self.snapshot.alive[self.enemy_indices]]
+
+    def alive_allies(self):
+        """存活队友的下标（按玩家顺序）"""
+        return self.ally_indices[self.snapshot.alive[self.ally_indices]]
+
+    def record(self, i):
+        """下标对应的玩家数据"""
+        return self.snapshot.records[i]
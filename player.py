@@ -361,6 +361,72 @@ class Player:
         
         return spread
 
+    def max_move_speed(self, now):
+        """当前的移动速度上限（瞄准、静步和速度提升）"""
+        speed = PLAYER_SPEED
+        if self.is_aiming:
+            speed *= AIMING_SPEED_MULTIPLIER
+        if self.is_walking:
+            speed *= self.walk_speed_multiplier  # 静步速度
+        if now < self.speed_boost_end_time:
+            speed *= self.speed_boost_multiplier  # 速度提升效果
+        return speed
+
+    def apply_move_input(self, move_x, move_y, dt, now):
+        """按方向输入更新速度：有输入时加速，无输入时摩擦减速，并限制最大速度"""
+        max_speed = self.max_move_speed(now)
+        move_dir = pygame.Vector2(move_x, move_y)
+        if move_dir.length() > 0:
+            self.velocity += move_dir.normalize() * max_speed * dt * 5
+        else:
+            self.velocity *= 0.9
+        if self.velocity.length() > max_speed:
+            self.velocity = self.velocity.normalize() * max_speed
+
+    def move(self, dt, game_map, now):
+        """按速度移动一步，处理被击中减速和墙壁/门碰撞（客户端预测回放与服务端执行输入共用）"""
+        # 检查是否处于被击中减速状态
+        is_slowed = now < self.hit_slowdown_end_time
+        
+        # 计算实际速度
+        actual_velocity = pygame.Vector2(self.velocity)
+        if is_slowed:
+            actual_velocity *= HIT_SLOWDOWN_FACTOR
+        
+        if actual_velocity.length() > 0 and not self.is_respawning and not self.is_dead:
+            new_pos = self.pos + actual_velocity * dt
+            player_rect = pygame.Rect(
+                new_pos.x - PLAYER_RADIUS,
+                new_pos.y - PLAYER_RADIUS,
+                PLAYER_RADIUS * 2,
+                PLAYER_RADIUS * 2
+            )
+            
+            can_move = True
+            # 墙壁碰撞检测（只检查与新位置相交的墙壁和关闭的门）
+            for wall in game_map.spatial.walls_in_rect(player_rect):
+                if player_rect.colliderect(wall):
+                    can_move = False
+                    if wall.left < player_rect.left < wall.right or wall.left < player_rect.right < wall.right:
+                        self.velocity.x *= -0.5
+                    if wall.top < player_rect.top < wall.bottom or wall.top < player_rect.bottom < wall.bottom:
+                        self.velocity.y *= -0.5
+                    break
+                    
+            # 检查门碰撞
+            for door in game_map.spatial.doors_in_rect(player_rect):
+                if door.check_collision(player_rect):
+                    can_move = False
+                    if door.rect.left < player_rect.left < door.rect.right or door.rect.left < player_rect.right < door.rect.right:
+                        self.velocity.x *= -0.5
+                    if door.rect.top < player_rect.top < door.rect.bottom or door.rect.top < player_rect.bottom < door.rect.bottom:
+                        self.velocity.y *= -0.5
+                    break
+                    
+            if can_move:
+                self.pos = new_pos
+                self.position = self.pos  # 保持别名同步
+
     def update(self, dt, game_map, bullets, network_manager=None, all_players=None, chat_active=False):
         current_time = time.time()
         
@@ -381,6 +447,7 @@ class Player:
                 return
             
             # 只有在非聊天状态下才处理移动和攻击输入
+            move_input = (0, 0)
             if not chat_active:
                 # 鼠标控制旋转
                 mouse_x, mouse_y = pygame.mouse.get_pos()
@@ -430,53 +497,18 @@ class Player:
                     self.is_making_sound = False
                     self.sound_volume = 0.0
                 
-                if move_dir.length() > 0:
-                    # 计算移动速度（瞄准时减速）
-                    current_speed = PLAYER_SPEED
-                    
-                    # 检查是否有速度提升效果
-                    current_time = time.time()
-                    has_speed_boost = current_time < self.speed_boost_end_time
-                    
-                    # 应用各种速度修饰符
-                    if self.is_aiming:
-                        current_speed *= AIMING_SPEED_MULTIPLIER
-                    if self.is_walking:
-                        current_speed *= self.walk_speed_multiplier  # 静步速度
-                    if has_speed_boost:
-                        current_speed *= self.speed_boost_multiplier  # 速度提升效果
-                        
-                        # 如果速度提升即将结束，发送提示
-                        remaining_time = self.speed_boost_end_time - current_time
-                        if remaining_time < 1.0 and hasattr(self, 'last_speed_warning_time') and current_time - self.last_speed_warning_time > 1.0:
-                            self.last_speed_warning_time = current_time
-                            # 尝试发送系统消息
-                            network_manager_obj = network_manager
-                            if network_manager_obj and hasattr(network_manager_obj, '_send_system_message'):
-                                network_manager_obj._send_system_message(f"速度提升效果即将结束: {remaining_time:.1f}秒")
-                    
-                    move_dir = move_dir.normalize() * current_speed
-                    self.velocity += move_dir * dt * 5
-                else:
-                    self.velocity *= 0.9
-                    
-                # 限制最大速度
-                max_speed = PLAYER_SPEED
-                
-                # 检查是否有速度提升效果
-                current_time = time.time()
-                has_speed_boost = current_time < self.speed_boost_end_time
+                # 如果速度提升即将结束，发送提示
+                if move_dir.length() > 0 and current_time < self.speed_boost_end_time:
+                    remaining_time = self.speed_boost_end_time - current_time
+                    if remaining_time < 1.0 and hasattr(self, 'last_speed_warning_time') and current_time - self.last_speed_warning_time > 1.0:
+                        self.last_speed_warning_time = current_time
+                        # 尝试发送系统消息
+                        network_manager_obj = network_manager
+                        if network_manager_obj and hasattr(network_manager_obj, '_send_system_message'):
+                            network_manager_obj._send_system_message(f"速度提升效果即将结束: {remaining_time:.1f}秒")
                 
-                # 应用各种速度修饰符
-                if self.is_aiming:
-                    max_speed *= AIMING_SPEED_MULTIPLIER
-                if self.is_walking:
-                    max_speed *= self.walk_speed_multiplier  # 静步速度上限
-                if has_speed_boost:
-                    max_speed *= self.speed_boost_multiplier  # 速度提升效果
-                    
-                if self.velocity.length() > max_speed:
-                    self.velocity = self.velocity.normalize() * max_speed
+                move_input = (int(move_dir.x), int(move_dir.y))
+                self.apply_move_input(move_input[0], move_input[1], dt, current_time)
 
 
                 # 左键攻击控制（根据武器类型）
@@ -527,11 +559,15 @@ class Player:
                     self.is_reloading = False
             else:
                 # 聊天状态下，停止移动，但保持摩擦力
-                self.velocity *= 0.9
+                self.apply_move_input(0, 0, dt, current_time)
                 self.shooting = False
                 self.is_making_sound = False
                 self.sound_volume = 0.0
 
+            # 客户端预测：把本帧的移动输入发给服务端，由服务端执行移动并回送确认
+            if not network_manager.is_server:
+                network_manager.send_move_input(move_input, dt, self.is_walking, self.is_aiming)
+
             # 即使在聊天时，物理检测（如近战）也允许完成
             if self.melee_weapon.is_attacking:
                 # 检查近战攻击是否击中目标
@@ -579,49 +615,9 @@ class Player:
                         is_heavy=self.melee_weapon.is_heavy_attack  # 传递是否为重击
                     )
         
-        # 检查是否处于被击中减速状态（所有玩家）
+        # 按速度移动（所有玩家）
         current_time = time.time()
-        is_slowed = current_time < self.hit_slowdown_end_time
-        
-        # 计算实际速度
-        actual_velocity = pygame.Vector2(self.velocity)
-        if is_slowed:
-            actual_velocity *= HIT_SLOWDOWN_FACTOR
-        
-        # 更新位置（所有玩家）
-        if actual_velocity.length() > 0 and not self.is_respawning and not self.is_dead:
-            new_pos = self.pos + actual_velocity * dt
-            player_rect = pygame.Rect(
-                new_pos.x - PLAYER_RADIUS,
-                new_pos.y - PLAYER_RADIUS,
-                PLAYER_RADIUS * 2,
-                PLAYER_RADIUS * 2
-            )
-            
-            can_move = True
-            # 墙壁碰撞检测
-            for wall in game_map.walls:
-                if player_rect.colliderect(wall):
-                    can_move = False
-                    if wall.left < player_rect.left < wall.right or wall.left < player_rect.right < wall.right:
-                        self.velocity.x *= -0.5
-                    if wall.top < player_rect.top < wall.bottom or wall.top < player_rect.bottom < wall.bottom:
-                        self.velocity.y *= -0.5
-                    break
-                    
-            # 检查门碰撞
-            for door in game_map.doors:
-                if door.check_collision(player_rect):
-                    can_move = False
-                    if door.rect.left < player_rect.left < door.rect.right or door.rect.left < player_rect.right < door.rect.right:
-                        self.velocity.x *= -0.5
-                    if door.rect.top < player_rect.top < door.rect.bottom or door.rect.top < player_rect.bottom < door.rect.bottom:
-                        self.velocity.y *= -0.5
-                    break
-                    
-            if can_move:
-                self.pos = new_pos
-                self.position = self.pos  # 保持别名同步
+        self.move(dt, game_map, current_time)
 
         # 门交互检测（只有本地玩家）
         if (is_local_player and not self.is_dead and not self.is_respawning):
@@ -747,8 +743,8 @@ class Player:
         
         return False
 
-    def draw(self, surface, camera_offset, player_pos=None, player_angle=None, walls=None, doors=None, is_local_player=False, is_aiming=False, team_manager=None, local_player_id=None):
-        """绘制玩家（考虑视线遮挡和团队共享视野）"""
+    def draw(self, surface, camera_offset, player_pos=None, player_angle=None, walls=None, doors=None, is_local_player=False, is_aiming=False, team_manager=None, local_player_id=None, spatial_index=None, los_table=None):
+        """绘制玩家（考虑视线遮挡和团队共享视野，spatial_index/los_table为地图空间索引和视线表，用于视线检测）"""
         player_screen_pos = pygame.Vector2(
             self.pos.x - camera_offset.x,
             self.pos.y - camera_offset.y
@@ -767,7 +763,8 @@ class Player:
                 from utils import is_visible
                 # 根据瞄准状态选择视野角度
                 current_fov = 30 if is_aiming else 120
-                if not is_visible(player_pos, player_angle, self.pos, current_fov, walls, doors):
+                if not is_visible(player_pos, player_angle, self.pos, current_fov, walls, doors,
+                                  spatial_index=spatial_index, los_table=los_table):
                     return  # 不可见，不绘制
         
         if self.is_dead:
@@ -0,0 +1,139 @@
+"""
+客户端预测与服务端校正模块
+
+客户端每帧的移动输入带递增序号发给服务端，同时立即在本地执行（预测），不必等待往返；
+服务端按序号执行输入（Player.apply_move_input + Player.move，与客户端同一套移动和碰撞代码），
+成为移动的权威，并随快照回送每个客户端最后执行的输入序号及执行后的位置和速度。
+
+服务端只接受每包最多 INPUT_REDUNDANCY 条输入，并按会话限制移动时间：
+累计执行的dt不超过真实经过的时间加 INPUT_TIME_ALLOWANCE，超出预算的输入暂不执行，
+防止客户端一次发送大量输入瞬移。
+
+客户端收到回送后丢弃已确认的输入，把本地玩家重置为服务端状态，
+再按顺序回放尚未确认的输入，得到校正后的当前位置（服务端与客户端一致时回放结果不变）。
+
+输入条目: (序号, dt, 方向x, 方向y, 标志位)，方向为 -1/0/1，标志位见 FLAG_*。
+"""
+
+import math
+from collections import deque
+from typing import Dict, List, Tuple
+
+FLAG_WALKING = 1  # 静步
+FLAG_AIMING = 2  # 瞄准
+
+MAX_INPUT_DT = 0.1  # 单条输入的最大时长（秒），防止客户端用超长dt加速移动
+INPUT_REDUNDANCY = 4  # 每个输入包携带的最近未确认输入数（丢包时由后续包补发）
+MAX_PENDING_INPUTS = 256  # 客户端最多保存的未确认输入
+INPUT_TIME_ALLOWANCE = 0.25  # 服务端移动时间预算的上限（秒），容许网络抖动造成的输入集中到达
+
+
+def make_flags(walking, aiming) -> int:
+    return (FLAG_WALKING if walking else 0) | (FLAG_AIMING if aiming else 0)
+
+
+def apply_input(player, entry, game_map, now):
+    """在玩家对象上执行一条输入（服务端执行与客户端回放共用）"""
+    _, dt, move_x, move_y, flags = entry
+    dt = min(max(float(dt), 0.0), MAX_INPUT_DT)
+    player.is_walking = bool(flags & FLAG_WALKING)
+    player.is_aiming = bool(flags & FLAG_AIMING)
+    player.apply_move_input(move_x, move_y, dt, now)
+    player.move(dt, game_map, now)
+
+
+class InputPredictor:
+    """客户端的输入记录与校正"""
+
+    def __init__(self):
+        self.next_seq = 1
+        self.pending = deque(maxlen=MAX_PENDING_INPUTS)  # 未确认的输入条目
+        self.acked_seq = 0  # 服务端最后执行的输入序号
+        self.last_correction = 0.0  # 最近一次校正的位置偏差（单位）
+
+    def record(self, move_input, dt, walking, aiming) -> Tuple:
+        """记录本帧输入并分配序号"""
+        entry = (self.next_seq, dt, int(move_input[0]), int(move_input[1]), make_flags(walking, aiming))
+        self.next_seq += 1
+        self.pending.append(entry)
+        return entry
+
+    def outgoing(self) -> Dict:
+        """本帧发给服务端的输入消息（携带最近的几条未确认输入）"""
+        return {'type': 'player_input', 'data': {'inputs': list(self.pending)[-INPUT_REDUNDANCY:]}}
+
+    def reconcile(self, player, game_map, ack, now) -> bool:
+        """
+        按服务端回送校正本地玩家
+
+        Args:
+            player: 本地玩家对象
+            game_map: 地图（碰撞检测）
+            ack: {'seq': 最后执行的输入序号, 'pos': [x, y], 'vel': [vx, vy]}
+            now: 当前时间
+
+        Returns:
+            bool: 是否执行了校正（乱序到达的旧回送会被忽略）
+        """
+        seq = ack.get('seq')
+        if not isinstance(seq, int) or seq < self.acked_seq:
+            return False
+        self.acked_seq = seq
+        while self.pending and self.pending[0][0] <= seq:
+            self.pending.popleft()
+
+        predicted = (player.pos.x, player.pos.y)
+        walking, aiming = player.is_walking, player.is_aiming
+        player.pos.update(ack['pos'])
+        player.velocity.update(ack['vel'])
+        for entry in self.pending:
+            apply_input(player, entry, game_map, now)
+        player.is_walking, player.is_aiming = walking, aiming
+        self.last_correction = player.pos.distance_to(predicted)
+        return True
+
+
+class InputBudget:
+    """服务端单个客户端的移动时间预算（令牌桶：按真实时间累积，上限 INPUT_TIME_ALLOWANCE）"""
+
+    def __init__(self, now):
+        self.available = INPUT_TIME_ALLOWANCE
+        self.updated = now
+
+    def take(self, entries, now) -> List[Tuple]:
+        """按顺序取出预算内的输入，超出预算的输入及其后的输入不执行（客户端会在后续包中补发）"""
+        self.available = min(self.available + max(now - self.updated, 0.0), INPUT_TIME_ALLOWANCE)
+        self.updated = now
+        accepted = []
+        for entry in entries:
+            if entry[1] > self.available:
+                break
+            self.available -= entry[1]
+            accepted.append(entry)
+        return accepted
+
+
+def new_inputs(entries, seq) -> List[Tuple]:
+    """
+    客户端发来的输入中序号大于seq的条目（服务端跳过已执行的重复输入，丢弃格式错误的条目）
+
+    方向分量限制在 -1..1，dt限制在 0..MAX_INPUT_DT，按序号排序，同一序号只保留第一条。
+    条目数超过 INPUT_REDUNDANCY 的包整体丢弃（正常客户端不会发送）。
+    """
+    result = {}
+    if not isinstance(entries, list) or len(entries) > INPUT_REDUNDANCY:
+        return []
+    for entry in entries:
+        try:
+            entry_seq, dt, move_x, move_y, flags = entry
+            entry_seq = int(entry_seq)
+            if entry_seq <= seq or entry_seq in result:
+                continue
+            dt = float(dt)
+            if not math.isfinite(dt):
+                continue
+            result[entry_seq] = (entry_seq, min(max(dt, 0.0), MAX_INPUT_DT), max(-1, min(1, int(move_x))),
+                                 max(-1, min(1, int(move_y))), int(flags))
+        except (TypeError, ValueError, OverflowError):
+            continue
+    return [result[entry_seq] for entry_seq in sorted(result)]
@@ -0,0 +1,96 @@
+"""
+服务端固定步长时钟
+
+服务端模拟（移动、子弹、手雷、AI、复活、广播）以固定频率推进，与渲染帧率解耦。
+渲染循环每帧调用 advance() 取得本帧需要补跑的tick数，慢帧之后通过累加器追帧，
+单帧追帧数有上限，避免模拟耗时超过tick间隔时越积越多。
+"""
+
+import time
+
+from constants import (
+    SERVER_TICK_RATE, SERVER_BROADCAST_RATE, SERVER_AI_RATE, SERVER_MAX_CATCHUP_TICKS
+)
+
+
+class FixedTickClock:
+    """基于累加器的固定步长时钟"""
+
+    def __init__(self, tick_rate=SERVER_TICK_RATE, max_catchup_ticks=SERVER_MAX_CATCHUP_TICKS,
+                 broadcast_rate=SERVER_BROADCAST_RATE, ai_rate=SERVER_AI_RATE):
+        """
+        Args:
+            tick_rate: 模拟频率（Hz）
+            max_catchup_ticks: 单次advance最多补跑的tick数
+            broadcast_rate: 状态广播频率（Hz），按tick整数倍分频
+            ai_rate: AI更新频率（Hz），按tick整数倍分频
+        """
+        self.tick_rate = max(1, int(tick_rate))
+        self.tick_interval = 1.0 / self.tick_rate
+        self.max_catchup_ticks = max(1, int(max_catchup_ticks))
+        self.broadcast_every = self._divisor(broadcast_rate)
+        self.ai_every = self._divisor(ai_rate)
+        self.tick_count = 0
+        self.accumulator = 0.0
+        self.dropped_time = 0.0  # 超出追帧上限被丢弃的累计时间
+        self.last_time = None
+
+    def _divisor(self, rate):
+        if not rate or rate <= 0:
+            return 1
+        return max(1, int(round(self.tick_rate / rate)))
+
+    def advance(self, now=None):
+        """
+        推进时钟
+
+        Args:
+            now: 当前单调时间，缺省使用time.perf_counter()
+
+        Returns:
+            本次需要执行的tick数
+        """
+        if now is None:
+            now = time.perf_counter()
+        if self.last_time is None:
+            self.last_time = now
+            return 0
+
+        self.accumulator += max(0.0, now - self.last_time)
+        self.last_time = now
+
+        ticks = int(self.accumulator / self.tick_interval)
+        if ticks > self.max_catchup_ticks:
+            # 追帧上限：丢弃无法追上的时间，保证下一帧能恢复正常节奏
+            self.dropped_time += (ticks - self.max_catchup_ticks) * self.tick_interval
+            self.accumulator -= (ticks - self.max_catchup_ticks) * self.tick_interval
+            ticks = self.max_catchup_ticks
+        self.accumulator -= ticks * self.tick_interval
+        return ticks
+
+    def begin_tick(self):
+        """开始一个新的tick，返回tick序号"""
+        self.tick_count += 1
+        return self.tick_count
+
+    def is_broadcast_tick(self):
+        """当前tick是否需要广播状态"""
+        return self.tick_count % self.broadcast_every == 0
+
+    def is_ai_tick(self):
+        """当前tick是否需要更新AI"""
+        return self.tick_count % self.ai_every == 0
+
+    @property
+    def ai_interval(self):
+        """AI两次更新之间的模拟时间"""
+        return self.ai_every * self.tick_interval
+
+    def time_until_next_tick(self):
+        """距离下一个tick到期的时间（秒）"""
+        return max(0.0, self.tick_interval - self.accumulator)
+
+    @property
+    def alpha(self):
+        """当前时间在两个tick之间的插值系数（0~1）"""
+        return self.accumulator / self.tick_interval
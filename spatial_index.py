@@ -0,0 +1,283 @@
+"""
+空间索引模块
+
+均匀网格空间哈希，把墙壁、门、玩家和道具按格子分桶，
+替代热点路径上对 game_map.walls / game_map.doors 的线性遍历。
+
+提供的查询:
+    - 矩形查询: 与给定矩形相交的条目（精确）
+    - 半径查询: 与给定圆相交的条目（精确）
+    - 线段查询: 线段经过的格子中的候选条目（调用方自行做精确相交测试，
+      保证各处原有的线段-矩形判定语义不变）
+
+门在开关动画中会改变矩形，Map 在每次门更新后调用 sync_door()，
+只有矩形或开关状态变化的门才会重新分桶。
+"""
+
+import math
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+import pygame
+
+from constants import PLAYER_RADIUS, SPATIAL_CELL_SIZE
+
+
+class SpatialHash:
+    """均匀网格空间哈希（条目以矩形表示）"""
+
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], Set[Hashable]] = {}
+        self.rects: Dict[Hashable, pygame.Rect] = {}
+        self._cell_ranges: Dict[Hashable, Tuple[int, int, int, int]] = {}
+
+    def __len__(self):
+        return len(self.rects)
+
+    def __contains__(self, key):
+        return key in self.rects
+
+    def _cell_range(self, rect):
+        # 右/下边界按闭区间处理，恰好贴在格子边界上的矩形同时落入两侧格子
+        cs = self.cell_size
+        return (int(rect.left // cs), int(rect.top // cs),
+                int(rect.right // cs), int(rect.bottom // cs))
+
+    def insert(self, key, rect):
+        """插入条目（已存在时等同于update）"""
+        if key in self.rects:
+            self.update(key, rect)
+            return
+        rect = pygame.Rect(rect)
+        cell_range = self._cell_range(rect)
+        self.rects[key] = rect
+        self._cell_ranges[key] = cell_range
+        x0, y0, x1, y1 = cell_range
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells.setdefault((cx, cy), set()).add(key)
+
+    def remove(self, key):
+        """移除条目"""
+        if key not in self.rects:
+            return
+        del self.rects[key]
+        x0, y0, x1, y1 = self._cell_ranges.pop(key)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self.cells[(cx, cy)]
+
+    def update(self, key, rect):
+        """更新条目矩形，覆盖的格子不变时不重新分桶"""
+        if key not in self.rects:
+            self.insert(key, rect)
+            return
+        rect = pygame.Rect(rect)
+        if self._cell_range(rect) == self._cell_ranges[key]:
+            self.rects[key] = rect
+            return
+        self.remove(key)
+        self.insert(key, rect)
+
+    def clear(self):
+        self.cells.clear()
+        self.rects.clear()
+        self._cell_ranges.clear()
+
+    def _keys_in_cells(self, x0, y0, x1, y1) -> Set[Hashable]:
+        found = set()
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        return found
+
+    def query_rect(self, rect) -> List[Hashable]:
+        """与矩形相交的条目"""
+        rect = pygame.Rect(rect)
+        keys = self._keys_in_cells(*self._cell_range(rect))
+        return [key for key in keys if self.rects[key].colliderect(rect)]
+
+    def query_radius(self, center, radius) -> List[Hashable]:
+        """与圆相交的条目"""
+        cx, cy = center[0], center[1]
+        cs = self.cell_size
+        keys = self._keys_in_cells(int((cx - radius) // cs), int((cy - radius) // cs),
+                                   int((cx + radius) // cs), int((cy + radius) // cs))
+        radius_sq = radius * radius
+        result = []
+        for key in keys:
+            rect = self.rects[key]
+            dx = cx - max(rect.left, min(cx, rect.right))
+            dy = cy - max(rect.top, min(cy, rect.bottom))
+            if dx * dx + dy * dy <= radius_sq:
+                result.append(key)
+        return result
+
+    def segment_cells(self, start, end) -> Iterable[Tuple[int, int]]:
+        """线段经过的格子（Amanatides-Woo 网格遍历）"""
+        cs = self.cell_size
+        x0, y0 = float(start[0]), float(start[1])
+        x1, y1 = float(end[0]), float(end[1])
+        cx, cy = int(x0 // cs), int(y0 // cs)
+        end_cx, end_cy = int(x1 // cs), int(y1 // cs)
+        dx, dy = x1 - x0, y1 - y0
+
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        t_max_x = ((cx + (dx > 0)) * cs - x0) / dx if dx else math.inf
+        t_max_y = ((cy + (dy > 0)) * cs - y0) / dy if dy else math.inf
+        t_delta_x = cs / abs(dx) if dx else math.inf
+        t_delta_y = cs / abs(dy) if dy else math.inf
+
+        yield cx, cy
+        remaining = abs(end_cx - cx) + abs(end_cy - cy)
+        while remaining > 0:
+            if t_max_x < t_max_y:
+                cx += step_x
+                t_max_x += t_delta_x
+                remaining -= 1
+            elif t_max_y < t_max_x:
+                cy += step_y
+                t_max_y += t_delta_y
+                remaining -= 1
+            else:
+                # 恰好穿过格点时两侧相邻格子也算经过，避免漏掉贴着格点的矩形
+                yield cx + step_x, cy
+                yield cx, cy + step_y
+                cx += step_x
+                cy += step_y
+                t_max_x += t_delta_x
+                t_max_y += t_delta_y
+                remaining -= 2
+            yield cx, cy
+
+    def query_segment(self, start, end) -> Set[Hashable]:
+        """线段经过格子中的候选条目（未做精确相交测试）"""
+        found = set()
+        for cell in self.segment_cells(start, end):
+            bucket = self.cells.get(cell)
+            if bucket:
+                found.update(bucket)
+        return found
+
+
+class MapSpatialIndex:
+    """
+    地图空间索引
+
+    静态墙壁、关闭（含动画中）的门、玩家和道具各占一层。
+    门层只包含会阻挡移动和视线的门（即 not door.is_open），与 Door.check_collision 一致。
+    """
+
+    def __init__(self, walls, doors, cell_size=SPATIAL_CELL_SIZE):
+        self.walls = walls
+        self.doors = doors
+        self.wall_hash = SpatialHash(cell_size)
+        self.door_hash = SpatialHash(cell_size)
+        self.player_hash = SpatialHash(cell_size)
+        self.item_hash = SpatialHash(cell_size)
+        self._door_states = {}
+        self.version = 0  # 门层变化时递增
+
+        for index, wall in enumerate(walls):
+            self.wall_hash.insert(index, wall)
+        for index in range(len(doors)):
+            self.sync_door(index)
+
+    # ------------------------------------------------------------------
+    # 门（增量更新）
+    # ------------------------------------------------------------------
+
+    def sync_door(self, index):
+        """门状态或矩形变化后更新门层，返回是否发生变化"""
+        door = self.doors[index]
+        state = (door.rect.x, door.rect.y, door.rect.width, door.rect.height, door.is_open)
+        if self._door_states.get(index) == state:
+            return False
+        self._door_states[index] = state
+        if door.is_open:
+            self.door_hash.remove(index)
+        else:
+            self.door_hash.update(index, door.rect)
+        self.version += 1
+        return True
+
+    # ------------------------------------------------------------------
+    # 墙壁与门查询
+    # ------------------------------------------------------------------
+
+    def walls_in_rect(self, rect) -> List[pygame.Rect]:
+        """与矩形相交的墙壁（按生成顺序）"""
+        return [self.walls[i] for i in sorted(self.wall_hash.query_rect(rect))]
+
+    def doors_in_rect(self, rect) -> list:
+        """与矩形相交的阻挡门（按生成顺序）"""
+        return [self.doors[i] for i in sorted(self.door_hash.query_rect(rect))]
+
+    def rect_blocked(self, rect) -> bool:
+        """矩形是否与墙壁或关闭的门相交"""
+        return bool(self.wall_hash.query_rect(rect) or self.door_hash.query_rect(rect))
+
+    def segment_candidates(self, start, end) -> Tuple[List[pygame.Rect], list]:
+        """线段附近的候选墙壁和阻挡门（调用方做精确相交测试）"""
+        walls = [self.walls[i] for i in sorted(self.wall_hash.query_segment(start, end))]
+        doors = [self.doors[i] for i in sorted(self.door_hash.query_segment(start, end))]
+        return walls, doors
+
+    def bbox_candidates(self, start, end) -> Tuple[List[pygame.Rect], list]:
+        """与线段包围盒（含边界）相交的墙壁和阻挡门，用于基于包围盒的粗略视线判定"""
+        left, right = min(start[0], end[0]), max(start[0], end[0])
+        top, bottom = min(start[1], end[1]), max(start[1], end[1])
+        # 外扩1像素，使贴边的矩形也能作为候选
+        bbox = pygame.Rect(int(left) - 1, int(top) - 1, int(right - left) + 3, int(bottom - top) + 3)
+        walls = [self.walls[i] for i in sorted(self.wall_hash.query_rect(bbox))]
+        doors = [self.doors[i] for i in sorted(self.door_hash.query_rect(bbox))]
+        return walls, doors
+
+    # ------------------------------------------------------------------
+    # 玩家与道具
+    # ------------------------------------------------------------------
+
+    def update_players(self, players):
+        """
+        同步玩家层
+
+        Args:
+            players: {player_id: 带pos属性的玩家对象}
+        """
+        for pid in [pid for pid in self.player_hash.rects if pid not in players]:
+            self.player_hash.remove(pid)
+        for pid, player in players.items():
+            self.player_hash.update(pid, (player.pos.x - PLAYER_RADIUS, player.pos.y - PLAYER_RADIUS,
+                                          PLAYER_RADIUS * 2, PLAYER_RADIUS * 2))
+
+    def players_in_rect(self, rect) -> List[Hashable]:
+        """碰撞盒与矩形相交的玩家ID"""
+        return self.player_hash.query_rect(rect)
+
+    def players_in_radius(self, center, radius) -> List[Hashable]:
+        """碰撞盒与圆相交的玩家ID"""
+        return self.player_hash.query_radius(center, radius)
+
+    def update_items(self, items):
+        """
+        同步道具层
+
+        Args:
+            items: {item_id: 带pos和RADIUS属性的道具对象}
+        """
+        for item_id in [i for i in self.item_hash.rects if i not in items]:
+            self.item_hash.remove(item_id)
+        for item_id, item in items.items():
+            radius = getattr(item, 'RADIUS', PLAYER_RADIUS)
+            self.item_hash.update(item_id, (item.pos.x - radius, item.pos.y - radius, radius * 2, radius * 2))
+
+    def items_in_radius(self, center, radius) -> List[Hashable]:
+        """碰撞盒与圆相交的道具ID"""
+        return self.item_hash.query_radius(center, radius)
@@ -120,12 +120,14 @@ def test_weapons_module():
         bullet = Bullet(bullet_data)
         log_test("子弹对象创建", bullet.pos.x == 100 and bullet.pos.y == 100)
         
-        # 测试子弹更新 - requires game_map and players
-        game_map = Map()
-        players = {}
-        old_x = bullet.pos.x
-        bullet.update(0.1, game_map, players)
-        log_test("子弹位置更新", bullet.pos.x != old_x)
+        # 测试子弹更新 - 子弹由BulletPool批量推进
+        import numpy as np
+        from bullet_pool import BulletPool, NO_TEAM
+        pool = BulletPool()
+        pool.sync([dict(bullet_data, owner=1)], speed=BULLET_SPEED)
+        no_players = np.empty(0, dtype=np.int64)
+        pool.step(0.1, np.empty((0, 4)), no_players, np.empty((0, 2)), no_players, np.array([NO_TEAM]))
+        log_test("子弹位置更新", abs(next(iter(pool)).pos.x - (100 + BULLET_SPEED * 0.1)) < 1e-6)
         
     except Exception as e:
         log_test("Weapons模块测试", False, str(e))
@@ -232,9 +234,822 @@ def test_network_module():
         log_test("网络管理器创建", network_mgr is not None)
         log_test("网络管理器属性", hasattr(network_mgr, 'is_server'))
         
+        # 客户端非阻塞套接字发送缓冲区满时丢包，不断开连接
+        class FullSocket:
+            def sendto(self, packet, addr):
+                raise BlockingIOError
+        network_mgr.socket = FullSocket()
+        network_mgr.server_address = "127.0.0.1"
+        network_mgr.connected = True
+        network_mgr.connection_error = None
+        network_mgr.send_data_raw({'type': 'chat_message', 'data': {'message': 'hi'}})
+        log_test("发送缓冲区满不断开连接", network_mgr.connected and not network_mgr.connection_error)
+        
     except Exception as e:
         log_test("Network模块测试", False, str(e))
 
+def test_net_loop_module():
+    """测试网络事件循环"""
+    print("\n=== 测试 Net Loop 模块 ===")
+    
+    try:
+        import socket
+        from net_loop import NetworkLoop
+        
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(("127.0.0.1", 0))
+        loop = NetworkLoop()
+        loop.start(server, lambda data, addr: loop.inbox.append((data, addr, time.time())))
+        ticks = []
+        loop.call_every(0.05, lambda: ticks.append(1) if len(ticks) < 3 else False)
+        
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for i in range(5):
+            client.sendto(b"packet%d" % i, server.getsockname())
+        loop.post(lambda: None)
+        deadline = time.time() + 2
+        while (len(loop.inbox) < 6 or len(ticks) < 3) and time.time() < deadline:
+            time.sleep(0.02)
+        received = [entry[0] for entry in loop.inbox if entry[1] is not None]
+        log_test("网络线程接收数据报", received == [b"packet%d" % i for i in range(5)])
+        log_test("网络定时器", len(ticks) == 3)
+        log_test("投递游戏线程任务", any(entry[1] is None for entry in loop.inbox))
+        
+        loop.stop()
+        client.close()
+        log_test("网络事件循环停止", not loop.thread.is_alive())
+        
+    except Exception as e:
+        log_test("Net Loop模块测试", False, str(e))
+
+# ============================================================================
+# 测试 6.1: 网络快照编解码测试
+# ============================================================================
+def test_net_codec_module():
+    """测试网络快照二进制编解码"""
+    print("\n=== 测试 Net Codec 模块 ===")
+    
+    try:
+        import net_codec
+        
+        now = time.time()
+        players = {
+            str(pid): {
+                'pos': [ROOM_SIZE * 1.5 + pid, ROOM_SIZE * 1.5],
+                'angle': 90,
+                'health': 75,
+                'ammo': MAGAZINE_SIZE,
+                'is_dead': False,
+                'respawn_time': now + RESPAWN_TIME,
+                'weapon_type': 'melee',
+                'name': f"玩家{pid}",
+                'team_id': 1,
+            } for pid in range(1, 121)
+        }
+        message = {'type': 'init_players', 'data': players}
+        
+        # 协商
+        log_test("编码协商-二进制", net_codec.choose_codec(
+            net_codec.supported_codecs(), net_codec.CODEC_VERSION) == net_codec.CODEC_BINARY)
+        log_test("编码协商-旧客户端回退JSON", net_codec.choose_codec(None, None) == net_codec.CODEC_JSON)
+        
+        # 二进制编码与拆包
+        packets = net_codec.encode_message(message, net_codec.CODEC_BINARY, now)
+        log_test("二进制快照不超过缓冲区", all(len(p) <= BUFFER_SIZE for p in packets))
+        log_test("二进制快照包标识", all(net_codec.is_binary_packet(p) for p in packets))
+        
+        decoded = [net_codec.decode_message(p) for p in packets]
+        merged = {}
+        for msg in decoded:
+            merged.update(msg['data'])
+        log_test("二进制快照首包类型", decoded[0]['type'] == 'init_players')
+        log_test("二进制快照玩家数量", len(merged) == len(players))
+        
+        pdata = merged['7']
+        log_test("二进制快照量化精度",
+                 abs(pdata['pos'][0] - players['7']['pos'][0]) <= 1 / net_codec.POS_SCALE
+                 and abs(pdata['angle'] - 90) < 0.01
+                 and abs(pdata['respawn_time'] - players['7']['respawn_time']) < 0.01)
+        log_test("二进制快照字段还原",
+                 pdata['name'] == "玩家7" and pdata['weapon_type'] == 'melee'
+                 and pdata['team_id'] == 1 and 'death_time' not in pdata)
+        
+        # JSON回退同样需要拆包
+        json_packets = net_codec.encode_message(message, net_codec.CODEC_JSON, now)
+        log_test("JSON快照不超过缓冲区", all(len(p) <= BUFFER_SIZE for p in json_packets))
+        
+        # 增量快照：只携带变化字段
+        current = net_codec.copy_players(players)
+        current['7']['pos'] = [current['7']['pos'][0] + 10, current['7']['pos'][1]]
+        current['8']['is_dead'] = True
+        del current['9']
+        delta = net_codec.build_player_delta(2, 1, players, current)
+        log_test("增量快照只包含变化玩家",
+                 set(delta['players']) == {'7', '8'} and delta['players']['8'] == {'is_dead': True}
+                 and delta['removed'] == ['9'])
+        
+        delta_packets = net_codec.encode_message({'type': 'player_delta', 'data': delta},
+                                                 net_codec.CODEC_BINARY, now)
+        full_packets = net_codec.encode_message({'type': 'player_update', 'data': current},
+                                                net_codec.CODEC_BINARY, now)
+        log_test("增量快照体积", sum(map(len, delta_packets)) * 20 < sum(map(len, full_packets)))
+        
+        decoded_delta = net_codec.decode_message(delta_packets[0])['data']
+        restored = net_codec.apply_player_delta(players, decoded_delta)
+        log_test("增量快照还原",
+                 len(restored) == len(current) and restored['8']['is_dead'] is True
+                 and abs(restored['7']['pos'][0] - current['7']['pos'][0]) <= 1 / net_codec.POS_SCALE)
+        
+        full = net_codec.build_player_delta(3, 0, None, current)
+        full_parts = net_codec.encode_message({'type': 'player_delta', 'data': full},
+                                              net_codec.CODEC_BINARY, now)
+        parts = [net_codec.decode_message(p)['data'] for p in full_parts]
+        log_test("完整增量快照分片",
+                 all(len(p) <= BUFFER_SIZE for p in full_parts)
+                 and all(part['parts'] == len(parts) for part in parts)
+                 and sum(len(part['players']) for part in parts) == len(current))
+        
+        # 合并包：按顺序合并小数据报，过大的数据报单独发送
+        small = [b'{"type": "heartbeat_response"}', delta_packets[0], b'{"type": "chat_message"}']
+        large = b'x' * 1500
+        bundles = net_codec.bundle_packets(small + [large] + small, 1200)
+        unpacked = []
+        for bundle in bundles:
+            unpacked.extend(net_codec.split_bundle(bundle) if net_codec.is_bundle(bundle) else [bundle])
+        log_test("合并包", len(bundles) == 3 and unpacked == small + [large] + small
+                 and all(len(b) <= 1200 for b in bundles if b is not large))
+        
+    except Exception as e:
+        log_test("Net Codec模块测试", False, str(e))
+
+def test_net_reliable_module():
+    """测试可靠有序通道"""
+    print("\n=== 测试 Net Reliable 模块 ===")
+    
+    try:
+        from net_reliable import ReliableChannel
+        
+        sender = ReliableChannel(rto_min=0.1, rto_max=2.0)
+        receiver = ReliableChannel()
+        now = 100.0
+        envelopes = [sender.wrap({'type': 'chat_message', 'data': {'n': i}}, now)['data'] for i in range(3)]
+        
+        # 乱序与重复到达：按序号顺序交付，重复的丢弃
+        delivered = receiver.receive(envelopes[1]['seq'], envelopes[1]['msg'])
+        delivered += receiver.receive(envelopes[0]['seq'], envelopes[0]['msg'])
+        delivered += receiver.receive(envelopes[0]['seq'], envelopes[0]['msg'])
+        log_test("可靠通道按序交付", [m['data']['n'] for m in delivered] == [0, 1])
+        
+        ack = receiver.take_ack()
+        log_test("可靠通道累计确认", ack == {'type': 'reliable_ack', 'data': {'ack': 2}}
+                 and receiver.take_ack() is None)
+        
+        # 未确认的消息超时后重发，已确认的不再重发
+        sender.on_ack(ack['data']['ack'], now + 0.05)
+        log_test("可靠通道RTT估计", sender.srtt is not None and sender.rto >= 0.1)
+        resent = sender.due(now + 5)
+        log_test("可靠通道超时重发", [e['data']['seq'] for e in resent] == [3] and list(sender.pending) == [3])
+        delivered = receiver.receive(resent[0]['data']['seq'], resent[0]['data']['msg'])
+        log_test("可靠通道重发后交付", [m['data']['n'] for m in delivered] == [2])
+        
+    except Exception as e:
+        log_test("Net Reliable模块测试", False, str(e))
+
+def test_prediction_module():
+    """测试客户端预测与服务端校正"""
+    print("\n=== 测试 Prediction 模块 ===")
+    
+    try:
+        from map import Map
+        from player import Player
+        from prediction import InputBudget, InputPredictor, apply_input, new_inputs, INPUT_REDUNDANCY
+        
+        game_map = Map()
+        start = (ROOM_SIZE * 1.5, ROOM_SIZE * 1.5)
+        client = Player(2, *start)
+        server = Player(2, *start)
+        predictor = InputPredictor()
+        now = time.time()
+        
+        # 客户端立即执行输入并发送，服务端按序号执行（重复的输入被跳过）
+        server_seq = 0
+        for i in range(30):
+            move = (1, 0) if i < 20 else (0, 1)
+            predictor.record(move, 1 / 60, False, False)
+            client.apply_move_input(move[0], move[1], 1 / 60, now)
+            client.move(1 / 60, game_map, now)
+            if i < 20:
+                entries = new_inputs([list(e) for e in predictor.outgoing()['data']['inputs']], server_seq)
+                for entry in entries:
+                    apply_input(server, entry, game_map, now)
+                    server_seq = entry[0]
+        log_test("服务端跳过重复输入", server_seq == 20)
+        
+        # 回送第20条输入的结果：回放剩余10条后与本地预测一致
+        predicted = pygame.Vector2(client.pos)
+        ack = {'seq': server_seq, 'pos': [server.pos.x, server.pos.y], 'vel': [server.velocity.x, server.velocity.y]}
+        predictor.reconcile(client, game_map, ack, now)
+        log_test("预测回放一致", len(predictor.pending) == 10 and client.pos.distance_to(predicted) < 1e-6)
+        
+        # 服务端位置不同（如被阻挡）时，校正到服务端位置加上未确认输入的位移
+        ack['pos'] = [server.pos.x - 10, server.pos.y]
+        predictor.reconcile(client, game_map, ack, now)
+        log_test("服务端校正", abs(predictor.last_correction - 10) < 1e-6)
+        log_test("忽略旧回送", not predictor.reconcile(client, game_map, dict(ack, seq=5), now))
+        
+        # 超过INPUT_REDUNDANCY条的包整体丢弃；累计dt超出真实时间加余量的输入不执行
+        burst = [[seq, 0.1, 1, 0, 0] for seq in range(1, 501)]
+        log_test("拒绝超量输入包", new_inputs(burst, 0) == [])
+        
+        # JSON Infinity 的条目单独跳过；同一序号重复时只执行一次
+        mixed = [[float('inf'), 0.01, 1, 0, 0], [2, 0.01, float('inf'), 0, float('-inf')],
+                 [3, 0.01, 1, 0, 0], [3, 0.02, -1, 0, 0]]
+        log_test("跳过溢出条目并按序号去重", new_inputs(mixed, 0) == [(3, 0.01, 1, 0, 0)])
+        budget = InputBudget(100.0)
+        log_test("移动时间预算", len(budget.take(new_inputs(burst[:INPUT_REDUNDANCY], 0), 100.0)) == 2
+                 and len(budget.take(new_inputs(burst[2:2 + INPUT_REDUNDANCY], 2), 100.1)) == 1)
+        
+    except Exception as e:
+        log_test("Prediction模块测试", False, str(e))
+
+def test_interpolation_module():
+    """测试远程玩家快照插值"""
+    print("\n=== 测试 Interpolation 模块 ===")
+    
+    try:
+        from interpolation import SnapshotInterpolator
+        
+        interp = SnapshotInterpolator(delay=0.1, max_extrapolation=0.1)
+        for i in range(5):
+            interp.push(7, 10.0 + i * 0.05, [100 + i * 10, 200], 350 + i * 5)
+        
+        x, y, angle = interp.sample(7, 10.125 + 0.1)
+        log_test("快照插值位置", abs(x - 125) < 1e-6 and y == 200)
+        log_test("快照插值朝向（跨越360度）", abs(angle % 360 - 2.5) < 1e-6)
+        
+        # 快照中断：按最后的速度外推，最多外推max_extrapolation秒
+        x, _, _ = interp.sample(7, 10.2 + 0.05 + 0.1)
+        far_x, _, _ = interp.sample(7, 10.2 + 5 + 0.1)
+        log_test("快照外推", abs(x - 150) < 1e-6 and abs(far_x - 160) < 1e-6)
+        
+        # 位移远超移动速度视为传送，直接跳到新位置
+        interp.push(7, 10.25, [2000, 2000], 0)
+        log_test("传送不插值", interp.sample(7, 10.3)[:2] == (2000.0, 2000.0))
+        log_test("无数据的实体", interp.sample(8, 10.3) is None)
+        
+    except Exception as e:
+        log_test("Interpolation模块测试", False, str(e))
+
+def test_lag_compensation_module():
+    """测试延迟补偿的位置回溯"""
+    print("\n=== 测试 LagCompensation 模块 ===")
+    
+    try:
+        import numpy as np
+        from bullet_pool import BulletPool, NO_TEAM
+        from lag_compensation import PositionHistory, view_latency
+        
+        history = PositionHistory(window=0.3)
+        for i in range(7):
+            history.record(10.0 + i * 0.05, {5: (300.0, 100.0 + i * 10)})
+        log_test("回溯插值", history.rewind(10.125) == {5: (300.0, 125.0)})
+        log_test("回溯超出记录范围", history.rewind(9.0)[5] == (300.0, 100.0) and history.rewind(11.0)[5] == (300.0, 160.0))
+        log_test("视角延迟上限", abs(view_latency(0.05, 0.1, 0.3) - 0.15) < 1e-9 and view_latency(1.0, 0.1, 0.3) == 0.3)
+        
+        # 子弹扫过目标0.3秒前的位置：按当前位置未命中，按回溯位置命中
+        pool = BulletPool()
+        pool.sync([{'id': 1, 'pos': [250, 100], 'dir': [1, 0], 'owner': 2, 'time': 0}], speed=500)
+        past = history.rewind(10.0)[5]
+        hits, _ = pool.step(0.2, np.empty((0, 4)), np.array([5]), np.array([[[past[0], past[1]]]]),
+                            np.array([NO_TEAM]), np.array([NO_TEAM]))
+        log_test("按回溯位置命中", hits == [(1, 2, 5)])
+        
+        # 复活传送不插出中间位置；超出窗口的旧记录被丢弃
+        history.record(10.35, {5: (2000.0, 2000.0)})
+        log_test("回溯不跨越传送", history.rewind(10.34)[5] == (2000.0, 2000.0)
+                 and history.rewind(10.31)[5] == (300.0, 160.0))
+        history.record(10.42, {})
+        log_test("回溯窗口", history.frames[0][0] == 10.1 and history.frames[1][0] > 10.12)
+        
+    except Exception as e:
+        log_test("LagCompensation模块测试", False, str(e))
+
+def test_interest_module():
+    """测试广播兴趣管理"""
+    print("\n=== 测试 Interest 模块 ===")
+    
+    try:
+        from interest import InterestIndex
+        
+        players = {
+            '1': {'pos': [100, 100], 'team_id': None},
+            '2': {'pos': [550, 100], 'team_id': None},               # 同房间
+            '3': {'pos': [700, 100], 'team_id': None},               # 相邻房间、半径内
+            '4': {'pos': [1700, 1700], 'team_id': None},             # 远处
+            '5': {'pos': [1700, 100], 'team_id': None},              # 远处队友
+        }
+        bullets = [
+            {'id': 1, 'pos': [120, 100], 'owner': 4},
+            {'id': 2, 'pos': [1600, 1600], 'owner': 1},
+            {'id': 3, 'pos': [1600, 1600], 'owner': 4},
+        ]
+        items = [{'id': 1, 'pos': [300, 300]}, {'id': 2, 'pos': [1500, 1500]}]
+        index = InterestIndex(players, bullets, items, radius=ROOM_SIZE,
+                              teammates_of=lambda pid: [5] if pid == 1 else [])
+        
+        log_test("兴趣集合-附近与队友", index.players_for(1) == {'1', '2', '3', '5'})
+        log_test("兴趣集合-远处玩家", index.players_for(4) == {'4'})
+        log_test("兴趣集合-子弹", [b['id'] for b in index.bullets_for(1)] == [1, 2])
+        log_test("兴趣集合-道具", [i['id'] for i in index.items_for(1)] == [1])
+        
+    except Exception as e:
+        log_test("Interest模块测试", False, str(e))
+
+def test_server_tick_module():
+    """测试服务端固定步长时钟"""
+    print("\n=== 测试 Server Tick 模块 ===")
+    
+    try:
+        from server_tick import FixedTickClock
+        
+        clock = FixedTickClock(tick_rate=60, max_catchup_ticks=5, broadcast_rate=20, ai_rate=20)
+        log_test("首次推进不产生tick", clock.advance(0.0) == 0)
+        log_test("按固定步长推进", clock.advance(0.05) == 3)
+        log_test("慢帧追帧上限", clock.advance(1.05) == 5 and clock.dropped_time > 0)
+        log_test("广播分频", clock.broadcast_every == 3 and abs(clock.ai_interval - 0.05) < 1e-9)
+        
+    except Exception as e:
+        log_test("Server Tick模块测试", False, str(e))
+
+def test_spatial_index_module():
+    """测试空间索引"""
+    print("\n=== 测试 Spatial Index 模块 ===")
+    
+    try:
+        from spatial_index import SpatialHash
+        from utils import has_line_of_sight
+        
+        grid = SpatialHash(cell_size=100)
+        grid.insert('a', (50, 50, 20, 20))
+        grid.insert('b', (450, 50, 20, 20))
+        log_test("矩形查询", grid.query_rect((40, 40, 30, 30)) == ['a'])
+        log_test("半径查询", grid.query_radius((300, 60), 160) == ['b'])
+        grid.update('a', (460, 60, 20, 20))
+        log_test("增量更新", sorted(grid.query_rect((440, 40, 60, 60))) == ['a', 'b'])
+        log_test("线段候选", grid.query_segment((0, 60), (500, 60)) == {'a', 'b'})
+        
+        game_map = Map()
+        door = game_map.doors[0]
+        # 垂直穿过门洞的视线
+        offset = pygame.Vector2(200, 0) if door.rect.height > door.rect.width else pygame.Vector2(0, 200)
+        start = pygame.Vector2(door.rect.center) - offset
+        end = pygame.Vector2(door.rect.center) + offset
+        log_test("关闭的门阻挡视线",
+                 not has_line_of_sight(start, end, game_map.walls, game_map.doors, game_map.spatial))
+        door.open()
+        for _ in range(20):
+            game_map.update(0.1)
+        log_test("门打开后索引同步", 0 not in game_map.spatial.door_hash and
+                 has_line_of_sight(start, end, game_map.walls, game_map.doors, game_map.spatial) ==
+                 has_line_of_sight(start, end, game_map.walls, game_map.doors))
+        
+        # 玩家层：子弹目标候选只包含子弹附近的玩家
+        from types import SimpleNamespace
+        from bullet_pool import BulletPool
+        from game_world import GameWorldMixin
+        world = GameWorldMixin()
+        world.game_map = game_map
+        world.position_history = None
+        world.network_manager = SimpleNamespace(is_server=True)
+        players = {1: Player(1, 100, 100), 2: Player(2, 1500, 1500), 3: Player(3, 130, 100)}
+        game_map.spatial.update_players(players)
+        log_test("玩家层半径查询", sorted(game_map.spatial.players_in_radius((110, 100), 30)) == [1, 3])
+        pool = BulletPool()
+        pool.sync([{'id': 1, 'pos': [100, 100], 'dir': [1, 0], 'owner': 1, 'time': 0}], speed=800)
+        log_test("子弹目标候选", world._bullet_target_candidates(pool, 0.05) == {1, 3})
+        del players[3]
+        game_map.spatial.update_players(players)
+        log_test("玩家层移除", game_map.spatial.players_in_radius((130, 100), 5) == [])
+        
+        # 道具层：拾取检测只检查附近的道具，结果与线性遍历一致
+        from items import ItemManager, ItemType
+        manager = ItemManager()
+        manager.attach_spatial_index(game_map.spatial)
+        near_item = manager.spawn_item(ItemType.AMMO_BOX, (300, 300))
+        manager.spawn_item(ItemType.AMMO_BOX, (900, 300))
+        log_test("道具层半径查询", game_map.spatial.items_in_radius((310, 300), 30) == [near_item.id])
+        picker = Player(5, 320, 300)
+        log_test("索引拾取检测", manager.check_pickup(picker) is not None and not near_item.is_active)
+        picker.pos = pygame.Vector2(600, 300)
+        log_test("远处不拾取", manager.check_pickup(picker) is None)
+        manager.set_state({'items': []})
+        log_test("道具层随状态同步", len(game_map.spatial.item_hash) == 0)
+        
+    except Exception as e:
+        log_test("Spatial Index模块测试", False, str(e))
+
+def test_bullet_pool_module():
+    """测试NumPy子弹池"""
+    print("\n=== 测试 Bullet Pool 模块 ===")
+    
+    try:
+        import numpy as np
+        from bullet_pool import BulletPool, rect_array, NO_TEAM
+        
+        pool = BulletPool(capacity=1)
+        pool.sync([
+            {'id': 1, 'pos': [100, 100], 'dir': [1, 0], 'owner': 1, 'time': 0},
+            {'id': 2, 'pos': [100, 200], 'dir': [1, 0], 'owner': 1, 'time': 0},
+            {'id': 3, 'pos': [300, 300], 'dir': [0, 1], 'owner': 1, 'time': 0},
+        ], speed=500)
+        log_test("子弹池扩容", len(pool) == 3)
+        
+        walls = rect_array([pygame.Rect(290, 320, 40, 20)])
+        player_ids = np.array([2, 3])
+        player_pos = np.array([[130.0, 100.0], [130.0, 200.0]])
+        hits, removed = pool.step(0.05, walls, player_ids, player_pos,
+                                  np.array([NO_TEAM, 7]), np.array([NO_TEAM, 7, NO_TEAM]))
+        log_test("批量命中（跳过队友）", hits == [(1, 1, 2)])
+        log_test("批量撞墙移除", sorted(removed) == [1, 3] and [b.id for b in pool] == [2])
+        
+        pool.sync([], speed=500)
+        log_test("同步移除子弹", len(pool) == 0)
+        
+        # 慢帧一步移动200像素，扫掠检测不会穿过20像素的墙
+        pool.sync([{'id': 4, 'pos': [200, 330], 'dir': [1, 0], 'owner': 1, 'time': 0}], speed=800)
+        hits, removed = pool.step(0.25, walls, player_ids[:0], player_pos[:0],
+                                  np.array([], dtype=np.int64), np.array([NO_TEAM]))
+        log_test("扫掠检测防穿墙", removed == [4])
+        pool.sync([{'id': 5, 'pos': [100, 500], 'dir': [1, 0], 'owner': 1, 'time': 0}], speed=800)
+        hits, removed = pool.step(0.25, walls, player_ids[:1], np.array([[200.0, 500.0]]),
+                                  np.array([NO_TEAM]), np.array([NO_TEAM]))
+        log_test("扫掠检测防穿过玩家", hits == [(5, 1, 2)] and removed == [5])
+        
+    except Exception as e:
+        log_test("Bullet Pool模块测试", False, str(e))
+
+def test_visibility_module():
+    """测试可见多边形"""
+    print("\n=== 测试 Visibility 模块 ===")
+    
+    try:
+        from visibility import VisibilityCache, compute_visibility_polygon, rect_edges
+        
+        # 正前方100像素处有一堵墙
+        edges = rect_edges([pygame.Rect(100, -50, 20, 100)])
+        polygon = compute_visibility_polygon((0, 0), 0, 30, edges, vision_range=300)
+        log_test("可见多边形-起点", polygon[0] == (0, 0))
+        log_test("可见多边形-墙壁遮挡", all(x <= 100 + 1e-6 for x, _ in polygon[1:]))
+        
+        game_map = Map()
+        cache = VisibilityCache(game_map)
+        pos = pygame.Vector2(300, 300)
+        first = cache.get(pos, 45, 120)
+        log_test("可见多边形缓存命中", cache.get(pos + pygame.Vector2(0.5, 0), 45.2, 120) is first)
+        game_map.doors[0].open()
+        for _ in range(20):
+            game_map.update(0.1)
+        log_test("门状态变化后缓存失效", cache.get(pos, 45, 120) is not first)
+        
+    except Exception as e:
+        log_test("Visibility模块测试", False, str(e))
+
+def test_navigation_module():
+    """测试共享导航网格"""
+    print("\n=== 测试 Navigation 模块 ===")
+    
+    try:
+        game_map = Map()
+        ai_a = AIPlayer("ai_nav_a", 300, 300, game_map)
+        ai_b = AIPlayer("ai_nav_b", 500, 500, game_map)
+        log_test("AI共用导航网格", ai_a.navigation is ai_b.navigation)
+        
+        nav = game_map.get_navigation_grid(PLAYER_RADIUS)
+        path = nav.find_path(pygame.Vector2(300, 300), pygame.Vector2(ROOM_SIZE * 2 + 300, 300))
+        log_test("跨房间寻路", len(path) > 0)
+        
+        # 起点在已缓存路径上时复用其后缀
+        cells = nav.find_cell_path(nav.to_cell(path[0]), nav.to_cell(path[-1]))
+        misses = nav.cache_misses
+        suffix = nav.find_cell_path(cells[3], cells[-1])
+        log_test("路径缓存复用后缀", nav.cache_misses == misses and suffix == cells[3:])
+        
+        # 多个AI前往同一目标时共享流场，沿流场可到达目标
+        goal = path[-1]
+        fields = [nav.flow_field_for(agent, goal, now=0.0) for agent in range(3)]
+        log_test("同目标AI共享流场", fields[0] is None and fields[1] is None and fields[2] is not None
+                 and nav.flow_field_for(3, goal, now=0.0) is fields[2])
+        pos, steps = path[0], 0
+        while steps < 500 and fields[2].waypoints(pos):
+            pos, steps = fields[2].waypoints(pos)[0], steps + 1
+        log_test("沿流场到达目标", nav.to_cell(pos) == nav.to_cell(goal))
+        
+        x, y = nav.door_cells[0][0]
+        closed_weight = nav.grid.node(x, y).weight
+        game_map.doors[0].open()
+        for _ in range(20):
+            game_map.update(0.1)
+        log_test("开门后门格子代价降低", nav.grid.node(x, y).weight < closed_weight)
+        
+    except Exception as e:
+        log_test("Navigation模块测试", False, str(e))
+
+def test_ai_cost_calculator_module():
+    """测试向量化代价网格"""
+    print("\n=== 测试 AI Cost Calculator 模块 ===")
+    
+    try:
+        from ai_cost_calculator import AICostCalculator
+        
+        game_map = Map()
+        calculator = AICostCalculator()
+        ai_pos = pygame.Vector2(300, 300)
+        enemies = [{'pos': [500, 420], 'health': 80, 'is_dead': False},
+                   {'pos': [900, 300], 'health': 100, 'is_dead': True}]
+        grid = calculator.calculate_position_cost_grid(ai_pos, enemies, game_map)
+        log_test("代价网格尺寸", grid.shape == (calculator.grid_height, calculator.grid_width))
+        
+        # 与逐格计算结果一致
+        matches = True
+        for i, j in [(2, 2), (5, 8), (6, 3), (10, 10)]:
+            cell = pygame.Vector2(calculator.grid_centers_x[j], calculator.grid_centers_y[i])
+            if calculator._is_in_wall(cell, game_map):
+                expected = 9999.0
+            else:
+                expected = max(0.0, calculator.calculate_threat_cost(cell, enemies, game_map) * 2.0
+                               + cell.distance_to(ai_pos) / 1000.0 * 0.5
+                               - calculator.calculate_cover_value(cell, enemies, game_map) * 1.5)
+            matches = matches and abs(grid[i, j] - expected) < 1e-9
+        log_test("向量化代价与逐格计算一致", matches)
+        
+        # 整个网格与标量回退路径比较，敌人放在墙角和门边，覆盖 clipline 取整与连续几何不一致的贴边线段
+        import ai_cost_calculator
+        door = game_map.doors[0].rect
+        wall = game_map.walls[len(game_map.walls) // 2]
+        edge_enemies = [{'pos': [950.0, 1525.0], 'health': 46},
+                        {'pos': [door.right, door.top - 1], 'health': 100},
+                        {'pos': [wall.left - 0.5, wall.bottom], 'health': 70}]
+        vectorized = calculator.calculate_position_cost_grid(ai_pos, edge_enemies, game_map)
+        ai_cost_calculator.HAS_NUMPY = False
+        try:
+            scalar = calculator.calculate_position_cost_grid(ai_pos, edge_enemies, game_map)
+        finally:
+            ai_cost_calculator.HAS_NUMPY = True
+        log_test("贴边视线与标量路径一致", float(abs(vectorized - scalar).max()) < 1e-9)
+        
+        best = calculator.find_best_position(ai_pos, enemies, game_map, max_search_radius=300)
+        log_test("最佳位置在搜索范围内", best is not None and abs(best.x - ai_pos.x) <= 325 and abs(best.y - ai_pos.y) <= 325)
+        
+    except Exception as e:
+        log_test("AI Cost Calculator模块测试", False, str(e))
+
+def test_perception_module():
+    """测试AI感知快照"""
+    print("\n=== 测试 Perception 模块 ===")
+    
+    try:
+        from perception import PerceptionSnapshot
+        from ai_player_enhanced import EnhancedAIPlayer
+        from ai_behavior_tree import IsInDanger
+        from team import TeamManager
+        
+        game_map = Map()
+        team_manager = TeamManager()
+        team_manager.create_team(100)
+        team_manager.join_team(101, 1)
+        ai_players = {100: EnhancedAIPlayer(100, 300, 300), 101: EnhancedAIPlayer(101, 400, 300)}
+        players = {
+            100: {"pos": [300, 300], "is_dead": False},
+            101: {"pos": [400, 300], "is_dead": False},
+            1: {"pos": [300, 400], "is_dead": False, "is_making_sound": True},
+            2: {"pos": [350, 350], "is_dead": False},
+        }
+        snapshot = PerceptionSnapshot(players, game_map, team_manager, ai_players)
+        view = snapshot.view(100)
+        log_test("感知快照距离矩阵", abs(snapshot.distance[0, 1] - 100) < 1e-9)
+        log_test("感知快照敌我划分", [e["id"] for e in view.enemies] == [1, 2] and [a["id"] for a in view.allies] == [101])
+        log_test("感知快照视线与听觉", bool(view.line_of_sight[2]) and bool(view.audible[2]) and not view.audible[3])
+        log_test("感知快照只读", not snapshot.distance.flags.writeable)
+        
+        # 条件节点使用快照与逐个过滤的结果一致
+        enemies, allies = ai_players[100]._split_players(players, team_manager)
+        blackboard = {"enemies": enemies, "allies": allies, "game_map": game_map, "team_manager": team_manager}
+        fallback = IsInDanger().tick(ai_players[100], dict(blackboard, perception=None))
+        log_test("条件节点使用感知快照", IsInDanger().tick(ai_players[100], dict(blackboard, perception=view)) == fallback)
+        
+    except Exception as e:
+        log_test("Perception模块测试", False, str(e))
+
+def test_ai_scheduler_module():
+    """测试AI决策调度器"""
+    print("\n=== 测试 AI Scheduler 模块 ===")
+    
+    try:
+        from ai_scheduler import AIScheduler, TIER_COMBAT, TIER_NEAR, TIER_IDLE
+        
+        class Bot:
+            def __init__(self, x, y):
+                self.pos = pygame.Vector2(x, y)
+                self.health = 100
+        
+        bots = {100: Bot(300, 300), 101: Bot(350, 300), 102: Bot(1500, 1500), 103: Bot(900, 900)}
+        players = {pid: {"pos": [bot.pos.x, bot.pos.y], "is_dead": False} for pid, bot in bots.items()}
+        players[1] = {"pos": [1400, 900], "is_dead": False}  # 真人玩家
+        scheduler = AIScheduler(tick_rate=60, combat_rate=20, think_rates=[10, 5, 2],
+                                near_distance=600, combat_distance=400, budget_ms=1000)
+        tiers = scheduler.classify(bots, players)
+        log_test("AI决策档位", tiers == {100: TIER_COMBAT, 101: TIER_COMBAT, 102: TIER_IDLE, 103: TIER_NEAR})
+        
+        # 一秒内各档位的决策次数，同档位的AI错开到不同tick
+        counts = {pid: 0 for pid in bots}
+        busiest = 0
+        for tick in range(1, 61):
+            due = scheduler.plan(tick, tiers)
+            busiest = max(busiest, len(due))
+            for pid in due:
+                scheduler.thought(pid, tick)
+                counts[pid] += 1
+        log_test("AI决策频率", counts == {100: 20, 101: 20, 102: 2, 103: 10})
+        log_test("AI决策错开", busiest <= 2)
+        
+        # 预算耗尽时每个tick仍至少执行一个AI，其余顺延
+        scheduler = AIScheduler(tick_rate=60, budget_ms=0)
+        due = scheduler.plan(1, {100: TIER_COMBAT, 101: TIER_COMBAT, 102: TIER_COMBAT, 103: TIER_COMBAT})
+        executed = 0
+        for pid in due:
+            if not scheduler.has_budget():
+                scheduler.defer(len(due) - executed)
+                break
+            scheduler.thought(pid, 1)
+            executed += 1
+        log_test("AI决策预算", executed == 1 and scheduler.deferred == len(due) - 1)
+        
+    except Exception as e:
+        log_test("AI Scheduler模块测试", False, str(e))
+
+def test_ai_workers_module():
+    """测试AI决策进程池"""
+    print("\n=== 测试 AI Workers 模块 ===")
+    
+    try:
+        from ai_player_enhanced import EnhancedAIPlayer
+        from ai_workers import AIWorkerPool, decode_action, encode_action
+        
+        game_map = Map()
+        door = game_map.doors[0]
+        action = {"move": pygame.Vector2(3, 4), "angle": 90, "shoot": False, "interact_door": door}
+        encoded = encode_action(action, game_map)
+        decoded = decode_action(encoded, game_map)
+        log_test("AI动作编码", encoded["move"] == (3, 4) and encoded["interact_door"] == 0)
+        log_test("AI动作解码", decoded["move"] == pygame.Vector2(3, 4) and decoded["interact_door"] is door)
+        
+        # 工作进程返回决策，主进程只取回结果
+        bot = EnhancedAIPlayer(100, 300, 300)
+        players = {100: {"pos": [300, 300], "is_dead": False}, 1: {"pos": [350, 300], "is_dead": False}}
+        pool = AIWorkerPool(1)
+        try:
+            submitted = pool.submit(1, 1 / 60, [bot], players, game_map)
+            log_test("AI决策提交", submitted == [100] and pool.submit(2, 1 / 60, [bot], players, game_map) == [])
+            results = []
+            deadline = time.time() + 30
+            while not results and time.time() < deadline:
+                results = pool.collect()
+                time.sleep(0.05)
+            log_test("AI决策结果", len(results) == 1 and results[0][0] == 100 and "move" in results[0][1])
+            
+            # 工作进程退出后不抛出异常，其AI改回主进程决策
+            pool.submit(3, 1 / 60, [bot], players, game_map)
+            pool.processes[0].kill()
+            pool.processes[0].join(5)
+            pool.collect()
+            log_test("AI工作进程退出", not pool.alive[0] and not pool.remote(100)
+                     and pool.submit(4, 1 / 60, [bot], players, game_map) == [])
+        finally:
+            pool.close()
+        
+    except Exception as e:
+        log_test("AI Workers模块测试", False, str(e))
+
+def test_ai_profiler_module():
+    """测试行为树性能分析"""
+    print("\n=== 测试 AI Profiler 模块 ===")
+    
+    try:
+        import json
+        import os
+        import tempfile
+        from ai_player_enhanced import EnhancedAIPlayer
+        from ai_profiler import get_profiler
+        
+        game_map = Map()
+        bot = EnhancedAIPlayer(100, 300, 300)
+        bot.behavior_tree.create_aggressive_tree()
+        profiler = get_profiler()
+        profiler.reset()
+        profiler.enable()
+        for _ in range(5):
+            bot.behavior_tree.tick(bot, [], game_map)
+        root = profiler.stats["aggressive"]["Root"]
+        patrol = profiler.stats["aggressive"]["Root/PatrolAction"]
+        log_test("行为树节点计数", root.calls == 5 and patrol.calls == 5)
+        log_test("行为树自身时间", 0 <= patrol.self_time <= patrol.total <= root.total)
+        log_test("行为树状态分布", sum(root.statuses.values()) == 5)
+        
+        path = os.path.join(tempfile.mkdtemp(), "ai_profile.json")
+        profiler.export(path)
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        log_test("行为树统计导出", data["trees"]["aggressive"]["ticks"] == 5)
+        
+        # 关闭后移除计时包装，不再计数
+        profiler.disable()
+        bot.behavior_tree.tick(bot, [], game_map)
+        log_test("行为树分析关闭", root.calls == 5 and "tick" not in bot.behavior_tree.root.__dict__)
+        
+    except Exception as e:
+        log_test("AI Profiler模块测试", False, str(e))
+
+def test_behavior_tree_compile():
+    """测试行为树编译"""
+    print("\n=== 测试 行为树编译 ===")
+    
+    try:
+        import itertools
+        from ai_behavior_tree import (
+            BehaviorNode, CompiledTree, InverterNode, NodeStatus, SelectorNode, SequenceNode
+        )
+        
+        class Leaf(BehaviorNode):
+            def __init__(self, name, log):
+                super().__init__(name)
+                self.log = log
+                self.result = NodeStatus.SUCCESS
+            
+            def tick(self, ai_player, blackboard):
+                self.log.append(self.name)
+                return self.result
+        
+        log = []
+        leaves = [Leaf(f"L{i}", log) for i in range(5)]
+        root = SelectorNode("Root", [
+            SequenceNode("A", [leaves[0], InverterNode("Not", leaves[1])]),
+            SequenceNode("B", [leaves[2], leaves[3]]),
+            leaves[4],
+        ])
+        compiled = CompiledTree(root)
+        
+        # 所有叶子状态组合下，编译后的执行顺序和结果与节点对象执行一致
+        same = True
+        statuses = [NodeStatus.SUCCESS, NodeStatus.FAILURE, NodeStatus.RUNNING]
+        for combination in itertools.product(statuses, repeat=len(leaves)):
+            for leaf, status in zip(leaves, combination):
+                leaf.result = status
+            log.clear()
+            expected = root.tick(None, {})
+            expected_log = list(log)
+            log.clear()
+            same = same and compiled.run(None, {}) == expected and log == expected_log
+        log_test("行为树编译执行一致", same)
+        
+    except Exception as e:
+        log_test("行为树编译测试", False, str(e))
+
+def test_los_table_module():
+    """测试视线预计算表"""
+    print("\n=== 测试 LOS Table 模块 ===")
+    
+    try:
+        from utils import has_line_of_sight
+        
+        game_map = Map()
+        table = game_map.los_table
+        log_test("同房间视线通畅", table.lookup((300, 300), (400, 400)) is True)
+        log_test("隔墙视线被挡", table.lookup((525, 100), (675, 100)) is False)
+        
+        # 表给出的确定结论必须与精确检测一致（门打开前后）
+        door = game_map.doors[0]
+        center = pygame.Vector2(door.original_rect.center)
+        samples = [(center + pygame.Vector2(dx, dy), center + pygame.Vector2(-dx, -dy + 30))
+                   for dx in range(-150, 151, 50) for dy in range(-150, 151, 50)]
+        
+        def consistent():
+            for start, end in samples:
+                known = table.lookup(start, end)
+                if known is not None and known != has_line_of_sight(start, end, game_map.walls, game_map.doors):
+                    return False
+            return True
+        
+        closed_ok = consistent()
+        version = table.door_version
+        door.open()
+        for _ in range(100):
+            game_map.update(0.05)
+        log_test("门状态变化同步到视线表", table.door_version != version)
+        log_test("视线表结论与精确检测一致", closed_ok and consistent())
+        
+    except Exception as e:
+        log_test("LOS Table模块测试", False, str(e))
+
 # ============================================================================
 # 测试 7: AI Player 模块测试
 # ============================================================================
@@ -321,6 +1136,25 @@ def run_all_tests():
     test_player_module()
     test_map_module()
     test_network_module()
+    test_net_loop_module()
+    test_net_codec_module()
+    test_net_reliable_module()
+    test_prediction_module()
+    test_interpolation_module()
+    test_lag_compensation_module()
+    test_interest_module()
+    test_server_tick_module()
+    test_spatial_index_module()
+    test_bullet_pool_module()
+    test_visibility_module()
+    test_navigation_module()
+    test_ai_cost_calculator_module()
+    test_los_table_module()
+    test_perception_module()
+    test_ai_scheduler_module()
+    test_ai_workers_module()
+    test_ai_profiler_module()
+    test_behavior_tree_compile()
     test_ai_player_module()
     test_game_integration()
     
@@ -48,8 +48,21 @@ def is_in_field_of_view(player_pos, player_angle, target_pos, fov_degrees):
     return angle_diff <= fov_degrees / 2
 
 
-def has_line_of_sight(start_pos, end_pos, walls, doors):
-    """检查两点之间是否有视线（不被墙壁或关闭的门阻挡）"""
+def has_line_of_sight(start_pos, end_pos, walls, doors, spatial_index=None, los_table=None):
+    """
+    检查两点之间是否有视线（不被墙壁或关闭的门阻挡）
+    
+    spatial_index: 可选的MapSpatialIndex，提供时只检查线段经过格子中的墙壁和门
+    los_table: 可选的LineOfSightTable，能给出确定结论时不再做精确检测
+    """
+    if los_table is not None:
+        known = los_table.lookup(start_pos, end_pos)
+        if known is not None:
+            return known
+    
+    if spatial_index is not None:
+        walls, doors = spatial_index.segment_candidates(start_pos, end_pos)
+    
     # 检查与墙壁的碰撞
     for wall in walls:
         if line_intersects_rect(start_pos, end_pos, wall):
@@ -63,14 +76,14 @@ def has_line_of_sight(start_pos, end_pos, walls, doors):
     return True
 
 
-def is_visible(player_pos, player_angle, target_pos, fov_degrees, walls, doors):
+def is_visible(player_pos, player_angle, target_pos, fov_degrees, walls, doors, spatial_index=None, los_table=None):
     """检查目标是否可见（在视野内且有视线）"""
     # 首先检查是否在视野角度内
     if not is_in_field_of_view(player_pos, player_angle, target_pos, fov_degrees):
         return False
     
     # 然后检查是否有视线
-    return has_line_of_sight(player_pos, target_pos, walls, doors)
+    return has_line_of_sight(player_pos, target_pos, walls, doors, spatial_index, los_table)
 
 
 def create_vision_fan_points(player_pos, player_angle, fov_degrees, vision_range, num_points=30):
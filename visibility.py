@@ -0,0 +1,189 @@
+"""
+可见性多边形模块
+
+按角度扫描墙壁和门的边，计算视野扇形内的精确可见区域，替代逐条光线遍历全部墙壁的做法。
+
+算法（关键角扫描）:
+    1. 从空间索引取出视距范围内的墙壁和关闭的门，拆成边
+    2. 收集关键角: 视野两侧边界、落在视野内的边端点和边与边的交点（及其两侧微小偏移）、
+       边与视距圆的交点，以及按视野均分的圆弧采样角（保证视距边界是圆弧）
+    3. 关键角排序后，用 NumPy 一次性求出每条光线与全部边的最近交点
+
+可见区域只在关键角处改变形状，因此结果与逐像素光线投射一致。
+结果按 (位置量化, 朝向量化, 视野角, 门状态版本) 缓存，只有门状态变化时整体失效。
+"""
+
+import math
+from collections import OrderedDict
+from typing import List, Tuple
+
+import numpy as np
+
+from constants import VISION_RANGE, VISION_CACHE_POSITION_QUANTUM, VISION_CACHE_ANGLE_QUANTUM
+
+ANGLE_EPSILON = 0.01  # 端点两侧的偏移角（度），用于看到端点后方的墙
+ARC_SEGMENTS = 40  # 视距圆弧的采样段数（与原光线数量一致）
+
+
+def rect_edges(rects) -> np.ndarray:
+    """把矩形列表拆成 (E, 4) 的边数组 [x1, y1, x2, y2]"""
+    edges = []
+    for rect in rects:
+        left, top, right, bottom = rect.left, rect.top, rect.right, rect.bottom
+        edges.append((left, top, left, bottom))
+        edges.append((right, top, right, bottom))
+        edges.append((left, top, right, top))
+        edges.append((left, bottom, right, bottom))
+    if not edges:
+        return np.empty((0, 4), dtype=np.float64)
+    return np.asarray(edges, dtype=np.float64)
+
+
+def _direction(angles_deg):
+    """游戏坐标系中角度对应的方向（y轴向下，角度逆时针）"""
+    rad = np.radians(angles_deg)
+    return np.cos(rad), -np.sin(rad)
+
+
+def _edge_crossings(edges: np.ndarray) -> np.ndarray:
+    """边两两之间的交点 (M, 2)"""
+    px, py = edges[:, None, 0], edges[:, None, 1]
+    rx, ry = edges[:, None, 2] - px, edges[:, None, 3] - py
+    qx, qy = edges[None, :, 0], edges[None, :, 1]
+    sx, sy = edges[None, :, 2] - qx, edges[None, :, 3] - qy
+    denom = rx * sy - ry * sx
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = ((qx - px) * sy - (qy - py) * sx) / denom
+        u = ((qx - px) * ry - (qy - py) * rx) / denom
+        x = px + t * rx
+        y = py + t * ry
+    hit = (np.abs(denom) > 1e-9) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    x = np.broadcast_to(x, hit.shape)[hit]
+    y = np.broadcast_to(y, hit.shape)[hit]
+    return np.stack([x, y], axis=1)
+
+
+def _angle_of(dx, dy):
+    return np.degrees(np.arctan2(-dy, dx))
+
+
+def compute_visibility_polygon(origin, angle, fov, edges: np.ndarray,
+                               vision_range=VISION_RANGE) -> List[Tuple[float, float]]:
+    """
+    计算视野扇形内的可见多边形
+
+    Args:
+        origin: 观察点 (x, y)
+        angle: 朝向（度）
+        fov: 视野角（度）
+        edges: (E, 4) 遮挡边
+        vision_range: 视距
+
+    Returns:
+        世界坐标多边形顶点，第一个点为观察点，其余按角度从小到大排列
+    """
+    ox, oy = float(origin[0]), float(origin[1])
+    start_angle = angle - fov / 2
+
+    critical = [np.linspace(0.0, fov, ARC_SEGMENTS + 1)]
+    if len(edges):
+        # 边端点，以及边与边的交点（墙壁相互搭接时可见的拐角不是任何一条边的端点）
+        points = np.concatenate([edges[:, 0:2], edges[:, 2:4], _edge_crossings(edges)])
+        dx = points[:, 0] - ox
+        dy = points[:, 1] - oy
+        near = dx * dx + dy * dy <= vision_range * vision_range
+        endpoint_angles = _angle_of(dx[near], dy[near])
+        critical.extend([endpoint_angles - start_angle - ANGLE_EPSILON,
+                         endpoint_angles - start_angle,
+                         endpoint_angles - start_angle + ANGLE_EPSILON])
+
+        # 边与视距圆的交点
+        ex = edges[:, 2] - edges[:, 0]
+        ey = edges[:, 3] - edges[:, 1]
+        fx = edges[:, 0] - ox
+        fy = edges[:, 1] - oy
+        a = ex * ex + ey * ey
+        b = 2 * (fx * ex + fy * ey)
+        c = fx * fx + fy * fy - vision_range * vision_range
+        disc = b * b - 4 * a * c
+        ok = (disc >= 0) & (a > 0)
+        root = np.sqrt(np.where(ok, disc, 0))
+        for sign in (-1, 1):
+            u = (-b + sign * root) / np.where(a > 0, 2 * a, 1)
+            hit = ok & (u >= 0) & (u <= 1)
+            critical.append(_angle_of(fx[hit] + ex[hit] * u[hit], fy[hit] + ey[hit] * u[hit]) - start_angle)
+
+    # 相对起始边界的角度，只保留视野内的
+    relative = np.concatenate(critical) % 360.0
+    relative = np.unique(np.concatenate([relative[relative <= fov], [0.0, fov]]))
+    ray_angles = start_angle + relative
+    dir_x, dir_y = _direction(ray_angles)
+
+    distance = np.full(len(ray_angles), float(vision_range))
+    if len(edges):
+        # 光线 origin + t*dir 与边 p + u*(q-p) 求交（A×E）
+        sx = edges[None, :, 2] - edges[None, :, 0]
+        sy = edges[None, :, 3] - edges[None, :, 1]
+        px = edges[None, :, 0] - ox
+        py = edges[None, :, 1] - oy
+        rx = dir_x[:, None]
+        ry = dir_y[:, None]
+        denom = rx * sy - ry * sx
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (px * sy - py * sx) / denom
+            u = (px * ry - py * rx) / denom
+        valid = (np.abs(denom) > 1e-9) & (t >= 0) & (u >= 0) & (u <= 1)
+        t = np.where(valid, t, np.inf)
+        distance = np.minimum(distance, t.min(axis=1))
+
+    xs = ox + dir_x * distance
+    ys = oy + dir_y * distance
+    return [(ox, oy)] + list(zip(xs.tolist(), ys.tolist()))
+
+
+class VisibilityCache:
+    """可见多边形缓存（门状态变化时失效）"""
+
+    def __init__(self, game_map, max_entries=64, position_quantum=VISION_CACHE_POSITION_QUANTUM,
+                 angle_quantum=VISION_CACHE_ANGLE_QUANTUM, vision_range=VISION_RANGE):
+        self.game_map = game_map
+        self.max_entries = max_entries
+        self.position_quantum = max(1e-6, position_quantum)
+        self.angle_quantum = max(1e-6, angle_quantum)
+        self.vision_range = vision_range
+        self.entries = OrderedDict()
+        self.door_version = None
+        self.hits = 0
+        self.misses = 0
+
+    def _occluders(self, origin) -> np.ndarray:
+        """视距范围内的墙壁和关闭的门的边"""
+        spatial = self.game_map.spatial
+        r = self.vision_range
+        area = (origin[0] - r, origin[1] - r, r * 2, r * 2)
+        rects = spatial.walls_in_rect(area) + [door.rect for door in spatial.doors_in_rect(area)]
+        return rect_edges(rects)
+
+    def get(self, origin, angle, fov) -> List[Tuple[float, float]]:
+        """获取可见多边形（世界坐标）"""
+        version = self.game_map.spatial.version
+        if version != self.door_version:
+            self.entries.clear()
+            self.door_version = version
+
+        key = (int(math.floor(origin[0] / self.position_quantum)),
+               int(math.floor(origin[1] / self.position_quantum)),
+               int(round((angle % 360.0) / self.angle_quantum)),
+               fov)
+        polygon = self.entries.get(key)
+        if polygon is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return polygon
+
+        self.misses += 1
+        polygon = compute_visibility_polygon(origin, angle, fov, self._occluders(origin), self.vision_range)
+        self.entries[key] = polygon
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return polygon
@@ -50,51 +50,13 @@ class Ray:
         # 计算射线终点
         self.end_pos = self.start_pos + self.direction * self.max_distance
         
-        # 检查与玩家的碰撞
-        closest_hit = None
-        closest_distance = float('inf')
+        # 只检查射线经过格子中的墙壁和关闭的门
+        walls, doors = self.game_map.spatial.segment_candidates(self.start_pos, self.end_pos)
+        obstacles = list(walls) + [door.rect for door in doors if not door.is_open]
+        targets = [player for player in self.players.values()
+                   if player.id != self.owner_id and not player.is_dead]
         
-        for player in self.players.values():
-            if player.id != self.owner_id and not player.is_dead:
-                # 计算射线与玩家的交点
-                player_center = player.pos
-                player_radius = PLAYER_RADIUS
-                
-                # 使用向量投影计算最近点
-                to_player = player_center - self.start_pos
-                projection = to_player.dot(self.direction)
-                
-                # 确保交点在射线上
-                if 0 <= projection <= self.max_distance:
-                    closest_point = self.start_pos + self.direction * projection
-                    distance_to_player = closest_point.distance_to(player_center)
-                    
-                    # 检查是否击中玩家
-                    if distance_to_player <= player_radius:
-                        if projection < closest_distance:
-                            closest_distance = projection
-                            closest_hit = player
-        
-        # 检查与墙壁的碰撞
-        for wall in self.game_map.walls:
-            if self.line_intersects_rect(self.start_pos, self.end_pos, wall):
-                # 计算交点
-                intersection = self.get_line_rect_intersection(self.start_pos, self.end_pos, wall)
-                if intersection:
-                    distance = self.start_pos.distance_to(intersection)
-                    if distance < closest_distance:
-                        closest_distance = distance
-                        closest_hit = None  # 击中墙壁
-        
-        # 检查与门的碰撞
-        for door in self.game_map.doors:
-            if not door.is_open and self.line_intersects_rect(self.start_pos, self.end_pos, door.rect):
-                intersection = self.get_line_rect_intersection(self.start_pos, self.end_pos, door.rect)
-                if intersection:
-                    distance = self.start_pos.distance_to(intersection)
-                    if distance < closest_distance:
-                        closest_distance = distance
-                        closest_hit = None  # 击中门
+        closest_distance, closest_hit = Ray.closest_hit(self.start_pos, self.end_pos, targets, obstacles)
         
         # 设置射线终点
         if closest_distance < float('inf'):
@@ -107,7 +69,67 @@ class Ray:
         # 更新轨迹点
         self.trail_points = [self.start_pos, self.end_pos]
     
-    def line_intersects_rect(self, start, end, rect):
+    @staticmethod
+    def closest_hit(start, end, players, obstacles):
+        """
+        射线的线段最近命中检测（子弹的批量扫掠见 bullet_pool.BulletPool.step）
+        
+        Args:
+            start, end: 线段起点和终点
+            players: 可被击中的玩家（调用方已排除所有者、死亡玩家和队友）
+            obstacles: 墙壁和关闭的门的矩形
+        
+        Returns:
+            (命中距离, 命中玩家)，命中墙壁/门时玩家为None，无命中时为 (inf, None)
+        """
+        start = pygame.Vector2(start)
+        segment = pygame.Vector2(end) - start
+        length = segment.length()
+        if length == 0:
+            return float('inf'), None
+        direction = segment / length
+        
+        closest_hit = None
+        closest_distance = float('inf')
+        
+        # 检查与玩家的碰撞（线段与圆，取进入点）
+        radius_sq = PLAYER_RADIUS * PLAYER_RADIUS
+        for player in players:
+            to_start = start - player.pos
+            c = to_start.length_squared() - radius_sq
+            if c <= 0:
+                distance = 0.0  # 起点已在玩家体内
+            else:
+                b = to_start.dot(direction)
+                disc = b * b - c
+                if b > 0 or disc < 0:
+                    continue
+                distance = -b - math.sqrt(disc)
+                if distance > length:
+                    continue
+            if distance < closest_distance:
+                closest_distance = distance
+                closest_hit = player
+        
+        # 检查与墙壁和门的碰撞
+        for rect in obstacles:
+            if rect.collidepoint(start):
+                distance = 0.0
+            elif Ray.line_intersects_rect(start, end, rect):
+                intersection = Ray.get_line_rect_intersection(start, end, rect)
+                if not intersection:
+                    continue
+                distance = start.distance_to(intersection)
+            else:
+                continue
+            if distance < closest_distance:
+                closest_distance = distance
+                closest_hit = None  # 击中墙壁或门
+        
+        return closest_distance, closest_hit
+    
+    @staticmethod
+    def line_intersects_rect(start, end, rect):
         """检查线段是否与矩形相交"""
         # 获取矩形的四条边
         left = rect.left
@@ -117,21 +139,22 @@ class Ray:
         
         # 检查线段是否与矩形的四条边相交
         # 左边
-        if self.line_intersects_line(start, end, (left, top), (left, bottom)):
+        if Ray.line_intersects_line(start, end, (left, top), (left, bottom)):
             return True
         # 右边
-        if self.line_intersects_line(start, end, (right, top), (right, bottom)):
+        if Ray.line_intersects_line(start, end, (right, top), (right, bottom)):
             return True
         # 上边
-        if self.line_intersects_line(start, end, (left, top), (right, top)):
+        if Ray.line_intersects_line(start, end, (left, top), (right, top)):
             return True
         # 下边
-        if self.line_intersects_line(start, end, (left, bottom), (right, bottom)):
+        if Ray.line_intersects_line(start, end, (left, bottom), (right, bottom)):
             return True
         
         return False
     
-    def line_intersects_line(self, p1, p2, p3, p4):
+    @staticmethod
+    def line_intersects_line(p1, p2, p3, p4):
         """检查两条线段是否相交"""
         x1, y1 = p1
         x2, y2 = p2
@@ -147,7 +170,8 @@ class Ray:
         
         return 0 <= t <= 1 and 0 <= u <= 1
     
-    def get_line_rect_intersection(self, start, end, rect):
+    @staticmethod
+    def get_line_rect_intersection(start, end, rect):
         """获取线段与矩形的交点"""
         # 检查与四条边的交点
         edges = [
@@ -161,7 +185,7 @@ class Ray:
         min_distance = float('inf')
         
         for edge in edges:
-            intersection = self.get_line_line_intersection(start, end, edge[0], edge[1])
+            intersection = Ray.get_line_line_intersection(start, end, edge[0], edge[1])
             if intersection:
                 distance = start.distance_to(intersection)
                 if distance < min_distance:
@@ -170,7 +194,8 @@ class Ray:
         
         return closest_point
     
-    def get_line_line_intersection(self, p1, p2, p3, p4):
+    @staticmethod
+    def get_line_line_intersection(p1, p2, p3, p4):
         """获取两条线段的交点"""
         x1, y1 = p1
         x2, y2 = p2
@@ -199,8 +224,14 @@ class Ray:
         """检查轨迹是否过期"""
         return time.time() - self.trail_creation_time > self.trail_lifetime
     
-    def draw(self, surface, camera_offset, player_pos=None, player_angle=None, walls=None, doors=None, is_aiming=False):
-        """绘制射线和曳光弹效果"""
+    def draw(self, surface, camera_offset, player_pos=None, player_angle=None, walls=None, doors=None, is_aiming=False,
+             spatial_index=None, los_table=None):
+        """
+        绘制射线和曳光弹效果
+
+        spatial_index: 地图空间索引，提供时视线检测只检查线段附近的墙壁和门
+        los_table: 地图视线表，能给出确定结论时不再做精确检测
+        """
         # 计算屏幕坐标
         start_screen = pygame.Vector2(
             self.start_pos.x - camera_offset.x,
@@ -216,7 +247,8 @@ class Ray:
         
         # 检查射线是否可见（在视野内且无遮挡）
         if player_pos and player_angle and walls and doors:
-            if not is_visible(player_pos, player_angle, self.start_pos, current_fov, walls, doors):
+            if not is_visible(player_pos, player_angle, self.start_pos, current_fov, walls, doors,
+                              spatial_index=spatial_index, los_table=los_table):
                 return  # 不可见，不绘制
         
         # 绘制曳光弹轨迹
@@ -391,7 +423,7 @@ class MeleeWeapon:
         return points
 
 class Bullet:
-    """子弹类 - 用于网络同步的子弹"""
+    """子弹渲染对象（由 BulletPool 迭代生成，移动与碰撞检测见 bullet_pool.BulletPool.step）"""
     def __init__(self, bullet_data, custom_speed=None):
         self.id = bullet_data['id']
         self.pos = pygame.Vector2(bullet_data['pos'])
@@ -401,99 +433,10 @@ class Bullet:
         self.speed = custom_speed if custom_speed is not None else BULLET_SPEED
         self.radius = BULLET_RADIUS
         self.creation_time = bullet_data['time']
-        self.has_hit = set()
-
-    def update(self, dt, game_map, players, network_manager=None):
-        """更新子弹位置并检测碰撞"""
-        self.pos += self.direction * self.speed * dt
-        
-        bullet_rect = pygame.Rect(
-            self.pos.x - self.radius,
-            self.pos.y - self.radius,
-            self.radius * 2,
-            self.radius * 2
-        )
-        
-        # 检查与其他玩家的碰撞
-        for player in players.values():
-            if (player.id != self.owner_id and 
-                not player.is_dead and 
-                player.id not in self.has_hit):
-                
-                # 检查是否是队友（团队系统）
-                if network_manager:
-                    game_instance = getattr(network_manager, 'game_instance', None)
-                    # 先用团队管理器判定
-                    if game_instance and hasattr(game_instance, 'team_manager'):
-                        if game_instance.team_manager.are_teammates(self.owner_id, player.id):
-                            continue
-                    # 回退：直接比较双方的team_id（网络数据或对象属性）
-                    try:
-                        owner_team_id = None
-                        target_team_id = None
-                        if hasattr(network_manager, 'players'):
-                            owner_team_id = network_manager.players.get(self.owner_id, {}).get('team_id', None)
-                            target_team_id = network_manager.players.get(player.id, {}).get('team_id', None)
-                        if owner_team_id is None and game_instance:
-                            # 从游戏实例对象获取（玩家或AI）
-                            if hasattr(game_instance, 'players') and self.owner_id in getattr(game_instance, 'players', {}):
-                                owner_team_id = getattr(game_instance.players[self.owner_id], 'team_id', None)
-                            if hasattr(game_instance, 'ai_players') and self.owner_id in getattr(game_instance, 'ai_players', {}):
-                                owner_team_id = getattr(game_instance.ai_players[self.owner_id], 'team_id', None)
-                        if target_team_id is None:
-                            target_team_id = getattr(player, 'team_id', None)
-                        if owner_team_id is not None and target_team_id is not None and owner_team_id == target_team_id:
-                            continue
-                    except Exception:
-                        pass
-                
-                player_rect = pygame.Rect(
-                    player.pos.x - PLAYER_RADIUS,
-                    player.pos.y - PLAYER_RADIUS,
-                    PLAYER_RADIUS * 2,
-                    PLAYER_RADIUS * 2
-                )
-                if bullet_rect.colliderect(player_rect):
-                    self.has_hit.add(player.id)
-                    
-                    print(f"[子弹碰撞] 子弹{self.id}击中玩家{player.id}，所有者{self.owner_id}")
-                    
-                    if network_manager:
-                        damage_data = {
-                            'target_id': player.id,
-                            'damage': BULLET_DAMAGE,
-                            'attacker_id': self.owner_id,
-                            'type': 'bullet'
-                        }
-                        
-                        # 服务端直接处理伤害
-                        if network_manager.is_server:
-                            print(f"[服务端] 直接处理伤害: 玩家{player.id}受到{BULLET_DAMAGE}伤害")
-                            network_manager._handle_damage(damage_data)
-                        else:
-                            # 客户端发送伤害请求
-                            print(f"[客户端] 发送伤害请求: 玩家{player.id}受到{BULLET_DAMAGE}伤害")
-                            network_manager.send_data({
-                                'type': 'hit_damage',
-                                'data': damage_data
-                            })
-                    
-                    return True
-        
-        # 碰撞墙壁检测
-        for wall in game_map.walls:
-            if bullet_rect.colliderect(wall):
-                return True
-                
-        # 检测门碰撞
-        for door in game_map.doors:
-            if door.check_collision(bullet_rect):
-                return True
-                
-        return False
 
-    def draw(self, surface, camera_offset, player_pos=None, player_angle=None, walls=None, doors=None, is_aiming=False):
-        """绘制子弹（考虑视线遮挡）"""
+    def draw(self, surface, camera_offset, player_pos=None, player_angle=None, walls=None, doors=None, is_aiming=False,
+             spatial_index=None, los_table=None):
+        """绘制子弹（考虑视线遮挡，spatial_index/los_table同Ray.draw）"""
         bullet_screen_pos = pygame.Vector2(
             self.pos.x - camera_offset.x,
             self.pos.y - camera_offset.y
@@ -504,7 +447,8 @@ class Bullet:
         
         # 检查子弹是否可见（在视野内且无遮挡）
         if player_pos and player_angle and walls and doors:
-            if not is_visible(player_pos, player_angle, self.pos, current_fov, walls, doors):
+            if not is_visible(player_pos, player_angle, self.pos, current_fov, walls, doors,
+                              spatial_index=spatial_index, los_table=los_table):
                 return  # 不可见，不绘制
         
         pygame.draw.circle(